@@ -3,16 +3,31 @@
 包含库存、支付和订单管理模块
 """
 
-from inventory import Inventory, InsufficientStockError, ProductNotFoundError
+from inventory import (
+    Inventory, ConcurrentInventory, InsufficientStockError, ProductNotFoundError
+)
 from payment import (
     Payment, PaymentProcessor, PaymentStatus, PaymentMethod,
     InsufficientFundsError, PaymentNotFoundError, InvalidPaymentStateError
 )
+from ledger import BalanceLedger
 from order import Order, OrderItem, OrderService, OrderStatus
+from order_columns import OrderItemColumns
+from order_archive import OrderArchive
+from id_generator import SnowflakeIdGenerator, SnowflakeId, parse_id
+from holds import StockHoldManager
+from timer_wheel import TimerWheel
+from journal import EventJournal
+from storage import StorageBackend, MemoryStorage, SQLiteStorage
+from payment_queue import PaymentQueue, PaymentTicket, TicketStatus, QueueFullError
+from idempotency import IdempotencyStore, IdempotencyKeyReusedError
+from reconciliation import PaymentColumns, ReconciliationReport, reconcile
+from trace_store import PaymentTrace, TraceStore
 
 __all__ = [
     # Inventory
     'Inventory',
+    'ConcurrentInventory',
     'InsufficientStockError',
     'ProductNotFoundError',
     
@@ -24,10 +39,39 @@ __all__ = [
     'InsufficientFundsError',
     'PaymentNotFoundError',
     'InvalidPaymentStateError',
+    'BalanceLedger',
+    'PaymentQueue',
+    'PaymentTicket',
+    'TicketStatus',
+    'QueueFullError',
+    'PaymentColumns',
+    'ReconciliationReport',
+    'reconcile',
+    'PaymentTrace',
+    'TraceStore',
     
     # Order
     'Order',
     'OrderItem',
     'OrderService',
     'OrderStatus',
+    'OrderItemColumns',
+    'OrderArchive',
+    'SnowflakeIdGenerator',
+    'SnowflakeId',
+    'parse_id',
+    
+    # Holds
+    'StockHoldManager',
+    'TimerWheel',
+    
+    # Persistence
+    'EventJournal',
+    'StorageBackend',
+    'MemoryStorage',
+    'SQLiteStorage',
+    
+    # Idempotency
+    'IdempotencyStore',
+    'IdempotencyKeyReusedError',
 ]
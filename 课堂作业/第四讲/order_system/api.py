@@ -3,20 +3,201 @@
 提供 REST API 接口
 """
 
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Query, Request
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from starlette.concurrency import run_in_threadpool
 from pydantic import BaseModel
-from typing import List, Dict, Optional
-from inventory import Inventory, InsufficientStockError, ProductNotFoundError
-from payment import PaymentProcessor, PaymentMethod, PaymentStatus, InsufficientFundsError
+from typing import AsyncIterator, Iterator, List, Dict, Optional, Tuple
+from contextlib import asynccontextmanager, suppress
+from datetime import datetime
+import asyncio
+import atexit
+import base64
+import hashlib
+import json
+import os
+from inventory import ConcurrentInventory, InsufficientStockError, ProductNotFoundError
+from payment import (
+    PaymentProcessor, PaymentMethod, PaymentStatus, PaymentNotFoundError,
+    InsufficientFundsError
+)
 from order import OrderService, OrderStatus
+from holds import StockHoldManager
+from order_archive import OrderArchive
+from journal import EventJournal
+from storage import SQLiteStorage, StorageBackend
+from payment_queue import PaymentQueue, QueueFullError, TicketStatus
+from idempotency import IdempotencyKeyReusedError, IdempotencyRecord, IdempotencyStore
+from id_generator import SnowflakeIdGenerator
+
+# 后台归还过期库存暂扣的间隔（秒）
+HOLD_SWEEP_INTERVAL = float(os.environ.get("HOLD_SWEEP_INTERVAL", "1.0"))
+
+
+async def _sweep_expired_holds() -> None:
+    """定期归还过期暂扣的库存，不依赖下一个请求触发"""
+    while True:
+        await asyncio.sleep(HOLD_SWEEP_INTERVAL)
+        try:
+            await run_in_threadpool(hold_manager.expire)
+        except Exception as e:
+            print(f"清理过期暂扣失败: {e}")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """应用生命周期：运行期间在后台清理过期暂扣"""
+    sweeper = asyncio.create_task(_sweep_expired_holds())
+    try:
+        yield
+    finally:
+        sweeper.cancel()
+        with suppress(asyncio.CancelledError):
+            await sweeper
+
 
 # 创建 FastAPI 应用
-app = FastAPI(title="订单系统 API", version="1.0.0")
+app = FastAPI(title="订单系统 API", version="1.0.0", lifespan=lifespan)
 
-# 初始化服务
-inventory = Inventory()
+# 初始化服务（同步接口运行在线程池中，库存需要线程安全）
+inventory = ConcurrentInventory()
 payment_processor = PaymentProcessor()
-order_service = OrderService(inventory, payment_processor)
+# 已确认未支付的订单暂扣库存 15 分钟，超时自动取消
+hold_manager = StockHoldManager(inventory, ttl=900.0)
+
+
+def _archive_path() -> str:
+    """
+    冷存储路径：优先使用 ORDER_ARCHIVE_PATH，未配置时放在事件日志目录或 SQLite 数据库旁边
+    
+    归档事件会把订单移出持久化的状态，状态持久化时冷存储也必须持久化，否则重启后订单丢失
+    """
+    if os.environ.get("ORDER_ARCHIVE_PATH"):
+        return os.environ["ORDER_ARCHIVE_PATH"]
+    if os.environ.get("ORDER_JOURNAL_DIR"):
+        os.makedirs(os.environ["ORDER_JOURNAL_DIR"], exist_ok=True)
+        return os.path.join(os.environ["ORDER_JOURNAL_DIR"], "archive.db")
+    db_path = os.environ.get("ORDER_DB_PATH")
+    if db_path and db_path != ":memory:":
+        return os.path.splitext(db_path)[0] + "_archive.db"
+    return ":memory:"
+
+
+# 已完成/已取消的订单归档到本地 SQLite 冷存储
+archive = OrderArchive(_archive_path())
+# 未指定订单ID时由服务端生成，多进程部署时每个进程的 ORDER_WORKER_ID 必须不同
+order_service = OrderService(
+    inventory, payment_processor, hold_manager, archive=archive,
+    id_generator=SnowflakeIdGenerator(int(os.environ.get("ORDER_WORKER_ID", "0")))
+)
+# 支付请求排队后立即返回受理凭证，由工作协程在线程池中处理
+payment_queue = PaymentQueue(order_service.process_payment,
+                             workers=int(os.environ.get("PAYMENT_WORKERS", "8")))
+atexit.register(payment_queue.close)
+# 带 Idempotency-Key 请求头的修改类请求缓存首次响应 24 小时
+idempotency_store = IdempotencyStore(ttl=86400.0, max_entries=100000)
+
+
+def _new_state() -> Dict:
+    """创建一组空服务（事件日志生成快照时使用）"""
+    state_inventory = ConcurrentInventory()
+    state_payments = PaymentProcessor()
+    return {
+        "stock": state_inventory,
+        "payment": state_payments,
+        "order": OrderService(state_inventory, state_payments)
+    }
+
+
+_services = {"stock": inventory, "payment": payment_processor, "order": order_service}
+
+# 配置 ORDER_JOURNAL_DIR 时所有状态变化写入事件日志，启动时从快照和日志恢复
+journal: Optional[EventJournal] = None
+# 配置 ORDER_DB_PATH 时状态保存到 SQLite（后台批量写入），内存中的服务作为读缓存
+storage: Optional[StorageBackend] = None
+if os.environ.get("ORDER_JOURNAL_DIR"):
+    journal = EventJournal(os.environ["ORDER_JOURNAL_DIR"],
+                           snapshot_every=100000, state_factory=_new_state)
+    journal.recover(_services)
+    order_service.resume_holds()
+elif os.environ.get("ORDER_DB_PATH"):
+    storage = SQLiteStorage(os.environ["ORDER_DB_PATH"])
+    storage.load(_services)
+    storage.attach(_services)
+    order_service.resume_holds()
+    atexit.register(storage.close)
+
+
+@app.middleware("http")
+async def sync_journal(request, call_next):
+    """修改类请求在事件落盘后再返回响应"""
+    response = await call_next(request)
+    if journal is not None and request.method != "GET":
+        await run_in_threadpool(journal.sync)
+    return response
+
+
+@app.middleware("http")
+async def idempotency_key(request: Request, call_next):
+    """
+    同一幂等键的修改类请求只执行一次，重试时返回首次的响应
+    
+    并发的重复请求等待首次执行完成；5xx 响应不缓存，重试会重新执行。
+    流式响应（没有 Content-Length，如批量取消的进度）原样流式返回且不缓存，
+    输出结束后重复请求会重新执行。
+    """
+    key = request.headers.get("Idempotency-Key")
+    if key is None or request.method not in ("POST", "PUT", "PATCH", "DELETE"):
+        return await call_next(request)
+    
+    body = await request.body()
+    fingerprint = hashlib.sha256(b"\n".join(
+        [request.method.encode(), request.url.path.encode(), request.url.query.encode(), body]
+    )).hexdigest()
+    while True:
+        try:
+            record, owner = idempotency_store.begin(key, fingerprint)
+        except IdempotencyKeyReusedError as e:
+            return JSONResponse({"detail": str(e)}, status_code=422)
+        if owner:
+            break
+        cached = record.response if record.done else await record.wait_async()
+        if cached is not None:
+            status_code, raw_headers, content = cached
+            replayed = Response(content=content, status_code=status_code)
+            replayed.raw_headers = raw_headers + [(b"idempotent-replayed", b"true")]
+            return replayed
+        # 首次执行失败，由当前请求重新执行
+    
+    try:
+        response = await call_next(request)
+        if "content-length" not in response.headers:
+            response.body_iterator = _abandon_after(response.body_iterator, record)
+            return response
+        content = b"".join([chunk async for chunk in response.body_iterator])
+    except BaseException:
+        idempotency_store.abandon(record)
+        raise
+    
+    # 保留原始响应头列表，重复的响应头（如多个 set-cookie）不会被合并
+    raw_headers = list(response.raw_headers)
+    if response.status_code >= 500:
+        idempotency_store.abandon(record)
+    else:
+        idempotency_store.complete(record, (response.status_code, raw_headers, content))
+    replied = Response(content=content, status_code=response.status_code)
+    replied.raw_headers = raw_headers
+    return replied
+
+
+async def _abandon_after(body_iterator: AsyncIterator[bytes],
+                         record: IdempotencyRecord) -> AsyncIterator[bytes]:
+    """流式输出响应体，结束（或中断）后放弃幂等记录"""
+    try:
+        async for chunk in body_iterator:
+            yield chunk
+    finally:
+        idempotency_store.abandon(record)
 
 
 # ============= Pydantic 模型 =============
@@ -35,8 +216,8 @@ class OrderItemRequest(BaseModel):
 
 
 class CreateOrderRequest(BaseModel):
-    """创建订单请求模型"""
-    order_id: str
+    """创建订单请求模型（不提供订单ID时由服务端生成）"""
+    order_id: Optional[str] = None
     customer_id: str
 
 
@@ -45,6 +226,35 @@ class PaymentRequest(BaseModel):
     payment_method: str
 
 
+class CheckoutRequest(BaseModel):
+    """一次下单请求模型（不提供订单ID时由服务端生成）"""
+    order_id: Optional[str] = None
+    customer_id: str
+    items: List[OrderItemRequest]
+    payment_method: str
+
+
+class PaymentBatchItem(BaseModel):
+    """批量结算支付项模型（金额须与订单总金额一致）"""
+    order_id: str
+    amount: float
+    payment_method: str
+
+
+class PaymentBatchRequest(BaseModel):
+    """批量结算请求模型"""
+    payments: List[PaymentBatchItem]
+
+
+class BulkCancelRequest(BaseModel):
+    """批量取消订单请求模型（指定订单ID或筛选条件）"""
+    order_ids: Optional[List[str]] = None
+    product_id: Optional[str] = None
+    customer_id: Optional[str] = None
+    since: Optional[datetime] = None
+    until: Optional[datetime] = None
+
+
 class OrderResponse(BaseModel):
     """订单响应模型"""
     order_id: str
@@ -111,7 +321,8 @@ def remove_product(product_id: str):
 def create_order(request: CreateOrderRequest):
     """创建订单"""
     try:
-        order = order_service.create_order(request.order_id, request.customer_id)
+        order_id = request.order_id or order_service.next_order_id()
+        order = order_service.create_order(order_id, request.customer_id)
         return {
             "message": "订单创建成功",
             "order_id": order.order_id,
@@ -145,18 +356,98 @@ def get_order(order_id: str):
     """获取订单详情"""
     try:
         order = order_service.get_order(order_id)
-        return order.to_dict()
+        # 直接返回订单缓存的 JSON，订单未修改时无需重新序列化
+        return Response(content=order.to_json(), media_type="application/json")
     except ValueError as e:
         raise HTTPException(status_code=404, detail=str(e))
 
 
+# 流式输出时每次从索引中取出的订单数量
+STREAM_CHUNK_SIZE = 500
+
+
 @app.get("/api/orders")
-def get_all_orders():
-    """获取所有订单"""
-    orders = order_service.get_all_orders()
-    return {
-        "orders": [order.to_dict() for order in orders.values()]
+def get_all_orders(customer_id: Optional[str] = None, status: Optional[str] = None,
+                   since: Optional[datetime] = None, until: Optional[datetime] = None,
+                   cursor: Optional[str] = None,
+                   limit: int = Query(100, ge=1, le=1000),
+                   format: str = Query("json", pattern="^(json|ndjson)$")):
+    """
+    获取订单（可按客户、状态、创建时间过滤）
+    
+    按 (创建时间, 订单ID) 游标分页，返回 next_cursor 用于获取下一页；
+    format=ndjson 时以每行一个订单的形式流式返回游标之后的全部订单。
+    """
+    try:
+        order_status = OrderStatus(status) if status else None
+        after = _decode_cursor(cursor) if cursor else None
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    filters = {
+        "customer_id": customer_id,
+        "status": order_status,
+        "since": since,
+        "until": until
     }
+    
+    if format == "ndjson":
+        return StreamingResponse(
+            _stream_orders(filters, after), media_type="application/x-ndjson"
+        )
+    
+    # 多取一条用于判断是否还有下一页
+    orders = order_service.find_orders(after=after, limit=limit + 1, **filters)
+    has_more = len(orders) > limit
+    orders = orders[:limit]
+    next_cursor = _encode_cursor(orders[-1]) if has_more else None
+    
+    # 拼接各订单缓存的 JSON，避免逐个重新序列化
+    body = b"".join([
+        b'{"orders":[',
+        b",".join(order.to_json() for order in orders),
+        b'],"next_cursor":',
+        json.dumps(next_cursor).encode("utf-8"),
+        b"}"
+    ])
+    return Response(content=body, media_type="application/json")
+
+
+def _stream_orders(filters: Dict, after: Optional[Tuple[int, str]]) -> Iterator[bytes]:
+    """按块从索引读取订单并逐行输出缓存的 JSON"""
+    while True:
+        orders = order_service.find_orders(after=after, limit=STREAM_CHUNK_SIZE, **filters)
+        for order in orders:
+            yield order.to_json() + b"\n"
+        if len(orders) < STREAM_CHUNK_SIZE:
+            return
+        after = orders[-1].sort_key
+
+
+def _encode_cursor(order) -> str:
+    """
+    生成分页游标
+    
+    使用整数纪元微秒而不是本地时间，夏令时回拨时两个时刻的本地时间相同，不能区分
+    """
+    created_us, order_id = order.sort_key
+    raw = f"{created_us}|{order_id}"
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii")
+
+
+def _decode_cursor(cursor: str) -> Tuple[int, str]:
+    """
+    解析分页游标
+    
+    Raises:
+        ValueError: 游标无效
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode("ascii")).decode("utf-8")
+        created_us, order_id = raw.split("|", 1)
+        return int(created_us), order_id
+    except (ValueError, UnicodeError) as e:
+        raise ValueError(f"无效的分页游标: {cursor}") from e
 
 
 @app.post("/api/orders/{order_id}/confirm")
@@ -174,25 +465,77 @@ def confirm_order(order_id: str):
         raise HTTPException(status_code=400, detail=str(e))
 
 
-@app.post("/api/orders/{order_id}/payment")
-def process_order_payment(order_id: str, payment: PaymentRequest):
-    """处理订单支付"""
+@app.post("/api/orders/{order_id}/payment", status_code=202)
+async def process_order_payment(order_id: str, payment: PaymentRequest,
+                                wait: float = Query(0, ge=0, le=30)):
+    """
+    提交订单支付
+    
+    支付进入队列后立即返回 202 和受理凭证，通过 GET /api/payments/{payment_id} 查询结果；
+    wait 大于0时最多等待该秒数，期间处理完成则直接返回支付结果。
+    """
     try:
         # 验证支付方式
         payment_method = PaymentMethod(payment.payment_method)
-        
-        payment_id = order_service.process_payment(order_id, payment_method)
         order = order_service.get_order(order_id)
-        
-        return {
-            "message": "支付成功",
-            "order_id": order_id,
-            "payment_id": payment_id,
-            "status": order.status.value,
-            "amount": order.total_amount
-        }
-    except (ValueError, InsufficientFundsError) as e:
+    except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
+    
+    ticket_id = f"PAY_{order_id}"
+    ticket = payment_queue.get(ticket_id)
+    if ((ticket is None or ticket.status == TicketStatus.FAILED)
+            and order.status != OrderStatus.CONFIRMED):
+        raise HTTPException(
+            status_code=400,
+            detail=f"只能支付已确认的订单。当前状态: {order.status.value}"
+        )
+    
+    try:
+        ticket = payment_queue.submit(ticket_id, order_id, payment_method)
+    except QueueFullError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    if wait > 0:
+        ticket = await payment_queue.wait_async(ticket_id, wait)
+        if ticket.status == TicketStatus.SUCCEEDED:
+            order = order_service.get_order(order_id)
+            return JSONResponse({
+                "message": "支付成功",
+                "order_id": order_id,
+                "payment_id": ticket.payment_id,
+                "status": order.status.value,
+                "amount": order.total_amount
+            })
+        if ticket.status == TicketStatus.FAILED:
+            raise HTTPException(status_code=400, detail=ticket.error)
+    
+    return {
+        "message": "支付已受理",
+        **ticket.to_dict(),
+        "status_url": f"/api/payments/{ticket_id}"
+    }
+
+
+@app.post("/api/checkout", status_code=201)
+def checkout(request: CheckoutRequest):
+    """一次完成下单：创建订单、添加商品、确认并支付，任一步骤失败时取消订单"""
+    try:
+        order = order_service.checkout(
+            request.customer_id,
+            [(item.product_id, item.quantity, item.price) for item in request.items],
+            PaymentMethod(request.payment_method),
+            order_id=request.order_id
+        )
+    except (ValueError, InsufficientStockError, ProductNotFoundError,
+            InsufficientFundsError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {
+        "message": "下单成功",
+        "order_id": order.order_id,
+        "customer_id": order.customer_id,
+        "payment_id": order.payment_id,
+        "status": order.status.value,
+        "amount": order.total_amount
+    }
 
 
 @app.post("/api/orders/{order_id}/ship")
@@ -240,18 +583,157 @@ def cancel_order(order_id: str):
         raise HTTPException(status_code=400, detail=str(e))
 
 
+@app.post("/api/admin/orders/archive")
+def archive_orders(older_than: Optional[datetime] = None):
+    """将已完成和已取消的订单移入冷存储"""
+    archived = order_service.archive_orders(older_than=older_than)
+    return {
+        "message": "订单归档完成",
+        "archived": archived,
+        "total_archived": len(archive)
+    }
+
+
+@app.post("/api/admin/orders/bulk-cancel")
+def bulk_cancel_orders(request: BulkCancelRequest,
+                       chunk_size: int = Query(500, ge=1, le=10000)):
+    """批量取消订单并退款，以 NDJSON 逐批返回累计进度"""
+    try:
+        progress = order_service.bulk_cancel(
+            order_ids=request.order_ids,
+            product_id=request.product_id,
+            customer_id=request.customer_id,
+            since=request.since,
+            until=request.until,
+            chunk_size=chunk_size
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    return StreamingResponse(_stream_progress(progress), media_type="application/x-ndjson")
+
+
+def _stream_progress(progress: Iterator[Dict]) -> Iterator[bytes]:
+    """逐批输出进度，最后一批在事件落盘后输出"""
+    for item in progress:
+        item["done"] = item["processed"] == item["total"]
+        if item["done"] and journal is not None:
+            journal.sync()
+        yield json.dumps(item, ensure_ascii=False).encode("utf-8") + b"\n"
+
+
+@app.post("/api/admin/journal/snapshot")
+def snapshot_journal():
+    """生成事件日志快照"""
+    if journal is None:
+        raise HTTPException(status_code=400, detail="未启用事件日志")
+    seq = journal.compact()
+    return {
+        "message": "快照生成完成",
+        "seq": seq
+    }
+
+
 # ============= 支付 API =============
 
+@app.get("/api/payments")
+def get_payments(order_id: Optional[str] = None, status: Optional[str] = None,
+                 method: Optional[str] = None,
+                 limit: int = Query(100, ge=1, le=1000)):
+    """获取支付记录（可按订单、状态、支付方式过滤，按创建时间排序）"""
+    try:
+        payment_status = PaymentStatus(status) if status else None
+        payment_method = PaymentMethod(method) if method else None
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    payments = payment_processor.find_payments(
+        order_id=order_id, status=payment_status, method=payment_method, limit=limit
+    )
+    # 不按订单过滤时总数直接读取汇总计数；单个订单的支付记录很少，取结果数量
+    total = (payment_processor.count_payments(payment_status, payment_method)
+             if order_id is None else len(payments))
+    return {
+        "payments": [payment.to_dict() for payment in payments],
+        "total": total
+    }
+
+
+@app.get("/api/payments/stats")
+def get_payment_stats():
+    """按状态和支付方式汇总的支付笔数和金额"""
+    return {
+        "by_status": {
+            status.value: {
+                "count": payment_processor.count_payments(status),
+                "amount": payment_processor.total_amount(status)
+            }
+            for status in PaymentStatus
+        },
+        "by_status_and_method": payment_processor.get_payment_stats()
+    }
+
+
+@app.get("/api/orders/{order_id}/payments")
+def get_order_payments(order_id: str):
+    """获取订单的所有支付记录"""
+    payments = payment_processor.get_payments_by_order(order_id)
+    return {
+        "order_id": order_id,
+        "payments": [payment.to_dict() for payment in payments]
+    }
+
+
 @app.get("/api/payments/{payment_id}")
-def get_payment(payment_id: str):
-    """获取支付信息"""
+async def get_payment(payment_id: str, wait: float = Query(0, ge=0, le=30)):
+    """
+    获取支付信息
+    
+    排队或处理中的支付返回 202 和受理凭证；wait 大于0时最多等待该秒数（长轮询）。
+    """
+    ticket = payment_queue.get(payment_id)
+    if ticket is not None and not ticket.done and wait > 0:
+        ticket = await payment_queue.wait_async(payment_id, wait)
+    if ticket is not None and not ticket.done:
+        return JSONResponse(ticket.to_dict(), status_code=202)
+    
     try:
         payment = payment_processor.get_payment(payment_id)
         return payment.to_dict()
-    except Exception as e:
+    except PaymentNotFoundError as e:
+        # 创建支付记录之前就失败的凭证
+        if ticket is not None:
+            return ticket.to_dict()
         raise HTTPException(status_code=404, detail=str(e))
 
 
+@app.post("/api/payments/batch")
+def settle_payment_batch(request: PaymentBatchRequest):
+    """批量支付已确认的订单（按支付方式分组，每组一次性扣款）"""
+    results: Dict[str, Dict] = {}
+    payments = []
+    # 同一订单只按第一次出现的支付项处理
+    items = {item.order_id: item for item in reversed(request.payments)}
+    ordered_ids = list(dict.fromkeys(item.order_id for item in request.payments))
+    for order_id in ordered_ids:
+        try:
+            payments.append((order_id, items[order_id].amount,
+                             PaymentMethod(items[order_id].payment_method)))
+        except ValueError as e:
+            results[order_id] = {"result": "rejected", "error": str(e)}
+    
+    for order_id, (outcome, payment_id) in order_service.settle_payments(payments).items():
+        results[order_id] = {"result": outcome, "payment_id": payment_id}
+    
+    summary: Dict[str, int] = {}
+    for result in results.values():
+        summary[result["result"]] = summary.get(result["result"], 0) + 1
+    return {
+        "results": [{"order_id": order_id, **results[order_id]} for order_id in ordered_ids],
+        "summary": summary
+    }
+
+
 @app.get("/api/payments/balance/{payment_method}")
 def get_payment_balance(payment_method: str):
     """获取支付方式余额"""
@@ -288,7 +770,8 @@ def health_check():
     return {
         "status": "healthy",
         "inventory_products": len(inventory.get_all_stock()),
-        "total_orders": len(order_service.get_all_orders())
+        "total_orders": order_service.count_orders(),
+        "pending_payments": payment_queue.pending
     }
 
 
@@ -301,6 +784,8 @@ def init_test_data():
     inventory.clear()
     payment_processor.clear()
     order_service.clear()
+    payment_queue.clear()
+    idempotency_store.clear()
     
     # 添加测试商品
     inventory.add_product("P001", 100)
@@ -319,6 +804,8 @@ def clear_test_data():
     inventory.clear()
     payment_processor.clear()
     order_service.clear()
+    payment_queue.clear()
+    idempotency_store.clear()
     
     return {
         "message": "所有数据已清空"
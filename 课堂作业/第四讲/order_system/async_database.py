@@ -0,0 +1,432 @@
+"""
+异步数据库模拟器
+与 database_simulator 相同的数据库模拟和故障注入，延迟和等待使用 asyncio，
+可以在 FastAPI 的异步接口中直接 await，不阻塞事件循环
+"""
+
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from database_simulator import (
+    CircuitOpenError, ConnectionStatus, DatabaseConnectionError, DatabaseOperationError,
+    RecordStore, TransactionConflictError
+)
+from resilience import CircuitBreaker, RetryAttempts, RetryPolicy
+
+
+class AsyncDatabaseSimulator(RecordStore):
+    """
+    异步数据库模拟器
+    
+    查询在 max_connections 个并发连接内进行（信号量），模拟延迟用 asyncio.sleep，
+    等待期间事件循环可以处理其他查询。所有方法都应在同一个事件循环中调用。
+    """
+    
+    def __init__(self, max_connections: int = 10000, latency: float = 0.05):
+        """
+        初始化异步数据库模拟器
+        
+        Args:
+            max_connections: 同时进行的查询数上限
+            latency: 每次查询的模拟延迟（秒）
+        
+        Raises:
+            ValueError: 参数无效
+        """
+        if max_connections <= 0:
+            raise ValueError(f"连接数必须大于0: {max_connections}")
+        if latency < 0:
+            raise ValueError(f"查询延迟不能为负数: {latency}")
+        
+        super().__init__()
+        self.status = ConnectionStatus.CONNECTED
+        self.connection_count = 0
+        self.operation_count = 0
+        self.error_count = 0
+        self.last_error: Optional[str] = None
+        self.last_operation_time: Optional[float] = None
+        self.max_connections = max_connections
+        self.latency = latency
+        self.statement_cost = 0.002  # 秒，批量执行时每条语句的额外开销
+        
+        # 重连时加锁，并发的重连请求只连接一次
+        self._connect_lock = asyncio.Lock()
+        self._connections = asyncio.Semaphore(max_connections)
+        self._in_flight = 0
+        self._max_in_flight = 0
+        self._total_wait = 0.0
+    
+    async def connect(self) -> bool:
+        """
+        连接数据库
+        
+        Returns:
+            是否连接成功
+        """
+        async with self._connect_lock:
+            if self.status == ConnectionStatus.CONNECTED:
+                return True
+            
+            self.status = ConnectionStatus.CONNECTING
+            self.connection_count += 1
+            
+            # 模拟连接延迟
+            await asyncio.sleep(0.1)
+            
+            # 模拟连接成功
+            self.status = ConnectionStatus.CONNECTED
+            self.last_error = None
+            return True
+    
+    def disconnect(self) -> None:
+        """断开数据库连接"""
+        self.status = ConnectionStatus.DISCONNECTED
+        self.last_error = "Connection manually disconnected"
+    
+    def simulate_connection_failure(self) -> None:
+        """模拟连接失败"""
+        self.status = ConnectionStatus.ERROR
+        self.error_count += 1
+        self.last_error = "Simulated connection failure"
+    
+    def is_connected(self) -> bool:
+        """检查是否已连接"""
+        return self.status == ConnectionStatus.CONNECTED
+    
+    def _check_connected(self) -> None:
+        """未连接时记录错误并抛出异常"""
+        if not self.is_connected():
+            self.error_count += 1
+            self.last_error = f"Database not connected. Status: {self.status.value}"
+            raise DatabaseConnectionError(self.last_error)
+    
+    async def execute_query(self, query: str, params: Dict[str, Any] = None,
+                            transaction_id: Optional[str] = None) -> Dict[str, Any]:
+        """
+        执行数据库查询
+        
+        Args:
+            query: SQL查询语句
+            params: 查询参数
+            transaction_id: 事务ID，为空时立即提交
+        
+        Returns:
+            查询结果
+        
+        Raises:
+            DatabaseConnectionError: 连接异常
+        """
+        self.operation_count += 1
+        self.last_operation_time = time.time()
+        self._check_connected()
+        
+        await self._round_trip(self.latency)
+        
+        # 延迟期间连接可能已中断；检查和修改之间没有 await，不会与其他查询交错
+        self._check_connected()
+        return self._dispatch(query, params, transaction_id)
+    
+    async def execute_many(self, statements: List[Tuple[str, Dict[str, Any]]],
+                           transaction_id: Optional[str] = None) -> List[Dict[str, Any]]:
+        """
+        在一次往返中执行多条语句
+        
+        延迟为一次往返加上每条语句的 statement_cost；连接在延迟期间中断时
+        一条也不执行，因此可以整批重试。
+        
+        Args:
+            statements: 语句列表，每条是 (query, params) 元组
+            transaction_id: 事务ID，为空时每条语句立即提交
+        
+        Returns:
+            与语句一一对应的查询结果
+        
+        Raises:
+            DatabaseConnectionError: 连接异常
+        """
+        if not statements:
+            return []
+        
+        self.operation_count += 1
+        self.last_operation_time = time.time()
+        self._check_connected()
+        
+        await self._round_trip(self.latency + self.statement_cost * len(statements))
+        
+        self._check_connected()
+        return [self._dispatch(query, params, transaction_id) for query, params in statements]
+    
+    async def _round_trip(self, delay: float) -> None:
+        """占用一个连接并等待模拟延迟"""
+        start = time.perf_counter()
+        async with self._connections:
+            self._total_wait += time.perf_counter() - start
+            self._in_flight += 1
+            self._max_in_flight = max(self._max_in_flight, self._in_flight)
+            try:
+                await asyncio.sleep(delay)
+            finally:
+                self._in_flight -= 1
+    
+    async def begin_transaction(self) -> str:
+        """
+        开始事务，之后事务内的读取看到此刻已提交的数据
+        
+        Returns:
+            事务ID
+        
+        Raises:
+            DatabaseConnectionError: 连接异常
+        """
+        if not self.is_connected():
+            raise DatabaseConnectionError("Cannot start transaction: not connected")
+        
+        return self._begin()
+    
+    async def commit_transaction(self, transaction_id: str) -> bool:
+        """
+        提交事务：校验快照后一次性写入暂存的修改
+        
+        Args:
+            transaction_id: 事务ID
+        
+        Returns:
+            是否提交成功
+        
+        Raises:
+            DatabaseConnectionError: 连接异常（事务未提交）
+            TransactionConflictError: 提交冲突（事务已丢弃，可以重试）
+            DatabaseOperationError: 事务不存在
+        """
+        if not self.is_connected():
+            raise DatabaseConnectionError("Cannot commit transaction: not connected")
+        
+        # 模拟提交延迟
+        await asyncio.sleep(0.02)
+        
+        if not self.is_connected():
+            raise DatabaseConnectionError("Cannot commit transaction: not connected")
+        self._commit(transaction_id)
+        return True
+    
+    async def rollback_transaction(self, transaction_id: str) -> bool:
+        """
+        回滚事务，丢弃暂存的修改（连接中断时同样丢弃）
+        
+        Args:
+            transaction_id: 事务ID
+        
+        Returns:
+            是否回滚成功
+        
+        Raises:
+            DatabaseConnectionError: 连接异常
+        """
+        self._rollback(transaction_id)
+        if not self.is_connected():
+            raise DatabaseConnectionError("Cannot rollback transaction: not connected")
+        
+        # 模拟回滚延迟
+        await asyncio.sleep(0.02)
+        return True
+    
+    def dump_records(self, table: Optional[str] = None) -> List[Dict[str, Any]]:
+        """
+        导出记录快照（用于对账）
+        
+        Args:
+            table: 表名，为空时导出全部记录
+        
+        Returns:
+            记录副本列表
+        
+        Raises:
+            DatabaseConnectionError: 连接异常
+        """
+        if not self.is_connected():
+            raise DatabaseConnectionError(f"Database not connected. Status: {self.status.value}")
+        return self._records(table)
+    
+    def get_connection_info(self) -> Dict[str, Any]:
+        """获取连接信息"""
+        return {
+            "status": self.status.value,
+            "connection_count": self.connection_count,
+            "operation_count": self.operation_count,
+            "error_count": self.error_count,
+            "last_error": self.last_error,
+            "last_operation_time": self.last_operation_time,
+            "data_records": len(self._data),
+            "in_flight": self._in_flight,
+            "max_in_flight": self._max_in_flight,
+            "total_wait_ms": round(self._total_wait * 1000, 3),
+            "transactions": self._transaction_stats(),
+        }
+    
+    def reset_stats(self) -> None:
+        """重置统计信息"""
+        self.connection_count = 0
+        self.operation_count = 0
+        self.error_count = 0
+        self.last_error = None
+        self.last_operation_time = None
+        self._max_in_flight = self._in_flight
+        self._total_wait = 0.0
+        self._committed_transactions = 0
+        self._transaction_conflicts = 0
+        self._aborted_transactions = 0
+    
+    def clear_data(self) -> None:
+        """清空数据（进行中的事务一并丢弃）"""
+        self._clear_store()
+
+
+class AsyncDatabaseManager:
+    """异步数据库管理器 - 包含重连、退避重试和熔断机制"""
+    
+    def __init__(self, db_simulator: AsyncDatabaseSimulator,
+                 retry_policy: Optional[RetryPolicy] = None,
+                 circuit_breaker: Optional[CircuitBreaker] = None):
+        """
+        初始化异步数据库管理器
+        
+        Args:
+            db_simulator: 异步数据库模拟器实例
+            retry_policy: 重试策略，为空时使用默认的指数退避策略（最多尝试3次）
+            circuit_breaker: 熔断器，为空时不熔断
+        """
+        self.db = db_simulator
+        self.auto_reconnect = True
+        self.retry_policy = retry_policy if retry_policy is not None else RetryPolicy()
+        self.circuit_breaker = circuit_breaker
+    
+    async def execute_with_retry(self, query: str, params: Dict[str, Any] = None,
+                                 transaction_id: Optional[str] = None) -> Dict[str, Any]:
+        """
+        带重试机制的查询执行（退避期间不阻塞事件循环）
+        
+        Args:
+            query: SQL查询语句
+            params: 查询参数
+            transaction_id: 事务ID，为空时立即提交
+        
+        Returns:
+            查询结果
+        
+        Raises:
+            CircuitOpenError: 熔断器打开，未执行查询
+            DatabaseConnectionError: 重试后仍然连接失败
+            DatabaseOperationError: 操作失败
+        """
+        return await self._run_with_retry(lambda: self.db.execute_query(query, params, transaction_id))
+    
+    async def execute_many(self, statements: List[Tuple[str, Dict[str, Any]]],
+                           transaction_id: Optional[str] = None) -> List[Dict[str, Any]]:
+        """
+        在一次往返中执行多条语句，连接失败时整批重试
+        
+        Args:
+            statements: 语句列表，每条是 (query, params) 元组
+            transaction_id: 事务ID，为空时每条语句立即提交
+        
+        Returns:
+            与语句一一对应的查询结果
+        
+        Raises:
+            CircuitOpenError: 熔断器打开，未执行查询
+            DatabaseConnectionError: 重试后仍然连接失败
+            DatabaseOperationError: 操作失败
+        """
+        if not statements:
+            return []
+        return await self._run_with_retry(lambda: self.db.execute_many(statements, transaction_id))
+    
+    async def _run_with_retry(self, execute: Callable[[], Awaitable[Any]]) -> Any:
+        """按重试策略和熔断器执行一次数据库往返"""
+        attempts = RetryAttempts(self.retry_policy, self.circuit_breaker)
+        
+        while True:
+            if not attempts.start():
+                raise CircuitOpenError(
+                    f"Circuit breaker is open, retry in {attempts.retry_after():.1f}s. "
+                    f"Last error: {attempts.last_error}"
+                )
+            
+            try:
+                if not self.db.is_connected() and self.auto_reconnect:
+                    if not await self.db.connect():
+                        raise DatabaseConnectionError("Failed to reconnect to database")
+                
+                result = await execute()
+            
+            except DatabaseConnectionError as e:
+                delay = attempts.failed(e)
+                if delay is None:
+                    break
+                await asyncio.sleep(delay)
+                continue
+            
+            except Exception as e:
+                # 其他异常不重试，也不计入熔断：应用错误不能说明数据库已恢复，释放探测名额
+                attempts.abandoned()
+                raise DatabaseOperationError(f"Database operation failed: {e}")
+            
+            except BaseException:
+                # 请求超时或客户端断开时被取消，没有得到结果：释放探测名额，不计入熔断
+                attempts.abandoned()
+                raise
+            
+            attempts.succeeded()
+            return result
+        
+        raise DatabaseConnectionError(
+            f"Failed to execute query after {attempts.attempt} attempts. Last error: {attempts.last_error}"
+        )
+    
+    async def execute_transaction(self, operations: List[Tuple[str, Dict[str, Any]]]) -> bool:
+        """
+        执行事务，提交冲突时按重试策略退避后重新执行整个事务
+        
+        Args:
+            operations: 操作列表，每个操作是 (query, params) 元组
+        
+        Returns:
+            是否成功
+        
+        Raises:
+            TransactionConflictError: 重试后仍然提交冲突
+        """
+        attempt = 0
+        
+        while True:
+            attempt += 1
+            try:
+                return await self._run_transaction(operations)
+            except TransactionConflictError:
+                if not self.retry_policy.allow_retry(attempt):
+                    raise
+                await asyncio.sleep(self.retry_policy.backoff(attempt - 1))
+    
+    async def _run_transaction(self, operations: List[Tuple[str, Dict[str, Any]]]) -> bool:
+        """执行一次事务，失败或被取消时回滚并抛出原异常"""
+        transaction_id = None
+        
+        try:
+            transaction_id = await self.db.begin_transaction()
+            
+            await self.execute_many(operations, transaction_id)
+            
+            await self.db.commit_transaction(transaction_id)
+            return True
+        
+        except BaseException:
+            # 取消（CancelledError）也要回滚，否则事务一直占用快照；
+            # rollback_transaction 在第一次 await 之前就丢弃了暂存的写入
+            if transaction_id:
+                try:
+                    await self.db.rollback_transaction(transaction_id)
+                except Exception:
+                    # 回滚失败不掩盖原异常
+                    pass
+            raise
@@ -0,0 +1,78 @@
+"""
+异步数据库模拟器并发测试
+在单个事件循环中同时发起大量查询，与线程池中的同步连接池模拟器比较吞吐量
+
+用法:
+    python async_database_benchmark.py [查询数]
+"""
+
+import asyncio
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from async_database import AsyncDatabaseManager, AsyncDatabaseSimulator
+from database_simulator import PooledDatabaseSimulator
+
+
+LATENCY = 0.05
+THREAD_COUNT = 64
+
+
+async def run_async(query_count: int) -> tuple:
+    """
+    单个事件循环中并发执行查询
+    
+    Returns:
+        (耗时秒数, 同时进行的最大查询数)
+    """
+    db = AsyncDatabaseSimulator(max_connections=query_count, latency=LATENCY)
+    manager = AsyncDatabaseManager(db)
+    start = time.perf_counter()
+    await asyncio.gather(*(
+        manager.execute_with_retry("INSERT INTO payment_logs (id)", {"id": f"log_{i}"})
+        for i in range(query_count)
+    ))
+    return time.perf_counter() - start, db.get_connection_info()["max_in_flight"]
+
+
+def run_threads(query_count: int) -> float:
+    """
+    线程池中执行同步连接池模拟器的查询
+    
+    Returns:
+        耗时秒数
+    """
+    db = PooledDatabaseSimulator(pool_size=THREAD_COUNT, latency=LATENCY)
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=THREAD_COUNT) as executor:
+        list(executor.map(
+            lambda i: db.execute_query("INSERT INTO payment_logs (id)", {"id": f"log_{i}"}),
+            range(query_count)
+        ))
+    return time.perf_counter() - start
+
+
+def main() -> None:
+    query_count = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    
+    print("⚡ 异步数据库模拟器并发测试")
+    print("=" * 60)
+    print(f"   - 查询数: {query_count:,}")
+    print(f"   - 单次查询延迟: {LATENCY * 1000:.0f} ms")
+    print()
+    
+    elapsed, max_in_flight = asyncio.run(run_async(query_count))
+    print(f"   异步（单事件循环）: {elapsed:.2f} 秒, {query_count / elapsed:>10,.0f} 次/秒, "
+          f"最大并发 {max_in_flight:,}")
+    
+    thread_elapsed = run_threads(query_count)
+    print(f"   同步（{THREAD_COUNT} 线程连接池）: {thread_elapsed:.2f} 秒, "
+          f"{query_count / thread_elapsed:>10,.0f} 次/秒")
+    print("-" * 60)
+    ok = max_in_flight >= min(query_count, 1000)
+    print(f"{'✅' if ok else '❌'} 单个事件循环{'能' if ok else '未能'}同时保持上千个进行中的查询")
+
+
+if __name__ == "__main__":
+    main()
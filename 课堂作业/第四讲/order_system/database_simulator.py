@@ -3,10 +3,14 @@
 用于模拟数据库连接中断和恢复的情况
 """
 
+import itertools
+import queue
+import re
 import time
 import threading
-from typing import Dict, Any, Optional
+from typing import Callable, Dict, Any, List, Optional, Set, Tuple
 from enum import Enum
+from resilience import CircuitBreaker, RetryAttempts, RetryPolicy
 
 
 class ConnectionStatus(Enum):
@@ -27,26 +31,360 @@ class DatabaseOperationError(Exception):
     pass
 
 
-class DatabaseSimulator:
+class CircuitOpenError(DatabaseConnectionError):
+    """熔断器打开，数据库操作被快速拒绝"""
+    pass
+
+
+class PoolTimeoutError(DatabaseOperationError):
+    """连接池已耗尽，等待空闲连接超时（数据库本身可达，不计入熔断）"""
+    pass
+
+
+class TransactionConflictError(DatabaseOperationError):
+    """事务提交时校验失败（读取或写入的记录已被其他事务修改），可以重试整个事务"""
+    pass
+
+
+class StagedTransaction:
+    """
+    事务状态
+    
+    snapshot 是开始时已提交的版本号，读取看到该版本的数据；写入暂存在 writes 中，
+    提交前其他事务不可见。started_at 是开始时的单调时钟时间，用于中止超时的事务。
+    """
+    
+    __slots__ = ("transaction_id", "snapshot", "started_at", "reads", "writes")
+    
+    def __init__(self, transaction_id: str, snapshot: int):
+        """
+        初始化事务状态
+        
+        Args:
+            transaction_id: 事务ID
+            snapshot: 快照版本号
+        """
+        self.transaction_id = transaction_id
+        self.snapshot = snapshot
+        self.started_at = time.monotonic()
+        # 按键读取过的记录（提交时校验）
+        self.reads: Set[str] = set()
+        # 记录键 -> (新记录, 表名)，新记录为 None 表示删除
+        self.writes: Dict[str, Tuple[Optional[Dict[str, Any]], Optional[str]]] = {}
+
+
+class RecordStore:
+    """
+    内存记录存储（多版本并发控制）
+    
+    按语句类型把 SQL 分派到对内存数据的操作，同步和异步数据库模拟器共用；
+    调用方保证调用时没有并发修改。
+    
+    每次提交（包括事务外的单条写入）分配一个递增的版本号。事务读取开始时的快照，
+    写入暂存到提交时才生效；提交时如果按键读取或写入的记录在快照之后被修改过，
+    抛出 TransactionConflictError（先提交者胜）。仍有事务需要的旧版本保留在
+    _history 中，不再需要时清理。SELECT 读取快照但不参与提交校验。
+    
+    开始超过 max_transaction_age 秒仍未结束的事务被中止，避免未提交也未回滚的
+    事务让旧版本无限增长；之后提交该事务会报告事务不存在。
+    """
+    
+    def __init__(self):
+        """初始化记录存储"""
+        # 模拟数据存储（最新已提交的记录）
+        self._data: Dict[str, Any] = {}
+        # 记录键 -> 插入时的表名
+        self._tables: Dict[str, str] = {}
+        # 记录键 -> 最后一次写入（含删除）的版本号
+        self._versions: Dict[str, int] = {}
+        # 记录键 -> 被覆盖的旧版本 [(版本号, 记录)]，按版本号递增
+        self._history: Dict[str, List[Tuple[int, Optional[Dict[str, Any]]]]] = {}
+        self._commit_version = 0
+        self._transactions: Dict[str, StagedTransaction] = {}
+        self._transaction_ids = itertools.count(1)
+        self._committed_transactions = 0
+        self._transaction_conflicts = 0
+        self._aborted_transactions = 0
+        self.max_transaction_age = 60.0  # 秒
+    
+    def _clear_store(self) -> None:
+        """清空记录、版本和进行中的事务"""
+        self._data.clear()
+        self._tables.clear()
+        self._versions.clear()
+        self._history.clear()
+        self._transactions.clear()
+    
+    def _dispatch(self, query: str, params: Dict[str, Any] = None,
+                  transaction_id: Optional[str] = None) -> Dict[str, Any]:
+        """
+        按语句类型执行内存数据操作
+        
+        Raises:
+            DatabaseOperationError: 事务不存在
+        """
+        txn = self._transaction(transaction_id) if transaction_id is not None else None
+        if query.upper().startswith('SELECT'):
+            return self._handle_select(query, params, txn)
+        elif query.upper().startswith('INSERT'):
+            return self._handle_insert(query, params, txn)
+        elif query.upper().startswith('UPDATE'):
+            return self._handle_update(query, params, txn)
+        elif query.upper().startswith('DELETE'):
+            return self._handle_delete(query, params, txn)
+        else:
+            return {"status": "success", "message": "Query executed"}
+    
+    def _handle_select(self, query: str, params: Dict[str, Any] = None,
+                       txn: Optional[StagedTransaction] = None) -> Dict[str, Any]:
+        """处理SELECT查询"""
+        # 简单模拟：返回一些数据
+        data = self._visible_records(txn)
+        return {
+            "status": "success",
+            "data": data,
+            "count": len(data)
+        }
+    
+    def _handle_insert(self, query: str, params: Dict[str, Any] = None,
+                       txn: Optional[StagedTransaction] = None) -> Dict[str, Any]:
+        """处理INSERT查询"""
+        if params:
+            key = params.get('id', f"record_{len(self._data) + 1}")
+            match = re.match(r"INSERT\s+INTO\s+(\w+)", query, re.IGNORECASE)
+            self._write(key, params, match.group(1) if match else None, txn)
+        
+        return {
+            "status": "success",
+            "message": "Record inserted",
+            "affected_rows": 1
+        }
+    
+    def _handle_update(self, query: str, params: Dict[str, Any] = None,
+                       txn: Optional[StagedTransaction] = None) -> Dict[str, Any]:
+        """处理UPDATE查询"""
+        affected_rows = 0
+        if params and 'id' in params:
+            key = params['id']
+            record = self._read(key, txn)
+            if record is not None:
+                # 写时复制，旧版本保持不变
+                self._write(key, {**record, **params}, None, txn)
+                affected_rows = 1
+        
+        return {
+            "status": "success",
+            "message": "Record updated",
+            "affected_rows": affected_rows
+        }
+    
+    def _handle_delete(self, query: str, params: Dict[str, Any] = None,
+                       txn: Optional[StagedTransaction] = None) -> Dict[str, Any]:
+        """处理DELETE查询"""
+        affected_rows = 0
+        if params and 'id' in params:
+            key = params['id']
+            if self._read(key, txn) is not None:
+                self._write(key, None, None, txn)
+                affected_rows = 1
+        
+        return {
+            "status": "success",
+            "message": "Record deleted",
+            "affected_rows": affected_rows
+        }
+    
+    def _records(self, table: Optional[str] = None) -> List[Dict[str, Any]]:
+        """已提交记录的副本列表，table 为空时包含全部记录"""
+        return [dict(record) for key, record in self._data.items()
+                if table is None or self._tables.get(key) == table]
+    
+    def _transaction(self, transaction_id: str) -> StagedTransaction:
+        """
+        查找进行中的事务
+        
+        Raises:
+            DatabaseOperationError: 事务不存在（未开始、已提交或已回滚）
+        """
+        txn = self._transactions.get(transaction_id)
+        if txn is None:
+            raise DatabaseOperationError(f"事务不存在或已结束: {transaction_id}")
+        return txn
+    
+    def _snapshot_read(self, key: str, snapshot: int) -> Optional[Dict[str, Any]]:
+        """读取快照版本号时的记录，不存在时返回 None"""
+        if self._versions.get(key, 0) <= snapshot:
+            return self._data.get(key)
+        for version, record in reversed(self._history.get(key, ())):
+            if version <= snapshot:
+                return record
+        return None
+    
+    def _read(self, key: str, txn: Optional[StagedTransaction]) -> Optional[Dict[str, Any]]:
+        """按键读取记录：事务内优先读取暂存的写入，其次读取快照"""
+        if txn is None:
+            return self._data.get(key)
+        if key in txn.writes:
+            return txn.writes[key][0]
+        txn.reads.add(key)
+        return self._snapshot_read(key, txn.snapshot)
+    
+    def _visible_records(self, txn: Optional[StagedTransaction]) -> List[Dict[str, Any]]:
+        """全部可见记录：事务外为最新已提交的记录，事务内为快照加上暂存的写入"""
+        if txn is None:
+            return list(self._data.values())
+        records = {}
+        for key in itertools.chain(self._data, (key for key in self._history if key not in self._data)):
+            record = self._snapshot_read(key, txn.snapshot)
+            if record is not None:
+                records[key] = record
+        for key, (record, _) in txn.writes.items():
+            if record is None:
+                records.pop(key, None)
+            else:
+                records[key] = record
+        return list(records.values())
+    
+    def _write(self, key: str, record: Optional[Dict[str, Any]], table: Optional[str],
+               txn: Optional[StagedTransaction]) -> None:
+        """写入记录：事务内暂存，事务外立即以新版本提交"""
+        if txn is not None:
+            if table is None and key in txn.writes:
+                table = txn.writes[key][1]
+            txn.writes[key] = (record, table)
+            return
+        self._commit_version += 1
+        self._apply(key, record, table, self._commit_version)
+    
+    def _apply(self, key: str, record: Optional[Dict[str, Any]], table: Optional[str],
+               version: int) -> None:
+        """以指定版本号覆盖已提交的记录（有进行中的事务时保留旧版本）"""
+        if self._transactions and self._abort_stale_transactions():
+            self._prune_history()
+        if self._transactions:
+            self._history.setdefault(key, []).append((self._versions.get(key, 0), self._data.get(key)))
+        self._versions[key] = version
+        if record is None:
+            self._data.pop(key, None)
+            self._tables.pop(key, None)
+        else:
+            self._data[key] = record
+            if table is not None:
+                self._tables[key] = table
+    
+    def _begin(self) -> str:
+        """
+        开始事务
+        
+        Returns:
+            事务ID
+        """
+        transaction_id = f"txn_{next(self._transaction_ids)}"
+        self._transactions[transaction_id] = StagedTransaction(transaction_id, self._commit_version)
+        return transaction_id
+    
+    def _commit(self, transaction_id: str) -> None:
+        """
+        校验并提交事务，所有写入使用同一个新版本号
+        
+        Raises:
+            DatabaseOperationError: 事务不存在
+            TransactionConflictError: 读取或写入的记录在快照之后已被修改（事务已丢弃）
+        """
+        txn = self._transaction(transaction_id)
+        del self._transactions[transaction_id]
+        try:
+            for key in itertools.chain(txn.reads, txn.writes):
+                if self._versions.get(key, 0) > txn.snapshot:
+                    self._transaction_conflicts += 1
+                    raise TransactionConflictError(
+                        f"事务 {transaction_id} 提交冲突: 记录 {key} 已被其他事务修改"
+                    )
+            
+            if txn.writes:
+                self._commit_version += 1
+                for key, (record, table) in txn.writes.items():
+                    self._apply(key, record, table, self._commit_version)
+            self._committed_transactions += 1
+        finally:
+            self._prune_history()
+    
+    def _rollback(self, transaction_id: str) -> None:
+        """丢弃事务的暂存写入（事务不存在时忽略）"""
+        if self._transactions.pop(transaction_id, None) is not None:
+            self._prune_history()
+    
+    def _abort_stale_transactions(self) -> bool:
+        """
+        中止超过 max_transaction_age 的事务
+        
+        Returns:
+            是否有事务被中止
+        """
+        deadline = time.monotonic() - self.max_transaction_age
+        aborted = 0
+        # 事务按开始顺序保存，只需检查最早的几个
+        while self._transactions:
+            transaction_id, txn = next(iter(self._transactions.items()))
+            if txn.started_at > deadline:
+                break
+            del self._transactions[transaction_id]
+            aborted += 1
+        self._aborted_transactions += aborted
+        return aborted > 0
+    
+    def _prune_history(self) -> None:
+        """中止超时的事务，清理进行中的事务都不再需要的旧版本"""
+        self._abort_stale_transactions()
+        if not self._transactions:
+            self._history.clear()
+            return
+        oldest = min(txn.snapshot for txn in self._transactions.values())
+        for key in list(self._history):
+            versions = self._history[key]
+            # 保留最老快照能看到的那个版本及之后的版本
+            keep = 0
+            for index, (version, _) in enumerate(versions):
+                if version <= oldest:
+                    keep = index
+            if self._versions.get(key, 0) <= oldest:
+                del self._history[key]
+            elif keep:
+                del versions[:keep]
+    
+    def _transaction_stats(self) -> Dict[str, int]:
+        """事务统计"""
+        return {
+            "active": len(self._transactions),
+            "committed": self._committed_transactions,
+            "conflicts": self._transaction_conflicts,
+            "aborted": self._aborted_transactions,
+            "commit_version": self._commit_version,
+            "history_keys": len(self._history),
+        }
+
+
+class DatabaseSimulator(RecordStore):
     """数据库模拟器"""
     
     def __init__(self):
         """初始化数据库模拟器"""
+        super().__init__()
         self.status = ConnectionStatus.CONNECTED
         self.connection_count = 0
         self.operation_count = 0
         self.error_count = 0
         self.last_error: Optional[str] = None
         self.last_operation_time: Optional[float] = None
+        # 只保护内存数据和事务状态，事务之间不互相阻塞
         self._lock = threading.Lock()
         
-        # 模拟数据存储
-        self._data: Dict[str, Any] = {}
-        
         # 连接配置
         self.max_retry_attempts = 3
         self.retry_delay = 1.0  # 秒
         self.connection_timeout = 5.0  # 秒
+        self.query_latency = 0.05  # 秒，一次往返的延迟
+        self.statement_cost = 0.002  # 秒，批量执行时每条语句的额外开销
         
     def connect(self) -> bool:
         """
@@ -87,13 +425,15 @@ class DatabaseSimulator:
         """检查是否已连接"""
         return self.status == ConnectionStatus.CONNECTED
     
-    def execute_query(self, query: str, params: Dict[str, Any] = None) -> Dict[str, Any]:
+    def execute_query(self, query: str, params: Dict[str, Any] = None,
+                      transaction_id: Optional[str] = None) -> Dict[str, Any]:
         """
         执行数据库查询
         
         Args:
             query: SQL查询语句
             params: 查询参数
+            transaction_id: 事务ID，为空时立即提交
             
         Returns:
             查询结果
@@ -113,90 +453,103 @@ class DatabaseSimulator:
                 raise DatabaseConnectionError(self.last_error)
             
             # 模拟查询延迟
-            time.sleep(0.05)
+            time.sleep(self.query_latency)
             
-            # 模拟查询操作
-            if query.upper().startswith('SELECT'):
-                return self._handle_select(query, params)
-            elif query.upper().startswith('INSERT'):
-                return self._handle_insert(query, params)
-            elif query.upper().startswith('UPDATE'):
-                return self._handle_update(query, params)
-            elif query.upper().startswith('DELETE'):
-                return self._handle_delete(query, params)
-            else:
-                return {"status": "success", "message": "Query executed"}
+            return self._dispatch(query, params, transaction_id)
     
-    def _handle_select(self, query: str, params: Dict[str, Any] = None) -> Dict[str, Any]:
-        """处理SELECT查询"""
-        # 简单模拟：返回一些数据
-        return {
-            "status": "success",
-            "data": list(self._data.values()),
-            "count": len(self._data)
-        }
-    
-    def _handle_insert(self, query: str, params: Dict[str, Any] = None) -> Dict[str, Any]:
-        """处理INSERT查询"""
-        if params:
-            key = params.get('id', f"record_{len(self._data) + 1}")
-            self._data[key] = params
+    def execute_many(self, statements: List[Tuple[str, Dict[str, Any]]],
+                     transaction_id: Optional[str] = None) -> List[Dict[str, Any]]:
+        """
+        在一次往返中执行多条语句
         
-        return {
-            "status": "success",
-            "message": "Record inserted",
-            "affected_rows": 1
-        }
-    
-    def _handle_update(self, query: str, params: Dict[str, Any] = None) -> Dict[str, Any]:
-        """处理UPDATE查询"""
-        affected_rows = 0
-        if params and 'id' in params:
-            key = params['id']
-            if key in self._data:
-                self._data[key].update(params)
-                affected_rows = 1
+        延迟为一次往返加上每条语句的 statement_cost；语句在延迟结束后依次执行，
+        连接在此之前中断时一条也不执行，因此可以整批重试。
         
-        return {
-            "status": "success",
-            "message": "Record updated",
-            "affected_rows": affected_rows
-        }
-    
-    def _handle_delete(self, query: str, params: Dict[str, Any] = None) -> Dict[str, Any]:
-        """处理DELETE查询"""
-        affected_rows = 0
-        if params and 'id' in params:
-            key = params['id']
-            if key in self._data:
-                del self._data[key]
-                affected_rows = 1
+        Args:
+            statements: 语句列表，每条是 (query, params) 元组
+            transaction_id: 事务ID，为空时每条语句立即提交
         
-        return {
-            "status": "success",
-            "message": "Record deleted",
-            "affected_rows": affected_rows
-        }
+        Returns:
+            与语句一一对应的查询结果
+        
+        Raises:
+            DatabaseConnectionError: 连接异常
+        """
+        if not statements:
+            return []
+        
+        with self._lock:
+            self.operation_count += 1
+            self.last_operation_time = time.time()
+            
+            if not self.is_connected():
+                self.error_count += 1
+                self.last_error = f"Database not connected. Status: {self.status.value}"
+                raise DatabaseConnectionError(self.last_error)
+            
+            time.sleep(self.query_latency + self.statement_cost * len(statements))
+            
+            return [self._dispatch(query, params, transaction_id) for query, params in statements]
     
     def begin_transaction(self) -> str:
-        """开始事务"""
+        """
+        开始事务，之后事务内的读取看到此刻已提交的数据
+        
+        Returns:
+            事务ID
+        
+        Raises:
+            DatabaseConnectionError: 连接异常
+        """
         if not self.is_connected():
             raise DatabaseConnectionError("Cannot start transaction: not connected")
         
-        transaction_id = f"txn_{int(time.time() * 1000)}"
-        return transaction_id
+        with self._lock:
+            return self._begin()
     
     def commit_transaction(self, transaction_id: str) -> bool:
-        """提交事务"""
+        """
+        提交事务：校验快照后一次性写入暂存的修改
+        
+        Args:
+            transaction_id: 事务ID
+        
+        Returns:
+            是否提交成功
+        
+        Raises:
+            DatabaseConnectionError: 连接异常（事务未提交）
+            TransactionConflictError: 提交冲突（事务已丢弃，可以重试）
+            DatabaseOperationError: 事务不存在
+        """
         if not self.is_connected():
             raise DatabaseConnectionError("Cannot commit transaction: not connected")
         
-        # 模拟提交延迟
+        # 模拟提交延迟（不持有锁，其他事务可以同时执行和提交）
         time.sleep(0.02)
+        
+        with self._lock:
+            if not self.is_connected():
+                raise DatabaseConnectionError("Cannot commit transaction: not connected")
+            self._commit(transaction_id)
         return True
     
     def rollback_transaction(self, transaction_id: str) -> bool:
-        """回滚事务"""
+        """
+        回滚事务，丢弃暂存的修改（连接中断时同样丢弃）
+        
+        Args:
+            transaction_id: 事务ID
+        
+        Returns:
+            是否回滚成功
+        
+        Raises:
+            DatabaseConnectionError: 连接异常
+        """
+        with self._lock:
+            self._rollback(transaction_id)
+        
         if not self.is_connected():
             raise DatabaseConnectionError("Cannot rollback transaction: not connected")
         
@@ -204,6 +557,24 @@ class DatabaseSimulator:
         time.sleep(0.02)
         return True
     
+    def dump_records(self, table: Optional[str] = None) -> List[Dict[str, Any]]:
+        """
+        导出记录快照（用于对账）
+        
+        Args:
+            table: 表名，为空时导出全部记录
+        
+        Returns:
+            记录副本列表
+        
+        Raises:
+            DatabaseConnectionError: 连接异常
+        """
+        with self._lock:
+            if not self.is_connected():
+                raise DatabaseConnectionError(f"Database not connected. Status: {self.status.value}")
+            return self._records(table)
+    
     def get_connection_info(self) -> Dict[str, Any]:
         """获取连接信息"""
         return {
@@ -213,7 +584,8 @@ class DatabaseSimulator:
             "error_count": self.error_count,
             "last_error": self.last_error,
             "last_operation_time": self.last_operation_time,
-            "data_records": len(self._data)
+            "data_records": len(self._data),
+            "transactions": self._transaction_stats()
         }
     
     def reset_stats(self) -> None:
@@ -224,86 +596,390 @@ class DatabaseSimulator:
             self.error_count = 0
             self.last_error = None
             self.last_operation_time = None
+            self._committed_transactions = 0
+            self._transaction_conflicts = 0
+            self._aborted_transactions = 0
     
     def clear_data(self) -> None:
-        """清空数据"""
+        """清空数据（进行中的事务一并丢弃）"""
+        with self._lock:
+            self._clear_store()
+
+
+class PooledConnection:
+    """连接池中的一个连接"""
+    
+    __slots__ = ("connection_id", "latency", "query_count")
+    
+    def __init__(self, connection_id: int, latency: float):
+        """
+        初始化连接
+        
+        Args:
+            connection_id: 连接编号
+            latency: 该连接每次查询的模拟延迟（秒）
+        """
+        self.connection_id = connection_id
+        self.latency = latency
+        self.query_count = 0
+
+
+class PooledDatabaseSimulator(DatabaseSimulator):
+    """
+    连接池模式的数据库模拟器
+    
+    查询先从池中取出一个连接，模拟的网络/IO延迟在连接上进行，不持有全局锁，
+    最多 pool_size 个查询同时进行；_lock 只保护内存数据的读写。
+    """
+    
+    def __init__(self, pool_size: int = 8, latency: float = 0.05,
+                 checkout_timeout: float = 5.0):
+        """
+        初始化连接池模拟器
+        
+        Args:
+            pool_size: 连接数
+            latency: 每个连接的查询延迟（秒），可通过 connections 单独调整
+            checkout_timeout: 等待空闲连接的最长时间（秒）
+        
+        Raises:
+            ValueError: 参数无效
+        """
+        if pool_size <= 0:
+            raise ValueError(f"连接数必须大于0: {pool_size}")
+        if latency < 0:
+            raise ValueError(f"查询延迟不能为负数: {latency}")
+        
+        super().__init__()
+        self.pool_size = pool_size
+        self.checkout_timeout = checkout_timeout
+        self.connections = [PooledConnection(i, latency) for i in range(pool_size)]
+        self._pool: "queue.LifoQueue[PooledConnection]" = queue.LifoQueue()
+        for connection in self.connections:
+            self._pool.put(connection)
+        
+        # 连接池统计，由 _stats_lock 保护
+        self._stats_lock = threading.Lock()
+        self._reset_pool_stats()
+    
+    def _reset_pool_stats(self) -> None:
+        """清零连接池统计（调用方持有 _stats_lock 或在初始化中）"""
+        self._in_use = 0
+        self._checkouts = 0
+        self._waited_checkouts = 0
+        self._total_wait = 0.0
+        self._max_wait = 0.0
+        self._checkout_timeouts = 0
+    
+    def _checkout(self) -> PooledConnection:
+        """
+        从池中取出一个连接，没有空闲连接时等待
+        
+        Raises:
+            PoolTimeoutError: 等待超时
+        """
+        try:
+            connection = self._pool.get_nowait()
+            waited = 0.0
+        except queue.Empty:
+            start = time.perf_counter()
+            try:
+                connection = self._pool.get(timeout=self.checkout_timeout)
+            except queue.Empty:
+                with self._stats_lock:
+                    self._checkout_timeouts += 1
+                raise PoolTimeoutError(
+                    f"连接池已耗尽，等待 {self.checkout_timeout} 秒后仍无空闲连接"
+                )
+            waited = time.perf_counter() - start
+        
+        with self._stats_lock:
+            self._in_use += 1
+            self._checkouts += 1
+            if waited:
+                self._waited_checkouts += 1
+                self._total_wait += waited
+                self._max_wait = max(self._max_wait, waited)
+        return connection
+    
+    def _checkin(self, connection: PooledConnection) -> None:
+        """归还连接"""
+        with self._stats_lock:
+            self._in_use -= 1
+        self._pool.put(connection)
+    
+    def execute_query(self, query: str, params: Dict[str, Any] = None,
+                      transaction_id: Optional[str] = None) -> Dict[str, Any]:
+        """
+        执行数据库查询（模拟延迟期间不持有全局锁）
+        
+        Args:
+            query: SQL查询语句
+            params: 查询参数
+            transaction_id: 事务ID，为空时立即提交
+            
+        Returns:
+            查询结果
+            
+        Raises:
+            DatabaseConnectionError: 连接异常或连接池耗尽
+        """
+        with self._lock:
+            self.operation_count += 1
+            self.last_operation_time = time.time()
+            if not self.is_connected():
+                self.error_count += 1
+                self.last_error = f"Database not connected. Status: {self.status.value}"
+                raise DatabaseConnectionError(self.last_error)
+        
+        connection = self._checkout()
+        try:
+            # 模拟查询延迟（在连接上进行，其他连接可以同时查询）
+            time.sleep(connection.latency)
+            connection.query_count += 1
+            
+            with self._lock:
+                # 延迟期间连接可能已中断
+                if not self.is_connected():
+                    self.error_count += 1
+                    self.last_error = f"Database not connected. Status: {self.status.value}"
+                    raise DatabaseConnectionError(self.last_error)
+                return self._dispatch(query, params, transaction_id)
+        finally:
+            self._checkin(connection)
+    
+    def execute_many(self, statements: List[Tuple[str, Dict[str, Any]]],
+                     transaction_id: Optional[str] = None) -> List[Dict[str, Any]]:
+        """
+        在一个连接上以一次往返执行多条语句（模拟延迟期间不持有全局锁）
+        
+        Args:
+            statements: 语句列表，每条是 (query, params) 元组
+            transaction_id: 事务ID，为空时每条语句立即提交
+        
+        Returns:
+            与语句一一对应的查询结果
+        
+        Raises:
+            DatabaseConnectionError: 连接异常或连接池耗尽
+        """
+        if not statements:
+            return []
+        
         with self._lock:
-            self._data.clear()
+            self.operation_count += 1
+            self.last_operation_time = time.time()
+            if not self.is_connected():
+                self.error_count += 1
+                self.last_error = f"Database not connected. Status: {self.status.value}"
+                raise DatabaseConnectionError(self.last_error)
+        
+        connection = self._checkout()
+        try:
+            time.sleep(connection.latency + self.statement_cost * len(statements))
+            connection.query_count += 1
+            
+            with self._lock:
+                # 延迟期间连接中断时整批都不执行
+                if not self.is_connected():
+                    self.error_count += 1
+                    self.last_error = f"Database not connected. Status: {self.status.value}"
+                    raise DatabaseConnectionError(self.last_error)
+                return [self._dispatch(query, params, transaction_id) for query, params in statements]
+        finally:
+            self._checkin(connection)
+    
+    def get_pool_stats(self) -> Dict[str, Any]:
+        """
+        获取连接池统计
+        
+        Returns:
+            连接数、使用中的连接数、取出次数和等待耗时
+        """
+        with self._stats_lock:
+            waited = self._waited_checkouts
+            return {
+                "pool_size": self.pool_size,
+                "in_use": self._in_use,
+                "available": self.pool_size - self._in_use,
+                "checkouts": self._checkouts,
+                "waited_checkouts": waited,
+                "checkout_timeouts": self._checkout_timeouts,
+                "total_wait_ms": round(self._total_wait * 1000, 3),
+                "avg_wait_ms": round(self._total_wait * 1000 / waited, 3) if waited else 0.0,
+                "max_wait_ms": round(self._max_wait * 1000, 3),
+            }
+    
+    def get_connection_info(self) -> Dict[str, Any]:
+        """获取连接信息（包含连接池统计）"""
+        info = super().get_connection_info()
+        info["pool"] = self.get_pool_stats()
+        return info
+    
+    def reset_stats(self) -> None:
+        """重置统计信息（包含连接池统计，使用中的连接数保留）"""
+        super().reset_stats()
+        with self._stats_lock:
+            in_use = self._in_use
+            self._reset_pool_stats()
+            self._in_use = in_use
 
 
 class DatabaseManager:
-    """数据库管理器 - 包含重连机制"""
+    """数据库管理器 - 包含重连、退避重试和熔断机制"""
     
-    def __init__(self, db_simulator: DatabaseSimulator):
+    def __init__(self, db_simulator: DatabaseSimulator,
+                 retry_policy: Optional[RetryPolicy] = None,
+                 circuit_breaker: Optional[CircuitBreaker] = None):
         """
         初始化数据库管理器
         
         Args:
             db_simulator: 数据库模拟器实例
+            retry_policy: 重试策略，为空时使用默认的指数退避策略（最多尝试3次）
+            circuit_breaker: 熔断器，为空时不熔断
         """
         self.db = db_simulator
         self.auto_reconnect = True
-        self.max_retry_attempts = 3
-        self.retry_delay = 1.0
+        self.retry_policy = retry_policy if retry_policy is not None else RetryPolicy()
+        self.circuit_breaker = circuit_breaker
     
-    def execute_with_retry(self, query: str, params: Dict[str, Any] = None) -> Dict[str, Any]:
+    def execute_with_retry(self, query: str, params: Dict[str, Any] = None,
+                           transaction_id: Optional[str] = None) -> Dict[str, Any]:
         """
         带重试机制的查询执行
         
         Args:
             query: SQL查询语句
             params: 查询参数
+            transaction_id: 事务ID，为空时立即提交
             
         Returns:
             查询结果
             
         Raises:
+            CircuitOpenError: 熔断器打开，未执行查询
             DatabaseConnectionError: 重试后仍然连接失败
             DatabaseOperationError: 操作失败
         """
-        last_error = None
+        return self._run_with_retry(lambda: self.db.execute_query(query, params, transaction_id))
+    
+    def execute_many(self, statements: List[Tuple[str, Dict[str, Any]]],
+                     transaction_id: Optional[str] = None) -> List[Dict[str, Any]]:
+        """
+        在一次往返中执行多条语句，连接失败时整批重试
+        
+        Args:
+            statements: 语句列表，每条是 (query, params) 元组
+            transaction_id: 事务ID，为空时每条语句立即提交
+        
+        Returns:
+            与语句一一对应的查询结果
+        
+        Raises:
+            CircuitOpenError: 熔断器打开，未执行查询
+            DatabaseConnectionError: 重试后仍然连接失败
+            DatabaseOperationError: 操作失败
+        """
+        if not statements:
+            return []
+        return self._run_with_retry(lambda: self.db.execute_many(statements, transaction_id))
+    
+    def pipeline(self, transaction_id: Optional[str] = None) -> "QueryPipeline":
+        """
+        创建查询流水线
         
-        for attempt in range(self.max_retry_attempts):
+        Args:
+            transaction_id: 事务ID，为空时每条语句立即提交
+        
+        Returns:
+            通过本管理器发送语句的流水线
+        """
+        return QueryPipeline(self, transaction_id)
+    
+    def _run_with_retry(self, execute: Callable[[], Any]) -> Any:
+        """按重试策略和熔断器执行一次数据库往返"""
+        attempts = RetryAttempts(self.retry_policy, self.circuit_breaker)
+        
+        while True:
+            # 熔断器打开时快速失败，不占用请求线程等待重试
+            if not attempts.start():
+                raise CircuitOpenError(
+                    f"Circuit breaker is open, retry in {attempts.retry_after():.1f}s. "
+                    f"Last error: {attempts.last_error}"
+                )
+            
             try:
                 # 检查连接状态
                 if not self.db.is_connected() and self.auto_reconnect:
-                    print(f"尝试重新连接数据库 (第 {attempt + 1} 次)")
+                    print(f"尝试重新连接数据库 (第 {attempts.attempt} 次)")
                     if not self.db.connect():
                         raise DatabaseConnectionError("Failed to reconnect to database")
                 
                 # 执行查询
-                result = self.db.execute_query(query, params)
-                return result
+                result = execute()
                 
             except DatabaseConnectionError as e:
-                last_error = e
-                print(f"数据库连接错误 (第 {attempt + 1} 次尝试): {e}")
-                
-                if attempt < self.max_retry_attempts - 1:
-                    print(f"等待 {self.retry_delay} 秒后重试...")
-                    time.sleep(self.retry_delay)
-                    continue
-                else:
-                    print("达到最大重试次数，放弃操作")
+                print(f"数据库连接错误 (第 {attempts.attempt} 次尝试): {e}")
+                delay = attempts.failed(e)
+                if delay is None:
+                    print("达到最大重试次数或重试预算已用完，放弃操作")
                     break
+                print(f"等待 {delay:.3f} 秒后重试...")
+                time.sleep(delay)
+                continue
+            
+            except PoolTimeoutError:
+                # 本进程的连接池饱和，不是数据库故障：不重试（避免加剧排队），不计入熔断
+                attempts.abandoned()
+                raise
             
             except Exception as e:
-                # 其他异常不重试
+                # 其他异常不重试，也不计入熔断：应用错误不能说明数据库已恢复，释放探测名额
+                attempts.abandoned()
                 raise DatabaseOperationError(f"Database operation failed: {e}")
+            
+            except BaseException:
+                # 调用方被中断，没有得到结果：释放探测名额，不计入熔断
+                attempts.abandoned()
+                raise
+            
+            attempts.succeeded()
+            return result
         
         # 所有重试都失败了
-        raise DatabaseConnectionError(f"Failed to execute query after {self.max_retry_attempts} attempts. Last error: {last_error}")
+        raise DatabaseConnectionError(
+            f"Failed to execute query after {attempts.attempt} attempts. Last error: {attempts.last_error}"
+        )
     
     def execute_transaction(self, operations: list) -> bool:
         """
-        执行事务
+        执行事务，提交冲突时按重试策略退避后重新执行整个事务
         
         Args:
             operations: 操作列表，每个操作是 (query, params) 元组
             
         Returns:
             是否成功
+        
+        Raises:
+            TransactionConflictError: 重试后仍然提交冲突
         """
+        attempt = 0
+        
+        while True:
+            attempt += 1
+            try:
+                return self._run_transaction(operations)
+            except TransactionConflictError:
+                if not self.retry_policy.allow_retry(attempt):
+                    raise
+                delay = self.retry_policy.backoff(attempt - 1)
+                print(f"事务冲突，等待 {delay:.3f} 秒后重试...")
+                time.sleep(delay)
+    
+    def _run_transaction(self, operations: list) -> bool:
+        """执行一次事务，失败或被中断时回滚并抛出原异常"""
         transaction_id = None
         
         try:
@@ -311,9 +987,9 @@ class DatabaseManager:
             transaction_id = self.db.begin_transaction()
             print(f"开始事务: {transaction_id}")
             
-            # 执行所有操作
-            for query, params in operations:
-                result = self.execute_with_retry(query, params)
+            # 所有操作在一次往返中执行
+            results = self.execute_many(operations, transaction_id)
+            for (query, _), result in zip(operations, results):
                 print(f"执行操作: {query[:50]}... -> {result.get('status', 'unknown')}")
             
             # 提交事务
@@ -321,7 +997,7 @@ class DatabaseManager:
             print(f"事务提交成功: {transaction_id}")
             return True
             
-        except Exception as e:
+        except BaseException as e:
             print(f"事务执行失败: {e}")
             
             # 回滚事务
@@ -333,3 +1009,57 @@ class DatabaseManager:
                     print(f"事务回滚失败: {rollback_error}")
             
             raise e
+
+
+class QueryPipeline:
+    """
+    查询流水线
+    
+    add 只暂存语句，execute 时通过 DatabaseManager.execute_many 在一次往返中发送。
+    每次 execute 发送并清空已暂存的语句，之后可以继续添加。
+    """
+    
+    def __init__(self, manager: DatabaseManager, transaction_id: Optional[str] = None):
+        """
+        初始化查询流水线
+        
+        Args:
+            manager: 数据库管理器
+            transaction_id: 事务ID，为空时每条语句立即提交
+        """
+        self._manager = manager
+        self.transaction_id = transaction_id
+        self._statements: List[Tuple[str, Dict[str, Any]]] = []
+    
+    def __len__(self) -> int:
+        """暂存的语句数"""
+        return len(self._statements)
+    
+    def add(self, query: str, params: Dict[str, Any] = None) -> int:
+        """
+        暂存一条语句
+        
+        Args:
+            query: SQL查询语句
+            params: 查询参数
+        
+        Returns:
+            该语句的结果在 execute 返回列表中的下标
+        """
+        self._statements.append((query, params))
+        return len(self._statements) - 1
+    
+    def execute(self) -> List[Dict[str, Any]]:
+        """
+        发送暂存的语句
+        
+        Returns:
+            与语句一一对应的查询结果
+        
+        Raises:
+            CircuitOpenError: 熔断器打开，未执行查询
+            DatabaseConnectionError: 重试后仍然连接失败
+            DatabaseOperationError: 操作失败
+        """
+        statements, self._statements = self._statements, []
+        return self._manager.execute_many(statements, self.transaction_id)
@@ -98,7 +98,8 @@ def demo_complete_order_flow():
     payment_data = {"payment_method": "alipay"}
     response = requests.post(
         f"{BASE_URL}/api/orders/ORD001/payment",
-        json=payment_data
+        json=payment_data,
+        params={"wait": 5}
     )
     print_response(response, "处理支付")
     
@@ -162,7 +163,8 @@ def demo_payment_methods():
         
         # 使用不同支付方式
         payment_data = {"payment_method": method}
-        response = requests.post(f"{BASE_URL}/api/orders/{order_id}/payment", json=payment_data)
+        response = requests.post(f"{BASE_URL}/api/orders/{order_id}/payment",
+                                 json=payment_data, params={"wait": 5})
         print_response(response, f"使用 {method} 支付")
 
 def main():
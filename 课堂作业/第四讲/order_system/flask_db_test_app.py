@@ -4,6 +4,8 @@ Flask应用 - 测试数据库连接中断和恢复
 """
 
 from flask import Flask, request, jsonify
+import atexit
+import os
 import threading
 import time
 from datetime import datetime
@@ -13,19 +15,33 @@ from typing import Dict, Any
 from inventory import Inventory, InsufficientStockError, ProductNotFoundError
 from payment import PaymentProcessor, PaymentMethod, PaymentStatus, InsufficientFundsError
 from order import OrderService, OrderStatus
-from database_simulator import DatabaseSimulator, DatabaseManager, DatabaseConnectionError, DatabaseOperationError
+from database_simulator import (
+    PooledDatabaseSimulator, DatabaseManager, DatabaseConnectionError, DatabaseOperationError,
+    CircuitOpenError
+)
+from resilience import CircuitBreaker, RetryBudget, RetryPolicy
+from payment_queue import PaymentQueue, QueueFullError
+from reconciliation import PaymentColumns, reconcile
+from trace_store import PaymentTrace, TraceStore
 
 app = Flask(__name__)
 
 # 全局变量
-db_simulator = DatabaseSimulator()
-db_manager = DatabaseManager(db_simulator)
+# 连接池模式：最多 DB_POOL_SIZE 个查询同时进行，模拟延迟不占用全局锁
+db_simulator = PooledDatabaseSimulator(pool_size=int(os.environ.get("DB_POOL_SIZE", "8")))
+# 指数退避重试（重试量不超过请求量的 20%），连续失败 5 次后熔断 5 秒
+db_manager = DatabaseManager(
+    db_simulator,
+    retry_policy=RetryPolicy(max_attempts=3, base_delay=0.05, max_delay=0.5,
+                             budget=RetryBudget(ratio=0.2, min_retries=10)),
+    circuit_breaker=CircuitBreaker(failure_threshold=5, recovery_timeout=5.0)
+)
 inventory = Inventory()
 payment_processor = PaymentProcessor()
 order_service = OrderService(inventory, payment_processor)
 
-# 支付处理状态跟踪
-payment_processing_status = {}
+# 支付处理状态跟踪（只保留最近的支付）
+payment_traces = TraceStore(capacity=10000)
 
 
 class EnhancedPaymentProcessor(PaymentProcessor):
@@ -47,21 +63,18 @@ class EnhancedPaymentProcessor(PaymentProcessor):
         """
         payment = self.get_payment(payment_id)
         
-        # 更新支付处理状态
-        payment_processing_status[payment_id] = {
-            "status": "processing",
-            "start_time": datetime.now().isoformat(),
-            "steps": []
-        }
+        # 开始跟踪支付处理状态
+        trace = payment_traces.start(payment_id)
         
         try:
             # 步骤1: 开始支付处理
             payment.process()
-            self._log_step(payment_id, "payment_processing_started", "支付处理开始")
+            self._log_step(trace, "payment_processing_started", "支付处理开始")
             
-            # 步骤2: 记录支付开始到数据库
-            self._log_step(payment_id, "db_insert_payment_start", "记录支付开始")
-            self.db_manager.execute_with_retry(
+            # 步骤2、3: 记录支付开始并检查余额（同一次数据库往返）
+            pipe = self.db_manager.pipeline()
+            self._log_step(trace, "db_insert_payment_start", "记录支付开始")
+            pipe.add(
                 "INSERT INTO payment_logs (payment_id, status, timestamp, amount, method)",
                 {
                     "id": f"log_{payment_id}_start",
@@ -72,17 +85,16 @@ class EnhancedPaymentProcessor(PaymentProcessor):
                     "method": payment.method.value
                 }
             )
-            
-            # 步骤3: 检查余额（数据库查询）
-            self._log_step(payment_id, "db_check_balance", "检查账户余额")
-            balance_result = self.db_manager.execute_with_retry(
+            self._log_step(trace, "db_check_balance", "检查账户余额")
+            balance_index = pipe.add(
                 "SELECT balance FROM accounts WHERE payment_method = ?",
                 {"payment_method": payment.method.value}
             )
+            balance_result = pipe.execute()[balance_index]
             
-            # 步骤4: 验证余额
-            if self._account_balances[payment.method] < payment.amount:
-                self._log_step(payment_id, "insufficient_funds", "余额不足")
+            # 步骤4: 验证余额并冻结扣款金额（原子操作，并发支付不会透支）
+            if not self._ledger.try_debit(payment.method, payment.amount):
+                self._log_step(trace, "insufficient_funds", "余额不足")
                 payment.fail()
                 
                 # 记录失败到数据库
@@ -100,11 +112,11 @@ class EnhancedPaymentProcessor(PaymentProcessor):
                 raise InsufficientFundsError(
                     f"余额不足。支付方式: {payment.method.value}, "
                     f"需要: {payment.amount}, "
-                    f"可用: {self._account_balances[payment.method]}"
+                    f"可用: {self.get_balance(payment.method)}"
                 )
             
             # 步骤5: 执行扣款事务
-            self._log_step(payment_id, "db_transaction_start", "开始扣款事务")
+            self._log_step(trace, "db_transaction_start", "开始扣款事务")
             transaction_operations = [
                 ("UPDATE accounts SET balance = balance - ? WHERE payment_method = ?", 
                  {"amount": payment.amount, "payment_method": payment.method.value}),
@@ -120,52 +132,45 @@ class EnhancedPaymentProcessor(PaymentProcessor):
                  })
             ]
             
-            # 执行事务
-            self.db_manager.execute_transaction(transaction_operations)
+            # 执行事务，失败时归还已扣减的余额
+            try:
+                self.db_manager.execute_transaction(transaction_operations)
+            except Exception:
+                self._ledger.credit(payment.method, payment.amount)
+                raise
             
-            # 步骤6: 更新内存中的余额
-            self._account_balances[payment.method] -= payment.amount
+            # 步骤6: 完成支付
             payment.complete()
             
-            self._log_step(payment_id, "payment_completed", "支付完成")
+            self._log_step(trace, "payment_completed", "支付完成")
             
             # 更新处理状态
-            payment_processing_status[payment_id]["status"] = "completed"
-            payment_processing_status[payment_id]["end_time"] = datetime.now().isoformat()
+            payment_traces.finish(trace)
             
             return True
             
         except (DatabaseConnectionError, DatabaseOperationError) as e:
-            self._log_step(payment_id, "database_error", f"数据库错误: {str(e)}")
+            self._log_step(trace, "database_error", f"数据库错误: {str(e)}")
             payment.fail()
             
             # 更新处理状态
-            payment_processing_status[payment_id]["status"] = "failed"
-            payment_processing_status[payment_id]["error"] = str(e)
-            payment_processing_status[payment_id]["end_time"] = datetime.now().isoformat()
+            payment_traces.finish(trace, str(e))
             
             raise e
         
         except Exception as e:
-            self._log_step(payment_id, "general_error", f"其他错误: {str(e)}")
+            self._log_step(trace, "general_error", f"其他错误: {str(e)}")
             payment.fail()
             
             # 更新处理状态
-            payment_processing_status[payment_id]["status"] = "failed"
-            payment_processing_status[payment_id]["error"] = str(e)
-            payment_processing_status[payment_id]["end_time"] = datetime.now().isoformat()
+            payment_traces.finish(trace, str(e))
             
             raise e
     
-    def _log_step(self, payment_id: str, step: str, description: str):
+    def _log_step(self, trace: PaymentTrace, step: str, description: str):
         """记录处理步骤"""
-        if payment_id in payment_processing_status:
-            payment_processing_status[payment_id]["steps"].append({
-                "step": step,
-                "description": description,
-                "timestamp": datetime.now().isoformat()
-            })
-        print(f"[{payment_id}] {step}: {description}")
+        trace.add_step(step, description)
+        print(f"[{trace.payment_id}] {step}: {description}")
 
 
 # 创建增强的支付处理器
@@ -173,6 +178,41 @@ enhanced_payment_processor = EnhancedPaymentProcessor(db_manager)
 order_service.payment_processor = enhanced_payment_processor
 
 
+def _pay_order(order_id: str, payment_method: PaymentMethod) -> str:
+    """
+    创建并处理订单支付（包含数据库操作）
+    
+    Returns:
+        支付ID
+    """
+    # 获取订单
+    order = order_service.get_order(order_id)
+    
+    # 创建支付记录
+    payment_id = f"PAY_{order_id}"
+    enhanced_payment_processor.create_payment(
+        payment_id, order_id, order.total_amount, payment_method
+    )
+    
+    # 处理支付（包含数据库操作）
+    enhanced_payment_processor.process_payment_with_db(payment_id)
+    
+    # 标记订单为已支付
+    order.mark_paid(payment_id)
+    return payment_id
+
+
+# 异步支付队列，数据库操作在工作线程中执行，请求线程不等待
+payment_queue = PaymentQueue(_pay_order, workers=4)
+atexit.register(payment_queue.close)
+
+
+def _trace_dict(payment_id: str) -> Dict[str, Any]:
+    """支付处理跟踪的字典形式，没有跟踪时返回空字典"""
+    trace = payment_traces.get(payment_id)
+    return trace.to_dict() if trace is not None else {}
+
+
 # ============= Flask路由 =============
 
 @app.route('/')
@@ -184,6 +224,7 @@ def home():
             "database": "/api/database",
             "orders": "/api/orders",
             "payments": "/api/payments",
+            "reconciliation": "/api/reconciliation",
             "test": "/api/test"
         }
     })
@@ -192,7 +233,9 @@ def home():
 @app.route('/api/database/status')
 def get_database_status():
     """获取数据库状态"""
-    return jsonify(db_simulator.get_connection_info())
+    info = db_simulator.get_connection_info()
+    info["circuit_breaker"] = db_manager.circuit_breaker.get_stats()
+    return jsonify(info)
 
 
 @app.route('/api/database/disconnect', methods=['POST'])
@@ -232,9 +275,11 @@ def init_test_data():
     # 清空现有数据
     inventory.clear()
     enhanced_payment_processor.clear()
+    payment_traces.clear()
     order_service.clear()
     db_simulator.clear_data()
     db_simulator.reset_stats()
+    db_manager.circuit_breaker.reset()
     
     # 连接数据库
     db_simulator.connect()
@@ -256,7 +301,8 @@ def create_order():
     """创建订单"""
     data = request.json
     try:
-        order = order_service.create_order(data['order_id'], data['customer_id'])
+        order_id = data.get('order_id') or order_service.next_order_id()
+        order = order_service.create_order(order_id, data['customer_id'])
         return jsonify({
             "message": "订单创建成功",
             "order_id": order.order_id,
@@ -306,23 +352,9 @@ def process_payment(order_id):
     payment_method = data.get('payment_method', 'credit_card')
     
     try:
-        # 获取订单
+        payment_id = _pay_order(order_id, PaymentMethod(payment_method))
         order = order_service.get_order(order_id)
         
-        # 创建支付记录
-        payment_id = f"PAY_{order_id}"
-        payment_method_enum = PaymentMethod(payment_method)
-        
-        payment = enhanced_payment_processor.create_payment(
-            payment_id, order_id, order.total_amount, payment_method_enum
-        )
-        
-        # 处理支付（包含数据库操作）
-        enhanced_payment_processor.process_payment_with_db(payment_id)
-        
-        # 标记订单为已支付
-        order.mark_paid(payment_id)
-        
         return jsonify({
             "message": "支付成功",
             "order_id": order_id,
@@ -332,22 +364,54 @@ def process_payment(order_id):
             "database_status": db_simulator.status.value
         })
         
+    except CircuitOpenError as e:
+        # 熔断期间立即拒绝，提示客户端稍后重试
+        retry_after = db_manager.circuit_breaker.retry_after()
+        return jsonify({
+            "error": "数据库暂不可用",
+            "details": str(e),
+            "database_status": db_simulator.status.value,
+            "retry_after": retry_after
+        }), 503, {"Retry-After": str(max(1, round(retry_after)))}
+        
     except (DatabaseConnectionError, DatabaseOperationError) as e:
         return jsonify({
             "error": "数据库连接错误",
             "details": str(e),
             "database_status": db_simulator.status.value,
-            "payment_status": payment_processing_status.get(f"PAY_{order_id}", {})
+            "payment_status": _trace_dict(f"PAY_{order_id}")
         }), 503
         
     except Exception as e:
         return jsonify({
             "error": str(e),
             "database_status": db_simulator.status.value,
-            "payment_status": payment_processing_status.get(f"PAY_{order_id}", {})
+            "payment_status": _trace_dict(f"PAY_{order_id}")
         }), 400
 
 
+@app.route('/api/orders/<order_id>/payment/async', methods=['POST'])
+def submit_payment(order_id):
+    """提交支付 - 进入队列后立即返回受理凭证，通过支付状态接口查询结果"""
+    data = request.json
+    payment_method = data.get('payment_method', 'credit_card')
+    
+    try:
+        payment_method_enum = PaymentMethod(payment_method)
+        order_service.get_order(order_id)
+        ticket = payment_queue.submit(f"PAY_{order_id}", order_id, payment_method_enum)
+    except QueueFullError as e:
+        return jsonify({"error": str(e)}), 503
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    
+    return jsonify({
+        "message": "支付已受理",
+        **ticket.to_dict(),
+        "status_url": f"/api/payments/{ticket.ticket_id}/status"
+    }), 202
+
+
 @app.route('/api/orders/<order_id>')
 def get_order(order_id):
     """获取订单详情"""
@@ -360,9 +424,20 @@ def get_order(order_id):
 
 @app.route('/api/payments/<payment_id>/status')
 def get_payment_status(payment_id):
-    """获取支付处理状态"""
-    if payment_id in payment_processing_status:
-        return jsonify(payment_processing_status[payment_id])
+    """获取支付处理状态（wait 参数指定排队中的支付最多等待的秒数）"""
+    ticket = payment_queue.get(payment_id)
+    wait = min(request.args.get('wait', 0, type=float), 30.0)
+    if ticket is not None and not ticket.done and wait > 0:
+        payment_queue.wait(payment_id, wait)
+    
+    trace = payment_traces.get(payment_id)
+    if trace is not None:
+        result = trace.to_dict()
+        if ticket is not None:
+            result["ticket"] = ticket.to_dict()
+        return jsonify(result)
+    elif ticket is not None:
+        return jsonify({"ticket": ticket.to_dict()}), 200 if ticket.done else 202
     else:
         return jsonify({"error": "支付记录不存在"}), 404
 
@@ -426,24 +501,46 @@ def get_stats():
     """获取统计信息"""
     return jsonify({
         "database": db_simulator.get_connection_info(),
+        "circuit_breaker": db_manager.circuit_breaker.get_stats(),
         "inventory": {
             "products": len(inventory.get_all_stock()),
             "total_stock": sum(inventory.get_all_stock().values())
         },
         "orders": {
-            "total": len(order_service.get_all_orders())
+            "total": order_service.count_orders()
         },
         "payments": {
-            "processing": len([p for p in payment_processing_status.values() 
-                            if p.get("status") == "processing"]),
-            "completed": len([p for p in payment_processing_status.values() 
-                           if p.get("status") == "completed"]),
-            "failed": len([p for p in payment_processing_status.values() 
-                         if p.get("status") == "failed"])
-        }
+            # 读取支付处理器的汇总计数，不遍历支付记录
+            "processing": enhanced_payment_processor.count_payments(PaymentStatus.PROCESSING),
+            "completed": enhanced_payment_processor.count_payments(PaymentStatus.SUCCESS),
+            "failed": enhanced_payment_processor.count_payments(PaymentStatus.FAILED),
+            "completed_amount": enhanced_payment_processor.total_amount(PaymentStatus.SUCCESS)
+        },
+        # 支付处理跟踪的增量计数
+        "payment_processing": payment_traces.get_stats()
     })
 
 
+@app.route('/api/reconciliation')
+def get_reconciliation():
+    """对账内存中的支付记录和数据库中的支付流水"""
+    try:
+        limit = int(request.args.get('limit', 100))
+        db_records = db_simulator.dump_records("payment_records")
+    except ValueError:
+        return jsonify({"error": "limit 必须是整数"}), 400
+    except DatabaseConnectionError as e:
+        return jsonify({
+            "error": "数据库连接错误",
+            "details": str(e),
+            "database_status": db_simulator.status.value
+        }), 503
+    
+    report = reconcile(PaymentColumns.from_processor(enhanced_payment_processor),
+                       PaymentColumns.from_db_records(db_records))
+    return jsonify(report.to_dict(limit=limit))
+
+
 if __name__ == '__main__':
     print("启动订单系统数据库连接测试服务...")
     print("访问 http://localhost:5000 查看API文档")
@@ -451,6 +548,7 @@ if __name__ == '__main__':
     print("1. POST /api/test/init-data - 初始化测试数据")
     print("2. POST /api/test/scenario/payment-with-db-failure - 测试支付过程中数据库失败")
     print("3. POST /api/orders/{order_id}/payment - 触发支付处理")
+    print("   POST /api/orders/{order_id}/payment/async - 异步提交支付（返回 202）")
     print("4. GET /api/database/status - 查看数据库状态")
     
     app.run(debug=True, host='0.0.0.0', port=5000)
@@ -0,0 +1,196 @@
+"""
+库存暂扣模块
+订单确认后库存以带有效期的暂扣形式占用，超时未支付自动归还
+"""
+
+import threading
+import time
+from collections import deque
+from typing import Callable, Deque, Dict, Iterable, List, Optional, Tuple
+
+from inventory import Inventory
+from timer_wheel import TimerWheel
+
+
+class StockHoldManager:
+    """库存暂扣管理器"""
+    
+    def __init__(self, inventory: Inventory, ttl: float = 900.0,
+                 tick: float = 1.0,
+                 clock: Callable[[], float] = time.monotonic,
+                 on_expire: Optional[Callable[[str], None]] = None):
+        """
+        初始化库存暂扣管理器
+        
+        Args:
+            inventory: 库存管理器
+            ttl: 默认暂扣有效期（秒）
+            tick: 时间轮精度（秒）
+            clock: 时钟函数
+            on_expire: 暂扣过期回调，参数为暂扣ID
+        
+        Raises:
+            ValueError: 有效期无效
+        """
+        if ttl <= 0:
+            raise ValueError(f"暂扣有效期必须大于0: {ttl}")
+        
+        self.inventory = inventory
+        self.ttl = ttl
+        self.on_expire = on_expire
+        self._clock = clock
+        self._wheel = TimerWheel(tick=tick, start=clock())
+        self._holds: Dict[str, List[Tuple[str, int]]] = {}
+        self._lock = threading.RLock()
+        # 过期时归还库存失败的暂扣 (暂扣ID, 商品列表, 错误信息)，只保留最近的记录
+        self.failed_releases: Deque[Tuple[str, List[Tuple[str, int]], str]] = deque(maxlen=1000)
+    
+    def place_hold(self, hold_id: str, items: Iterable[Tuple[str, int]],
+                   ttl: Optional[float] = None) -> None:
+        """
+        暂扣库存
+        
+        Args:
+            hold_id: 暂扣ID（通常为订单ID）
+            items: (商品ID, 数量) 列表
+            ttl: 有效期（秒），默认使用管理器的有效期
+        
+        Raises:
+            ValueError: 暂扣ID已存在
+            ProductNotFoundError: 商品不存在
+            InsufficientStockError: 库存不足
+        """
+        items = list(items)
+        self.expire()
+        
+        with self._lock:
+            if hold_id in self._holds:
+                raise ValueError(f"暂扣ID已存在: {hold_id}")
+            
+            self.inventory.reserve_many(items)
+            self._holds[hold_id] = items
+            self._wheel.schedule(hold_id, self._clock() + (ttl or self.ttl))
+    
+    def adopt_hold(self, hold_id: str, items: Iterable[Tuple[str, int]],
+                   ttl: Optional[float] = None) -> None:
+        """
+        登记已预留库存的暂扣（不再扣减库存，用于重启后恢复暂扣）
+        
+        Args:
+            hold_id: 暂扣ID
+            items: 已预留的 (商品ID, 数量) 列表
+            ttl: 有效期（秒），默认使用管理器的有效期
+        
+        Raises:
+            ValueError: 暂扣ID已存在
+        """
+        items = list(items)
+        with self._lock:
+            if hold_id in self._holds:
+                raise ValueError(f"暂扣ID已存在: {hold_id}")
+            
+            self._holds[hold_id] = items
+            self._wheel.schedule(hold_id, self._clock() + (ttl or self.ttl))
+    
+    def commit_hold(self, hold_id: str) -> bool:
+        """
+        将暂扣转为正式扣减（库存不再归还）
+        
+        Args:
+            hold_id: 暂扣ID
+        
+        Returns:
+            暂扣是否仍然有效
+        """
+        self.expire()
+        
+        with self._lock:
+            if self._holds.pop(hold_id, None) is None:
+                return False
+            self._wheel.cancel(hold_id)
+            return True
+    
+    def release_hold(self, hold_id: str) -> bool:
+        """
+        取消暂扣并归还库存
+        
+        Args:
+            hold_id: 暂扣ID
+        
+        Returns:
+            暂扣是否存在
+        """
+        with self._lock:
+            items = self._holds.pop(hold_id, None)
+            if items is None:
+                return False
+            self._wheel.cancel(hold_id)
+            if items:
+                self.inventory.release_many(items)
+            return True
+    
+    def detach_holds(self, hold_ids: Iterable[str]) -> Dict[str, List[Tuple[str, int]]]:
+        """
+        取消暂扣但不归还库存，由调用方汇总后统一归还
+        
+        Args:
+            hold_ids: 暂扣ID列表
+        
+        Returns:
+            暂扣ID -> 暂扣的 (商品ID, 数量) 列表（只包含仍然有效的暂扣）
+        """
+        detached: Dict[str, List[Tuple[str, int]]] = {}
+        with self._lock:
+            for hold_id in hold_ids:
+                items = self._holds.pop(hold_id, None)
+                if items is not None:
+                    self._wheel.cancel(hold_id)
+                    detached[hold_id] = items
+        return detached
+    
+    def expire(self, now: Optional[float] = None) -> List[str]:
+        """
+        归还所有已过期暂扣的库存
+        
+        每个暂扣单独归还，某个暂扣归还失败（例如商品已下架）时记录到 failed_releases，
+        不影响其他暂扣，也不向调用方抛出异常；on_expire 只对归还成功的暂扣调用。
+        
+        Args:
+            now: 当前时间，默认读取时钟
+        
+        Returns:
+            已归还库存的过期暂扣ID列表
+        """
+        released = []
+        with self._lock:
+            expired = self._wheel.advance(self._clock() if now is None else now)
+            for hold_id in expired:
+                items = self._holds.pop(hold_id)
+                try:
+                    if items:
+                        self.inventory.release_many(items)
+                except Exception as e:
+                    self.failed_releases.append((hold_id, items, str(e)))
+                    print(f"暂扣 {hold_id} 过期归还库存失败: {e}")
+                    continue
+                released.append(hold_id)
+        
+        if self.on_expire is not None:
+            for hold_id in released:
+                self.on_expire(hold_id)
+        return released
+    
+    def clear(self) -> None:
+        """丢弃所有暂扣（不归还库存，用于与库存一起清空）"""
+        with self._lock:
+            for hold_id in list(self._holds):
+                self._wheel.cancel(hold_id)
+            self._holds.clear()
+    
+    def has_hold(self, hold_id: str) -> bool:
+        """暂扣是否有效"""
+        return hold_id in self._holds
+    
+    def __len__(self) -> int:
+        """有效暂扣数量"""
+        return len(self._holds)
@@ -0,0 +1,99 @@
+"""
+ID生成模块
+生成 64 位雪花（Snowflake）ID：按时间递增，并携带生成它的工作进程（分片）编号
+
+位布局（从高到低）：1 位符号位（恒为0）、41 位毫秒时间戳（相对 EPOCH_MS）、
+10 位工作进程编号、12 位同一毫秒内的序号
+"""
+
+import threading
+import time
+from typing import Callable, NamedTuple
+
+
+# 2024-01-01 00:00:00 UTC，41 位毫秒时间戳可用约 69 年
+EPOCH_MS = 1704067200000
+
+WORKER_BITS = 10
+SEQUENCE_BITS = 12
+MAX_WORKER_ID = (1 << WORKER_BITS) - 1
+MAX_SEQUENCE = (1 << SEQUENCE_BITS) - 1
+
+
+class SnowflakeId(NamedTuple):
+    """雪花ID的组成部分"""
+    timestamp_ms: int  # 纪元毫秒
+    worker_id: int
+    sequence: int
+
+
+def parse_id(value: int) -> SnowflakeId:
+    """
+    拆分雪花ID
+    
+    Args:
+        value: 雪花ID
+    
+    Returns:
+        时间戳、工作进程编号和序号
+    """
+    return SnowflakeId(
+        timestamp_ms=(value >> (WORKER_BITS + SEQUENCE_BITS)) + EPOCH_MS,
+        worker_id=(value >> SEQUENCE_BITS) & MAX_WORKER_ID,
+        sequence=value & MAX_SEQUENCE,
+    )
+
+
+def _now_ms() -> int:
+    """当前时间（纪元毫秒）"""
+    return time.time_ns() // 1_000_000
+
+
+class SnowflakeIdGenerator:
+    """
+    雪花ID生成器（线程安全）
+    
+    同一生成器产生的ID严格递增。同一毫秒内序号用完，或系统时钟回拨时，
+    借用下一毫秒的时间戳继续生成，不等待时钟。
+    """
+    
+    def __init__(self, worker_id: int = 0, clock: Callable[[], int] = _now_ms):
+        """
+        初始化ID生成器
+        
+        Args:
+            worker_id: 工作进程（分片）编号，0 ~ 1023，多个进程同时生成时必须互不相同
+            clock: 返回纪元毫秒的时钟函数（测试时可替换）
+        
+        Raises:
+            ValueError: 工作进程编号超出范围
+        """
+        if not 0 <= worker_id <= MAX_WORKER_ID:
+            raise ValueError(f"工作进程编号必须在 0 ~ {MAX_WORKER_ID} 之间: {worker_id}")
+        
+        self.worker_id = worker_id
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._last_ms = -1
+        self._sequence = 0
+    
+    def next_id(self) -> int:
+        """
+        生成下一个ID
+        
+        Returns:
+            64 位雪花ID
+        """
+        with self._lock:
+            now = self._clock() - EPOCH_MS
+            if now > self._last_ms:
+                self._last_ms = now
+                self._sequence = 0
+            elif self._sequence < MAX_SEQUENCE:
+                self._sequence += 1
+            else:
+                self._last_ms += 1
+                self._sequence = 0
+            return ((self._last_ms << (WORKER_BITS + SEQUENCE_BITS))
+                    | (self.worker_id << SEQUENCE_BITS)
+                    | self._sequence)
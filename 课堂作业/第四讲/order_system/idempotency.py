@@ -0,0 +1,182 @@
+"""
+幂等键模块
+客户端为修改类请求附带幂等键，首次执行的响应被缓存，
+重试时直接返回缓存的响应；并发的重复请求等待首次执行完成后共享结果
+"""
+
+import asyncio
+import concurrent.futures
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Optional, Tuple
+
+
+class IdempotencyKeyReusedError(ValueError):
+    """幂等键被用于不同的请求"""
+    pass
+
+
+class IdempotencyRecord:
+    """一个幂等键对应的请求记录"""
+    
+    __slots__ = ("key", "fingerprint", "response", "expires_at", "_future")
+    
+    def __init__(self, key: str, fingerprint: str):
+        """
+        初始化请求记录
+        
+        Args:
+            key: 幂等键
+            fingerprint: 请求指纹（方法、路径和请求体等）
+        """
+        self.key = key
+        self.fingerprint = fingerprint
+        self.response: Any = None
+        # 执行完成后才开始计算过期时间
+        self.expires_at: Optional[float] = None
+        # 首次执行结束时设置结果（响应，放弃时为 None）
+        self._future: "concurrent.futures.Future[Any]" = concurrent.futures.Future()
+    
+    @property
+    def done(self) -> bool:
+        """首次执行是否已完成"""
+        return self.expires_at is not None
+    
+    def wait(self, timeout: Optional[float] = None) -> Any:
+        """
+        等待首次执行结束（阻塞当前线程）
+        
+        Args:
+            timeout: 最长等待时间（秒）
+        
+        Returns:
+            缓存的响应，首次执行被放弃时返回 None
+        
+        Raises:
+            concurrent.futures.TimeoutError: 等待超时
+        """
+        return self._future.result(timeout)
+    
+    async def wait_async(self) -> Any:
+        """
+        等待首次执行结束（不占用线程）
+        
+        Returns:
+            缓存的响应，首次执行被放弃时返回 None
+        """
+        return await asyncio.wrap_future(self._future)
+
+
+class IdempotencyStore:
+    """
+    幂等键存储
+    
+    已完成的记录在 ttl 秒后过期；记录数超过 max_entries 时淘汰最久未使用的已完成记录，
+    执行中的记录不会被淘汰。
+    """
+    
+    def __init__(self, ttl: float = 86400.0, max_entries: int = 10000,
+                 clock: Callable[[], float] = time.monotonic):
+        """
+        初始化幂等键存储
+        
+        Args:
+            ttl: 已完成记录的保留时间（秒）
+            max_entries: 最多保留的记录数
+            clock: 时钟函数（测试时可替换）
+        
+        Raises:
+            ValueError: 参数无效
+        """
+        if ttl <= 0:
+            raise ValueError(f"保留时间必须大于0: {ttl}")
+        if max_entries <= 0:
+            raise ValueError(f"记录数上限必须大于0: {max_entries}")
+        
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._records: "OrderedDict[str, IdempotencyRecord]" = OrderedDict()
+    
+    def __len__(self) -> int:
+        """记录数（含执行中的请求）"""
+        return len(self._records)
+    
+    def begin(self, key: str, fingerprint: str) -> Tuple[IdempotencyRecord, bool]:
+        """
+        开始处理带幂等键的请求
+        
+        Args:
+            key: 幂等键
+            fingerprint: 请求指纹
+        
+        Returns:
+            (请求记录, 是否由调用方执行)。不由调用方执行时，
+            记录已完成则直接使用 record.response，否则等待 record.wait()
+        
+        Raises:
+            IdempotencyKeyReusedError: 幂等键已用于不同的请求
+        """
+        with self._lock:
+            record = self._records.get(key)
+            if record is not None and record.done and record.expires_at <= self._clock():
+                del self._records[key]
+                record = None
+            
+            if record is not None:
+                if record.fingerprint != fingerprint:
+                    raise IdempotencyKeyReusedError(f"幂等键已用于其他请求: {key}")
+                self._records.move_to_end(key)
+                return record, False
+            
+            record = IdempotencyRecord(key, fingerprint)
+            self._records[key] = record
+            self._evict()
+            return record, True
+    
+    def complete(self, record: IdempotencyRecord, response: Any) -> None:
+        """
+        缓存首次执行的响应并唤醒等待的重复请求
+        
+        Args:
+            record: begin 返回的请求记录
+            response: 响应
+        """
+        with self._lock:
+            record.response = response
+            record.expires_at = self._clock() + self.ttl
+        record._future.set_result(response)
+    
+    def abandon(self, record: IdempotencyRecord) -> None:
+        """
+        放弃首次执行（不缓存结果），等待的重复请求需要重新执行
+        
+        Args:
+            record: begin 返回的请求记录
+        """
+        with self._lock:
+            if self._records.get(record.key) is record:
+                del self._records[record.key]
+        record._future.set_result(None)
+    
+    def clear(self) -> None:
+        """丢弃所有已完成的记录"""
+        with self._lock:
+            for key in [key for key, record in self._records.items() if record.done]:
+                del self._records[key]
+    
+    def _evict(self) -> None:
+        """从最久未使用的一端淘汰超出上限的已完成记录（调用方持有 _lock）"""
+        excess = len(self._records) - self.max_entries
+        if excess <= 0:
+            return
+        victims = []
+        for key, record in self._records.items():
+            if record.done:
+                victims.append(key)
+                if len(victims) == excess:
+                    break
+        for key in victims:
+            del self._records[key]
@@ -3,7 +3,9 @@
 负责商品库存的增减和查询
 """
 
-from typing import Dict, Optional
+import threading
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
 
 
 class InsufficientStockError(Exception):
@@ -22,6 +24,13 @@ class Inventory:
     def __init__(self):
         """初始化库存"""
         self._stock: Dict[str, int] = {}
+        # 事件接收器，参数为 (事件名, 事件数据)，由事件日志注册
+        self.event_sink: Optional[Callable[[str, Dict[str, Any]], None]] = None
+    
+    def _emit(self, event: str, data: Dict[str, Any]) -> None:
+        """发布库存变化事件"""
+        if self.event_sink is not None:
+            self.event_sink(event, data)
     
     def add_product(self, product_id: str, quantity: int) -> None:
         """
@@ -41,6 +50,7 @@ class Inventory:
             self._stock[product_id] += quantity
         else:
             self._stock[product_id] = quantity
+        self._emit("added", {"product_id": product_id, "quantity": quantity})
     
     def remove_product(self, product_id: str) -> None:
         """
@@ -56,6 +66,7 @@ class Inventory:
             raise ProductNotFoundError(f"商品不存在: {product_id}")
         
         del self._stock[product_id]
+        self._emit("removed", {"product_id": product_id})
     
     def get_stock(self, product_id: str) -> int:
         """
@@ -75,6 +86,18 @@ class Inventory:
         
         return self._stock[product_id]
     
+    def has_product(self, product_id: str) -> bool:
+        """
+        商品是否存在
+        
+        Args:
+            product_id: 商品ID
+        
+        Returns:
+            是否存在
+        """
+        return product_id in self._stock
+    
     def check_availability(self, product_id: str, quantity: int) -> bool:
         """
         检查库存是否充足
@@ -119,6 +142,7 @@ class Inventory:
             )
         
         self._stock[product_id] -= quantity
+        self._emit("reserved", {"items": {product_id: quantity}})
     
     def release_stock(self, product_id: str, quantity: int) -> None:
         """
@@ -139,6 +163,75 @@ class Inventory:
             raise ProductNotFoundError(f"商品不存在: {product_id}")
         
         self._stock[product_id] += quantity
+        self._emit("released", {"items": {product_id: quantity}})
+    
+    def reserve_many(self, items: Iterable[Tuple[str, int]]) -> None:
+        """
+        批量预留库存（全部成功或全部失败）
+        
+        先校验所有商品的库存，全部满足后再统一扣减，
+        任一商品不满足时库存保持不变。
+        
+        Args:
+            items: (商品ID, 数量) 列表，同一商品可出现多次
+        
+        Raises:
+            ProductNotFoundError: 商品不存在
+            InsufficientStockError: 库存不足
+            ValueError: 数量无效
+        """
+        demand = self._aggregate_items(items)
+        self._reserve_aggregated(demand)
+    
+    def release_many(self, items: Iterable[Tuple[str, int]]) -> None:
+        """
+        批量释放库存（全部成功或全部失败）
+        
+        Args:
+            items: (商品ID, 数量) 列表，同一商品可出现多次
+        
+        Raises:
+            ProductNotFoundError: 商品不存在
+            ValueError: 数量无效
+        """
+        demand = self._aggregate_items(items)
+        self._release_aggregated(demand)
+    
+    @staticmethod
+    def _aggregate_items(items: Iterable[Tuple[str, int]]) -> Dict[str, int]:
+        """按商品汇总数量"""
+        demand: Dict[str, int] = {}
+        for product_id, quantity in items:
+            if quantity <= 0:
+                raise ValueError(f"数量必须大于0: {quantity}")
+            demand[product_id] = demand.get(product_id, 0) + quantity
+        return demand
+    
+    def _reserve_aggregated(self, demand: Dict[str, int]) -> None:
+        """校验并扣减汇总后的库存"""
+        for product_id, quantity in demand.items():
+            if product_id not in self._stock:
+                raise ProductNotFoundError(f"商品不存在: {product_id}")
+            if self._stock[product_id] < quantity:
+                raise InsufficientStockError(
+                    f"库存不足。商品: {product_id}, "
+                    f"当前库存: {self._stock[product_id]}, "
+                    f"需要: {quantity}"
+                )
+        
+        for product_id, quantity in demand.items():
+            self._stock[product_id] -= quantity
+        self._emit("reserved", {"items": demand})
+    
+    def _release_aggregated(self, demand: Dict[str, int]) -> None:
+        """校验并归还汇总后的库存"""
+        for product_id in demand:
+            if product_id not in self._stock:
+                raise ProductNotFoundError(f"商品不存在: {product_id}")
+        
+        for product_id, quantity in demand.items():
+            self._stock[product_id] += quantity
+        self._emit("released", {"items": demand})
     
     def get_all_stock(self) -> Dict[str, int]:
         """
@@ -152,3 +245,152 @@ class Inventory:
     def clear(self) -> None:
         """清空所有库存"""
         self._stock.clear()
+        self._emit("cleared", {})
+    
+    def snapshot_state(self) -> Dict[str, Any]:
+        """
+        导出库存快照
+        
+        Returns:
+            可序列化为 JSON 的库存状态
+        """
+        return {"stock": self.get_all_stock()}
+    
+    def restore_state(self, state: Dict[str, Any]) -> None:
+        """
+        从快照恢复库存（不发布事件）
+        
+        Args:
+            state: snapshot_state 导出的状态
+        """
+        self._stock = dict(state["stock"])
+    
+    def apply_event(self, event: str, data: Dict[str, Any]) -> None:
+        """
+        重放库存事件（不校验、不发布事件）
+        
+        Args:
+            event: 事件名
+            data: 事件数据
+        
+        Raises:
+            ValueError: 未知的事件
+        """
+        if event == "added":
+            product_id = data["product_id"]
+            self._stock[product_id] = self._stock.get(product_id, 0) + data["quantity"]
+        elif event == "removed":
+            del self._stock[data["product_id"]]
+        elif event == "reserved":
+            for product_id, quantity in data["items"].items():
+                self._stock[product_id] -= quantity
+        elif event == "released":
+            for product_id, quantity in data["items"].items():
+                self._stock[product_id] += quantity
+        elif event == "cleared":
+            self._stock.clear()
+        else:
+            raise ValueError(f"未知的库存事件: {event}")
+
+
+class ConcurrentInventory(Inventory):
+    """
+    线程安全的库存管理类（锁分段）
+    
+    按商品ID哈希到固定数量的锁分段上，不同商品的预留可以并行执行，
+    同一商品的预留在同一把锁内串行，保证不会超卖。
+    """
+    
+    def __init__(self, stripes: int = 16):
+        """
+        初始化库存
+        
+        Args:
+            stripes: 锁分段数量
+        
+        Raises:
+            ValueError: 分段数量无效
+        """
+        if stripes <= 0:
+            raise ValueError(f"锁分段数量必须大于0: {stripes}")
+        
+        super().__init__()
+        self._locks: List[threading.Lock] = [
+            threading.Lock() for _ in range(stripes)
+        ]
+        # 保护字典结构变化（新增/删除商品、清空）
+        self._structure_lock = threading.Lock()
+    
+    def _lock_for(self, product_id: str) -> threading.Lock:
+        """获取商品对应的分段锁"""
+        return self._locks[hash(product_id) % len(self._locks)]
+    
+    @contextmanager
+    def _locked(self, product_ids: Iterable[str]) -> Iterator[None]:
+        """按分段序号顺序获取多把分段锁，避免死锁"""
+        stripes = len(self._locks)
+        indexes = sorted({hash(product_id) % stripes for product_id in product_ids})
+        for index in indexes:
+            self._locks[index].acquire()
+        try:
+            yield
+        finally:
+            for index in reversed(indexes):
+                self._locks[index].release()
+    
+    def add_product(self, product_id: str, quantity: int) -> None:
+        """添加商品库存（线程安全）"""
+        with self._lock_for(product_id):
+            if product_id in self._stock:
+                super().add_product(product_id, quantity)
+                return
+            with self._structure_lock:
+                super().add_product(product_id, quantity)
+    
+    def remove_product(self, product_id: str) -> None:
+        """移除商品（线程安全）"""
+        with self._lock_for(product_id), self._structure_lock:
+            super().remove_product(product_id)
+    
+    def get_stock(self, product_id: str) -> int:
+        """查询商品库存（线程安全）"""
+        with self._lock_for(product_id):
+            return super().get_stock(product_id)
+    
+    def reserve_stock(self, product_id: str, quantity: int) -> None:
+        """预留库存（线程安全）"""
+        with self._lock_for(product_id):
+            super().reserve_stock(product_id, quantity)
+    
+    def release_stock(self, product_id: str, quantity: int) -> None:
+        """释放库存（线程安全）"""
+        with self._lock_for(product_id):
+            super().release_stock(product_id, quantity)
+    
+    def reserve_many(self, items: Iterable[Tuple[str, int]]) -> None:
+        """批量预留库存（线程安全，一次临界区完成）"""
+        demand = self._aggregate_items(items)
+        with self._locked(demand):
+            self._reserve_aggregated(demand)
+    
+    def release_many(self, items: Iterable[Tuple[str, int]]) -> None:
+        """批量释放库存（线程安全，一次临界区完成）"""
+        demand = self._aggregate_items(items)
+        with self._locked(demand):
+            self._release_aggregated(demand)
+    
+    def get_all_stock(self) -> Dict[str, int]:
+        """获取所有库存信息（线程安全）"""
+        with self._structure_lock:
+            return super().get_all_stock()
+    
+    def clear(self) -> None:
+        """清空所有库存（线程安全）"""
+        for lock in self._locks:
+            lock.acquire()
+        try:
+            with self._structure_lock:
+                super().clear()
+        finally:
+            for lock in reversed(self._locks):
+                lock.release()
@@ -0,0 +1,119 @@
+"""
+库存并发预留压力测试
+比较单锁与锁分段库存在不同线程数下的预留吞吐量（次/秒）
+
+用法:
+    python inventory_benchmark.py [每线程预留次数]
+"""
+
+import sys
+import threading
+import time
+from typing import List
+
+from inventory import ConcurrentInventory, InsufficientStockError
+
+
+PRODUCT_COUNT = 64
+THREAD_COUNTS = [1, 2, 4, 8, 16]
+
+
+def run_reservations(inventory: ConcurrentInventory, thread_count: int,
+                     ops_per_thread: int) -> float:
+    """
+    多线程并发预留库存
+    
+    Args:
+        inventory: 库存管理器
+        thread_count: 线程数
+        ops_per_thread: 每个线程的预留次数
+    
+    Returns:
+        每秒预留次数
+    """
+    product_ids = [f"P{i:03d}" for i in range(PRODUCT_COUNT)]
+    barrier = threading.Barrier(thread_count + 1)
+    
+    def worker(offset: int) -> None:
+        barrier.wait()
+        for i in range(ops_per_thread):
+            product_id = product_ids[(offset + i) % PRODUCT_COUNT]
+            try:
+                inventory.reserve_stock(product_id, 1)
+            except InsufficientStockError:
+                pass
+    
+    threads: List[threading.Thread] = [
+        threading.Thread(target=worker, args=(n * 7,))
+        for n in range(thread_count)
+    ]
+    for thread in threads:
+        thread.start()
+    
+    barrier.wait()
+    start_time = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start_time
+    
+    return thread_count * ops_per_thread / elapsed
+
+
+def check_no_oversell(stripes: int, thread_count: int = 8,
+                      ops_per_thread: int = 2000) -> bool:
+    """
+    检查同一商品高并发预留时不会超卖
+    
+    Returns:
+        最终库存是否正确
+    """
+    inventory = ConcurrentInventory(stripes=stripes)
+    initial_stock = thread_count * ops_per_thread // 2
+    inventory.add_product("HOT", initial_stock)
+    reserved = [0] * thread_count
+    
+    def worker(index: int) -> None:
+        for _ in range(ops_per_thread):
+            try:
+                inventory.reserve_stock("HOT", 1)
+                reserved[index] += 1
+            except InsufficientStockError:
+                pass
+    
+    threads = [threading.Thread(target=worker, args=(n,)) for n in range(thread_count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    
+    return (inventory.get_stock("HOT") == 0
+            and sum(reserved) == initial_stock)
+
+
+def main() -> None:
+    ops_per_thread = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    
+    print("📦 库存并发预留压力测试")
+    print("=" * 60)
+    print(f"   - 商品数量: {PRODUCT_COUNT}")
+    print(f"   - 每线程预留次数: {ops_per_thread}")
+    print()
+    print(f"{'线程数':>6} | {'单锁 (次/秒)':>14} | {'分段锁 (次/秒)':>16}")
+    print("-" * 60)
+    
+    for thread_count in THREAD_COUNTS:
+        results = []
+        for stripes in (1, 16):
+            inventory = ConcurrentInventory(stripes=stripes)
+            for i in range(PRODUCT_COUNT):
+                inventory.add_product(f"P{i:03d}", thread_count * ops_per_thread)
+            results.append(run_reservations(inventory, thread_count, ops_per_thread))
+        print(f"{thread_count:>6} | {results[0]:>14,.0f} | {results[1]:>16,.0f}")
+    
+    print("-" * 60)
+    ok = check_no_oversell(stripes=16)
+    print(f"{'✅' if ok else '❌'} 同一商品并发预留{'未' if ok else ''}出现超卖")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,330 @@
+"""
+事件日志模块
+库存、支付和订单的每次变化以领域事件追加写入日志文件（组提交 fsync），
+定期将日志压缩为快照，启动时加载最新快照并只重放其后的事件
+"""
+
+import functools
+import json
+import os
+import threading
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+
+SNAPSHOT_FILE = "snapshot.json"
+SEGMENT_PREFIX = "events-"
+SEGMENT_SUFFIX = ".log"
+
+
+class EventJournal:
+    """
+    领域事件日志（预写日志 + 快照）
+    
+    服务以名称注册（如 "stock"、"payment"、"order"），需要提供:
+        event_sink: 事件接收器属性，由日志设置
+        snapshot_state() / restore_state(state): 导出和恢复快照
+        apply_event(event, data): 重放事件
+    
+    日志按段文件保存，每行一个事件 [序号, 服务名, 事件名, 数据]。
+    并发写入的事件由后台线程合并后一次写入并 fsync（组提交），
+    调用 sync() 等待事件落盘。
+    """
+    
+    def __init__(self, directory: str, snapshot_every: Optional[int] = None,
+                 state_factory: Optional[Callable[[], Dict[str, Any]]] = None,
+                 fsync: bool = True):
+        """
+        初始化事件日志
+        
+        Args:
+            directory: 日志目录
+            snapshot_every: 每写入多少个事件自动生成一次快照，为空时不自动生成
+            state_factory: 创建一组空服务的函数，生成快照时在其上重放日志
+            fsync: 写入后是否 fsync
+        
+        Raises:
+            ValueError: 快照间隔无效
+        """
+        if snapshot_every is not None and snapshot_every <= 0:
+            raise ValueError(f"快照间隔必须大于0: {snapshot_every}")
+        
+        self.directory = directory
+        self.snapshot_every = snapshot_every
+        self.fsync = fsync
+        self._state_factory = state_factory
+        os.makedirs(directory, exist_ok=True)
+        
+        self._lock = threading.Lock()
+        self._has_pending = threading.Condition(self._lock)
+        self._durable = threading.Condition(self._lock)
+        # 保护当前段文件的写入和切换
+        self._io_lock = threading.Lock()
+        self._compact_lock = threading.Lock()
+        self._pending: List[str] = []
+        self._seq = 0
+        self._durable_seq = 0
+        self._snapshot_seq = 0
+        self._file = None
+        self._services: Dict[str, Any] = {}
+        self._writer: Optional[threading.Thread] = None
+        self._closed = False
+        self._compacting = False
+        self._error: Optional[OSError] = None
+    
+    @property
+    def last_seq(self) -> int:
+        """最后一个事件的序号"""
+        return self._seq
+    
+    def recover(self, services: Dict[str, Any]) -> int:
+        """
+        加载快照并重放日志恢复服务状态，然后开始记录这些服务的事件
+        
+        Args:
+            services: 服务名 -> 服务对象
+        
+        Returns:
+            重放的事件数量
+        
+        Raises:
+            ValueError: 日志已打开
+        """
+        if self._file is not None or self._closed:
+            raise ValueError("事件日志已打开")
+        
+        self._snapshot_seq, seq, replayed = self._load(services, self._segments())
+        self._seq = self._durable_seq = seq
+        self._open_segment(seq + 1)
+        
+        self._writer = threading.Thread(target=self._write_loop, daemon=True)
+        self._writer.start()
+        self._services = dict(services)
+        for name, service in self._services.items():
+            service.event_sink = functools.partial(self.append, name)
+        return replayed
+    
+    def append(self, service: str, event: str, data: Dict[str, Any]) -> int:
+        """
+        追加事件（不等待落盘）
+        
+        Args:
+            service: 服务名
+            event: 事件名
+            data: 事件数据
+        
+        Returns:
+            事件序号
+        
+        Raises:
+            ValueError: 日志未打开或已关闭
+        """
+        payload = json.dumps(data, ensure_ascii=False, separators=(",", ":"))
+        with self._lock:
+            if self._file is None or self._closed:
+                raise ValueError("事件日志未打开")
+            self._seq += 1
+            seq = self._seq
+            self._pending.append(f'[{seq},"{service}","{event}",{payload}]\n')
+            self._has_pending.notify()
+        return seq
+    
+    def sync(self, seq: Optional[int] = None) -> None:
+        """
+        等待事件落盘
+        
+        Args:
+            seq: 等待到的事件序号，默认为当前最后一个事件
+        
+        Raises:
+            OSError: 日志写入失败
+        """
+        with self._lock:
+            target = self._seq if seq is None else seq
+            while self._durable_seq < target and self._error is None:
+                self._durable.wait()
+            if self._error is not None:
+                raise OSError(f"事件日志写入失败: {self._error}") from self._error
+    
+    def compact(self) -> int:
+        """
+        生成快照并删除快照已包含的日志段
+        
+        切换到新的日志段后，在 state_factory 创建的空服务上加载旧快照并重放
+        已封存的日志段，不需要暂停正在运行的服务。
+        
+        Returns:
+            快照包含的最后一个事件序号
+        
+        Raises:
+            ValueError: 未配置 state_factory，或日志未打开
+        """
+        if self._state_factory is None:
+            raise ValueError("未配置状态工厂，无法生成快照")
+        
+        with self._compact_lock:
+            if self._file is None or self._closed:
+                raise ValueError("事件日志未打开")
+            sealed = self._rotate()
+            services = self._state_factory()
+            _, seq, _ = self._load(services, sealed)
+            self._write_snapshot(services, seq)
+            with self._lock:
+                self._snapshot_seq = seq
+            for path in sealed:
+                os.remove(path)
+            return seq
+    
+    def close(self) -> None:
+        """写入剩余事件并关闭日志，已注册的服务不再记录事件"""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._has_pending.notify()
+        
+        if self._writer is not None:
+            self._writer.join()
+        with self._compact_lock, self._io_lock:
+            if self._file is not None:
+                self._file.close()
+        for service in self._services.values():
+            service.event_sink = None
+    
+    def _segments(self) -> List[str]:
+        """按序号排列的日志段文件路径"""
+        names = sorted(
+            name for name in os.listdir(self.directory)
+            if name.startswith(SEGMENT_PREFIX) and name.endswith(SEGMENT_SUFFIX)
+        )
+        return [os.path.join(self.directory, name) for name in names]
+    
+    def _segment_path(self, first_seq: int) -> str:
+        """以段内第一个事件序号命名的日志段路径"""
+        return os.path.join(self.directory, f"{SEGMENT_PREFIX}{first_seq:020d}{SEGMENT_SUFFIX}")
+    
+    def _open_segment(self, first_seq: int) -> None:
+        """打开新的日志段"""
+        self._file = open(self._segment_path(first_seq), "ab")
+    
+    def _load(self, services: Dict[str, Any], segments: List[str]) -> Tuple[int, int, int]:
+        """
+        加载快照并重放日志段
+        
+        Returns:
+            (快照的事件序号, 最后一个事件序号, 重放的事件数量)
+        """
+        seq = 0
+        snapshot_path = os.path.join(self.directory, SNAPSHOT_FILE)
+        if os.path.exists(snapshot_path):
+            with open(snapshot_path, "rb") as f:
+                snapshot = json.load(f)
+            seq = snapshot["seq"]
+            for name, state in snapshot["state"].items():
+                services[name].restore_state(state)
+        snapshot_seq = seq
+        
+        replayed = 0
+        for path in segments:
+            with open(path, "rb") as f:
+                for line in f:
+                    try:
+                        event_seq, name, event, data = json.loads(line)
+                    except ValueError:
+                        # 崩溃时未写完的最后一行
+                        break
+                    if event_seq <= seq:
+                        continue
+                    services[name].apply_event(event, data)
+                    seq = event_seq
+                    replayed += 1
+        return snapshot_seq, seq, replayed
+    
+    def _write_snapshot(self, services: Dict[str, Any], seq: int) -> None:
+        """原子地写入快照文件"""
+        path = os.path.join(self.directory, SNAPSHOT_FILE)
+        tmp_path = path + ".tmp"
+        snapshot = {
+            "seq": seq,
+            "state": {name: service.snapshot_state() for name, service in services.items()}
+        }
+        with open(tmp_path, "wb") as f:
+            f.write(json.dumps(snapshot, ensure_ascii=False, separators=(",", ":")).encode("utf-8"))
+            f.flush()
+            if self.fsync:
+                os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+        if self.fsync and hasattr(os, "O_DIRECTORY"):
+            fd = os.open(self.directory, os.O_RDONLY | os.O_DIRECTORY)
+            try:
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+    
+    def _write_pending(self) -> None:
+        """将待写入的事件一次写入当前日志段（调用方持有 _io_lock）"""
+        with self._lock:
+            batch, self._pending = self._pending, []
+            last_seq = self._seq
+        if batch:
+            self._file.write("".join(batch).encode("utf-8"))
+            self._file.flush()
+            if self.fsync:
+                os.fsync(self._file.fileno())
+        with self._lock:
+            self._durable_seq = last_seq
+            self._durable.notify_all()
+    
+    def _rotate(self) -> List[str]:
+        """
+        封存当前日志段并切换到新段
+        
+        Returns:
+            已封存的日志段路径
+        """
+        with self._io_lock:
+            self._write_pending()
+            self._file.close()
+            first_seq = self._durable_seq + 1
+            self._open_segment(first_seq)
+        active = self._segment_path(first_seq)
+        return [path for path in self._segments() if path != active]
+    
+    def _write_loop(self) -> None:
+        """后台写入线程：合并所有待写入事件后一次写入并 fsync"""
+        while True:
+            with self._lock:
+                while not self._pending and not self._closed:
+                    self._has_pending.wait()
+                if not self._pending and self._closed:
+                    return
+            
+            try:
+                with self._io_lock:
+                    self._write_pending()
+            except OSError as e:
+                with self._lock:
+                    self._error = e
+                    self._durable.notify_all()
+                return
+            self._maybe_compact()
+    
+    def _maybe_compact(self) -> None:
+        """写入的事件达到快照间隔时在后台生成快照"""
+        if self.snapshot_every is None or self._state_factory is None:
+            return
+        with self._lock:
+            if self._compacting or self._durable_seq - self._snapshot_seq < self.snapshot_every:
+                return
+            self._compacting = True
+        threading.Thread(target=self._compact_in_background, daemon=True).start()
+    
+    def _compact_in_background(self) -> None:
+        """后台生成快照"""
+        try:
+            self.compact()
+        except ValueError:
+            # 生成快照前日志已关闭
+            pass
+        finally:
+            with self._lock:
+                self._compacting = False
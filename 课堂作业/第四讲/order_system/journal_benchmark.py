@@ -0,0 +1,130 @@
+"""
+事件日志测试
+测量组提交写入吞吐量，以及从纯日志和从快照+日志尾部恢复的耗时
+
+用法:
+    python journal_benchmark.py [事件数量]
+"""
+
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from typing import Dict
+
+from inventory import Inventory
+from journal import EventJournal
+from order import OrderService
+from payment import PaymentProcessor
+
+
+THREAD_COUNT = 8
+TAIL_EVENTS = 1000
+
+
+def new_state() -> Dict:
+    """创建一组空服务"""
+    inventory = Inventory()
+    payment_processor = PaymentProcessor()
+    return {
+        "stock": inventory,
+        "payment": payment_processor,
+        "order": OrderService(inventory, payment_processor)
+    }
+
+
+def measure_group_commit(directory: str, ops_per_thread: int) -> float:
+    """
+    多线程写入事件，每次写入后等待落盘
+    
+    Returns:
+        每秒落盘的事件数
+    """
+    services = new_state()
+    journal = EventJournal(directory)
+    journal.recover(services)
+    inventory = services["stock"]
+    lock = threading.Lock()
+    
+    def worker(n: int) -> None:
+        for _ in range(ops_per_thread):
+            with lock:
+                inventory.add_product(f"P{n}", 1)
+            journal.sync()
+    
+    threads = [threading.Thread(target=worker, args=(n,)) for n in range(THREAD_COUNT)]
+    start_time = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start_time
+    journal.close()
+    return THREAD_COUNT * ops_per_thread / elapsed
+
+
+def build_history(directory: str, event_count: int) -> None:
+    """写入约 event_count 个订单事件（创建、加商品、确认、取消）"""
+    services = new_state()
+    journal = EventJournal(directory, fsync=False)
+    journal.recover(services)
+    services["stock"].add_product("P001", event_count)
+    order_service = services["order"]
+    for i in range(event_count // 5):
+        order_id = f"ORD{i:08d}"
+        order_service.create_order(order_id, f"CUST{i % 1000:04d}")
+        order_service.add_item_to_order(order_id, "P001", 1, 9.9)
+        order_service.confirm_order(order_id)
+        if i % 2:
+            order_service.cancel_order(order_id)
+    journal.close()
+
+
+def measure_recovery(directory: str) -> float:
+    """
+    恢复全部状态
+    
+    Returns:
+        耗时（秒）
+    """
+    start_time = time.perf_counter()
+    journal = EventJournal(directory)
+    journal.recover(new_state())
+    elapsed = time.perf_counter() - start_time
+    journal.close()
+    return elapsed
+
+
+def main() -> None:
+    event_count = int(sys.argv[1]) if len(sys.argv) > 1 else 10 ** 6
+    directory = tempfile.mkdtemp(prefix="journal_benchmark_")
+    
+    print("📒 事件日志测试")
+    print("=" * 60)
+    print(f"   - 历史事件数量: {event_count:,}")
+    print(f"   - 写入线程数: {THREAD_COUNT}")
+    print()
+    
+    try:
+        throughput = measure_group_commit(f"{directory}/commit", 500)
+        print(f"   组提交写入: {throughput:,.0f} 事件/秒（每次写入都等待 fsync）")
+        
+        history = f"{directory}/history"
+        build_history(history, event_count)
+        print(f"   纯日志恢复: {measure_recovery(history):.2f} 秒")
+        
+        journal = EventJournal(history, state_factory=new_state, fsync=False)
+        services = new_state()
+        journal.recover(services)
+        journal.compact()
+        for i in range(TAIL_EVENTS):
+            services["stock"].add_product(f"T{i}", 1)
+        journal.close()
+        print(f"   快照 + {TAIL_EVENTS} 个尾部事件恢复: {measure_recovery(history):.2f} 秒")
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
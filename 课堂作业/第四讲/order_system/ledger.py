@@ -0,0 +1,169 @@
+"""
+余额账本模块
+每个账户的余额拆分为多个子余额（以分为单位的整数），
+不同线程优先在各自的子余额上扣款，子余额不足时再汇总重新均分
+"""
+
+import itertools
+import threading
+from contextlib import contextmanager
+from typing import Dict, Generic, Hashable, Iterator, List, TypeVar
+
+
+K = TypeVar("K", bound=Hashable)
+
+
+class BalanceLedger(Generic[K]):
+    """
+    分段余额账本（线程安全）
+    
+    扣款先在当前线程对应的子余额上加锁检查并扣减，只有该子余额不足时
+    才锁住全部子余额汇总判断，并把剩余余额重新均分到各子余额上。
+    """
+    
+    def __init__(self, balances: Dict[K, float], stripes: int = 8):
+        """
+        初始化账本
+        
+        Args:
+            balances: 账户 -> 初始余额
+            stripes: 每个账户的子余额数量
+        
+        Raises:
+            ValueError: 子余额数量无效或余额为负数
+        """
+        if stripes <= 0:
+            raise ValueError(f"子余额数量必须大于0: {stripes}")
+        
+        self.stripes = stripes
+        self._stripes: Dict[K, List[int]] = {}
+        self._locks: Dict[K, List[threading.Lock]] = {}
+        for key, balance in balances.items():
+            self._stripes[key] = [0] * stripes
+            self._locks[key] = [threading.Lock() for _ in range(stripes)]
+            self.set_balance(key, balance)
+        
+        # 每个线程固定使用一个子余额，按线程首次访问的顺序轮流分配
+        self._local = threading.local()
+        self._next_index = itertools.count()
+    
+    @staticmethod
+    def _to_cents(amount: float) -> int:
+        """金额转换为分"""
+        if amount < 0:
+            raise ValueError(f"金额不能为负数: {amount}")
+        return round(amount * 100)
+    
+    def _stripe_index(self) -> int:
+        """当前线程使用的子余额序号"""
+        index = getattr(self._local, "index", None)
+        if index is None:
+            index = self._local.index = next(self._next_index) % self.stripes
+        return index
+    
+    @contextmanager
+    def _all_locked(self, key: K) -> Iterator[List[int]]:
+        """按顺序锁住账户的全部子余额"""
+        locks = self._locks[key]
+        for lock in locks:
+            lock.acquire()
+        try:
+            yield self._stripes[key]
+        finally:
+            for lock in reversed(locks):
+                lock.release()
+    
+    def _spread(self, stripes: List[int], total: int) -> None:
+        """将余额均分到各子余额（调用方持有全部子余额锁）"""
+        share, remainder = divmod(total, self.stripes)
+        for index in range(self.stripes):
+            stripes[index] = share + (1 if index < remainder else 0)
+    
+    def try_debit(self, key: K, amount: float) -> bool:
+        """
+        余额充足时扣款（检查与扣减是原子的）
+        
+        Args:
+            key: 账户
+            amount: 金额
+        
+        Returns:
+            是否扣款成功
+        
+        Raises:
+            KeyError: 账户不存在
+            ValueError: 金额为负数
+        """
+        cents = self._to_cents(amount)
+        stripes = self._stripes[key]
+        index = self._stripe_index()
+        with self._locks[key][index]:
+            if stripes[index] >= cents:
+                stripes[index] -= cents
+                return True
+        
+        # 当前子余额不足，汇总全部子余额后扣款并重新均分
+        with self._all_locked(key) as stripes:
+            total = sum(stripes)
+            if total < cents:
+                return False
+            self._spread(stripes, total - cents)
+            return True
+    
+    def credit(self, key: K, amount: float) -> None:
+        """
+        入账
+        
+        Args:
+            key: 账户
+            amount: 金额
+        
+        Raises:
+            KeyError: 账户不存在
+            ValueError: 金额为负数
+        """
+        cents = self._to_cents(amount)
+        index = self._stripe_index()
+        with self._locks[key][index]:
+            self._stripes[key][index] += cents
+    
+    def set_balance(self, key: K, balance: float) -> None:
+        """
+        设置账户余额
+        
+        Args:
+            key: 账户
+            balance: 余额
+        
+        Raises:
+            KeyError: 账户不存在
+            ValueError: 余额为负数
+        """
+        cents = self._to_cents(balance)
+        with self._all_locked(key) as stripes:
+            self._spread(stripes, cents)
+    
+    def balance(self, key: K) -> float:
+        """
+        查询账户余额
+        
+        Args:
+            key: 账户
+        
+        Returns:
+            余额
+        
+        Raises:
+            KeyError: 账户不存在
+        """
+        with self._all_locked(key) as stripes:
+            return sum(stripes) / 100
+    
+    def balances(self) -> Dict[K, float]:
+        """
+        查询全部账户余额
+        
+        Returns:
+            账户 -> 余额
+        """
+        return {key: self.balance(key) for key in self._stripes}
@@ -6,7 +6,6 @@ Locust 性能测试脚本
 from locust import HttpUser, task, between
 import random
 import json
-import time
 
 class OrderSystemUser(HttpUser):
     """订单系统用户行为模拟"""
@@ -40,10 +39,8 @@ class OrderSystemUser(HttpUser):
     def create_order(self):
         """创建订单 - 高频任务"""
         self.order_counter += 1
-        order_id = f"ORD_{self.user_id}_{self.order_counter}_{int(time.time())}"
-        
+        # 订单ID由服务端生成，避免客户端拼接的ID冲突
         order_data = {
-            "order_id": order_id,
             "customer_id": f"CUST_{self.user_id}"
         }
         
@@ -51,7 +48,7 @@ class OrderSystemUser(HttpUser):
             if response.status_code == 201:
                 response.success()
                 # 保存订单ID用于后续操作
-                self.current_order_id = order_id
+                self.current_order_id = response.json()["order_id"]
             else:
                 response.failure(f"创建订单失败: {response.text}")
     
@@ -112,7 +109,8 @@ class OrderSystemUser(HttpUser):
             json=payment_data, 
             catch_response=True
         ) as response:
-            if response.status_code == 200:
+            if response.status_code in (200, 202):
+                # 202 表示支付已进入队列
                 response.success()
             elif response.status_code == 400:
                 # 订单状态不正确等业务错误
@@ -179,10 +177,7 @@ class OrderCreationUser(HttpUser):
     def create_order_only(self):
         """只创建订单"""
         self.order_counter += 1
-        order_id = f"LOAD_ORD_{self.user_id}_{self.order_counter}_{int(time.time() * 1000)}"
-        
         order_data = {
-            "order_id": order_id,
             "customer_id": f"LOAD_CUST_{self.user_id}"
         }
         
@@ -193,6 +188,39 @@ class OrderCreationUser(HttpUser):
                 response.failure(f"创建订单失败: {response.text}")
 
 
+class CheckoutUser(HttpUser):
+    """通过一次下单接口购买的用户类（一次请求完成创建、添加商品、确认和支付）"""
+    
+    wait_time = between(0.5, 2)
+    
+    def on_start(self):
+        """初始化"""
+        self.user_id = random.randint(10000, 99999)
+    
+    @task
+    def checkout(self):
+        """一次下单"""
+        checkout_data = {
+            "customer_id": f"CHECKOUT_CUST_{self.user_id}",
+            "items": [
+                {
+                    "product_id": f"P{random.randint(1, 10):03d}",
+                    "quantity": random.randint(1, 3),
+                    "price": round(random.uniform(10.0, 100.0), 2)
+                }
+                for _ in range(random.randint(1, 3))
+            ],
+            "payment_method": random.choice(["credit_card", "alipay", "wechat"])
+        }
+        
+        with self.client.post("/api/checkout", json=checkout_data, catch_response=True) as response:
+            # 库存或余额不足时订单已被取消，属于正常的业务失败
+            if response.status_code in (201, 400):
+                response.success()
+            else:
+                response.failure(f"下单失败: {response.text}")
+
+
 class InventoryUser(HttpUser):
     """专门测试库存查询的用户类"""
     
@@ -0,0 +1,74 @@
+"""
+订单内存占用测试
+比较普通模式与紧凑模式（列式订单项）下每个订单占用的字节数
+
+用法:
+    python memory_benchmark.py [订单数量]
+"""
+
+import gc
+import sys
+import time
+import tracemalloc
+
+from inventory import Inventory
+from payment import PaymentProcessor
+from order import OrderService
+
+
+ITEMS_PER_ORDER = 3
+
+
+def measure(order_count: int, compact: bool) -> float:
+    """
+    创建订单并统计内存占用
+    
+    Args:
+        order_count: 订单数量
+        compact: 是否使用紧凑模式
+    
+    Returns:
+        每个订单占用的字节数
+    """
+    gc.collect()
+    tracemalloc.start()
+    baseline, _ = tracemalloc.get_traced_memory()
+    
+    service = OrderService(Inventory(), PaymentProcessor(), compact=compact)
+    for i in range(order_count):
+        order = service.create_order(f"ORD{i:08d}", f"CUST{i % 10000:05d}")
+        for j in range(ITEMS_PER_ORDER):
+            order.add_item(f"P{(i + j) % 500:03d}", j + 1, 19.99 + j)
+    
+    gc.collect()
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    
+    per_order = (current - baseline) / order_count
+    del service
+    return per_order
+
+
+def main() -> None:
+    order_count = int(sys.argv[1]) if len(sys.argv) > 1 else 10 ** 6
+    
+    print("🧮 订单内存占用测试")
+    print("=" * 60)
+    print(f"   - 订单数量: {order_count:,}")
+    print(f"   - 每单商品数: {ITEMS_PER_ORDER}")
+    print()
+    
+    results = {}
+    for label, compact in (("普通模式", False), ("紧凑模式", True)):
+        start_time = time.perf_counter()
+        results[label] = measure(order_count, compact)
+        elapsed = time.perf_counter() - start_time
+        print(f"   {label}: {results[label]:,.0f} 字节/订单 (耗时 {elapsed:.1f} 秒)")
+    
+    saved = 1 - results["紧凑模式"] / results["普通模式"]
+    print("-" * 60)
+    print(f"📉 紧凑模式节省 {saved:.0%} 内存")
+
+
+if __name__ == "__main__":
+    main()
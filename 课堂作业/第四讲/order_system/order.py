@@ -3,11 +3,21 @@
 整合库存和支付模块，处理订单流程
 """
 
-from typing import Dict, List, Optional
+import bisect
+import heapq
+import json
+import threading
+from operator import attrgetter
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple
 from enum import Enum
 from datetime import datetime
 from inventory import Inventory, InsufficientStockError, ProductNotFoundError
 from payment import PaymentProcessor, PaymentMethod, PaymentStatus
+from holds import StockHoldManager
+from order_columns import OrderItemColumns
+from order_archive import OrderArchive
+from id_generator import SnowflakeIdGenerator
+from timestamps import now_us, to_datetime, from_datetime
 
 
 class OrderStatus(Enum):
@@ -23,6 +33,8 @@ class OrderStatus(Enum):
 class OrderItem:
     """订单项"""
     
+    __slots__ = ("product_id", "quantity", "price")
+    
     def __init__(self, product_id: str, quantity: int, price: float):
         """
         初始化订单项
@@ -59,21 +71,80 @@ class OrderItem:
 class Order:
     """订单类"""
     
-    def __init__(self, order_id: str, customer_id: str):
+    __slots__ = (
+        "order_id", "customer_id", "status", "payment_id",
+        "_items", "_columns", "_first_row", "_last_row", "_item_count",
+        "_created_us", "_updated_us", "_status_listener", "_total_amount",
+        "_version", "_dict_cache", "_json_cache",
+    )
+    
+    def __init__(self, order_id: str, customer_id: str,
+                 columns: Optional[OrderItemColumns] = None):
         """
         初始化订单
         
         Args:
             order_id: 订单ID
             customer_id: 客户ID
+            columns: 共享的订单项列式存储，提供时订单项不再单独创建对象
         """
         self.order_id = order_id
         self.customer_id = customer_id
-        self.items: List[OrderItem] = []
         self.status = OrderStatus.CREATED
         self.payment_id: Optional[str] = None
-        self.created_at = datetime.now()
-        self.updated_at = datetime.now()
+        # 普通模式下订单项保存在列表中，紧凑模式下保存在共享列中
+        self._items: Optional[List[OrderItem]] = [] if columns is None else None
+        self._columns = columns
+        self._first_row = -1
+        self._last_row = -1
+        self._item_count = 0
+        # 时间以纪元微秒保存
+        self._created_us = now_us()
+        self._updated_us = self._created_us
+        # 状态变化监听器，参数为 (订单, 原状态)，由 OrderService 注册以维护索引
+        self._status_listener: Optional[Callable[["Order", OrderStatus], None]] = None
+        # 随 add_item 增量维护的总金额
+        self._total_amount = 0.0
+        # 每次修改递增的版本号，序列化缓存以 (版本号, 结果) 形式保存
+        self._version = 0
+        self._dict_cache: Optional[Tuple[int, Dict]] = None
+        self._json_cache: Optional[Tuple[int, bytes]] = None
+    
+    @property
+    def created_at(self) -> datetime:
+        """创建时间"""
+        return to_datetime(self._created_us)
+    
+    @property
+    def updated_at(self) -> datetime:
+        """更新时间"""
+        return to_datetime(self._updated_us)
+    
+    @property
+    def sort_key(self) -> Tuple[int, str]:
+        """排序键 (创建时间纪元微秒, 订单ID)，与创建时间索引一致，用作分页游标"""
+        return (self._created_us, self.order_id)
+    
+    @property
+    def items(self) -> List[OrderItem]:
+        """订单项列表（紧凑模式下为根据列式存储生成的副本）"""
+        if self._items is not None:
+            return self._items
+        return [OrderItem(product_id, quantity, price)
+                for product_id, quantity, price in self._columns.rows(self._first_row)]
+    
+    def _touch(self) -> None:
+        """记录修改：更新时间并使序列化缓存失效"""
+        self._updated_us = now_us()
+        self._version += 1
+    
+    def _set_status(self, status: OrderStatus) -> None:
+        """更新状态并通知监听器"""
+        old_status = self.status
+        self.status = status
+        self._touch()
+        if self._status_listener is not None:
+            self._status_listener(self, old_status)
     
     def add_item(self, product_id: str, quantity: int, price: float) -> None:
         """
@@ -85,28 +156,48 @@ class Order:
             price: 单价
         """
         item = OrderItem(product_id, quantity, price)
-        self.items.append(item)
-        self.updated_at = datetime.now()
+        if self._columns is None:
+            self._items.append(item)
+            self._total_amount += item.total_price
+        else:
+            row = self._columns.append(self._last_row, product_id, quantity, price)
+            if self._first_row < 0:
+                self._first_row = row
+            self._last_row = row
+            self._total_amount += quantity * self._columns.price_of(row)
+        self._item_count += 1
+        self._touch()
+    
+    def _release_items(self) -> None:
+        """订单移出热数据时归还列式存储中的行，订单项转为列表保存"""
+        if self._columns is None:
+            return
+        self._items = self.items
+        self._columns.release(self._first_row)
+        self._columns = None
+        self._first_row = -1
+        self._last_row = -1
     
     @property
     def total_amount(self) -> float:
-        """计算订单总金额"""
-        return sum(item.total_price for item in self.items)
+        """订单总金额"""
+        return self._total_amount
     
     @property
     def item_count(self) -> int:
         """获取订单项数量"""
-        return len(self.items)
+        if self._items is not None:
+            return len(self._items)
+        return self._item_count
     
     def confirm(self) -> None:
         """确认订单"""
         if self.status != OrderStatus.CREATED:
             raise ValueError(f"只能确认已创建的订单。当前状态: {self.status.value}")
-        if not self.items:
+        if not self.item_count:
             raise ValueError("订单没有商品")
         
-        self.status = OrderStatus.CONFIRMED
-        self.updated_at = datetime.now()
+        self._set_status(OrderStatus.CONFIRMED)
     
     def mark_paid(self, payment_id: str) -> None:
         """标记为已支付"""
@@ -114,61 +205,166 @@ class Order:
             raise ValueError(f"只能支付已确认的订单。当前状态: {self.status.value}")
         
         self.payment_id = payment_id
-        self.status = OrderStatus.PAID
-        self.updated_at = datetime.now()
+        self._set_status(OrderStatus.PAID)
     
     def ship(self) -> None:
         """发货"""
         if self.status != OrderStatus.PAID:
             raise ValueError(f"只能发货已支付的订单。当前状态: {self.status.value}")
         
-        self.status = OrderStatus.SHIPPED
-        self.updated_at = datetime.now()
+        self._set_status(OrderStatus.SHIPPED)
     
     def complete(self) -> None:
         """完成订单"""
         if self.status != OrderStatus.SHIPPED:
             raise ValueError(f"只能完成已发货的订单。当前状态: {self.status.value}")
         
-        self.status = OrderStatus.COMPLETED
-        self.updated_at = datetime.now()
+        self._set_status(OrderStatus.COMPLETED)
     
     def cancel(self) -> None:
         """取消订单"""
         if self.status in [OrderStatus.SHIPPED, OrderStatus.COMPLETED]:
             raise ValueError(f"无法取消该状态的订单。当前状态: {self.status.value}")
         
-        self.status = OrderStatus.CANCELLED
-        self.updated_at = datetime.now()
+        self._set_status(OrderStatus.CANCELLED)
     
     def to_dict(self) -> Dict:
-        """转换为字典"""
-        return {
+        """
+        转换为字典
+        
+        结果按版本号缓存，订单未修改时直接复用，调用方不应修改返回的字典
+        """
+        version = self._version
+        cache = self._dict_cache
+        if cache is not None and cache[0] == version:
+            return cache[1]
+        
+        data = {
             "order_id": self.order_id,
             "customer_id": self.customer_id,
-            "items": [item.to_dict() for item in self.items],
+            "items": self._items_to_dicts(),
             "total_amount": self.total_amount,
             "status": self.status.value,
             "payment_id": self.payment_id,
             "created_at": self.created_at.isoformat(),
             "updated_at": self.updated_at.isoformat()
         }
+        self._dict_cache = (version, data)
+        return data
+    
+    @classmethod
+    def from_dict(cls, data: Dict,
+                  columns: Optional[OrderItemColumns] = None) -> "Order":
+        """
+        从字典恢复订单（to_dict 的逆操作）
+        
+        Args:
+            data: 订单字典
+            columns: 共享的订单项列式存储
+        
+        Returns:
+            订单对象
+        """
+        order = cls(data["order_id"], data["customer_id"], columns)
+        for item in data["items"]:
+            order.add_item(item["product_id"], item["quantity"], item["price"])
+        order.status = OrderStatus(data["status"])
+        order.payment_id = data["payment_id"]
+        order._created_us = from_datetime(datetime.fromisoformat(data["created_at"]))
+        order._updated_us = from_datetime(datetime.fromisoformat(data["updated_at"]))
+        return order
+    
+    def _items_to_dicts(self) -> List[Dict]:
+        """订单项转换为字典列表"""
+        if self._items is not None:
+            return [item.to_dict() for item in self._items]
+        return [
+            {
+                "product_id": product_id,
+                "quantity": quantity,
+                "price": price,
+                "total_price": quantity * price
+            }
+            for product_id, quantity, price in self._columns.rows(self._first_row)
+        ]
+    
+    def to_json(self) -> bytes:
+        """
+        转换为 JSON 字节串
+        
+        结果按版本号缓存，订单未修改时直接复用
+        """
+        version = self._version
+        cache = self._json_cache
+        if cache is not None and cache[0] == version:
+            return cache[1]
+        
+        data = json.dumps(
+            self.to_dict(), ensure_ascii=False, separators=(",", ":")
+        ).encode("utf-8")
+        self._json_cache = (version, data)
+        return data
 
 
 class OrderService:
     """订单服务"""
     
-    def __init__(self, inventory: Inventory, payment_processor: PaymentProcessor):
+    def __init__(self, inventory: Inventory, payment_processor: PaymentProcessor,
+                 hold_manager: Optional[StockHoldManager] = None,
+                 compact: bool = False,
+                 archive: Optional[OrderArchive] = None,
+                 id_generator: Optional[SnowflakeIdGenerator] = None):
         """
         初始化订单服务
         
         Args:
             inventory: 库存管理器
             payment_processor: 支付处理器
+            hold_manager: 库存暂扣管理器，提供时确认订单只暂扣库存，
+                超时未支付的订单自动取消并归还库存
+            compact: 紧凑模式，所有订单的订单项保存在共享的列式存储中
+                （单价按分取整）
+            archive: 订单冷存储，提供时可将已完成/已取消的订单移出内存
+            id_generator: 服务端订单ID生成器，为空时使用工作进程编号为0的生成器
         """
         self.inventory = inventory
         self.payment_processor = payment_processor
+        self.hold_manager = hold_manager
         self._orders: Dict[str, Order] = {}
+        self._columns: Optional[OrderItemColumns] = OrderItemColumns() if compact else None
+        self.archive = archive
+        self.id_generator = id_generator if id_generator is not None else SnowflakeIdGenerator()
+        
+        # 二级索引：客户 -> 订单ID，状态 -> 订单ID，按创建时间排序的 (创建纪元微秒, 订单ID)
+        self._index_lock = threading.Lock()
+        self._by_customer: Dict[str, Set[str]] = {}
+        self._by_status: Dict[OrderStatus, Set[str]] = {
+            status: set() for status in OrderStatus
+        }
+        self._by_created: List[Tuple[int, str]] = []
+        
+        # 事件接收器，参数为 (事件名, 事件数据)，由事件日志注册
+        self.event_sink: Optional[Callable[[str, Dict[str, Any]], None]] = None
+        
+        if hold_manager is not None:
+            hold_manager.on_expire = self._on_hold_expired
+    
+    def _emit(self, event: str, data: Dict[str, Any]) -> None:
+        """发布订单变化事件"""
+        if self.event_sink is not None:
+            self.event_sink(event, data)
+    
+    def next_order_id(self) -> str:
+        """
+        生成服务端订单ID
+        
+        ID由 "ORD" 和定长19位的雪花ID组成，字典序即创建顺序，
+        按创建时间的索引和分页只需在末尾追加。
+        
+        Returns:
+            订单ID
+        """
+        return f"ORD{self.id_generator.next_id():019d}"
     
     def create_order(self, order_id: str, customer_id: str) -> Order:
         """
@@ -184,11 +380,17 @@ class OrderService:
         Raises:
             ValueError: 订单ID已存在
         """
-        if order_id in self._orders:
+        if order_id in self._orders or (self.archive is not None and order_id in self.archive):
             raise ValueError(f"订单ID已存在: {order_id}")
         
-        order = Order(order_id, customer_id)
+        order = Order(order_id, customer_id, self._columns)
         self._orders[order_id] = order
+        self._index_order(order)
+        self._emit("created", {
+            "order_id": order_id,
+            "customer_id": customer_id,
+            "at": order._created_us
+        })
         return order
     
     def get_order(self, order_id: str) -> Order:
@@ -204,10 +406,17 @@ class OrderService:
         Raises:
             ValueError: 订单不存在
         """
-        if order_id not in self._orders:
-            raise ValueError(f"订单不存在: {order_id}")
+        order = self._orders.get(order_id)
+        if order is not None:
+            return order
+        
+        # 热数据中没有时查找冷存储
+        if self.archive is not None:
+            order = self.archive.get(order_id, Order.from_dict)
+            if order is not None:
+                return order
         
-        return self._orders[order_id]
+        raise ValueError(f"订单不存在: {order_id}")
     
     def add_item_to_order(self, order_id: str, product_id: str, 
                          quantity: int, price: float) -> None:
@@ -222,6 +431,13 @@ class OrderService:
         """
         order = self.get_order(order_id)
         order.add_item(product_id, quantity, price)
+        self._emit("item_added", {
+            "order_id": order_id,
+            "product_id": product_id,
+            "quantity": quantity,
+            "price": price,
+            "at": order._updated_us
+        })
     
     def confirm_order(self, order_id: str) -> bool:
         """
@@ -239,18 +455,22 @@ class OrderService:
         """
         order = self.get_order(order_id)
         
-        # 检查所有商品库存
-        for item in order.items:
-            if not self.inventory.check_availability(item.product_id, item.quantity):
-                raise InsufficientStockError(
-                    f"商品 {item.product_id} 库存不足。需要: {item.quantity}"
-                )
+        # 一次性校验并预留所有商品库存，任一商品不足则全部不预留
+        reserved = [(item.product_id, item.quantity) for item in order.items]
+        if self.hold_manager is not None:
+            self.hold_manager.place_hold(order_id, reserved)
+        else:
+            self.inventory.reserve_many(reserved)
         
-        # 预留库存
-        for item in order.items:
-            self.inventory.reserve_stock(item.product_id, item.quantity)
-        
-        order.confirm()
+        try:
+            order.confirm()
+        except ValueError:
+            # 订单状态不允许确认，归还刚预留的库存
+            if self.hold_manager is not None:
+                self.hold_manager.release_hold(order_id)
+            elif reserved:
+                self.inventory.release_many(reserved)
+            raise
         return True
     
     def process_payment(self, order_id: str, payment_method: PaymentMethod) -> str:
@@ -265,9 +485,14 @@ class OrderService:
             支付ID
         
         Raises:
-            ValueError: 订单状态错误
+            ValueError: 订单状态错误或库存暂扣已过期
         """
+        if self.hold_manager is not None:
+            self.hold_manager.expire()
+        
         order = self.get_order(order_id)
+        if order.status != OrderStatus.CONFIRMED:
+            raise ValueError(f"只能支付已确认的订单。当前状态: {order.status.value}")
         
         # 创建支付
         payment_id = f"PAY_{order_id}"
@@ -278,11 +503,115 @@ class OrderService:
         # 处理支付
         self.payment_processor.process_payment(payment_id)
         
+        # 暂扣转为正式扣减；若在支付期间过期则退款
+        if self.hold_manager is not None and not self.hold_manager.commit_hold(order_id):
+            self.payment_processor.refund_payment(payment_id)
+            raise ValueError(f"订单库存暂扣已过期: {order_id}")
+        
         # 标记订单为已支付
         order.mark_paid(payment_id)
         
         return payment_id
     
+    def settle_payments(self, payments: Iterable[Tuple[str, float, PaymentMethod]]
+                        ) -> Dict[str, Tuple[str, Optional[str]]]:
+        """
+        批量支付已确认的订单
+        
+        逐个校验订单后为其创建支付记录，由支付处理器按支付方式分组一次性扣款，
+        扣款成功的订单与逐笔支付一样转为正式扣减库存并标记为已支付。
+        
+        Args:
+            payments: 支付序列 (订单ID, 支付金额, 支付方式)，金额须与订单总金额一致
+        
+        Returns:
+            订单ID -> (结果, 支付ID)，结果为 success / not_found / invalid_state /
+            amount_mismatch / payment_exists / insufficient_funds / hold_expired
+        """
+        if self.hold_manager is not None:
+            self.hold_manager.expire()
+        
+        order_ids: List[str] = []
+        results: Dict[str, Tuple[str, Optional[str]]] = {}
+        pending: Dict[str, Order] = {}
+        for order_id, amount, payment_method in payments:
+            if order_id in order_ids:
+                continue
+            order_ids.append(order_id)
+            try:
+                order = self.get_order(order_id)
+            except ValueError:
+                results[order_id] = ("not_found", None)
+                continue
+            if order.status != OrderStatus.CONFIRMED:
+                results[order_id] = ("invalid_state", None)
+                continue
+            if round(amount * 100) != round(order.total_amount * 100):
+                results[order_id] = ("amount_mismatch", None)
+                continue
+            
+            payment_id = f"PAY_{order_id}"
+            try:
+                self.payment_processor.create_payment(
+                    payment_id, order_id, order.total_amount, payment_method
+                )
+            except ValueError:
+                results[order_id] = ("payment_exists", payment_id)
+                continue
+            pending[payment_id] = order
+        
+        for payment_id, outcome in self.payment_processor.settle_batch(pending).items():
+            order = pending[payment_id]
+            if outcome == "success":
+                # 暂扣转为正式扣减；若在支付期间过期则退款
+                if self.hold_manager is not None and not self.hold_manager.commit_hold(order.order_id):
+                    self.payment_processor.refund_payment(payment_id)
+                    outcome = "hold_expired"
+                else:
+                    order.mark_paid(payment_id)
+            results[order.order_id] = (outcome, payment_id)
+        return {order_id: results[order_id] for order_id in order_ids}
+    
+    def checkout(self, customer_id: str, items: Iterable[Tuple[str, int, float]],
+                 payment_method: PaymentMethod,
+                 order_id: Optional[str] = None) -> Order:
+        """
+        一次完成下单：创建订单、添加订单项、确认并支付
+        
+        任一步骤失败时取消已创建的订单（归还已预留的库存），然后抛出原异常。
+        
+        Args:
+            customer_id: 客户ID
+            items: 订单项序列 (商品ID, 数量, 单价)
+            payment_method: 支付方式
+            order_id: 订单ID，为空时由服务端生成
+        
+        Returns:
+            已支付的订单
+        
+        Raises:
+            ValueError: 购物车为空、订单ID已存在或订单项无效
+            InsufficientStockError: 库存不足
+            ProductNotFoundError: 商品不存在
+            InsufficientFundsError: 余额不足
+        """
+        items = list(items)
+        if not items:
+            raise ValueError("购物车为空")
+        
+        order = self.create_order(order_id or self.next_order_id(), customer_id)
+        try:
+            for product_id, quantity, price in items:
+                self.add_item_to_order(order.order_id, product_id, quantity, price)
+            self.confirm_order(order.order_id)
+            self.process_payment(order.order_id, payment_method)
+        except Exception:
+            # 补偿：取消订单，已确认的订单同时归还预留的库存
+            if order.status in (OrderStatus.CREATED, OrderStatus.CONFIRMED):
+                self.cancel_order(order.order_id)
+            raise
+        return order
+    
     def ship_order(self, order_id: str) -> bool:
         """
         发货
@@ -323,10 +652,13 @@ class OrderService:
         """
         order = self.get_order(order_id)
         
-        # 如果已确认，释放库存
-        if order.status in [OrderStatus.CONFIRMED, OrderStatus.PAID]:
-            for item in order.items:
-                self.inventory.release_stock(item.product_id, item.quantity)
+        # 如果已确认，释放库存（暂扣中的订单只归还暂扣，已过期的暂扣已自动归还）
+        if order.status == OrderStatus.CONFIRMED and self.hold_manager is not None:
+            self.hold_manager.release_hold(order_id)
+        elif order.status in [OrderStatus.CONFIRMED, OrderStatus.PAID]:
+            self.inventory.release_many(
+                (item.product_id, item.quantity) for item in order.items
+            )
         
         # 如果已支付，退款
         if order.payment_id and order.status == OrderStatus.PAID:
@@ -335,10 +667,451 @@ class OrderService:
         order.cancel()
         return True
     
+    def bulk_cancel(self, order_ids: Optional[Iterable[str]] = None,
+                    product_id: Optional[str] = None,
+                    customer_id: Optional[str] = None,
+                    since: Optional[datetime] = None,
+                    until: Optional[datetime] = None,
+                    chunk_size: int = 500) -> Iterator[Dict[str, Any]]:
+        """
+        批量取消订单并退款（用于商品召回、秒杀回滚等）
+        
+        按订单ID或筛选条件选出订单后分批处理：每批的退款按支付方式汇总入账，
+        归还的库存按商品汇总后一次归还，然后取消订单。
+        
+        Args:
+            order_ids: 订单ID列表
+            product_id: 筛选包含该商品的订单
+            customer_id: 筛选客户ID
+            since: 筛选创建时间下限（包含）
+            until: 筛选创建时间上限（不包含）
+            chunk_size: 每批处理的订单数量
+        
+        Returns:
+            进度迭代器，每处理完一批产出一次累计进度
+            {"total", "processed", "cancelled", "refunded", "refund_amount",
+            "released_units", "failed", "errors"}，errors 只包含本批失败的订单
+        
+        Raises:
+            ValueError: 未指定或同时指定订单ID和筛选条件，或批量大小无效
+        """
+        if chunk_size <= 0:
+            raise ValueError(f"批量大小必须大于0: {chunk_size}")
+        has_filter = any(value is not None for value in (product_id, customer_id, since, until))
+        if order_ids is not None and has_filter:
+            raise ValueError("订单ID和筛选条件不能同时指定")
+        
+        if order_ids is not None:
+            targets = list(dict.fromkeys(order_ids))
+        elif has_filter:
+            orders: List[Order] = []
+            for status in (OrderStatus.CREATED, OrderStatus.CONFIRMED, OrderStatus.PAID):
+                orders.extend(self.find_orders(customer_id=customer_id, status=status,
+                                               since=since, until=until))
+            if product_id is not None:
+                orders = [order for order in orders
+                          if any(item.product_id == product_id for item in order.items)]
+            orders.sort(key=attrgetter("sort_key"))
+            targets = [order.order_id for order in orders]
+        else:
+            raise ValueError("必须指定订单ID或筛选条件")
+        
+        return self._bulk_cancel_chunks(targets, chunk_size)
+    
+    def _bulk_cancel_chunks(self, order_ids: List[str],
+                            chunk_size: int) -> Iterator[Dict[str, Any]]:
+        """分批取消订单并产出累计进度"""
+        progress: Dict[str, Any] = {
+            "total": len(order_ids),
+            "processed": 0,
+            "cancelled": 0,
+            "refunded": 0,
+            "refund_amount": 0.0,
+            "released_units": 0,
+            "failed": 0,
+            "errors": []
+        }
+        refund_cents = 0
+        for start in range(0, max(len(order_ids), 1), chunk_size):
+            chunk = order_ids[start:start + chunk_size]
+            cancelled, refunded, cents, units, errors = self._cancel_chunk(chunk)
+            refund_cents += cents
+            progress["processed"] += len(chunk)
+            progress["cancelled"] += cancelled
+            progress["refunded"] += refunded
+            progress["refund_amount"] = refund_cents / 100
+            progress["released_units"] += units
+            progress["failed"] += len(errors)
+            progress["errors"] = errors
+            yield dict(progress)
+    
+    def _cancel_chunk(self, order_ids: List[str]) -> Tuple[int, int, int, int, List[Dict[str, str]]]:
+        """
+        取消一批订单
+        
+        Returns:
+            (取消数量, 退款笔数, 退款金额（分）, 归还的库存数量, 失败的订单)
+        """
+        errors: List[Dict[str, str]] = []
+        orders: List[Order] = []
+        # 本批处理依据的订单状态，并发的支付或取消可能在处理期间改变订单状态
+        statuses: Dict[str, OrderStatus] = {}
+        for order_id in order_ids:
+            order = self._orders.get(order_id)
+            status = None if order is None else order.status
+            if order is None:
+                errors.append({"order_id": order_id, "error": f"订单不存在: {order_id}"})
+            elif status not in (OrderStatus.CREATED, OrderStatus.CONFIRMED, OrderStatus.PAID):
+                errors.append({"order_id": order_id,
+                               "error": f"无法取消该状态的订单。当前状态: {status.value}"})
+            else:
+                orders.append(order)
+                statuses[order_id] = status
+        
+        # 整批库存一次归还（全部成功或全部失败），先排除包含已下架商品的订单
+        missing = {item.product_id for order in orders
+                   if statuses[order.order_id] != OrderStatus.CREATED
+                   for item in order.items if not self.inventory.has_product(item.product_id)}
+        if missing:
+            kept = []
+            for order in orders:
+                missing_ids = sorted({item.product_id for item in order.items} & missing)
+                if statuses[order.order_id] != OrderStatus.CREATED and missing_ids:
+                    errors.append({"order_id": order.order_id,
+                                   "error": f"商品不存在: {', '.join(missing_ids)}"})
+                else:
+                    kept.append(order)
+            orders = kept
+        
+        # 退款按支付方式汇总入账
+        paid = [order for order in orders
+                if statuses[order.order_id] == OrderStatus.PAID and order.payment_id]
+        results = self.payment_processor.refund_batch(order.payment_id for order in paid)
+        refund_cents = 0
+        failed_ids: Set[str] = set()
+        for order in paid:
+            if results[order.payment_id] == "refunded":
+                refund_cents += round(
+                    self.payment_processor.get_payment(order.payment_id).amount * 100
+                )
+            else:
+                failed_ids.add(order.order_id)
+                errors.append({"order_id": order.order_id,
+                               "error": f"退款失败: {results[order.payment_id]}"})
+        if failed_ids:
+            orders = [order for order in orders if order.order_id not in failed_ids]
+        
+        # 暂扣中的订单取出暂扣（已过期或已转为正式扣减的暂扣不会被取出）
+        held: Dict[str, List[Tuple[str, int]]] = {}
+        if self.hold_manager is not None:
+            held = self.hold_manager.detach_holds(
+                order.order_id for order in orders
+                if statuses[order.order_id] == OrderStatus.CONFIRMED
+            )
+        
+        # 先取消订单再归还库存；状态已被并发修改的订单单独记为失败，不影响同批其他订单
+        release: List[Tuple[str, int]] = [item for items in held.values() for item in items]
+        cancelled = 0
+        for order in orders:
+            status = statuses[order.order_id]
+            try:
+                if order.status != status:
+                    raise ValueError(f"订单状态已变化。当前状态: {order.status.value}")
+                order.cancel()
+            except ValueError as e:
+                errors.append({"order_id": order.order_id, "error": str(e)})
+                continue
+            cancelled += 1
+            if status == OrderStatus.PAID or (status == OrderStatus.CONFIRMED
+                                              and self.hold_manager is None):
+                release.extend((item.product_id, item.quantity) for item in order.items)
+        if release:
+            self.inventory.release_many(release)
+        
+        return (cancelled, len(paid) - len(failed_ids), refund_cents,
+                sum(quantity for _, quantity in release), errors)
+    
+    def expire_holds(self) -> List[str]:
+        """
+        取消所有库存暂扣已过期的订单
+        
+        Returns:
+            被取消的订单ID列表
+        """
+        if self.hold_manager is None:
+            return []
+        return self.hold_manager.expire()
+    
+    def _on_hold_expired(self, order_id: str) -> None:
+        """库存暂扣过期回调：取消仍未支付的订单"""
+        order = self._orders.get(order_id)
+        if order is not None and order.status == OrderStatus.CONFIRMED:
+            order.cancel()
+    
+    def find_orders(self, customer_id: Optional[str] = None,
+                    status: Optional[OrderStatus] = None,
+                    since: Optional[datetime] = None,
+                    until: Optional[datetime] = None,
+                    after: Optional[Tuple[int, str]] = None,
+                    limit: Optional[int] = None) -> List[Order]:
+        """
+        按条件查询订单（使用二级索引，耗时与结果规模成正比）
+        
+        Args:
+            customer_id: 客户ID
+            status: 订单状态
+            since: 创建时间下限（包含）
+            until: 创建时间上限（不包含）
+            after: 分页游标（上一页最后一个订单的 sort_key），只返回排在其后的订单
+            limit: 最多返回的订单数量
+        
+        Returns:
+            按 (创建时间, 订单ID) 排序的订单列表
+        """
+        since_us = None if since is None else from_datetime(since)
+        until_us = None if until is None else from_datetime(until)
+        after_key = after
+        
+        with self._index_lock:
+            candidates: List[Set[str]] = []
+            if customer_id is not None:
+                candidates.append(self._by_customer.get(customer_id, set()))
+            if status is not None:
+                candidates.append(self._by_status[status])
+            
+            if not candidates:
+                # 只有时间范围条件，直接在有序索引上二分
+                lo = 0 if since_us is None else bisect.bisect_left(self._by_created, (since_us, ""))
+                if after_key is not None:
+                    lo = max(lo, bisect.bisect_right(self._by_created, after_key))
+                hi = (len(self._by_created) if until_us is None
+                      else bisect.bisect_left(self._by_created, (until_us, "")))
+                if limit is not None:
+                    hi = min(hi, lo + limit)
+                return [self._orders[order_id]
+                        for _, order_id in self._by_created[lo:hi]]
+            
+            candidates.sort(key=len)
+            order_ids = candidates[0].intersection(*candidates[1:])
+            orders = [self._orders[order_id] for order_id in order_ids]
+        
+        if since_us is not None:
+            orders = [order for order in orders if order._created_us >= since_us]
+        if until_us is not None:
+            orders = [order for order in orders if order._created_us < until_us]
+        if after_key is not None:
+            orders = [order for order in orders if order.sort_key > after_key]
+        
+        sort_key = attrgetter("sort_key")
+        if limit is not None:
+            return heapq.nsmallest(limit, orders, key=sort_key)
+        orders.sort(key=sort_key)
+        return orders
+    
+    def count_orders(self, status: Optional[OrderStatus] = None) -> int:
+        """
+        统计订单数量
+        
+        Args:
+            status: 订单状态，为空时统计全部
+        
+        Returns:
+            订单数量
+        """
+        if status is None:
+            return len(self._orders)
+        return len(self._by_status[status])
+    
+    def archive_orders(self, older_than: Optional[datetime] = None) -> int:
+        """
+        将已完成和已取消的订单移入冷存储
+        
+        归档后的订单仍可通过 get_order 查询，但不再出现在 find_orders 结果中
+        
+        Args:
+            older_than: 只归档最后更新时间早于该时间的订单
+        
+        Returns:
+            归档的订单数量
+        """
+        if self.archive is None:
+            return 0
+        
+        cutoff_us = None if older_than is None else from_datetime(older_than)
+        with self._index_lock:
+            terminal_ids = (self._by_status[OrderStatus.COMPLETED]
+                            | self._by_status[OrderStatus.CANCELLED])
+            orders = [self._orders[order_id] for order_id in terminal_ids]
+        if cutoff_us is not None:
+            orders = [order for order in orders if order._updated_us < cutoff_us]
+        if not orders:
+            return 0
+        
+        # 先写入冷存储，再从热数据和索引中移除
+        self.archive.append(orders)
+        self._drop_orders(orders)
+        self._emit("archived", {"order_ids": [order.order_id for order in orders]})
+        return len(orders)
+    
+    def _drop_orders(self, orders: List[Order]) -> None:
+        """从热数据和索引中移除订单"""
+        dropped = {order.order_id for order in orders}
+        with self._index_lock:
+            for order in orders:
+                del self._orders[order.order_id]
+                order._status_listener = None
+                order._release_items()
+                self._by_status[order.status].discard(order.order_id)
+                customer_orders = self._by_customer.get(order.customer_id)
+                if customer_orders is not None:
+                    customer_orders.discard(order.order_id)
+                    if not customer_orders:
+                        del self._by_customer[order.customer_id]
+            self._by_created = [key for key in self._by_created if key[1] not in dropped]
+    
+    def _index_order(self, order: Order) -> None:
+        """将新订单加入二级索引"""
+        key = order.sort_key
+        with self._index_lock:
+            self._by_customer.setdefault(order.customer_id, set()).add(order.order_id)
+            self._by_status[order.status].add(order.order_id)
+            if not self._by_created or key >= self._by_created[-1]:
+                self._by_created.append(key)
+            else:
+                bisect.insort(self._by_created, key)
+        order._status_listener = self._on_status_change
+    
+    def _on_status_change(self, order: Order, old_status: OrderStatus) -> None:
+        """订单状态变化时更新状态索引并发布事件"""
+        if self._orders.get(order.order_id) is not order:
+            return
+        self._reindex_status(order, old_status)
+        self._emit("status", {
+            "order_id": order.order_id,
+            "status": order.status.value,
+            "payment_id": order.payment_id,
+            "at": order._updated_us
+        })
+    
+    def _reindex_status(self, order: Order, old_status: OrderStatus) -> None:
+        """更新状态索引"""
+        with self._index_lock:
+            self._by_status[old_status].discard(order.order_id)
+            self._by_status[order.status].add(order.order_id)
+    
     def get_all_orders(self) -> Dict[str, Order]:
         """获取所有订单"""
         return self._orders.copy()
     
     def clear(self) -> None:
         """清空所有订单"""
+        self._clear_live()
+        if self.archive is not None:
+            self.archive.clear()
+        if self.hold_manager is not None:
+            self.hold_manager.clear()
+        self._emit("cleared", {})
+    
+    def _clear_live(self) -> None:
+        """清空热数据和索引"""
         self._orders.clear()
+        if self._columns is not None:
+            self._columns = OrderItemColumns()
+        with self._index_lock:
+            self._by_customer.clear()
+            for order_ids in self._by_status.values():
+                order_ids.clear()
+            self._by_created.clear()
+    
+    def resume_holds(self) -> int:
+        """
+        为已确认未支付的订单重新登记库存暂扣（用于从事件日志恢复后，有效期重新计算）
+        
+        Returns:
+            登记的暂扣数量
+        """
+        if self.hold_manager is None:
+            return 0
+        
+        with self._index_lock:
+            order_ids = list(self._by_status[OrderStatus.CONFIRMED])
+        for order_id in order_ids:
+            order = self._orders[order_id]
+            self.hold_manager.adopt_hold(
+                order_id, [(item.product_id, item.quantity) for item in order.items]
+            )
+        return len(order_ids)
+    
+    def snapshot_state(self) -> Dict[str, Any]:
+        """
+        导出热数据订单快照（已归档的订单由冷存储保存）
+        
+        Returns:
+            可序列化为 JSON 的订单状态
+        """
+        with self._index_lock:
+            order_ids = [order_id for _, order_id in self._by_created]
+        orders = []
+        for order_id in order_ids:
+            order = self._orders[order_id]
+            orders.append([
+                order.order_id, order.customer_id, order.status.value, order.payment_id,
+                order._created_us, order._updated_us,
+                [[item.product_id, item.quantity, item.price] for item in order.items]
+            ])
+        return {"orders": orders}
+    
+    def restore_state(self, state: Dict[str, Any]) -> None:
+        """
+        从快照恢复订单（不发布事件）
+        
+        Args:
+            state: snapshot_state 导出的状态
+        """
+        self._clear_live()
+        for (order_id, customer_id, status, payment_id,
+             created_us, updated_us, items) in state["orders"]:
+            order = Order(order_id, customer_id, self._columns)
+            for product_id, quantity, price in items:
+                order.add_item(product_id, quantity, price)
+            order.status = OrderStatus(status)
+            order.payment_id = payment_id
+            order._created_us = created_us
+            order._updated_us = updated_us
+            self._orders[order_id] = order
+            self._index_order(order)
+    
+    def apply_event(self, event: str, data: Dict[str, Any]) -> None:
+        """
+        重放订单事件（不校验、不发布事件）
+        
+        Args:
+            event: 事件名
+            data: 事件数据
+        
+        Raises:
+            ValueError: 未知的事件
+        """
+        if event == "created":
+            order = Order(data["order_id"], data["customer_id"], self._columns)
+            order._created_us = order._updated_us = data["at"]
+            self._orders[order.order_id] = order
+            self._index_order(order)
+        elif event == "item_added":
+            order = self._orders[data["order_id"]]
+            order.add_item(data["product_id"], data["quantity"], data["price"])
+            order._updated_us = data["at"]
+        elif event == "status":
+            order = self._orders[data["order_id"]]
+            old_status = order.status
+            order.status = OrderStatus(data["status"])
+            order.payment_id = data["payment_id"]
+            order._updated_us = data["at"]
+            order._version += 1
+            self._reindex_status(order, old_status)
+        elif event == "archived":
+            self._drop_orders([self._orders[order_id] for order_id in data["order_ids"]])
+        elif event == "cleared":
+            self._clear_live()
+        else:
+            raise ValueError(f"未知的订单事件: {event}")
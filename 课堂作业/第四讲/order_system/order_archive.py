@@ -0,0 +1,132 @@
+"""
+订单归档模块
+已完成和已取消的订单压缩后追加写入本地 SQLite 冷存储，
+热数据字典中只保留进行中的订单
+"""
+
+import json
+import sqlite3
+import threading
+import zlib
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterable
+
+
+class OrderArchive:
+    """订单冷存储（只追加写入，带 LRU 读缓存）"""
+    
+    def __init__(self, path: str = ":memory:", cache_size: int = 1024):
+        """
+        初始化订单冷存储
+        
+        Args:
+            path: SQLite 数据库文件路径
+            cache_size: LRU 缓存的订单数量
+        
+        Raises:
+            ValueError: 缓存大小无效
+        """
+        if cache_size < 0:
+            raise ValueError(f"缓存大小不能为负数: {cache_size}")
+        
+        self.path = path
+        self.cache_size = cache_size
+        self._cache: "OrderedDict[str, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS archived_orders ("
+            " order_id TEXT PRIMARY KEY,"
+            " customer_id TEXT NOT NULL,"
+            " status TEXT NOT NULL,"
+            " created_us INTEGER NOT NULL,"
+            " payload BLOB NOT NULL)"
+        )
+        self._conn.commit()
+    
+    def append(self, orders: Iterable) -> int:
+        """
+        批量归档订单（一个事务内写入）
+        
+        Args:
+            orders: 订单列表
+        
+        Returns:
+            写入的订单数量
+        
+        Raises:
+            ValueError: 订单已归档
+        """
+        rows = [
+            (order.order_id, order.customer_id, order.status.value,
+             order._created_us, zlib.compress(order.to_json()))
+            for order in orders
+        ]
+        if not rows:
+            return 0
+        
+        with self._lock:
+            try:
+                with self._conn:
+                    self._conn.executemany(
+                        "INSERT INTO archived_orders VALUES (?, ?, ?, ?, ?)", rows
+                    )
+            except sqlite3.IntegrityError as e:
+                raise ValueError(f"订单已归档: {e}") from e
+        return len(rows)
+    
+    def get(self, order_id: str, decode: Callable[[Dict[str, Any]], Any]) -> Any:
+        """
+        读取归档订单
+        
+        Args:
+            order_id: 订单ID
+            decode: 将订单字典还原为订单对象的函数
+        
+        Returns:
+            订单对象，不存在时返回 None
+        """
+        with self._lock:
+            order = self._cache.get(order_id)
+            if order is not None:
+                self._cache.move_to_end(order_id)
+                return order
+            
+            row = self._conn.execute(
+                "SELECT payload FROM archived_orders WHERE order_id = ?", (order_id,)
+            ).fetchone()
+            if row is None:
+                return None
+            
+            order = decode(json.loads(zlib.decompress(row[0])))
+            if self.cache_size:
+                self._cache[order_id] = order
+                if len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+            return order
+    
+    def __contains__(self, order_id: str) -> bool:
+        """订单是否已归档"""
+        with self._lock:
+            if order_id in self._cache:
+                return True
+            return self._conn.execute(
+                "SELECT 1 FROM archived_orders WHERE order_id = ?", (order_id,)
+            ).fetchone() is not None
+    
+    def __len__(self) -> int:
+        """归档订单数量"""
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM archived_orders").fetchone()[0]
+    
+    def clear(self) -> None:
+        """清空归档"""
+        with self._lock:
+            self._cache.clear()
+            with self._conn:
+                self._conn.execute("DELETE FROM archived_orders")
+    
+    def close(self) -> None:
+        """关闭数据库连接"""
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,128 @@
+"""
+订单项列式存储模块
+多个订单共享一组数组列保存订单项，避免为每个订单项创建对象
+"""
+
+import threading
+from array import array
+from typing import Dict, Iterator, List, Tuple
+
+
+# 数量列为 32 位无符号整数
+MAX_QUANTITY = 2 ** 32 - 1
+
+
+class OrderItemColumns:
+    """
+    订单项列式存储
+    
+    每个订单项占用一行：商品序号、数量、以分为单位的单价，
+    以及指向同一订单下一行的链接（-1 表示结尾），
+    订单只需记录首行和末行即可遍历自己的订单项。
+    订单被移除后其行进入空闲链表，供之后追加的订单项复用。
+    """
+    
+    def __init__(self):
+        """初始化列式存储"""
+        self._product_ids: List[str] = []
+        self._product_index: Dict[str, int] = {}
+        self._product = array("I")
+        self._quantity = array("I")
+        self._price_cents = array("q")
+        self._next_row = array("i")
+        self._free_rows = array("i")
+        self._lock = threading.Lock()
+    
+    def append(self, last_row: int, product_id: str, quantity: int,
+               price: float) -> int:
+        """
+        追加一行订单项
+        
+        Args:
+            last_row: 所属订单当前的末行，-1 表示订单还没有订单项
+            product_id: 商品ID
+            quantity: 数量
+            price: 单价
+        
+        Returns:
+            新行的行号
+        
+        Raises:
+            ValueError: 数量超出范围
+        """
+        if not 0 <= quantity <= MAX_QUANTITY:
+            raise ValueError(f"数量超出范围: {quantity}")
+        
+        with self._lock:
+            product = self._product_index.get(product_id)
+            if product is None:
+                product = len(self._product_ids)
+                self._product_ids.append(product_id)
+                self._product_index[product_id] = product
+            
+            if self._free_rows:
+                row = self._free_rows.pop()
+                self._product[row] = product
+                self._quantity[row] = quantity
+                self._price_cents[row] = round(price * 100)
+                self._next_row[row] = -1
+            else:
+                row = len(self._product)
+                self._product.append(product)
+                self._quantity.append(quantity)
+                self._price_cents.append(round(price * 100))
+                self._next_row.append(-1)
+            if last_row >= 0:
+                self._next_row[last_row] = row
+            return row
+    
+    def release(self, first_row: int) -> int:
+        """
+        释放订单的全部行，供之后追加时复用
+        
+        Args:
+            first_row: 订单的首行，-1 表示没有订单项
+        
+        Returns:
+            释放的行数
+        """
+        released = 0
+        with self._lock:
+            row = first_row
+            while row >= 0:
+                next_row = self._next_row[row]
+                self._next_row[row] = -1
+                self._free_rows.append(row)
+                released += 1
+                row = next_row
+        return released
+    
+    def rows(self, first_row: int) -> Iterator[Tuple[str, int, float]]:
+        """
+        遍历订单的订单项
+        
+        Args:
+            first_row: 订单的首行，-1 表示没有订单项
+        
+        Yields:
+            (商品ID, 数量, 单价)
+        """
+        row = first_row
+        while row >= 0:
+            yield (self._product_ids[self._product[row]],
+                   self._quantity[row],
+                   self._price_cents[row] / 100)
+            row = self._next_row[row]
+    
+    def price_of(self, row: int) -> float:
+        """获取某行按分取整后的单价"""
+        return self._price_cents[row] / 100
+    
+    def __len__(self) -> int:
+        """使用中的行数"""
+        return len(self._product) - len(self._free_rows)
+    
+    @property
+    def capacity(self) -> int:
+        """已分配的行数（包括空闲行）"""
+        return len(self._product)
@@ -3,9 +3,15 @@
 负责处理支付请求和支付状态管理
 """
 
-from typing import Dict, Optional
+import bisect
+import heapq
+import threading
+from operator import attrgetter
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple
 from enum import Enum
 from datetime import datetime
+from ledger import BalanceLedger
+from timestamps import now_us, to_datetime
 
 
 class PaymentStatus(Enum):
@@ -44,6 +50,11 @@ class InvalidPaymentStateError(Exception):
 class Payment:
     """支付记录类"""
     
+    __slots__ = (
+        "payment_id", "order_id", "amount", "method", "status",
+        "_created_us", "_updated_us", "_status_listener",
+    )
+    
     def __init__(self, payment_id: str, order_id: str, amount: float, 
                  method: PaymentMethod):
         """
@@ -63,35 +74,79 @@ class Payment:
         self.amount = amount
         self.method = method
         self.status = PaymentStatus.PENDING
-        self.created_at = datetime.now()
-        self.updated_at = datetime.now()
+        # 时间以纪元微秒保存
+        self._created_us = now_us()
+        self._updated_us = self._created_us
+        # 状态变化监听器，由支付处理器注册以维护索引，参数为 (支付记录, 原状态)
+        self._status_listener: Optional[Callable[["Payment", PaymentStatus], None]] = None
+    
+    @property
+    def created_at(self) -> datetime:
+        """创建时间"""
+        return to_datetime(self._created_us)
+    
+    @property
+    def updated_at(self) -> datetime:
+        """更新时间"""
+        return to_datetime(self._updated_us)
+    
+    @property
+    def sort_key(self) -> Tuple[int, str]:
+        """排序键 (创建时间纪元微秒, 支付ID)，与创建时间索引一致"""
+        return (self._created_us, self.payment_id)
     
-    def process(self) -> None:
-        """将支付状态设置为处理中"""
+    def _set_status(self, status: PaymentStatus, at: Optional[int] = None) -> None:
+        """
+        更新状态并通知监听器
+        
+        Args:
+            status: 新状态
+            at: 更新时间（纪元微秒），默认为当前时间
+        """
+        old_status = self.status
+        self.status = status
+        self._updated_us = now_us() if at is None else at
+        if self._status_listener is not None:
+            self._status_listener(self, old_status)
+    
+    def process(self, at: Optional[int] = None) -> None:
+        """
+        将支付状态设置为处理中
+        
+        Args:
+            at: 更新时间（纪元微秒），默认为当前时间
+        """
         if self.status != PaymentStatus.PENDING:
             raise InvalidPaymentStateError(
                 f"只能处理待支付的订单。当前状态: {self.status.value}"
             )
-        self.status = PaymentStatus.PROCESSING
-        self.updated_at = datetime.now()
+        self._set_status(PaymentStatus.PROCESSING, at)
     
-    def complete(self) -> None:
-        """完成支付"""
+    def complete(self, at: Optional[int] = None) -> None:
+        """
+        完成支付
+        
+        Args:
+            at: 更新时间（纪元微秒），默认为当前时间
+        """
         if self.status != PaymentStatus.PROCESSING:
             raise InvalidPaymentStateError(
                 f"只能完成处理中的支付。当前状态: {self.status.value}"
             )
-        self.status = PaymentStatus.SUCCESS
-        self.updated_at = datetime.now()
+        self._set_status(PaymentStatus.SUCCESS, at)
     
-    def fail(self) -> None:
-        """支付失败"""
+    def fail(self, at: Optional[int] = None) -> None:
+        """
+        支付失败
+        
+        Args:
+            at: 更新时间（纪元微秒），默认为当前时间
+        """
         if self.status not in [PaymentStatus.PENDING, PaymentStatus.PROCESSING]:
             raise InvalidPaymentStateError(
                 f"无法将当前状态设置为失败。当前状态: {self.status.value}"
             )
-        self.status = PaymentStatus.FAILED
-        self.updated_at = datetime.now()
+        self._set_status(PaymentStatus.FAILED, at)
     
     def refund(self) -> None:
         """退款"""
@@ -99,8 +154,7 @@ class Payment:
             raise InvalidPaymentStateError(
                 f"只能退款成功的支付。当前状态: {self.status.value}"
             )
-        self.status = PaymentStatus.REFUNDED
-        self.updated_at = datetime.now()
+        self._set_status(PaymentStatus.REFUNDED)
     
     def to_dict(self) -> Dict:
         """转换为字典"""
@@ -116,19 +170,56 @@ class Payment:
 
 
 class PaymentProcessor:
-    """支付处理器"""
+    """
+    支付处理器（线程安全）
+    
+    同一支付记录的状态变化在该记录对应的分段锁内完成，
+    账户余额保存在分段余额账本中，同一支付方式的并发扣款不会透支。
+    """
     
-    def __init__(self):
-        """初始化支付处理器"""
+    def __init__(self, stripes: int = 8):
+        """
+        初始化支付处理器
+        
+        Args:
+            stripes: 每种支付方式的子余额数量
+        """
         self._payments: Dict[str, Payment] = {}
+        # 二级索引：订单ID / 状态 / 支付方式 -> 支付ID集合
+        self._index_lock = threading.Lock()
+        self._by_order: Dict[str, Set[str]] = {}
+        self._by_status: Dict[PaymentStatus, Set[str]] = {
+            status: set() for status in PaymentStatus
+        }
+        self._by_method: Dict[PaymentMethod, Set[str]] = {
+            method: set() for method in PaymentMethod
+        }
+        # 按 (创建时间, 支付ID) 排序的列表，无筛选条件时直接分页
+        self._by_created: List[Tuple[int, str]] = []
+        # 按 (状态, 支付方式) 汇总的 [笔数, 金额（分）]
+        self._totals: Dict[Tuple[PaymentStatus, PaymentMethod], List[int]] = {
+            (status, method): [0, 0] for status in PaymentStatus for method in PaymentMethod
+        }
         # 模拟账户余额
-        self._account_balances: Dict[PaymentMethod, float] = {
+        self._ledger: BalanceLedger[PaymentMethod] = BalanceLedger({
             PaymentMethod.CREDIT_CARD: 10000.0,
             PaymentMethod.DEBIT_CARD: 5000.0,
             PaymentMethod.ALIPAY: 8000.0,
             PaymentMethod.WECHAT: 6000.0,
             PaymentMethod.PAYPAL: 15000.0,
-        }
+        }, stripes=stripes)
+        self._payment_locks: List[threading.Lock] = [threading.Lock() for _ in range(16)]
+        # 事件接收器，参数为 (事件名, 事件数据)，由事件日志注册
+        self.event_sink: Optional[Callable[[str, Dict[str, Any]], None]] = None
+    
+    def _emit(self, event: str, data: Dict[str, Any]) -> None:
+        """发布支付变化事件"""
+        if self.event_sink is not None:
+            self.event_sink(event, data)
+    
+    def _lock_for(self, payment_id: str) -> threading.Lock:
+        """获取支付记录对应的分段锁"""
+        return self._payment_locks[hash(payment_id) % len(self._payment_locks)]
     
     def create_payment(self, payment_id: str, order_id: str, 
                       amount: float, method: PaymentMethod) -> Payment:
@@ -147,11 +238,20 @@ class PaymentProcessor:
         Raises:
             ValueError: 支付ID已存在或金额无效
         """
-        if payment_id in self._payments:
-            raise ValueError(f"支付ID已存在: {payment_id}")
-        
-        payment = Payment(payment_id, order_id, amount, method)
-        self._payments[payment_id] = payment
+        with self._lock_for(payment_id):
+            if payment_id in self._payments:
+                raise ValueError(f"支付ID已存在: {payment_id}")
+            
+            payment = Payment(payment_id, order_id, amount, method)
+            self._payments[payment_id] = payment
+            self._index_payment(payment)
+            self._emit("created", {
+                "payment_id": payment_id,
+                "order_id": order_id,
+                "amount": amount,
+                "method": method.value,
+                "at": payment._created_us
+            })
         return payment
     
     def get_payment(self, payment_id: str) -> Payment:
@@ -187,20 +287,21 @@ class PaymentProcessor:
             InsufficientFundsError: 余额不足
         """
         payment = self.get_payment(payment_id)
-        payment.process()
-        
-        # 检查余额
-        if self._account_balances[payment.method] < payment.amount:
-            payment.fail()
-            raise InsufficientFundsError(
-                f"余额不足。支付方式: {payment.method.value}, "
-                f"需要: {payment.amount}, "
-                f"可用: {self._account_balances[payment.method]}"
-            )
-        
-        # 扣款
-        self._account_balances[payment.method] -= payment.amount
-        payment.complete()
+        with self._lock_for(payment_id):
+            payment.process()
+            
+            # 检查余额并扣款（原子操作）
+            if not self._ledger.try_debit(payment.method, payment.amount):
+                payment.fail()
+                self._emit("failed", {"payment_id": payment_id, "at": payment._updated_us})
+                raise InsufficientFundsError(
+                    f"余额不足。支付方式: {payment.method.value}, "
+                    f"需要: {payment.amount}, "
+                    f"可用: {self.get_balance(payment.method)}"
+                )
+            
+            payment.complete()
+            self._emit("completed", {"payment_id": payment_id, "at": payment._updated_us})
         return True
     
     def refund_payment(self, payment_id: str) -> bool:
@@ -218,11 +319,120 @@ class PaymentProcessor:
         """
         payment = self.get_payment(payment_id)
         
-        # 退款
-        self._account_balances[payment.method] += payment.amount
-        payment.refund()
+        # 先校验状态再退款，避免状态错误时余额已被修改
+        with self._lock_for(payment_id):
+            payment.refund()
+            self._ledger.credit(payment.method, payment.amount)
+            self._emit("refunded", {"payment_id": payment_id, "at": payment._updated_us})
         return True
     
+    def settle_batch(self, payment_ids: Iterable[str]) -> Dict[str, str]:
+        """
+        批量结算待支付的支付记录
+        
+        按支付方式分组，每组按总额一次性扣款；总额不足时按顺序逐笔扣款，
+        余额不足的支付记为失败。支付记录与逐笔处理一样经过处理中状态，
+        所有状态变化使用同一个时间戳一次完成。
+        
+        Args:
+            payment_ids: 支付ID列表
+        
+        Returns:
+            支付ID -> 结果（success / insufficient_funds / not_found / invalid_state）
+        """
+        payment_ids = list(dict.fromkeys(payment_ids))
+        results: Dict[str, str] = {}
+        
+        # 按分段序号顺序获取全部相关的支付记录锁，避免死锁
+        locks = [self._payment_locks[index] for index in sorted(
+            {hash(payment_id) % len(self._payment_locks) for payment_id in payment_ids}
+        )]
+        for lock in locks:
+            lock.acquire()
+        try:
+            groups: Dict[PaymentMethod, List[Payment]] = {}
+            for payment_id in payment_ids:
+                payment = self._payments.get(payment_id)
+                if payment is None:
+                    results[payment_id] = "not_found"
+                elif payment.status != PaymentStatus.PENDING:
+                    results[payment_id] = "invalid_state"
+                else:
+                    groups.setdefault(payment.method, []).append(payment)
+            
+            settled_at = now_us()
+            for method, payments in groups.items():
+                for payment in payments:
+                    payment.process(settled_at)
+                total = sum(round(payment.amount * 100) for payment in payments) / 100
+                if self._ledger.try_debit(method, total):
+                    failed: Set[str] = set()
+                else:
+                    failed = {payment.payment_id for payment in payments
+                              if not self._ledger.try_debit(method, payment.amount)}
+                
+                for payment in payments:
+                    if payment.payment_id in failed:
+                        payment.fail(settled_at)
+                        results[payment.payment_id] = "insufficient_funds"
+                        event = "failed"
+                    else:
+                        payment.complete(settled_at)
+                        results[payment.payment_id] = "success"
+                        event = "completed"
+                    self._emit(event, {"payment_id": payment.payment_id, "at": settled_at})
+        finally:
+            for lock in reversed(locks):
+                lock.release()
+        
+        return {payment_id: results[payment_id] for payment_id in payment_ids}
+    
+    def refund_batch(self, payment_ids: Iterable[str]) -> Dict[str, str]:
+        """
+        批量退款
+        
+        退款金额按支付方式汇总后每种方式只入账一次，所有状态变化使用同一个时间戳。
+        
+        Args:
+            payment_ids: 支付ID列表
+        
+        Returns:
+            支付ID -> 结果（refunded / not_found / invalid_state）
+        """
+        payment_ids = list(dict.fromkeys(payment_ids))
+        results: Dict[str, str] = {}
+        
+        # 按分段序号顺序获取全部相关的支付记录锁，避免死锁
+        locks = [self._payment_locks[index] for index in sorted(
+            {hash(payment_id) % len(self._payment_locks) for payment_id in payment_ids}
+        )]
+        for lock in locks:
+            lock.acquire()
+        try:
+            credits: Dict[PaymentMethod, int] = {}
+            refunded_at = now_us()
+            for payment_id in payment_ids:
+                payment = self._payments.get(payment_id)
+                if payment is None:
+                    results[payment_id] = "not_found"
+                    continue
+                if payment.status != PaymentStatus.SUCCESS:
+                    results[payment_id] = "invalid_state"
+                    continue
+                
+                payment._set_status(PaymentStatus.REFUNDED, refunded_at)
+                credits[payment.method] = credits.get(payment.method, 0) + round(payment.amount * 100)
+                results[payment_id] = "refunded"
+                self._emit("refunded", {"payment_id": payment_id, "at": refunded_at})
+            
+            for method, cents in credits.items():
+                self._ledger.credit(method, cents / 100)
+        finally:
+            for lock in reversed(locks):
+                lock.release()
+        
+        return {payment_id: results[payment_id] for payment_id in payment_ids}
+    
     def get_balance(self, method: PaymentMethod) -> float:
         """
         获取账户余额
@@ -233,7 +443,7 @@ class PaymentProcessor:
         Returns:
             余额
         """
-        return self._account_balances[method]
+        return self._ledger.balance(method)
     
     def set_balance(self, method: PaymentMethod, balance: float) -> None:
         """
@@ -245,7 +455,8 @@ class PaymentProcessor:
         """
         if balance < 0:
             raise ValueError(f"余额不能为负数: {balance}")
-        self._account_balances[method] = balance
+        self._ledger.set_balance(method, balance)
+        self._emit("balance_set", {"method": method.value, "balance": balance})
     
     def get_all_payments(self) -> Dict[str, Payment]:
         """
@@ -256,6 +467,237 @@ class PaymentProcessor:
         """
         return self._payments.copy()
     
+    def find_payments(self, order_id: Optional[str] = None,
+                      status: Optional[PaymentStatus] = None,
+                      method: Optional[PaymentMethod] = None,
+                      limit: Optional[int] = None) -> List[Payment]:
+        """
+        按条件查询支付记录（使用二级索引，耗时与结果规模成正比）
+        
+        Args:
+            order_id: 订单ID
+            status: 支付状态
+            method: 支付方式
+            limit: 最多返回的支付记录数量
+        
+        Returns:
+            按 (创建时间, 支付ID) 排序的支付记录列表
+        """
+        with self._index_lock:
+            candidates: List[Set[str]] = []
+            if order_id is not None:
+                candidates.append(self._by_order.get(order_id, set()))
+            if status is not None:
+                candidates.append(self._by_status[status])
+            if method is not None:
+                candidates.append(self._by_method[method])
+            
+            if not candidates:
+                keys = self._by_created if limit is None else self._by_created[:limit]
+                return [self._payments[payment_id] for _, payment_id in keys]
+            
+            candidates.sort(key=len)
+            payment_ids = candidates[0].intersection(*candidates[1:])
+            payments = [self._payments[payment_id] for payment_id in payment_ids]
+        
+        sort_key = attrgetter("sort_key")
+        if limit is not None:
+            return heapq.nsmallest(limit, payments, key=sort_key)
+        payments.sort(key=sort_key)
+        return payments
+    
+    def get_payments_by_order(self, order_id: str) -> List[Payment]:
+        """
+        获取订单的所有支付记录
+        
+        Args:
+            order_id: 订单ID
+        
+        Returns:
+            按创建时间排序的支付记录列表
+        """
+        return self.find_payments(order_id=order_id)
+    
+    def count_payments(self, status: Optional[PaymentStatus] = None,
+                       method: Optional[PaymentMethod] = None) -> int:
+        """
+        统计支付笔数（读取汇总计数，不遍历支付记录）
+        
+        Args:
+            status: 支付状态，为空时统计全部
+            method: 支付方式，为空时统计全部
+        
+        Returns:
+            支付笔数
+        """
+        return self._sum_totals(status, method)[0]
+    
+    def total_amount(self, status: Optional[PaymentStatus] = None,
+                     method: Optional[PaymentMethod] = None) -> float:
+        """
+        统计支付金额（读取汇总计数，不遍历支付记录）
+        
+        Args:
+            status: 支付状态，为空时统计全部
+            method: 支付方式，为空时统计全部
+        
+        Returns:
+            支付金额合计
+        """
+        return self._sum_totals(status, method)[1] / 100
+    
+    def get_payment_stats(self) -> Dict[str, Dict[str, Dict[str, float]]]:
+        """
+        获取按状态和支付方式汇总的笔数和金额
+        
+        Returns:
+            状态 -> 支付方式 -> {"count": 笔数, "amount": 金额}
+        """
+        with self._index_lock:
+            return {
+                status.value: {
+                    method.value: {
+                        "count": self._totals[(status, method)][0],
+                        "amount": self._totals[(status, method)][1] / 100
+                    }
+                    for method in PaymentMethod
+                }
+                for status in PaymentStatus
+            }
+    
+    def _sum_totals(self, status: Optional[PaymentStatus],
+                    method: Optional[PaymentMethod]) -> Tuple[int, int]:
+        """汇总匹配的 (状态, 支付方式) 计数，返回 (笔数, 金额（分）)"""
+        statuses = list(PaymentStatus) if status is None else [status]
+        methods = list(PaymentMethod) if method is None else [method]
+        count = cents = 0
+        with self._index_lock:
+            for key_status in statuses:
+                for key_method in methods:
+                    totals = self._totals[(key_status, key_method)]
+                    count += totals[0]
+                    cents += totals[1]
+        return count, cents
+    
+    def _index_payment(self, payment: Payment) -> None:
+        """将支付记录加入索引和汇总计数，并监听其状态变化"""
+        key = payment.sort_key
+        with self._index_lock:
+            if not self._by_created or key >= self._by_created[-1]:
+                self._by_created.append(key)
+            else:
+                bisect.insort(self._by_created, key)
+            self._by_order.setdefault(payment.order_id, set()).add(payment.payment_id)
+            self._by_status[payment.status].add(payment.payment_id)
+            self._by_method[payment.method].add(payment.payment_id)
+            totals = self._totals[(payment.status, payment.method)]
+            totals[0] += 1
+            totals[1] += round(payment.amount * 100)
+        payment._status_listener = self._on_status_change
+    
+    def _on_status_change(self, payment: Payment, old_status: PaymentStatus) -> None:
+        """支付状态变化时更新状态索引和汇总计数"""
+        if self._payments.get(payment.payment_id) is not payment:
+            return
+        cents = round(payment.amount * 100)
+        with self._index_lock:
+            self._by_status[old_status].discard(payment.payment_id)
+            self._by_status[payment.status].add(payment.payment_id)
+            old_totals = self._totals[(old_status, payment.method)]
+            old_totals[0] -= 1
+            old_totals[1] -= cents
+            new_totals = self._totals[(payment.status, payment.method)]
+            new_totals[0] += 1
+            new_totals[1] += cents
+    
+    def _clear_payments(self) -> None:
+        """清空支付记录和索引（不发布事件）"""
+        with self._index_lock:
+            for payment in self._payments.values():
+                payment._status_listener = None
+            self._payments.clear()
+            self._by_order.clear()
+            self._by_created.clear()
+            for payment_ids in self._by_status.values():
+                payment_ids.clear()
+            for payment_ids in self._by_method.values():
+                payment_ids.clear()
+            for totals in self._totals.values():
+                totals[0] = totals[1] = 0
+    
     def clear(self) -> None:
         """清空所有支付记录"""
-        self._payments.clear()
+        self._clear_payments()
+        self._emit("cleared", {})
+    
+    def snapshot_state(self) -> Dict[str, Any]:
+        """
+        导出支付快照
+        
+        Returns:
+            可序列化为 JSON 的支付记录和账户余额
+        """
+        return {
+            "payments": [
+                [payment.payment_id, payment.order_id, payment.amount,
+                 payment.method.value, payment.status.value,
+                 payment._created_us, payment._updated_us]
+                for payment in self._payments.values()
+            ],
+            "balances": {
+                method.value: balance
+                for method, balance in self._ledger.balances().items()
+            }
+        }
+    
+    def restore_state(self, state: Dict[str, Any]) -> None:
+        """
+        从快照恢复支付记录和账户余额（不发布事件）
+        
+        Args:
+            state: snapshot_state 导出的状态
+        """
+        self._clear_payments()
+        for payment_id, order_id, amount, method, status, created_us, updated_us in state["payments"]:
+            payment = Payment(payment_id, order_id, amount, PaymentMethod(method))
+            payment.status = PaymentStatus(status)
+            payment._created_us = created_us
+            payment._updated_us = updated_us
+            self._payments[payment_id] = payment
+            self._index_payment(payment)
+        for method, balance in state["balances"].items():
+            self._ledger.set_balance(PaymentMethod(method), balance)
+    
+    def apply_event(self, event: str, data: Dict[str, Any]) -> None:
+        """
+        重放支付事件（不校验、不发布事件）
+        
+        Args:
+            event: 事件名
+            data: 事件数据
+        
+        Raises:
+            ValueError: 未知的事件
+        """
+        if event == "created":
+            payment = Payment(data["payment_id"], data["order_id"], data["amount"],
+                              PaymentMethod(data["method"]))
+            payment._created_us = payment._updated_us = data["at"]
+            self._payments[payment.payment_id] = payment
+            self._index_payment(payment)
+        elif event in ("completed", "failed", "refunded"):
+            payment = self._payments[data["payment_id"]]
+            if event == "completed":
+                payment._set_status(PaymentStatus.SUCCESS, data["at"])
+                self._ledger.try_debit(payment.method, payment.amount)
+            elif event == "failed":
+                payment._set_status(PaymentStatus.FAILED, data["at"])
+            else:
+                payment._set_status(PaymentStatus.REFUNDED, data["at"])
+                self._ledger.credit(payment.method, payment.amount)
+        elif event == "balance_set":
+            self._ledger.set_balance(PaymentMethod(data["method"]), data["balance"])
+        elif event == "cleared":
+            self._clear_payments()
+        else:
+            raise ValueError(f"未知的支付事件: {event}")
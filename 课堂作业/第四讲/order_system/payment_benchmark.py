@@ -0,0 +1,107 @@
+"""
+支付余额并发扣款压力测试
+比较单一余额（1 个子余额）与分段余额在不同线程数下
+同一支付方式的扣款吞吐量（次/秒）
+
+用法:
+    python payment_benchmark.py [每线程扣款次数]
+"""
+
+import sys
+import threading
+import time
+from typing import List
+
+from ledger import BalanceLedger
+from payment import PaymentMethod
+
+
+THREAD_COUNTS = [1, 2, 4, 8, 16]
+
+
+def run_debits(ledger: BalanceLedger, thread_count: int, ops_per_thread: int) -> float:
+    """
+    多线程并发扣款
+    
+    Args:
+        ledger: 余额账本
+        thread_count: 线程数
+        ops_per_thread: 每个线程的扣款次数
+    
+    Returns:
+        每秒扣款次数
+    """
+    barrier = threading.Barrier(thread_count + 1)
+    
+    def worker() -> None:
+        barrier.wait()
+        for _ in range(ops_per_thread):
+            ledger.try_debit(PaymentMethod.ALIPAY, 0.01)
+    
+    threads: List[threading.Thread] = [
+        threading.Thread(target=worker) for _ in range(thread_count)
+    ]
+    for thread in threads:
+        thread.start()
+    
+    barrier.wait()
+    start_time = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start_time
+    
+    return thread_count * ops_per_thread / elapsed
+
+
+def check_no_overdraw(stripes: int, thread_count: int = 8,
+                      ops_per_thread: int = 2000) -> bool:
+    """
+    检查余额不足时并发扣款不会透支
+    
+    Returns:
+        成功扣款次数和最终余额是否正确
+    """
+    initial = thread_count * ops_per_thread // 2
+    ledger = BalanceLedger({PaymentMethod.ALIPAY: initial / 100}, stripes=stripes)
+    succeeded = [0] * thread_count
+    
+    def worker(index: int) -> None:
+        for _ in range(ops_per_thread):
+            if ledger.try_debit(PaymentMethod.ALIPAY, 0.01):
+                succeeded[index] += 1
+    
+    threads = [threading.Thread(target=worker, args=(n,)) for n in range(thread_count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    
+    return sum(succeeded) == initial and ledger.balance(PaymentMethod.ALIPAY) == 0
+
+
+def main() -> None:
+    ops_per_thread = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    
+    print("💳 支付余额并发扣款压力测试")
+    print("=" * 60)
+    print(f"   - 支付方式: {PaymentMethod.ALIPAY.value}")
+    print(f"   - 每线程扣款次数: {ops_per_thread}")
+    print()
+    print(f"{'线程数':>6} | {'单一余额 (次/秒)':>16} | {'分段余额 (次/秒)':>16}")
+    print("-" * 60)
+    
+    for thread_count in THREAD_COUNTS:
+        results = []
+        for stripes in (1, 16):
+            balance = thread_count * ops_per_thread / 100
+            ledger = BalanceLedger({PaymentMethod.ALIPAY: balance}, stripes=stripes)
+            results.append(run_debits(ledger, thread_count, ops_per_thread))
+        print(f"{thread_count:>6} | {results[0]:>16,.0f} | {results[1]:>16,.0f}")
+    
+    print("-" * 60)
+    ok = check_no_overdraw(stripes=16)
+    print(f"{'✅' if ok else '❌'} 余额不足时并发扣款{'未' if ok else ''}出现透支")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,279 @@
+"""
+异步支付队列模块
+支付请求进入 asyncio 队列后立即返回受理凭证，由固定数量的工作协程
+在线程池中执行支付，客户端凭受理凭证查询或长轮询支付结果
+"""
+
+import asyncio
+import concurrent.futures
+import threading
+from collections import OrderedDict
+from enum import Enum
+from typing import Callable, Dict, List, Optional
+
+from payment import PaymentMethod
+from timestamps import now_us, to_datetime
+
+
+class QueueFullError(Exception):
+    """支付队列已满异常"""
+    pass
+
+
+class TicketStatus(Enum):
+    """受理凭证状态枚举"""
+    QUEUED = "queued"            # 排队中
+    PROCESSING = "processing"    # 处理中
+    SUCCEEDED = "succeeded"      # 支付成功
+    FAILED = "failed"            # 支付失败
+
+
+class PaymentTicket:
+    """支付受理凭证"""
+    
+    __slots__ = (
+        "ticket_id", "order_id", "payment_method", "status", "payment_id",
+        "error", "error_type", "_submitted_us", "_finished_us", "_future",
+    )
+    
+    def __init__(self, ticket_id: str, order_id: str, payment_method: PaymentMethod):
+        """
+        初始化受理凭证
+        
+        Args:
+            ticket_id: 凭证ID（与支付ID相同）
+            order_id: 订单ID
+            payment_method: 支付方式
+        """
+        self.ticket_id = ticket_id
+        self.order_id = order_id
+        self.payment_method = payment_method
+        self.status = TicketStatus.QUEUED
+        self.payment_id: Optional[str] = None
+        self.error: Optional[str] = None
+        self.error_type: Optional[str] = None
+        self._submitted_us = now_us()
+        self._finished_us: Optional[int] = None
+        # 处理完成时设置结果，供同步和异步等待使用
+        self._future: "concurrent.futures.Future[PaymentTicket]" = concurrent.futures.Future()
+    
+    @property
+    def done(self) -> bool:
+        """是否处理完成"""
+        return self.status in (TicketStatus.SUCCEEDED, TicketStatus.FAILED)
+    
+    def to_dict(self) -> Dict:
+        """转换为字典"""
+        return {
+            "ticket_id": self.ticket_id,
+            "order_id": self.order_id,
+            "payment_method": self.payment_method.value,
+            "status": self.status.value,
+            "payment_id": self.payment_id,
+            "error": self.error,
+            "submitted_at": to_datetime(self._submitted_us).isoformat(),
+            "finished_at": (None if self._finished_us is None
+                            else to_datetime(self._finished_us).isoformat())
+        }
+
+
+class PaymentQueue:
+    """
+    异步支付队列
+    
+    队列和工作协程运行在独立线程的事件循环中，可以从任意线程提交支付。
+    同一凭证ID在处理中或已成功时重复提交返回原凭证，失败后可重新提交。
+    """
+    
+    def __init__(self, handler: Callable[[str, PaymentMethod], str],
+                 workers: int = 4, max_pending: int = 1000,
+                 max_finished: int = 10000):
+        """
+        初始化支付队列并启动工作协程
+        
+        Args:
+            handler: 支付处理函数，参数为 (订单ID, 支付方式)，返回支付ID
+            workers: 并发处理的工作协程数量
+            max_pending: 排队和处理中的支付数量上限
+            max_finished: 保留的已完成凭证数量，超出时淘汰最早完成的凭证
+        
+        Raises:
+            ValueError: 参数无效
+        """
+        if workers <= 0:
+            raise ValueError(f"工作协程数量必须大于0: {workers}")
+        if max_pending <= 0:
+            raise ValueError(f"队列容量必须大于0: {max_pending}")
+        
+        self.handler = handler
+        self.workers = workers
+        self.max_pending = max_pending
+        self.max_finished = max_finished
+        self._lock = threading.Lock()
+        self._tickets: Dict[str, PaymentTicket] = {}
+        self._finished: "OrderedDict[str, None]" = OrderedDict()
+        self._pending = 0
+        self._closed = False
+        
+        self._executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix="payment-worker"
+        )
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, daemon=True)
+        self._thread.start()
+        self._worker_tasks: List[asyncio.Task] = []
+        asyncio.run_coroutine_threadsafe(self._start_workers(), self._loop).result()
+    
+    @property
+    def pending(self) -> int:
+        """排队和处理中的支付数量"""
+        return self._pending
+    
+    def submit(self, ticket_id: str, order_id: str,
+               payment_method: PaymentMethod) -> PaymentTicket:
+        """
+        提交支付（立即返回）
+        
+        Args:
+            ticket_id: 凭证ID
+            order_id: 订单ID
+            payment_method: 支付方式
+        
+        Returns:
+            受理凭证
+        
+        Raises:
+            QueueFullError: 队列已满
+            ValueError: 队列已关闭
+        """
+        with self._lock:
+            if self._closed:
+                raise ValueError("支付队列已关闭")
+            
+            ticket = self._tickets.get(ticket_id)
+            if ticket is not None and ticket.status != TicketStatus.FAILED:
+                return ticket
+            if self._pending >= self.max_pending:
+                raise QueueFullError(f"支付队列已满: {self.max_pending}")
+            
+            ticket = PaymentTicket(ticket_id, order_id, payment_method)
+            self._tickets[ticket_id] = ticket
+            self._finished.pop(ticket_id, None)
+            self._pending += 1
+        
+        self._loop.call_soon_threadsafe(self._queue.put_nowait, ticket)
+        return ticket
+    
+    def get(self, ticket_id: str) -> Optional[PaymentTicket]:
+        """
+        查询受理凭证
+        
+        Args:
+            ticket_id: 凭证ID
+        
+        Returns:
+            受理凭证，不存在时返回 None
+        """
+        return self._tickets.get(ticket_id)
+    
+    def wait(self, ticket_id: str, timeout: Optional[float] = None) -> Optional[PaymentTicket]:
+        """
+        等待支付处理完成（阻塞当前线程）
+        
+        Args:
+            ticket_id: 凭证ID
+            timeout: 最长等待时间（秒）
+        
+        Returns:
+            受理凭证（超时时仍未完成），不存在时返回 None
+        """
+        ticket = self._tickets.get(ticket_id)
+        if ticket is not None:
+            concurrent.futures.wait([ticket._future], timeout=timeout)
+        return ticket
+    
+    async def wait_async(self, ticket_id: str,
+                         timeout: Optional[float] = None) -> Optional[PaymentTicket]:
+        """
+        等待支付处理完成（在调用方的事件循环中等待，不占用线程）
+        
+        Args:
+            ticket_id: 凭证ID
+            timeout: 最长等待时间（秒）
+        
+        Returns:
+            受理凭证（超时时仍未完成），不存在时返回 None
+        """
+        ticket = self._tickets.get(ticket_id)
+        if ticket is not None and not ticket.done:
+            await asyncio.wait({asyncio.wrap_future(ticket._future)}, timeout=timeout)
+        return ticket
+    
+    def clear(self) -> None:
+        """丢弃所有已完成的凭证"""
+        with self._lock:
+            for ticket_id in self._finished:
+                del self._tickets[ticket_id]
+            self._finished.clear()
+    
+    def close(self) -> None:
+        """处理完已提交的支付后停止工作协程"""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+        
+        asyncio.run_coroutine_threadsafe(self._drain(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.close()
+        self._executor.shutdown(wait=True)
+    
+    async def _start_workers(self) -> None:
+        """在事件循环中创建队列和工作协程"""
+        self._queue: "asyncio.Queue[PaymentTicket]" = asyncio.Queue()
+        self._worker_tasks = [asyncio.create_task(self._work()) for _ in range(self.workers)]
+    
+    async def _drain(self) -> None:
+        """等待队列清空后取消工作协程"""
+        await self._queue.join()
+        for task in self._worker_tasks:
+            task.cancel()
+        await asyncio.gather(*self._worker_tasks, return_exceptions=True)
+    
+    async def _work(self) -> None:
+        """工作协程：从队列取出支付并在线程池中执行"""
+        loop = asyncio.get_running_loop()
+        while True:
+            ticket = await self._queue.get()
+            ticket.status = TicketStatus.PROCESSING
+            try:
+                payment_id = await loop.run_in_executor(
+                    self._executor, self.handler, ticket.order_id, ticket.payment_method
+                )
+            except Exception as e:
+                self._finish(ticket, TicketStatus.FAILED, error=e)
+            else:
+                self._finish(ticket, TicketStatus.SUCCEEDED, payment_id=payment_id)
+            finally:
+                self._queue.task_done()
+    
+    def _finish(self, ticket: PaymentTicket, status: TicketStatus,
+                payment_id: Optional[str] = None,
+                error: Optional[Exception] = None) -> None:
+        """记录处理结果并唤醒等待者"""
+        with self._lock:
+            ticket.payment_id = payment_id
+            if error is not None:
+                ticket.error = str(error)
+                ticket.error_type = type(error).__name__
+            ticket._finished_us = now_us()
+            ticket.status = status
+            self._pending -= 1
+            
+            if self._tickets.get(ticket.ticket_id) is ticket:
+                self._finished[ticket.ticket_id] = None
+                while len(self._finished) > self.max_finished:
+                    evicted, _ = self._finished.popitem(last=False)
+                    del self._tickets[evicted]
+        ticket._future.set_result(ticket)
@@ -0,0 +1,65 @@
+"""
+批量执行性能测试
+比较每笔支付的数据库语句逐条执行与在一次往返中批量执行的耗时
+
+用法:
+    python pipeline_benchmark.py [支付笔数]
+"""
+
+import sys
+import time
+from typing import Any, Dict, List, Tuple
+
+from database_simulator import PooledDatabaseSimulator
+
+
+def payment_statements(index: int) -> List[Tuple[str, Dict[str, Any]]]:
+    """一笔支付的数据库语句（记录开始、检查余额、扣款、写支付记录）"""
+    payment_id = f"PAY_{index}"
+    return [
+        ("INSERT INTO payment_logs (payment_id, status)",
+         {"id": f"log_{payment_id}_start", "payment_id": payment_id, "status": "processing"}),
+        ("SELECT balance FROM accounts WHERE payment_method = ?", {"payment_method": "alipay"}),
+        ("UPDATE accounts SET balance = balance - ? WHERE payment_method = ?",
+         {"amount": 100, "payment_method": "alipay"}),
+        ("INSERT INTO payment_records (payment_id, amount, status)",
+         {"id": payment_id, "payment_id": payment_id, "amount": 100, "status": "success"}),
+    ]
+
+
+def main() -> None:
+    payment_count = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    
+    print("📦 批量执行性能测试")
+    print("=" * 60)
+    print(f"   - 支付笔数: {payment_count:,}")
+    print(f"   - 每笔语句数: {len(payment_statements(0))}")
+    print()
+    
+    db = PooledDatabaseSimulator(pool_size=1)
+    start_time = time.perf_counter()
+    for index in range(payment_count):
+        for query, params in payment_statements(index):
+            db.execute_query(query, params)
+    sequential_elapsed = time.perf_counter() - start_time
+    sequential_records = len(db.dump_records())
+    
+    db = PooledDatabaseSimulator(pool_size=1)
+    start_time = time.perf_counter()
+    for index in range(payment_count):
+        db.execute_many(payment_statements(index))
+    batched_elapsed = time.perf_counter() - start_time
+    batched_records = len(db.dump_records())
+    
+    print(f"   逐条执行: {sequential_elapsed:.2f} 秒 "
+          f"({sequential_elapsed * 1000 / payment_count:.1f} ms/笔)")
+    print(f"   批量执行: {batched_elapsed:.2f} 秒 "
+          f"({batched_elapsed * 1000 / payment_count:.1f} ms/笔, "
+          f"{sequential_elapsed / batched_elapsed:.1f}x)")
+    print("-" * 60)
+    ok = sequential_records == batched_records
+    print(f"{'✅' if ok else '❌'} 两种方式写入的记录数{'一致' if ok else '不一致'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,264 @@
+"""
+支付对账模块
+把内存中的支付记录和数据库中的支付流水分别加载为 NumPy 列，
+按支付ID排序后用有序归并关联，找出金额不一致、状态不一致和缺失的记录
+"""
+
+from typing import Any, Dict, Iterable, List, Mapping, Tuple
+
+import numpy as np
+
+from payment import PaymentProcessor
+
+
+# 尚未完成的支付还没有写入数据库流水，不参与比对
+IN_FLIGHT_STATUSES = ("pending", "processing")
+# 这些状态的支付必须在数据库中有流水
+SETTLED_STATUSES = ("success", "refunded")
+
+
+def _to_cents(amounts: Any) -> np.ndarray:
+    """金额（元）转换为以分为单位的整数列"""
+    return np.rint(np.asarray(amounts, dtype=np.float64) * 100).astype(np.int64)
+
+
+class PaymentColumns:
+    """
+    支付记录列式快照
+    
+    三列按支付ID升序排列：支付ID、以分为单位的金额、状态。
+    """
+    
+    __slots__ = ("payment_ids", "amounts", "statuses")
+    
+    def __init__(self, payment_ids: Any, amounts: Any, statuses: Any):
+        """
+        初始化列式快照（按支付ID排序）
+        
+        Args:
+            payment_ids: 支付ID列
+            amounts: 以分为单位的金额列
+            statuses: 状态列
+        
+        Raises:
+            ValueError: 列长度不一致或支付ID重复
+        """
+        payment_ids = np.asarray(payment_ids, dtype=np.str_)
+        amounts = np.asarray(amounts, dtype=np.int64)
+        statuses = np.asarray(statuses, dtype=np.str_)
+        if not len(payment_ids) == len(amounts) == len(statuses):
+            raise ValueError(
+                f"列长度不一致: {len(payment_ids)}, {len(amounts)}, {len(statuses)}"
+            )
+        
+        order = np.argsort(payment_ids, kind="stable")
+        self.payment_ids = payment_ids[order]
+        self.amounts = amounts[order]
+        self.statuses = statuses[order]
+        
+        duplicated = self.payment_ids[1:] == self.payment_ids[:-1]
+        if duplicated.any():
+            raise ValueError(f"支付ID重复: {self.payment_ids[1:][duplicated][0]}")
+    
+    def __len__(self) -> int:
+        """记录数"""
+        return len(self.payment_ids)
+    
+    @classmethod
+    def from_records(cls, records: Iterable[Tuple[str, float, str]]) -> "PaymentColumns":
+        """
+        从 (支付ID, 金额, 状态) 序列创建
+        
+        Args:
+            records: 记录序列，金额以元为单位
+        
+        Returns:
+            列式快照
+        """
+        rows = list(records)
+        if not rows:
+            return cls([], [], [])
+        payment_ids, amounts, statuses = zip(*rows)
+        return cls(payment_ids, _to_cents(amounts), statuses)
+    
+    @classmethod
+    def from_processor(cls, processor: PaymentProcessor) -> "PaymentColumns":
+        """
+        从支付处理器的内存记录创建
+        
+        Args:
+            processor: 支付处理器
+        
+        Returns:
+            列式快照
+        """
+        return cls.from_records(
+            (payment.payment_id, payment.amount, payment.status.value)
+            for payment in processor.get_all_payments().values()
+        )
+    
+    @classmethod
+    def from_db_records(cls, records: Iterable[Mapping[str, Any]]) -> "PaymentColumns":
+        """
+        从数据库支付流水（payment_records 表的记录）创建
+        
+        Args:
+            records: 记录序列，包含 payment_id、amount 和 status 字段
+        
+        Returns:
+            列式快照
+        """
+        return cls.from_records(
+            (record["payment_id"], record["amount"], record["status"])
+            for record in records
+        )
+
+
+class ReconciliationReport:
+    """对账结果"""
+    
+    __slots__ = (
+        "memory_count", "db_count", "matched", "in_flight",
+        "missing_in_db", "missing_in_memory",
+        "amount_mismatches", "status_mismatches",
+    )
+    
+    def __init__(self, memory_count: int, db_count: int, matched: int, in_flight: int,
+                 missing_in_db: np.ndarray, missing_in_memory: np.ndarray,
+                 amount_mismatches: Tuple[np.ndarray, np.ndarray, np.ndarray],
+                 status_mismatches: Tuple[np.ndarray, np.ndarray, np.ndarray]):
+        """
+        初始化对账结果
+        
+        Args:
+            memory_count: 内存记录数
+            db_count: 数据库记录数
+            matched: 两侧都存在的记录数
+            in_flight: 处理中（不参与比对）的内存记录数
+            missing_in_db: 已结算但数据库中没有流水的支付ID
+            missing_in_memory: 数据库中有流水但内存中没有的支付ID
+            amount_mismatches: (支付ID, 内存金额（分）, 数据库金额（分）)
+            status_mismatches: (支付ID, 内存状态, 数据库状态)
+        """
+        self.memory_count = memory_count
+        self.db_count = db_count
+        self.matched = matched
+        self.in_flight = in_flight
+        self.missing_in_db = missing_in_db
+        self.missing_in_memory = missing_in_memory
+        self.amount_mismatches = amount_mismatches
+        self.status_mismatches = status_mismatches
+    
+    @property
+    def consistent(self) -> bool:
+        """两侧是否完全一致"""
+        return not (len(self.missing_in_db) or len(self.missing_in_memory)
+                    or len(self.amount_mismatches[0]) or len(self.status_mismatches[0]))
+    
+    def to_dict(self, limit: int = 100) -> Dict[str, Any]:
+        """
+        转换为字典，每类差异最多列出 limit 条
+        
+        Args:
+            limit: 每类差异列出的最大条数
+        
+        Returns:
+            对账结果字典
+        """
+        amount_ids, memory_cents, db_cents = (column[:limit] for column in self.amount_mismatches)
+        status_ids, memory_statuses, db_statuses = (column[:limit] for column in self.status_mismatches)
+        amount_rows: List[Dict[str, Any]] = [
+            {"payment_id": payment_id, "memory_amount": memory / 100, "db_amount": db / 100}
+            for payment_id, memory, db in zip(amount_ids.tolist(), memory_cents.tolist(),
+                                              db_cents.tolist())
+        ]
+        status_rows: List[Dict[str, Any]] = [
+            {"payment_id": payment_id, "memory_status": memory, "db_status": db}
+            for payment_id, memory, db in zip(status_ids.tolist(), memory_statuses.tolist(),
+                                              db_statuses.tolist())
+        ]
+        return {
+            "consistent": self.consistent,
+            "memory_count": self.memory_count,
+            "db_count": self.db_count,
+            "matched": self.matched,
+            "in_flight": self.in_flight,
+            "counts": {
+                "missing_in_db": len(self.missing_in_db),
+                "missing_in_memory": len(self.missing_in_memory),
+                "amount_mismatches": len(self.amount_mismatches[0]),
+                "status_mismatches": len(self.status_mismatches[0]),
+            },
+            "missing_in_db": self.missing_in_db[:limit].tolist(),
+            "missing_in_memory": self.missing_in_memory[:limit].tolist(),
+            "amount_mismatches": amount_rows,
+            "status_mismatches": status_rows,
+        }
+
+
+def _merge_join(left: np.ndarray, right: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    有序归并关联两个各自有序且无重复的键列
+    
+    两列拼接后做稳定排序，归并排序识别出两段有序序列后只需线性归并；
+    相等的相邻键即为关联上的一对，且左列的行总在前面。
+    
+    Returns:
+        (左列行号, 右列行号)，按键升序
+    """
+    keys = np.concatenate([left, right])
+    order = np.argsort(keys, kind="stable")
+    pairs = np.flatnonzero(keys[order[1:]] == keys[order[:-1]])
+    return order[pairs], order[pairs + 1] - len(left)
+
+
+def reconcile(memory: PaymentColumns, db: PaymentColumns) -> ReconciliationReport:
+    """
+    对账内存支付记录和数据库支付流水
+    
+    处理中的支付跳过比对；已退款的支付在数据库中仍是成功流水，视为一致；
+    失败的支付在数据库中存在流水视为状态不一致。
+    
+    Args:
+        memory: 内存支付记录
+        db: 数据库支付流水
+    
+    Returns:
+        对账结果
+    """
+    memory_rows, db_rows = _merge_join(memory.payment_ids, db.payment_ids)
+    in_flight = np.isin(memory.statuses, IN_FLIGHT_STATUSES)
+    
+    in_db = np.zeros(len(memory), dtype=bool)
+    in_db[memory_rows] = True
+    missing_in_db = memory.payment_ids[~in_db & np.isin(memory.statuses, SETTLED_STATUSES)]
+    in_memory = np.zeros(len(db), dtype=bool)
+    in_memory[db_rows] = True
+    missing_in_memory = db.payment_ids[~in_memory]
+    
+    matched = len(memory_rows)
+    compared = ~in_flight[memory_rows]
+    memory_rows = memory_rows[compared]
+    db_rows = db_rows[compared]
+    
+    ids = memory.payment_ids[memory_rows]
+    memory_cents = memory.amounts[memory_rows]
+    db_cents = db.amounts[db_rows]
+    amount_diff = memory_cents != db_cents
+    
+    memory_statuses = memory.statuses[memory_rows]
+    db_statuses = db.statuses[db_rows]
+    status_ok = (memory_statuses == db_statuses) | (
+        (memory_statuses == "refunded") & (db_statuses == "success")
+    )
+    
+    return ReconciliationReport(
+        memory_count=len(memory),
+        db_count=len(db),
+        matched=matched,
+        in_flight=int(in_flight.sum()),
+        missing_in_db=missing_in_db,
+        missing_in_memory=missing_in_memory,
+        amount_mismatches=(ids[amount_diff], memory_cents[amount_diff], db_cents[amount_diff]),
+        status_mismatches=(ids[~status_ok], memory_statuses[~status_ok], db_statuses[~status_ok]),
+    )
@@ -0,0 +1,102 @@
+"""
+支付对账性能测试
+生成内存和数据库两侧的支付记录并注入差异，比较逐条查字典与列式有序归并的对账耗时
+
+用法:
+    python reconciliation_benchmark.py [记录数]
+"""
+
+import sys
+import time
+from typing import Dict, Tuple
+
+import numpy as np
+
+from reconciliation import PaymentColumns, reconcile
+
+
+MISMATCH_RATE = 0.001
+
+
+def build_sides(count: int, seed: int = 7) -> Tuple[PaymentColumns, PaymentColumns]:
+    """
+    生成两侧的支付记录（乱序），按 MISMATCH_RATE 注入各类差异
+    
+    Returns:
+        (内存记录, 数据库记录)
+    """
+    rng = np.random.default_rng(seed)
+    payment_ids = np.char.add("PAY_", np.arange(count).astype(np.str_))
+    amounts = rng.integers(100, 1_000_000, size=count, dtype=np.int64)
+    statuses = np.full(count, "success")
+    
+    db_amounts = amounts.copy()
+    db_amounts[rng.random(count) < MISMATCH_RATE] += 1
+    failed = rng.random(count) < MISMATCH_RATE
+    memory_statuses = statuses.copy()
+    memory_statuses[failed] = "failed"
+    in_db = rng.random(count) >= MISMATCH_RATE
+    
+    memory_order = rng.permutation(count)
+    db_order = rng.permutation(np.flatnonzero(in_db))
+    memory = PaymentColumns(payment_ids[memory_order], amounts[memory_order],
+                            memory_statuses[memory_order])
+    db = PaymentColumns(payment_ids[db_order], db_amounts[db_order], statuses[db_order])
+    return memory, db
+
+
+def reconcile_with_dicts(memory: PaymentColumns, db: PaymentColumns) -> Dict[str, int]:
+    """逐条查字典的对账（对照组）"""
+    db_rows = {
+        payment_id: (amount, status)
+        for payment_id, amount, status in zip(db.payment_ids.tolist(), db.amounts.tolist(),
+                                              db.statuses.tolist())
+    }
+    counts = {"missing_in_db": 0, "amount_mismatches": 0, "status_mismatches": 0}
+    for payment_id, amount, status in zip(memory.payment_ids.tolist(), memory.amounts.tolist(),
+                                          memory.statuses.tolist()):
+        row = db_rows.get(payment_id)
+        if row is None:
+            if status in ("success", "refunded"):
+                counts["missing_in_db"] += 1
+            continue
+        if row[0] != amount:
+            counts["amount_mismatches"] += 1
+        if row[1] != status:
+            counts["status_mismatches"] += 1
+    return counts
+
+
+def main() -> None:
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    
+    print("🧾 支付对账性能测试")
+    print("=" * 60)
+    print(f"   - 记录数: {count:,}")
+    print(f"   - 差异注入比例: {MISMATCH_RATE:.2%}")
+    print()
+    
+    start_time = time.perf_counter()
+    memory, db = build_sides(count)
+    print(f"   构建并排序列: {time.perf_counter() - start_time:.2f} 秒")
+    
+    start_time = time.perf_counter()
+    expected = reconcile_with_dicts(memory, db)
+    dict_elapsed = time.perf_counter() - start_time
+    
+    start_time = time.perf_counter()
+    report = reconcile(memory, db)
+    columnar_elapsed = time.perf_counter() - start_time
+    
+    counts = report.to_dict(limit=0)["counts"]
+    print(f"   逐条查字典: {dict_elapsed:.3f} 秒")
+    print(f"   列式有序归并: {columnar_elapsed:.3f} 秒 ({dict_elapsed / columnar_elapsed:.1f}x)")
+    print("-" * 60)
+    for name, value in counts.items():
+        print(f"   {name}: {value:,}")
+    ok = all(counts[name] == value for name, value in expected.items())
+    print(f"{'✅' if ok else '❌'} 两种对账结果{'一致' if ok else '不一致'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,355 @@
+"""
+容错策略模块
+提供带完全抖动的指数退避重试策略、重试预算和熔断器，
+避免下游故障时所有请求同步重试、长时间占用请求线程
+"""
+
+import random
+import threading
+import time
+from enum import Enum
+from typing import Any, Callable, Dict, Optional
+
+
+class RetryBudget:
+    """
+    重试预算
+    
+    每个请求存入 ratio 个令牌，每次重试取出一个令牌，令牌不足时不再重试，
+    使重试量不超过请求量的 ratio 倍（外加 min_retries 个保底令牌）。
+    """
+    
+    def __init__(self, ratio: float = 0.2, min_retries: int = 10):
+        """
+        初始化重试预算
+        
+        Args:
+            ratio: 每个请求存入的令牌数
+            min_retries: 保底令牌数，同时也是令牌数的起始值
+        
+        Raises:
+            ValueError: 参数无效
+        """
+        if ratio < 0:
+            raise ValueError(f"重试比例不能为负数: {ratio}")
+        if min_retries < 0:
+            raise ValueError(f"保底重试次数不能为负数: {min_retries}")
+        
+        self.ratio = ratio
+        self.min_retries = min_retries
+        # 令牌上限：保底令牌加上约 100 个请求存入的令牌
+        self._capacity = min_retries + ratio * 100
+        self._tokens = float(min_retries)
+        self._lock = threading.Lock()
+    
+    @property
+    def tokens(self) -> float:
+        """当前令牌数"""
+        return self._tokens
+    
+    def deposit(self) -> None:
+        """记录一个请求，存入令牌"""
+        with self._lock:
+            self._tokens = min(self._capacity, self._tokens + self.ratio)
+    
+    def withdraw(self) -> bool:
+        """
+        为一次重试取出令牌
+        
+        Returns:
+            是否允许重试
+        """
+        with self._lock:
+            if self._tokens < 1:
+                return False
+            self._tokens -= 1
+            return True
+
+
+class RetryPolicy:
+    """
+    重试策略：指数退避加完全抖动
+    
+    第 n 次重试前等待 [0, min(max_delay, base_delay * 2^n)) 内的随机时长，
+    避免客户端同步重试；提供重试预算时，预算耗尽后不再重试。
+    """
+    
+    def __init__(self, max_attempts: int = 3, base_delay: float = 0.05,
+                 max_delay: float = 1.0, budget: Optional[RetryBudget] = None,
+                 rng: Callable[[], float] = random.random):
+        """
+        初始化重试策略
+        
+        Args:
+            max_attempts: 最多尝试次数（含首次）
+            base_delay: 退避基准时长（秒）
+            max_delay: 单次退避的上限（秒）
+            budget: 重试预算，为空时不限制
+            rng: 返回 [0, 1) 随机数的函数（测试时可替换）
+        
+        Raises:
+            ValueError: 参数无效
+        """
+        if max_attempts <= 0:
+            raise ValueError(f"尝试次数必须大于0: {max_attempts}")
+        if base_delay < 0 or max_delay < 0:
+            raise ValueError(f"退避时长不能为负数: {base_delay}, {max_delay}")
+        
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.budget = budget
+        self._rng = rng
+    
+    def backoff(self, retry: int) -> float:
+        """
+        计算退避时长
+        
+        Args:
+            retry: 第几次重试（从0开始）
+        
+        Returns:
+            等待时长（秒）
+        """
+        ceiling = min(self.max_delay, self.base_delay * (2 ** retry))
+        return ceiling * self._rng()
+    
+    def on_request(self) -> None:
+        """记录一个新请求（向重试预算存入令牌）"""
+        if self.budget is not None:
+            self.budget.deposit()
+    
+    def allow_retry(self, attempt: int) -> bool:
+        """
+        判断失败后是否重试
+        
+        Args:
+            attempt: 已尝试的次数
+        
+        Returns:
+            是否重试
+        """
+        if attempt >= self.max_attempts:
+            return False
+        return self.budget is None or self.budget.withdraw()
+
+
+class CircuitState(Enum):
+    """熔断器状态枚举"""
+    CLOSED = "closed"        # 正常放行
+    OPEN = "open"            # 快速失败
+    HALF_OPEN = "half_open"  # 放行少量探测请求
+
+
+class CircuitBreaker:
+    """
+    熔断器
+    
+    连续失败达到 failure_threshold 次后打开，打开期间的请求直接拒绝；
+    recovery_timeout 秒后进入半开状态，最多放行 half_open_max_calls 个探测请求，
+    探测成功则关闭，失败则重新打开。探测请求超过 recovery_timeout 秒仍未报告结果
+    （例如调用方被取消）时视为丢失，重新放行探测请求。
+    """
+    
+    def __init__(self, failure_threshold: int = 5, recovery_timeout: float = 5.0,
+                 half_open_max_calls: int = 1,
+                 clock: Callable[[], float] = time.monotonic):
+        """
+        初始化熔断器
+        
+        Args:
+            failure_threshold: 打开熔断器的连续失败次数
+            recovery_timeout: 打开后进入半开状态前的等待时间（秒）
+            half_open_max_calls: 半开状态同时放行的探测请求数
+            clock: 时钟函数（测试时可替换）
+        
+        Raises:
+            ValueError: 参数无效
+        """
+        if failure_threshold <= 0:
+            raise ValueError(f"失败阈值必须大于0: {failure_threshold}")
+        if half_open_max_calls <= 0:
+            raise ValueError(f"探测请求数必须大于0: {half_open_max_calls}")
+        
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.half_open_max_calls = half_open_max_calls
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._state = CircuitState.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probes = 0
+        self._probe_started = 0.0
+        self._rejected = 0
+        self._times_opened = 0
+    
+    @property
+    def state(self) -> CircuitState:
+        """当前状态（打开状态超时后视为半开）"""
+        with self._lock:
+            self._refresh()
+            return self._state
+    
+    def _refresh(self) -> None:
+        """打开状态超过恢复时间后转为半开，半开状态的探测超时后释放名额（调用方持有 _lock）"""
+        if (self._state == CircuitState.OPEN
+                and self._clock() - self._opened_at >= self.recovery_timeout):
+            self._state = CircuitState.HALF_OPEN
+            self._probes = 0
+        elif (self._state == CircuitState.HALF_OPEN and self._probes
+                and self._clock() - self._probe_started >= self.recovery_timeout):
+            self._probes = 0
+    
+    def _open(self) -> None:
+        """打开熔断器（调用方持有 _lock）"""
+        self._state = CircuitState.OPEN
+        self._opened_at = self._clock()
+        self._times_opened += 1
+    
+    def allow_request(self) -> bool:
+        """
+        判断是否放行请求，放行后调用方必须调用 record_success 或 record_failure
+        
+        Returns:
+            是否放行
+        """
+        with self._lock:
+            self._refresh()
+            if self._state == CircuitState.CLOSED:
+                return True
+            if self._state == CircuitState.HALF_OPEN and self._probes < self.half_open_max_calls:
+                self._probes += 1
+                self._probe_started = self._clock()
+                return True
+            self._rejected += 1
+            return False
+    
+    def record_success(self) -> None:
+        """记录请求成功"""
+        with self._lock:
+            self._failures = 0
+            if self._state == CircuitState.HALF_OPEN:
+                self._state = CircuitState.CLOSED
+    
+    def release(self) -> None:
+        """放弃已放行的请求（调用方被取消等，没有得到结果），不计入成功或失败"""
+        with self._lock:
+            if self._state == CircuitState.HALF_OPEN and self._probes:
+                self._probes -= 1
+    
+    def record_failure(self) -> None:
+        """记录请求失败"""
+        with self._lock:
+            if self._state == CircuitState.HALF_OPEN:
+                self._open()
+                return
+            self._failures += 1
+            if self._state == CircuitState.CLOSED and self._failures >= self.failure_threshold:
+                self._open()
+    
+    def retry_after(self) -> float:
+        """
+        距离放行下一个请求的剩余时间
+        
+        Returns:
+            剩余秒数：打开时为距离半开的时间，半开且探测名额用完时为距离探测超时的时间，
+            其他情况为0
+        """
+        with self._lock:
+            self._refresh()
+            if self._state == CircuitState.OPEN:
+                return max(0.0, self._opened_at + self.recovery_timeout - self._clock())
+            if self._state == CircuitState.HALF_OPEN and self._probes >= self.half_open_max_calls:
+                return max(0.0, self._probe_started + self.recovery_timeout - self._clock())
+            return 0.0
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        获取熔断器统计
+        
+        Returns:
+            状态、连续失败次数、拒绝的请求数和打开次数
+        """
+        with self._lock:
+            self._refresh()
+            return {
+                "state": self._state.value,
+                "consecutive_failures": self._failures,
+                "rejected": self._rejected,
+                "times_opened": self._times_opened,
+            }
+    
+    def reset(self) -> None:
+        """重置为关闭状态"""
+        with self._lock:
+            self._state = CircuitState.CLOSED
+            self._failures = 0
+            self._probes = 0
+
+
+class RetryAttempts:
+    """
+    一次调用的重试和熔断状态
+    
+    同步和异步的重试循环共用：每次尝试前调用 start，之后按结果调用
+    succeeded（成功）、failed（可重试的下游故障）或 abandoned（没有得到下游的结果，
+    如应用错误或调用方被取消，不计入成功或失败）。
+    """
+    
+    def __init__(self, policy: RetryPolicy, breaker: Optional[CircuitBreaker] = None):
+        """
+        初始化调用状态（记录一个新请求）
+        
+        Args:
+            policy: 重试策略
+            breaker: 熔断器，为空时不熔断
+        """
+        self.policy = policy
+        self.breaker = breaker
+        self.attempt = 0
+        self.last_error: Optional[BaseException] = None
+        policy.on_request()
+    
+    def start(self) -> bool:
+        """
+        开始一次尝试
+        
+        Returns:
+            熔断器是否放行（不放行时不计入尝试次数）
+        """
+        if self.breaker is not None and not self.breaker.allow_request():
+            return False
+        self.attempt += 1
+        return True
+    
+    def succeeded(self) -> None:
+        """本次尝试成功"""
+        if self.breaker is not None:
+            self.breaker.record_success()
+    
+    def failed(self, error: BaseException) -> Optional[float]:
+        """
+        本次尝试遇到可重试的下游故障
+        
+        Args:
+            error: 故障异常
+        
+        Returns:
+            重试前的等待时长（秒），不再重试时返回 None
+        """
+        if self.breaker is not None:
+            self.breaker.record_failure()
+        self.last_error = error
+        if not self.policy.allow_retry(self.attempt):
+            return None
+        return self.policy.backoff(self.attempt - 1)
+    
+    def abandoned(self) -> None:
+        """本次尝试没有得到下游的结果：释放熔断器的探测名额"""
+        if self.breaker is not None:
+            self.breaker.release()
+    
+    def retry_after(self) -> float:
+        """熔断器距离放行下一个请求的剩余时间（秒）"""
+        return 0.0 if self.breaker is None else self.breaker.retry_after()
@@ -0,0 +1,357 @@
+"""
+持久化存储模块
+订单、库存和支付服务的状态变化通过事件接收器写入存储后端，
+服务内存中的数据即读缓存（所有写入先经过服务，缓存与存储始终一致）
+"""
+
+import abc
+import functools
+import itertools
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+
+# 一条待执行的 SQL: (语句, 参数)
+Statement = Tuple[str, Tuple]
+
+
+class StorageBackend(abc.ABC):
+    """
+    存储后端基类
+    
+    服务以名称注册（"stock"、"payment"、"order"），
+    需要提供 event_sink 属性和 restore_state(state) 方法。
+    """
+    
+    def attach(self, services: Dict[str, Any]) -> None:
+        """
+        开始记录服务的状态变化
+        
+        Args:
+            services: 服务名 -> 服务对象
+        """
+        for name, service in services.items():
+            service.event_sink = functools.partial(self.record, name)
+    
+    def load(self, services: Dict[str, Any]) -> bool:
+        """
+        从存储恢复服务状态
+        
+        Args:
+            services: 服务名 -> 服务对象
+        
+        Returns:
+            存储中是否有数据
+        """
+        return False
+    
+    @abc.abstractmethod
+    def record(self, service: str, event: str, data: Dict[str, Any]) -> None:
+        """
+        记录一个状态变化事件
+        
+        Args:
+            service: 服务名
+            event: 事件名
+            data: 事件数据
+        """
+    
+    def flush(self) -> None:
+        """等待已记录的变化全部写入存储"""
+    
+    def close(self) -> None:
+        """写入剩余变化并关闭存储"""
+
+
+class MemoryStorage(StorageBackend):
+    """纯内存存储（不持久化）"""
+    
+    def record(self, service: str, event: str, data: Dict[str, Any]) -> None:
+        """丢弃事件"""
+
+
+class SQLiteStorage(StorageBackend):
+    """
+    SQLite 存储后端（WAL 模式）
+    
+    write_behind 为 True 时事件进入队列，由后台线程合并为批量事务写入，
+    请求线程不等待提交；为 False 时每个事件单独提交。
+    """
+    
+    SCHEMA = (
+        "CREATE TABLE IF NOT EXISTS products ("
+        " product_id TEXT PRIMARY KEY, quantity INTEGER NOT NULL)",
+        "CREATE TABLE IF NOT EXISTS payments ("
+        " payment_id TEXT PRIMARY KEY, order_id TEXT NOT NULL, amount REAL NOT NULL,"
+        " method TEXT NOT NULL, status TEXT NOT NULL,"
+        " created_us INTEGER NOT NULL, updated_us INTEGER NOT NULL)",
+        "CREATE TABLE IF NOT EXISTS balances ("
+        " method TEXT PRIMARY KEY, balance REAL NOT NULL)",
+        "CREATE TABLE IF NOT EXISTS orders ("
+        " order_id TEXT PRIMARY KEY, customer_id TEXT NOT NULL, status TEXT NOT NULL,"
+        " payment_id TEXT, created_us INTEGER NOT NULL, updated_us INTEGER NOT NULL)",
+        "CREATE TABLE IF NOT EXISTS order_items ("
+        " order_id TEXT NOT NULL, product_id TEXT NOT NULL,"
+        " quantity INTEGER NOT NULL, price REAL NOT NULL)",
+        "CREATE INDEX IF NOT EXISTS idx_order_items_order ON order_items (order_id)",
+    )
+    
+    def __init__(self, path: str, write_behind: bool = True,
+                 batch_size: int = 1000, flush_interval: float = 0.05):
+        """
+        初始化 SQLite 存储
+        
+        Args:
+            path: 数据库文件路径
+            write_behind: 是否后台批量写入
+            batch_size: 每个事务最多写入的事件数
+            flush_interval: 后台线程凑批的最长等待时间（秒）
+        
+        Raises:
+            ValueError: 批量大小无效
+        """
+        if batch_size <= 0:
+            raise ValueError(f"批量大小必须大于0: {batch_size}")
+        
+        self.path = path
+        self.write_behind = write_behind
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        for statement in self.SCHEMA:
+            self._conn.execute(statement)
+        
+        self._lock = threading.Lock()
+        self._has_pending = threading.Condition(self._lock)
+        self._written = threading.Condition(self._lock)
+        # 保护数据库连接
+        self._db_lock = threading.Lock()
+        self._pending: List[Statement] = []
+        self._queued = 0
+        self._committed = 0
+        # 正在等待 flush 的线程数，大于0时后台线程不再凑批
+        self._flushing = 0
+        self._closed = False
+        self._error: Optional[sqlite3.Error] = None
+        self._writer: Optional[threading.Thread] = None
+        if write_behind:
+            self._writer = threading.Thread(target=self._write_loop, daemon=True)
+            self._writer.start()
+    
+    def attach(self, services: Dict[str, Any]) -> None:
+        """开始记录服务的状态变化（首次使用时写入当前账户余额）"""
+        payment_processor = services.get("payment")
+        if payment_processor is not None:
+            balances = payment_processor.snapshot_state()["balances"]
+            with self._db_lock:
+                self._conn.executemany(
+                    "INSERT OR IGNORE INTO balances VALUES (?, ?)", balances.items()
+                )
+        super().attach(services)
+    
+    def load(self, services: Dict[str, Any]) -> bool:
+        """从数据库恢复服务状态"""
+        with self._db_lock:
+            conn = self._conn
+            stock = dict(conn.execute("SELECT product_id, quantity FROM products"))
+            payments = [list(row) for row in conn.execute(
+                "SELECT payment_id, order_id, amount, method, status, created_us, updated_us"
+                " FROM payments ORDER BY created_us, payment_id"
+            )]
+            balances = dict(conn.execute("SELECT method, balance FROM balances"))
+            items: Dict[str, List[List]] = {}
+            for order_id, product_id, quantity, price in conn.execute(
+                "SELECT order_id, product_id, quantity, price FROM order_items ORDER BY rowid"
+            ):
+                items.setdefault(order_id, []).append([product_id, quantity, price])
+            orders = [
+                list(row) + [items.get(row[0], [])]
+                for row in conn.execute(
+                    "SELECT order_id, customer_id, status, payment_id, created_us, updated_us"
+                    " FROM orders ORDER BY created_us, order_id"
+                )
+            ]
+        
+        if "stock" in services:
+            services["stock"].restore_state({"stock": stock})
+        if "payment" in services:
+            current = services["payment"].snapshot_state()["balances"]
+            current.update(balances)
+            services["payment"].restore_state({"payments": payments, "balances": current})
+        if "order" in services:
+            services["order"].restore_state({"orders": orders})
+        return bool(stock or payments or orders)
+    
+    def record(self, service: str, event: str, data: Dict[str, Any]) -> None:
+        """
+        将事件转换为 SQL 语句，后台写入或立即提交
+        
+        Raises:
+            ValueError: 存储已关闭
+            sqlite3.Error: 后台写入已失败，之后的事件不再排队
+        """
+        statements = self._statements(service, event, data)
+        if not self.write_behind:
+            with self._db_lock:
+                self._execute(statements)
+            return
+        
+        with self._lock:
+            if self._closed:
+                raise ValueError("存储已关闭")
+            if self._error is not None:
+                raise self._error
+            self._pending.extend(statements)
+            self._queued += len(statements)
+            self._has_pending.notify()
+    
+    def flush(self) -> None:
+        """
+        等待已记录的变化全部提交
+        
+        Raises:
+            sqlite3.Error: 后台写入失败
+        """
+        with self._lock:
+            target = self._queued
+            self._flushing += 1
+            self._has_pending.notify()
+            try:
+                while self._committed < target and self._error is None:
+                    self._written.wait()
+            finally:
+                self._flushing -= 1
+            if self._error is not None:
+                raise self._error
+    
+    def close(self) -> None:
+        """写入剩余变化并关闭数据库连接"""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._has_pending.notify()
+        if self._writer is not None:
+            self._writer.join()
+        with self._db_lock:
+            self._conn.close()
+    
+    def _execute(self, statements: List[Statement]) -> None:
+        """在一个事务中执行语句，连续相同的语句合并为 executemany（调用方持有 _db_lock）"""
+        conn = self._conn
+        conn.execute("BEGIN")
+        try:
+            for sql, group in itertools.groupby(statements, key=lambda statement: statement[0]):
+                conn.executemany(sql, [params for _, params in group])
+        except sqlite3.Error:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+    
+    def _write_loop(self) -> None:
+        """后台写入线程：凑够一批或等待超时后在一个事务中提交"""
+        while True:
+            with self._lock:
+                while not self._pending and not self._closed:
+                    self._has_pending.wait()
+                if not self._pending and self._closed:
+                    return
+                deadline = time.monotonic() + self.flush_interval
+                while (len(self._pending) < self.batch_size
+                       and not self._closed and not self._flushing):
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._has_pending.wait(remaining)
+                batch = self._pending[:self.batch_size]
+                del self._pending[:self.batch_size]
+            
+            try:
+                with self._db_lock:
+                    self._execute(batch)
+            except sqlite3.Error as e:
+                with self._lock:
+                    self._error = e
+                    self._written.notify_all()
+                return
+            
+            with self._lock:
+                self._committed += len(batch)
+                self._written.notify_all()
+    
+    @staticmethod
+    def _statements(service: str, event: str, data: Dict[str, Any]) -> List[Statement]:
+        """
+        将事件转换为 SQL 语句
+        
+        Raises:
+            ValueError: 未知的事件
+        """
+        if service == "stock":
+            if event == "added":
+                return [("INSERT INTO products VALUES (?, ?) ON CONFLICT (product_id)"
+                         " DO UPDATE SET quantity = quantity + excluded.quantity",
+                         (data["product_id"], data["quantity"]))]
+            if event == "removed":
+                return [("DELETE FROM products WHERE product_id = ?", (data["product_id"],))]
+            if event in ("reserved", "released"):
+                sign = -1 if event == "reserved" else 1
+                return [("UPDATE products SET quantity = quantity + ? WHERE product_id = ?",
+                         (sign * quantity, product_id))
+                        for product_id, quantity in data["items"].items()]
+            if event == "cleared":
+                return [("DELETE FROM products", ())]
+        
+        elif service == "payment":
+            if event == "created":
+                return [("INSERT INTO payments VALUES (?, ?, ?, ?, 'pending', ?, ?)",
+                         (data["payment_id"], data["order_id"], data["amount"],
+                          data["method"], data["at"], data["at"]))]
+            if event in ("completed", "failed", "refunded"):
+                status = {"completed": "success", "failed": "failed", "refunded": "refunded"}[event]
+                statements = [("UPDATE payments SET status = ?, updated_us = ? WHERE payment_id = ?",
+                               (status, data["at"], data["payment_id"]))]
+                if event != "failed":
+                    sign = -1 if event == "completed" else 1
+                    statements.append((
+                        "UPDATE balances SET balance = balance + ? * ("
+                        "SELECT amount FROM payments WHERE payment_id = ?)"
+                        " WHERE method = (SELECT method FROM payments WHERE payment_id = ?)",
+                        (sign, data["payment_id"], data["payment_id"])
+                    ))
+                return statements
+            if event == "balance_set":
+                return [("INSERT OR REPLACE INTO balances VALUES (?, ?)",
+                         (data["method"], data["balance"]))]
+            if event == "cleared":
+                return [("DELETE FROM payments", ())]
+        
+        elif service == "order":
+            if event == "created":
+                return [("INSERT INTO orders VALUES (?, ?, 'created', NULL, ?, ?)",
+                         (data["order_id"], data["customer_id"], data["at"], data["at"]))]
+            if event == "item_added":
+                return [
+                    ("INSERT INTO order_items VALUES (?, ?, ?, ?)",
+                     (data["order_id"], data["product_id"], data["quantity"], data["price"])),
+                    ("UPDATE orders SET updated_us = ? WHERE order_id = ?",
+                     (data["at"], data["order_id"])),
+                ]
+            if event == "status":
+                return [("UPDATE orders SET status = ?, payment_id = ?, updated_us = ?"
+                         " WHERE order_id = ?",
+                         (data["status"], data["payment_id"], data["at"], data["order_id"]))]
+            if event == "archived":
+                # 归档的订单由冷存储保存
+                return ([("DELETE FROM order_items WHERE order_id = ?", (order_id,))
+                         for order_id in data["order_ids"]]
+                        + [("DELETE FROM orders WHERE order_id = ?", (order_id,))
+                           for order_id in data["order_ids"]])
+            if event == "cleared":
+                return [("DELETE FROM order_items", ()), ("DELETE FROM orders", ())]
+        
+        raise ValueError(f"未知的事件: {service}.{event}")
@@ -0,0 +1,92 @@
+"""
+持久化存储测试
+比较纯内存、SQLite 逐次提交和 SQLite 后台批量写入三种模式下
+完整下单流程（创建、加商品、确认、支付）的吞吐量
+
+用法:
+    python storage_benchmark.py [订单数量]
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+import time
+from typing import Dict
+
+from inventory import Inventory
+from order import OrderService
+from payment import PaymentMethod, PaymentProcessor
+from storage import MemoryStorage, SQLiteStorage, StorageBackend
+
+
+def new_state() -> Dict:
+    """创建一组空服务"""
+    inventory = Inventory()
+    payment_processor = PaymentProcessor()
+    payment_processor.set_balance(PaymentMethod.PAYPAL, 10.0 ** 12)
+    return {
+        "stock": inventory,
+        "payment": payment_processor,
+        "order": OrderService(inventory, payment_processor)
+    }
+
+
+def run_orders(storage: StorageBackend, order_count: int) -> float:
+    """
+    执行下单流程
+    
+    Args:
+        storage: 存储后端
+        order_count: 订单数量
+    
+    Returns:
+        每秒完成的订单数（包括等待全部写入落盘）
+    """
+    services = new_state()
+    storage.attach(services)
+    services["stock"].add_product("P001", order_count)
+    order_service = services["order"]
+    
+    start_time = time.perf_counter()
+    for i in range(order_count):
+        order_id = f"ORD{i:08d}"
+        order_service.create_order(order_id, f"CUST{i % 1000:04d}")
+        order_service.add_item_to_order(order_id, "P001", 1, 9.9)
+        order_service.confirm_order(order_id)
+        order_service.process_payment(order_id, PaymentMethod.PAYPAL)
+    request_elapsed = time.perf_counter() - start_time
+    storage.flush()
+    elapsed = time.perf_counter() - start_time
+    storage.close()
+    
+    print(f"      请求线程耗时 {request_elapsed:.2f} 秒，含落盘 {elapsed:.2f} 秒")
+    return order_count / elapsed
+
+
+def main() -> None:
+    order_count = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    directory = tempfile.mkdtemp(prefix="storage_benchmark_")
+    
+    print("💾 持久化存储测试")
+    print("=" * 60)
+    print(f"   - 订单数量: {order_count:,}")
+    print()
+    
+    modes = [
+        ("纯内存", lambda: MemoryStorage()),
+        ("SQLite 逐次提交", lambda: SQLiteStorage(os.path.join(directory, "sync.db"),
+                                              write_behind=False)),
+        ("SQLite 后台批量写入", lambda: SQLiteStorage(os.path.join(directory, "batch.db"))),
+    ]
+    try:
+        for label, factory in modes:
+            print(f"   {label}:")
+            throughput = run_orders(factory(), order_count)
+            print(f"      {throughput:,.0f} 订单/秒")
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,224 @@
+"""
+API 服务配置单元测试
+"""
+
+import importlib.util
+import json
+import os
+import sys
+import time
+import pytest
+from fastapi.testclient import TestClient
+
+
+API_PATH = os.path.join(os.path.dirname(__file__), "api.py")
+
+
+def load_api(name):
+    """按当前环境变量重新初始化一份 API 服务（模拟进程重启）"""
+    spec = importlib.util.spec_from_file_location(name, API_PATH)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def shutdown(api):
+    """写入剩余状态并关闭服务"""
+    api.payment_queue.close()
+    if api.journal is not None:
+        api.journal.close()
+    if api.storage is not None:
+        api.storage.close()
+    api.archive.close()
+
+
+@pytest.mark.parametrize("variable, value", [
+    ("ORDER_JOURNAL_DIR", "journal"),
+    ("ORDER_DB_PATH", "orders.db"),
+])
+def test_archived_orders_survive_restart(tmp_path, monkeypatch, variable, value):
+    """测试只配置持久化状态时，归档的订单重启后仍可查询"""
+    for name in ("ORDER_JOURNAL_DIR", "ORDER_DB_PATH", "ORDER_ARCHIVE_PATH"):
+        monkeypatch.delenv(name, raising=False)
+    monkeypatch.setenv(variable, str(tmp_path / value))
+    
+    api = load_api("api_before_restart")
+    api.order_service.create_order("ORD001", "C001")
+    api.order_service.cancel_order("ORD001")
+    assert api.order_service.archive_orders() == 1
+    shutdown(api)
+    
+    api = load_api("api_after_restart")
+    try:
+        assert api.archive.path != ":memory:"
+        assert api.order_service.get_order("ORD001").status.value == "cancelled"
+    finally:
+        shutdown(api)
+
+
+def test_archive_path_env_takes_precedence(tmp_path, monkeypatch):
+    """测试显式配置的冷存储路径优先"""
+    monkeypatch.setenv("ORDER_DB_PATH", str(tmp_path / "orders.db"))
+    monkeypatch.setenv("ORDER_ARCHIVE_PATH", str(tmp_path / "cold.db"))
+    
+    api = load_api("api_archive_path")
+    try:
+        assert api._archive_path() == str(tmp_path / "cold.db")
+    finally:
+        shutdown(api)
+
+
+def test_expired_holds_swept_in_background(monkeypatch):
+    """测试没有新请求时后台任务也会归还过期暂扣的库存"""
+    for name in ("ORDER_JOURNAL_DIR", "ORDER_DB_PATH", "ORDER_ARCHIVE_PATH"):
+        monkeypatch.delenv(name, raising=False)
+    monkeypatch.setenv("HOLD_SWEEP_INTERVAL", "0.01")
+    
+    api = load_api("api_hold_sweep")
+    try:
+        api.inventory.add_product("P001", 10)
+        api.hold_manager = api.StockHoldManager(api.inventory, ttl=0.05, tick=0.01)
+        api.hold_manager.place_hold("H1", [("P001", 4)])
+        assert api.inventory.get_stock("P001") == 6
+        
+        with TestClient(api.app):
+            deadline = time.monotonic() + 2.0
+            while api.inventory.get_stock("P001") != 10 and time.monotonic() < deadline:
+                time.sleep(0.01)
+        
+        assert api.inventory.get_stock("P001") == 10
+        assert len(api.hold_manager) == 0
+    finally:
+        shutdown(api)
+
+
+@pytest.fixture
+def new_york_time(monkeypatch):
+    """本地时区设为有夏令时的 America/New_York"""
+    monkeypatch.setenv("TZ", "America/New_York")
+    time.tzset()
+    yield
+    monkeypatch.undo()
+    time.tzset()
+
+
+def load_fall_back_api(monkeypatch, name):
+    """加载内存模式的 API，并在夏令时回拨前后各创建订单"""
+    for env in ("ORDER_JOURNAL_DIR", "ORDER_DB_PATH", "ORDER_ARCHIVE_PATH"):
+        monkeypatch.delenv(env, raising=False)
+    api = load_api(name)
+    # 2024-11-03 01:30 EDT、01:30 EST（本地时间相同）和 02:30 EST
+    for index, created_us in enumerate([1730611800, 1730615400, 1730619000]):
+        monkeypatch.setattr(sys.modules["order"], "now_us", lambda: created_us * 1_000_000)
+        api.order_service.create_order(f"ORD{index}", "C001")
+    return api
+
+
+def test_cursor_pagination_across_dst_fall_back(monkeypatch, new_york_time):
+    """测试夏令时回拨时本地时间相同的订单分页不重复、不遗漏"""
+    api = load_fall_back_api(monkeypatch, "api_dst_cursor")
+    try:
+        seen = []
+        with TestClient(api.app) as client:
+            params = {"limit": 1}
+            for _ in range(10):
+                page = client.get("/api/orders", params=params).json()
+                seen.extend(order["order_id"] for order in page["orders"])
+                if page["next_cursor"] is None:
+                    break
+                params["cursor"] = page["next_cursor"]
+            else:
+                pytest.fail("分页未结束")
+        
+        assert seen == ["ORD0", "ORD1", "ORD2"]
+    finally:
+        shutdown(api)
+
+
+def test_time_filter_across_dst_fall_back(monkeypatch, new_york_time):
+    """测试带时区的筛选时间在夏令时回拨期间不偏移一小时"""
+    api = load_fall_back_api(monkeypatch, "api_dst_filter")
+    try:
+        with TestClient(api.app) as client:
+            response = client.get("/api/orders", params={
+                "since": "2024-11-03T06:30:00Z",
+                "until": "2024-11-03T07:30:00Z"
+            })
+        
+        assert [order["order_id"] for order in response.json()["orders"]] == ["ORD1"]
+    finally:
+        shutdown(api)
+
+
+def test_payment_batch_pays_confirmed_orders(monkeypatch):
+    """测试批量支付接口按订单校验并标记订单为已支付"""
+    for name in ("ORDER_JOURNAL_DIR", "ORDER_DB_PATH", "ORDER_ARCHIVE_PATH"):
+        monkeypatch.delenv(name, raising=False)
+    api = load_api("api_payment_batch")
+    try:
+        api.inventory.add_product("P001", 10)
+        api.order_service.create_order("ORD001", "C001")
+        api.order_service.add_item_to_order("ORD001", "P001", 2, 50.0)
+        api.order_service.confirm_order("ORD001")
+        
+        with TestClient(api.app) as client:
+            response = client.post("/api/payments/batch", json={"payments": [
+                {"order_id": "ORD001", "amount": 100.0, "payment_method": "alipay"},
+                {"order_id": "ORD002", "amount": 10.0, "payment_method": "bitcoin"},
+            ]})
+        
+        body = response.json()
+        assert [result["result"] for result in body["results"]] == ["success", "rejected"]
+        assert body["results"][0]["payment_id"] == "PAY_ORD001"
+        assert api.order_service.get_order("ORD001").status.value == "paid"
+    finally:
+        shutdown(api)
+
+
+def test_idempotency_key_with_streaming_response(monkeypatch):
+    """测试带幂等键的流式响应不被缓存，进度照常返回"""
+    for name in ("ORDER_JOURNAL_DIR", "ORDER_DB_PATH", "ORDER_ARCHIVE_PATH"):
+        monkeypatch.delenv(name, raising=False)
+    api = load_api("api_idempotent_stream")
+    try:
+        api.order_service.create_order("ORD001", "C001")
+        with TestClient(api.app) as client:
+            responses = [client.post("/api/admin/orders/bulk-cancel",
+                                     json={"order_ids": ["ORD001"]},
+                                     headers={"Idempotency-Key": "cancel-1"})
+                         for _ in range(2)]
+        
+        for response in responses:
+            assert "idempotent-replayed" not in response.headers
+            assert response.headers["content-type"] == "application/x-ndjson"
+        assert json.loads(responses[0].text.splitlines()[-1])["cancelled"] == 1
+        assert len(api.idempotency_store) == 0
+    finally:
+        shutdown(api)
+
+
+def test_idempotency_replay_keeps_repeated_headers(monkeypatch):
+    """测试重放的响应保留重复的响应头"""
+    for name in ("ORDER_JOURNAL_DIR", "ORDER_DB_PATH", "ORDER_ARCHIVE_PATH"):
+        monkeypatch.delenv(name, raising=False)
+    api = load_api("api_idempotent_headers")
+    
+    @api.app.post("/test/cookies")
+    def set_cookies():
+        response = api.JSONResponse({"ok": True})
+        response.set_cookie("a", "1")
+        response.set_cookie("b", "2")
+        return response
+    
+    try:
+        with TestClient(api.app) as client:
+            responses = [client.post("/test/cookies", headers={"Idempotency-Key": "cookies-1"})
+                         for _ in range(2)]
+        
+        assert "idempotent-replayed" not in responses[0].headers
+        assert responses[1].headers["idempotent-replayed"] == "true"
+        for response in responses:
+            assert len(response.headers.get_list("set-cookie")) == 2
+            assert response.json() == {"ok": True}
+    finally:
+        shutdown(api)
@@ -0,0 +1,256 @@
+"""
+异步数据库模拟器单元测试
+"""
+
+import asyncio
+import time
+import pytest
+from .async_database import (
+    AsyncDatabaseManager, AsyncDatabaseSimulator, CircuitOpenError, DatabaseConnectionError,
+    DatabaseOperationError
+)
+from .resilience import CircuitBreaker, CircuitState, RetryPolicy
+
+
+class TestAsyncDatabaseSimulator:
+    """异步数据库模拟器测试"""
+    
+    def test_concurrent_queries_share_one_loop(self):
+        """测试大量查询在同一事件循环中并发进行"""
+        db = AsyncDatabaseSimulator(latency=0.1)
+        
+        async def run():
+            start = time.perf_counter()
+            await asyncio.gather(*(
+                db.execute_query("INSERT INTO payment_logs (id)", {"id": f"log_{i}"})
+                for i in range(1000)
+            ))
+            return time.perf_counter() - start
+        
+        elapsed = asyncio.run(run())
+        
+        assert elapsed < 1.0
+        assert len(db.dump_records("payment_logs")) == 1000
+        assert db.get_connection_info()["max_in_flight"] == 1000
+    
+    def test_connection_limit(self):
+        """测试同时进行的查询数不超过连接数"""
+        db = AsyncDatabaseSimulator(max_connections=5, latency=0.01)
+        
+        async def run():
+            await asyncio.gather(*(db.execute_query("SELECT 1") for _ in range(20)))
+        
+        asyncio.run(run())
+        
+        info = db.get_connection_info()
+        assert info["max_in_flight"] == 5
+        assert info["total_wait_ms"] > 0
+    
+    def test_failure_injection(self):
+        """测试断开连接和查询期间的连接失败"""
+        db = AsyncDatabaseSimulator(latency=0.05)
+        
+        async def run():
+            query = asyncio.ensure_future(
+                db.execute_query("INSERT INTO payment_logs (id)", {"id": "log_1"})
+            )
+            await asyncio.sleep(0.01)
+            db.simulate_connection_failure()
+            with pytest.raises(DatabaseConnectionError):
+                await query
+            with pytest.raises(DatabaseConnectionError):
+                await db.execute_query("SELECT 1")
+            await db.connect()
+            await db.execute_query("SELECT 1")
+        
+        asyncio.run(run())
+        
+        assert db.dump_records() == []
+        assert db.connection_count == 1
+    
+    def test_execute_many_one_round_trip(self):
+        """测试批量执行只占用一个连接、付出一次往返延迟"""
+        db = AsyncDatabaseSimulator(max_connections=1, latency=0.05)
+        statements = [("INSERT INTO payment_logs (id)", {"id": f"log_{i}"}) for i in range(20)]
+        
+        start = time.perf_counter()
+        results = asyncio.run(db.execute_many(statements))
+        
+        assert time.perf_counter() - start < 0.3
+        assert len(results) == 20
+        assert db.operation_count == 1
+        assert len(db.dump_records("payment_logs")) == 20
+    
+    def test_invalid_arguments(self):
+        """测试无效参数"""
+        with pytest.raises(ValueError):
+            AsyncDatabaseSimulator(max_connections=0)
+        with pytest.raises(ValueError):
+            AsyncDatabaseSimulator(latency=-1)
+
+
+class TestAsyncDatabaseManager:
+    """异步数据库管理器测试"""
+    
+    def test_reconnects(self):
+        """测试连接断开后自动重连，并发的重连只连接一次"""
+        db = AsyncDatabaseSimulator(latency=0.0)
+        db.disconnect()
+        manager = AsyncDatabaseManager(db)
+        
+        async def run():
+            return await asyncio.gather(*(manager.execute_with_retry("SELECT 1") for _ in range(10)))
+        
+        results = asyncio.run(run())
+        
+        assert all(result["status"] == "success" for result in results)
+        assert db.connection_count == 1
+    
+    def test_retry_then_circuit_open(self):
+        """测试重试失败后熔断，之后快速失败"""
+        db = AsyncDatabaseSimulator(latency=0.0)
+        db.disconnect()
+        manager = AsyncDatabaseManager(
+            db, retry_policy=RetryPolicy(max_attempts=5, base_delay=0.001),
+            circuit_breaker=CircuitBreaker(failure_threshold=3, recovery_timeout=60.0)
+        )
+        manager.auto_reconnect = False
+        
+        async def run():
+            with pytest.raises(CircuitOpenError):
+                await manager.execute_with_retry("SELECT 1")
+            with pytest.raises(CircuitOpenError):
+                await manager.execute_with_retry("SELECT 1")
+        
+        asyncio.run(run())
+        
+        assert db.operation_count == 3
+    
+    def test_execute_many_retries_whole_batch(self):
+        """测试批次失败后整批重试，语句只执行一次"""
+        db = AsyncDatabaseSimulator(latency=0.05)
+        manager = AsyncDatabaseManager(db, retry_policy=RetryPolicy(max_attempts=3, base_delay=0.0))
+        
+        async def run():
+            batch = asyncio.ensure_future(manager.execute_many([
+                ("INSERT INTO payment_logs (id)", {"id": "log_1"}),
+                ("INSERT INTO payment_logs (id)", {"id": "log_2"}),
+            ]))
+            await asyncio.sleep(0.02)
+            db.simulate_connection_failure()
+            return await batch
+        
+        results = asyncio.run(run())
+        
+        assert len(results) == 2
+        assert [record["id"] for record in db.dump_records("payment_logs")] == ["log_1", "log_2"]
+        assert db.operation_count == 2
+    
+    def test_cancelled_probe_released(self):
+        """测试半开状态的探测请求被取消后熔断器仍能恢复"""
+        db = AsyncDatabaseSimulator(latency=0.05)
+        now = [0.0]
+        breaker = CircuitBreaker(failure_threshold=1, recovery_timeout=60.0, clock=lambda: now[0])
+        manager = AsyncDatabaseManager(db, circuit_breaker=breaker)
+        breaker.record_failure()
+        now[0] = 60.0
+        
+        async def run():
+            with pytest.raises(asyncio.TimeoutError):
+                await asyncio.wait_for(manager.execute_with_retry("SELECT 1"), timeout=0.01)
+            return await manager.execute_with_retry("SELECT 1")
+        
+        assert asyncio.run(run())["status"] == "success"
+        assert breaker.state == CircuitState.CLOSED
+    
+    def test_application_error_does_not_close_breaker(self):
+        """测试半开状态的探测遇到应用错误时不关闭熔断器"""
+        db = AsyncDatabaseSimulator(latency=0.0)
+        now = [0.0]
+        breaker = CircuitBreaker(failure_threshold=1, recovery_timeout=60.0, clock=lambda: now[0])
+        manager = AsyncDatabaseManager(db, circuit_breaker=breaker)
+        breaker.record_failure()
+        now[0] = 60.0
+        
+        async def broken(query, params=None, transaction_id=None):
+            raise KeyError("id")
+        
+        db.execute_query = broken
+        with pytest.raises(DatabaseOperationError):
+            asyncio.run(manager.execute_with_retry("SELECT 1"))
+        
+        assert breaker.state == CircuitState.HALF_OPEN
+        assert breaker.allow_request()
+    
+    def test_transaction(self):
+        """测试事务执行所有操作"""
+        db = AsyncDatabaseSimulator(latency=0.0)
+        manager = AsyncDatabaseManager(db)
+        
+        ok = asyncio.run(manager.execute_transaction([
+            ("INSERT INTO payment_records (id)", {"id": "PAY_1", "payment_id": "PAY_1"}),
+            ("UPDATE payment_records SET status = ?", {"id": "PAY_1", "status": "success"}),
+        ]))
+        
+        assert ok
+        assert db.dump_records("payment_records") == [
+            {"id": "PAY_1", "payment_id": "PAY_1", "status": "success"}
+        ]
+    
+    def test_transaction_failure_raises(self):
+        """测试事务中的操作失败时回滚并抛出原异常"""
+        db = AsyncDatabaseSimulator(latency=0.05)
+        manager = AsyncDatabaseManager(db, retry_policy=RetryPolicy(max_attempts=1))
+        manager.auto_reconnect = False
+        
+        async def run():
+            transaction = asyncio.ensure_future(manager.execute_transaction([
+                ("INSERT INTO payment_records (id)", {"id": "PAY_1"}),
+            ]))
+            await asyncio.sleep(0.01)
+            db.disconnect()
+            await transaction
+        
+        with pytest.raises(DatabaseConnectionError):
+            asyncio.run(run())
+    
+    def test_conflicting_transactions_retry(self):
+        """测试并发修改同一记录的事务冲突后重试，最终都提交"""
+        db = AsyncDatabaseSimulator(latency=0.01)
+        manager = AsyncDatabaseManager(db, retry_policy=RetryPolicy(max_attempts=5, base_delay=0.001))
+        
+        async def run():
+            await db.execute_query("INSERT INTO payment_records (id)", {"id": "PAY_1", "status": "pending"})
+            return await asyncio.gather(*(
+                manager.execute_transaction([
+                    ("UPDATE payment_records SET status = ?", {"id": "PAY_1", "status": f"step_{i}"}),
+                ])
+                for i in range(3)
+            ))
+        
+        assert asyncio.run(run()) == [True, True, True]
+        
+        stats = db.get_connection_info()["transactions"]
+        assert stats["committed"] == 3
+        assert stats["conflicts"] >= 2
+        assert stats["active"] == 0
+    
+    def test_cancelled_transaction_rolled_back(self):
+        """测试被取消的事务回滚，不再占用快照"""
+        db = AsyncDatabaseSimulator(latency=0.05)
+        manager = AsyncDatabaseManager(db)
+        
+        async def run():
+            with pytest.raises(asyncio.TimeoutError):
+                await asyncio.wait_for(manager.execute_transaction([
+                    ("INSERT INTO payment_records (id)", {"id": "PAY_1"}),
+                ]), timeout=0.01)
+            for i in range(10):
+                await db.execute_query("INSERT INTO payment_logs (id)", {"id": f"log_{i}"})
+        
+        asyncio.run(run())
+        
+        stats = db.get_connection_info()["transactions"]
+        assert stats["active"] == 0
+        assert stats["history_keys"] == 0
+        assert db.dump_records("payment_records") == []
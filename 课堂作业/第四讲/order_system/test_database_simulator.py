@@ -0,0 +1,526 @@
+"""
+数据库模拟器单元测试
+"""
+
+import threading
+import time
+import pytest
+from .database_simulator import (
+    CircuitOpenError, DatabaseConnectionError, DatabaseManager, DatabaseOperationError,
+    DatabaseSimulator, PoolTimeoutError, PooledDatabaseSimulator, TransactionConflictError
+)
+from .resilience import CircuitBreaker, CircuitState, RetryPolicy
+
+
+def run_concurrently(db, count):
+    """多线程同时执行插入，返回总耗时（秒）"""
+    barrier = threading.Barrier(count + 1)
+    
+    def worker(index):
+        barrier.wait()
+        db.execute_query("INSERT INTO payment_logs (id)", {"id": f"log_{index}"})
+    
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(count)]
+    for thread in threads:
+        thread.start()
+    barrier.wait()
+    start = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    return time.perf_counter() - start
+
+
+class TestDatabaseSimulator:
+    """数据库模拟器测试"""
+    
+    def test_crud(self):
+        """测试插入、更新和删除"""
+        db = DatabaseSimulator()
+        db.execute_query("INSERT INTO payment_records (id)", {"id": "PAY_1", "amount": 1})
+        db.execute_query("UPDATE payment_records SET amount = ?", {"id": "PAY_1", "amount": 2})
+        
+        assert db.dump_records("payment_records") == [{"id": "PAY_1", "amount": 2}]
+        
+        db.execute_query("DELETE FROM payment_records WHERE id = ?", {"id": "PAY_1"})
+        assert db.dump_records() == []
+    
+    def test_disconnected(self):
+        """测试断开连接后查询失败"""
+        db = DatabaseSimulator()
+        db.disconnect()
+        
+        with pytest.raises(DatabaseConnectionError):
+            db.execute_query("SELECT 1")
+        with pytest.raises(DatabaseConnectionError):
+            db.dump_records()
+
+
+class TestPooledDatabaseSimulator:
+    """连接池模式数据库模拟器测试"""
+    
+    def test_queries_run_concurrently(self):
+        """测试多个连接同时查询，耗时接近单次查询延迟"""
+        db = PooledDatabaseSimulator(pool_size=8, latency=0.1)
+        
+        elapsed = run_concurrently(db, 8)
+        
+        assert elapsed < 0.4
+        assert len(db.dump_records("payment_logs")) == 8
+        assert db.get_pool_stats()["checkouts"] == 8
+        assert db.get_pool_stats()["in_use"] == 0
+    
+    def test_waits_for_free_connection(self):
+        """测试连接用完时排队等待并记录等待耗时"""
+        db = PooledDatabaseSimulator(pool_size=2, latency=0.05)
+        
+        run_concurrently(db, 6)
+        stats = db.get_pool_stats()
+        
+        assert stats["checkouts"] == 6
+        assert stats["waited_checkouts"] >= 4
+        assert stats["max_wait_ms"] >= 40
+        assert stats["avg_wait_ms"] > 0
+        assert db.operation_count == 6
+    
+    def test_checkout_timeout(self):
+        """测试等待空闲连接超时"""
+        db = PooledDatabaseSimulator(pool_size=1, latency=0.3, checkout_timeout=0.05)
+        thread = threading.Thread(target=db.execute_query, args=("SELECT 1",))
+        thread.start()
+        time.sleep(0.05)
+        
+        with pytest.raises(PoolTimeoutError):
+            db.execute_query("SELECT 1")
+        thread.join()
+        
+        assert db.get_pool_stats()["checkout_timeouts"] == 1
+    
+    def test_checkout_timeout_does_not_trip_breaker(self):
+        """测试连接池耗尽不重试，也不计入熔断"""
+        db = PooledDatabaseSimulator(pool_size=1, latency=0.3, checkout_timeout=0.05)
+        breaker = CircuitBreaker(failure_threshold=1)
+        manager = DatabaseManager(db, retry_policy=RetryPolicy(max_attempts=3, base_delay=0.0),
+                                  circuit_breaker=breaker)
+        thread = threading.Thread(target=db.execute_query, args=("SELECT 1",))
+        thread.start()
+        time.sleep(0.05)
+        
+        with pytest.raises(PoolTimeoutError):
+            manager.execute_with_retry("SELECT 1")
+        thread.join()
+        
+        assert breaker.state == CircuitState.CLOSED
+        assert db.get_pool_stats()["checkout_timeouts"] == 1
+    
+    def test_per_connection_latency(self):
+        """测试每个连接有自己的延迟"""
+        db = PooledDatabaseSimulator(pool_size=1, latency=0.0)
+        db.connections[0].latency = 0.1
+        
+        start = time.perf_counter()
+        db.execute_query("SELECT 1")
+        
+        assert time.perf_counter() - start >= 0.1
+        assert db.connections[0].query_count == 1
+    
+    def test_disconnect_during_query(self):
+        """测试查询延迟期间连接中断"""
+        db = PooledDatabaseSimulator(pool_size=1, latency=0.1)
+        threading.Timer(0.02, db.simulate_connection_failure).start()
+        
+        with pytest.raises(DatabaseConnectionError):
+            db.execute_query("INSERT INTO payment_logs (id)", {"id": "log_1"})
+        
+        assert db.get_pool_stats()["in_use"] == 0
+        db.connect()
+        assert db.dump_records() == []
+    
+    def test_connection_info_and_reset(self):
+        """测试连接信息包含连接池统计，重置后清零"""
+        db = PooledDatabaseSimulator(pool_size=3, latency=0.0)
+        db.execute_query("SELECT 1")
+        
+        assert db.get_connection_info()["pool"]["checkouts"] == 1
+        db.reset_stats()
+        assert db.get_connection_info()["pool"]["checkouts"] == 0
+        assert db.get_connection_info()["pool"]["available"] == 3
+    
+    def test_invalid_arguments(self):
+        """测试无效参数"""
+        with pytest.raises(ValueError):
+            PooledDatabaseSimulator(pool_size=0)
+        with pytest.raises(ValueError):
+            PooledDatabaseSimulator(latency=-1)
+
+
+class TestExecuteMany:
+    """批量执行测试"""
+    
+    def test_one_round_trip(self):
+        """测试多条语句只付出一次往返延迟"""
+        db = DatabaseSimulator()
+        statements = [("INSERT INTO payment_logs (id)", {"id": f"log_{i}"}) for i in range(20)]
+        
+        start = time.perf_counter()
+        results = db.execute_many(statements)
+        elapsed = time.perf_counter() - start
+        
+        assert len(results) == 20
+        assert all(result["status"] == "success" for result in results)
+        assert elapsed < 0.3
+        assert db.operation_count == 1
+        assert len(db.dump_records("payment_logs")) == 20
+    
+    def test_empty_batch(self):
+        """测试空批次不访问数据库"""
+        db = PooledDatabaseSimulator(pool_size=1)
+        
+        assert db.execute_many([]) == []
+        assert db.operation_count == 0
+    
+    def test_failure_during_latency_executes_nothing(self):
+        """测试延迟期间连接中断时整批都不执行"""
+        db = PooledDatabaseSimulator(pool_size=1, latency=0.1)
+        timer = threading.Timer(0.03, db.simulate_connection_failure)
+        timer.start()
+        
+        with pytest.raises(DatabaseConnectionError):
+            db.execute_many([
+                ("INSERT INTO payment_logs (id)", {"id": "log_1"}),
+                ("INSERT INTO payment_logs (id)", {"id": "log_2"}),
+            ])
+        timer.join()
+        
+        db.connect()
+        assert db.dump_records() == []
+
+
+class TestDatabaseManager:
+    """数据库管理器测试"""
+    
+    def test_reconnects_and_retries(self):
+        """测试连接断开后自动重连"""
+        db = DatabaseSimulator()
+        db.disconnect()
+        manager = DatabaseManager(db)
+        
+        result = manager.execute_with_retry("SELECT 1")
+        
+        assert result["status"] == "success"
+        assert db.is_connected()
+    
+    def test_backoff_between_attempts(self):
+        """测试按重试策略退避后放弃"""
+        db = DatabaseSimulator()
+        db.disconnect()
+        manager = DatabaseManager(db, retry_policy=RetryPolicy(max_attempts=3, base_delay=0.0))
+        manager.auto_reconnect = False
+        
+        with pytest.raises(DatabaseConnectionError):
+            manager.execute_with_retry("SELECT 1")
+        
+        assert db.operation_count == 3
+    
+    def test_circuit_breaker_fails_fast(self):
+        """测试熔断器打开后不再访问数据库"""
+        db = DatabaseSimulator()
+        db.disconnect()
+        breaker = CircuitBreaker(failure_threshold=2, recovery_timeout=60.0)
+        manager = DatabaseManager(db, retry_policy=RetryPolicy(max_attempts=5, base_delay=0.0),
+                                  circuit_breaker=breaker)
+        manager.auto_reconnect = False
+        
+        with pytest.raises(CircuitOpenError):
+            manager.execute_with_retry("SELECT 1")
+        assert db.operation_count == 2
+        
+        start = time.perf_counter()
+        with pytest.raises(CircuitOpenError):
+            manager.execute_with_retry("SELECT 1")
+        assert time.perf_counter() - start < 0.01
+        assert db.operation_count == 2
+        assert breaker.state == CircuitState.OPEN
+    
+    def test_probe_success_closes_breaker(self):
+        """测试半开状态的探测请求成功后关闭熔断器"""
+        db = DatabaseSimulator()
+        breaker = CircuitBreaker(failure_threshold=1, recovery_timeout=0.0)
+        breaker.record_failure()
+        manager = DatabaseManager(db, circuit_breaker=breaker)
+        
+        manager.execute_with_retry("SELECT 1")
+        
+        assert breaker.state == CircuitState.CLOSED
+    
+    def test_interrupted_probe_released(self):
+        """测试探测请求被中断时释放名额，熔断器仍可放行下一个探测"""
+        db = DatabaseSimulator()
+        now = [0.0]
+        breaker = CircuitBreaker(failure_threshold=1, recovery_timeout=60.0, clock=lambda: now[0])
+        breaker.record_failure()
+        now[0] = 60.0
+        manager = DatabaseManager(db, circuit_breaker=breaker)
+        
+        def interrupted(query, params=None, transaction_id=None):
+            raise KeyboardInterrupt
+        
+        db.execute_query = interrupted
+        with pytest.raises(KeyboardInterrupt):
+            manager.execute_with_retry("SELECT 1")
+        
+        assert breaker.state == CircuitState.HALF_OPEN
+        assert breaker.allow_request()
+    
+    def test_application_error_does_not_close_breaker(self):
+        """测试半开状态的探测遇到应用错误时不关闭熔断器"""
+        db = DatabaseSimulator()
+        now = [0.0]
+        breaker = CircuitBreaker(failure_threshold=1, recovery_timeout=60.0, clock=lambda: now[0])
+        breaker.record_failure()
+        now[0] = 60.0
+        manager = DatabaseManager(db, circuit_breaker=breaker)
+        
+        def broken(query, params=None, transaction_id=None):
+            raise KeyError("id")
+        
+        db.execute_query = broken
+        with pytest.raises(DatabaseOperationError):
+            manager.execute_with_retry("SELECT 1")
+        
+        assert breaker.state == CircuitState.HALF_OPEN
+        assert breaker.allow_request()
+    
+    def test_execute_many_retries_whole_batch(self):
+        """测试批次失败后整批重试，语句只执行一次"""
+        db = PooledDatabaseSimulator(pool_size=1, latency=0.05)
+        manager = DatabaseManager(db, retry_policy=RetryPolicy(max_attempts=3, base_delay=0.0))
+        timer = threading.Timer(0.02, db.simulate_connection_failure)
+        timer.start()
+        
+        results = manager.execute_many([
+            ("INSERT INTO payment_logs (id)", {"id": "log_1"}),
+            ("INSERT INTO payment_logs (id)", {"id": "log_2"}),
+        ])
+        timer.join()
+        
+        assert [result["affected_rows"] for result in results] == [1, 1]
+        assert [record["id"] for record in db.dump_records("payment_logs")] == ["log_1", "log_2"]
+        assert db.operation_count == 2
+    
+    def test_pipeline(self):
+        """测试流水线暂存语句并在一次往返中发送"""
+        db = DatabaseSimulator()
+        pipe = DatabaseManager(db).pipeline()
+        
+        assert pipe.add("INSERT INTO payment_logs (id)", {"id": "log_1"}) == 0
+        index = pipe.add("SELECT balance FROM accounts WHERE payment_method = ?", {})
+        assert len(pipe) == 2
+        
+        results = pipe.execute()
+        
+        assert results[index]["status"] == "success"
+        assert len(pipe) == 0
+        assert db.operation_count == 1
+    
+    def test_transaction_in_one_round_trip(self):
+        """测试事务中的操作在一次往返中执行"""
+        db = DatabaseSimulator()
+        manager = DatabaseManager(db)
+        
+        assert manager.execute_transaction([
+            ("INSERT INTO payment_records (id)", {"id": "PAY_1"}),
+            ("UPDATE payment_records SET status = ?", {"id": "PAY_1", "status": "success"}),
+        ])
+        
+        assert db.operation_count == 1
+        assert db.dump_records("payment_records")[0]["status"] == "success"
+
+
+class TestTransactions:
+    """事务（多版本并发控制）测试"""
+    
+    def insert_payment(self, db, status="pending"):
+        """事务外插入一条支付记录"""
+        db.execute_query("INSERT INTO payment_records (id)", {"id": "PAY_1", "status": status})
+    
+    def test_writes_staged_until_commit(self):
+        """测试事务内的写入提交前不可见"""
+        db = DatabaseSimulator()
+        txn = db.begin_transaction()
+        
+        db.execute_query("INSERT INTO payment_records (id)", {"id": "PAY_1"}, txn)
+        assert db.dump_records() == []
+        
+        db.commit_transaction(txn)
+        assert db.dump_records("payment_records") == [{"id": "PAY_1"}]
+    
+    def test_rollback_discards_writes(self):
+        """测试回滚后不留下部分写入"""
+        db = DatabaseSimulator()
+        self.insert_payment(db)
+        txn = db.begin_transaction()
+        db.execute_many([
+            ("UPDATE payment_records SET status = ?", {"id": "PAY_1", "status": "success"}),
+            ("INSERT INTO payment_logs (id)", {"id": "log_1"}),
+        ], txn)
+        
+        db.rollback_transaction(txn)
+        
+        assert db.dump_records() == [{"id": "PAY_1", "status": "pending"}]
+        with pytest.raises(DatabaseOperationError):
+            db.commit_transaction(txn)
+    
+    def test_reads_see_snapshot(self):
+        """测试事务读取开始时的快照，并看到自己暂存的写入"""
+        db = DatabaseSimulator()
+        self.insert_payment(db)
+        txn = db.begin_transaction()
+        
+        db.execute_query("UPDATE payment_records SET status = ?", {"id": "PAY_1", "status": "success"})
+        db.execute_query("INSERT INTO payment_logs (id)", {"id": "log_1"})
+        db.execute_query("INSERT INTO payment_logs (id)", {"id": "log_2"}, txn)
+        
+        result = db.execute_query("SELECT * FROM payment_records", {}, txn)
+        assert sorted(record["id"] for record in result["data"]) == ["PAY_1", "log_2"]
+        assert {"id": "PAY_1", "status": "pending"} in result["data"]
+        assert db.execute_query("SELECT * FROM payment_records")["count"] == 2
+    
+    def test_write_conflict_first_committer_wins(self):
+        """测试两个事务修改同一记录时后提交者冲突"""
+        db = DatabaseSimulator()
+        self.insert_payment(db)
+        first = db.begin_transaction()
+        second = db.begin_transaction()
+        db.execute_query("UPDATE payment_records SET status = ?", {"id": "PAY_1", "status": "success"}, first)
+        db.execute_query("UPDATE payment_records SET status = ?", {"id": "PAY_1", "status": "failed"}, second)
+        
+        db.commit_transaction(first)
+        with pytest.raises(TransactionConflictError):
+            db.commit_transaction(second)
+        
+        assert db.dump_records() == [{"id": "PAY_1", "status": "success"}]
+        stats = db.get_connection_info()["transactions"]
+        assert stats["committed"] == 1
+        assert stats["conflicts"] == 1
+        assert stats["active"] == 0
+        assert stats["history_keys"] == 0
+    
+    def test_concurrent_insert_conflicts(self):
+        """测试两个事务插入同一个键时冲突"""
+        db = DatabaseSimulator()
+        first = db.begin_transaction()
+        second = db.begin_transaction()
+        db.execute_query("INSERT INTO payment_records (id)", {"id": "PAY_1", "amount": 1}, first)
+        db.execute_query("INSERT INTO payment_records (id)", {"id": "PAY_1", "amount": 2}, second)
+        
+        db.commit_transaction(second)
+        with pytest.raises(TransactionConflictError):
+            db.commit_transaction(first)
+        
+        assert db.dump_records() == [{"id": "PAY_1", "amount": 2}]
+    
+    def test_disjoint_transactions_both_commit(self):
+        """测试修改不同记录的并发事务都能提交"""
+        db = DatabaseSimulator()
+        first = db.begin_transaction()
+        second = db.begin_transaction()
+        db.execute_query("INSERT INTO payment_records (id)", {"id": "PAY_1"}, first)
+        db.execute_query("INSERT INTO payment_records (id)", {"id": "PAY_2"}, second)
+        
+        db.commit_transaction(first)
+        db.commit_transaction(second)
+        
+        assert len(db.dump_records()) == 2
+    
+    def test_stale_transaction_aborted(self):
+        """测试未结束的事务超时后被中止，旧版本不再无限保留"""
+        db = DatabaseSimulator()
+        db.max_transaction_age = 0.5
+        self.insert_payment(db)
+        txn = db.begin_transaction()
+        db.execute_query("SELECT * FROM payment_records", {}, txn)
+        for status in ("processing", "success"):
+            db.execute_query("UPDATE payment_records SET status = ?", {"id": "PAY_1", "status": status})
+        assert db.get_connection_info()["transactions"]["history_keys"] == 1
+        
+        time.sleep(0.5)
+        db.execute_query("UPDATE payment_records SET status = ?", {"id": "PAY_1", "status": "refunded"})
+        
+        stats = db.get_connection_info()["transactions"]
+        assert stats["active"] == 0
+        assert stats["aborted"] == 1
+        assert stats["history_keys"] == 0
+        with pytest.raises(DatabaseOperationError):
+            db.commit_transaction(txn)
+    
+    def test_manager_retries_conflict(self):
+        """测试管理器在提交冲突后重新执行整个事务"""
+        db = DatabaseSimulator()
+        self.insert_payment(db)
+        manager = DatabaseManager(db, retry_policy=RetryPolicy(max_attempts=3, base_delay=0.0))
+        original_commit = db.commit_transaction
+        commits = []
+        
+        def commit_after_concurrent_write(transaction_id):
+            if not commits:
+                db.execute_query("UPDATE payment_records SET status = ?", {"id": "PAY_1", "note": "concurrent"})
+            commits.append(transaction_id)
+            return original_commit(transaction_id)
+        
+        db.commit_transaction = commit_after_concurrent_write
+        
+        assert manager.execute_transaction([
+            ("UPDATE payment_records SET status = ?", {"id": "PAY_1", "status": "success"}),
+        ])
+        
+        assert len(commits) == 2
+        assert db.dump_records() == [
+            {"id": "PAY_1", "status": "success", "note": "concurrent"}
+        ]
+    
+    def test_manager_gives_up_after_max_attempts(self):
+        """测试冲突持续时重试后抛出冲突异常"""
+        db = DatabaseSimulator()
+        self.insert_payment(db)
+        manager = DatabaseManager(db, retry_policy=RetryPolicy(max_attempts=2, base_delay=0.0))
+        original_commit = db.commit_transaction
+        
+        def always_conflict(transaction_id):
+            db.execute_query("UPDATE payment_records SET status = ?", {"id": "PAY_1", "status": "failed"})
+            return original_commit(transaction_id)
+        
+        db.commit_transaction = always_conflict
+        
+        with pytest.raises(TransactionConflictError):
+            manager.execute_transaction([
+                ("UPDATE payment_records SET status = ?", {"id": "PAY_1", "status": "success"}),
+            ])
+        assert db.get_connection_info()["transactions"]["conflicts"] == 2
+    
+    def test_concurrent_transactions_overlap(self):
+        """测试连接池模式下的事务并发执行，互不阻塞"""
+        db = PooledDatabaseSimulator(pool_size=8, latency=0.05)
+        manager = DatabaseManager(db)
+        errors = []
+        
+        def pay(index):
+            try:
+                manager.execute_transaction([
+                    ("INSERT INTO payment_records (id)", {"id": f"PAY_{index}", "status": "success"}),
+                    ("INSERT INTO payment_logs (id)", {"id": f"log_{index}"}),
+                ])
+            except Exception as e:
+                errors.append(e)
+        
+        threads = [threading.Thread(target=pay, args=(i,)) for i in range(8)]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - start
+        
+        assert errors == []
+        assert len(db.dump_records("payment_records")) == 8
+        # 串行执行至少需要 8 * (50ms 查询 + 20ms 提交)
+        assert elapsed < 0.4
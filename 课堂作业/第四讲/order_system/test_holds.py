@@ -0,0 +1,236 @@
+"""
+库存暂扣模块单元测试
+"""
+
+import pytest
+from .holds import StockHoldManager
+from .inventory import Inventory
+from .order import OrderService, OrderStatus
+from .payment import PaymentProcessor, PaymentMethod
+
+
+class FakeClock:
+    """可手动推进的时钟"""
+    
+    def __init__(self):
+        self.now = 0.0
+    
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    """测试时钟"""
+    return FakeClock()
+
+
+@pytest.fixture
+def inventory():
+    """包含商品的库存"""
+    inv = Inventory()
+    inv.add_product("P001", 100)
+    inv.add_product("P002", 50)
+    return inv
+
+
+class TestStockHoldManager:
+    """库存暂扣管理器测试"""
+    
+    def test_place_hold_reserves_stock(self, inventory, clock):
+        """测试暂扣减少库存"""
+        holds = StockHoldManager(inventory, ttl=60, clock=clock)
+        holds.place_hold("H1", [("P001", 10), ("P002", 5)])
+        
+        assert inventory.get_stock("P001") == 90
+        assert inventory.get_stock("P002") == 45
+        assert holds.has_hold("H1")
+    
+    def test_hold_expires_and_returns_stock(self, inventory, clock):
+        """测试暂扣过期后自动归还库存"""
+        holds = StockHoldManager(inventory, ttl=60, clock=clock)
+        holds.place_hold("H1", [("P001", 10)])
+        
+        clock.now = 59
+        assert holds.expire() == []
+        
+        clock.now = 61
+        assert holds.expire() == ["H1"]
+        assert inventory.get_stock("P001") == 100
+        assert len(holds) == 0
+    
+    def test_commit_hold_keeps_stock(self, inventory, clock):
+        """测试暂扣转正式扣减后不再归还"""
+        holds = StockHoldManager(inventory, ttl=60, clock=clock)
+        holds.place_hold("H1", [("P001", 10)])
+        
+        assert holds.commit_hold("H1") is True
+        clock.now = 120
+        assert holds.expire() == []
+        assert inventory.get_stock("P001") == 90
+    
+    def test_commit_expired_hold(self, inventory, clock):
+        """测试过期后无法转正式扣减"""
+        holds = StockHoldManager(inventory, ttl=60, clock=clock)
+        holds.place_hold("H1", [("P001", 10)])
+        
+        clock.now = 61
+        assert holds.commit_hold("H1") is False
+        assert inventory.get_stock("P001") == 100
+    
+    def test_release_hold(self, inventory, clock):
+        """测试取消暂扣"""
+        holds = StockHoldManager(inventory, ttl=60, clock=clock)
+        holds.place_hold("H1", [("P001", 10)])
+        
+        assert holds.release_hold("H1") is True
+        assert holds.release_hold("H1") is False
+        assert inventory.get_stock("P001") == 100
+    
+    def test_duplicate_hold(self, inventory, clock):
+        """测试重复暂扣"""
+        holds = StockHoldManager(inventory, ttl=60, clock=clock)
+        holds.place_hold("H1", [("P001", 10)])
+        
+        with pytest.raises(ValueError):
+            holds.place_hold("H1", [("P001", 10)])
+        assert inventory.get_stock("P001") == 90
+    
+    def test_failed_release_does_not_block_others(self, inventory, clock):
+        """测试某个暂扣归还失败时其他暂扣照常归还"""
+        expired = []
+        holds = StockHoldManager(inventory, ttl=60, clock=clock, on_expire=expired.append)
+        holds.place_hold("H1", [("P001", 10)])
+        holds.place_hold("H2", [("P002", 5)])
+        inventory.remove_product("P001")
+        
+        clock.now = 61
+        assert holds.expire() == ["H2"]
+        
+        assert expired == ["H2"]
+        assert inventory.get_stock("P002") == 50
+        assert len(holds) == 0
+        assert [(hold_id, items) for hold_id, items, _ in holds.failed_releases] == [
+            ("H1", [("P001", 10)])
+        ]
+    
+    def test_many_holds_expire(self, inventory, clock):
+        """测试大量暂扣批量过期"""
+        inventory.add_product("P003", 5000)
+        holds = StockHoldManager(inventory, ttl=30, clock=clock)
+        for i in range(5000):
+            clock.now = i * 0.005
+            holds.place_hold(f"H{i}", [("P003", 1)])
+        
+        assert inventory.get_stock("P003") == 0
+        clock.now = 100
+        assert len(holds.expire()) == 5000
+        assert inventory.get_stock("P003") == 5000
+    
+    def test_detach_holds(self, inventory, clock):
+        """测试取消暂扣但不归还库存"""
+        holds = StockHoldManager(inventory, ttl=60, clock=clock)
+        holds.place_hold("H1", [("P001", 10)])
+        holds.place_hold("H2", [("P002", 5)])
+        
+        detached = holds.detach_holds(["H1", "H3"])
+        
+        assert detached == {"H1": [("P001", 10)]}
+        assert not holds.has_hold("H1")
+        assert inventory.get_stock("P001") == 90
+        clock.now = 61
+        assert holds.expire() == ["H2"]
+
+
+class TestOrderServiceWithHolds:
+    """订单服务库存暂扣集成测试"""
+    
+    def _service(self, inventory, clock):
+        holds = StockHoldManager(inventory, ttl=60, clock=clock)
+        service = OrderService(inventory, PaymentProcessor(), holds)
+        service.create_order("ORD001", "CUST001")
+        service.add_item_to_order("ORD001", "P001", 2, 50.0)
+        service.confirm_order("ORD001")
+        return service
+    
+    def test_unpaid_order_cancelled_on_expiry(self, inventory, clock):
+        """测试超时未支付订单自动取消"""
+        service = self._service(inventory, clock)
+        assert inventory.get_stock("P001") == 98
+        
+        clock.now = 61
+        assert service.expire_holds() == ["ORD001"]
+        assert service.get_order("ORD001").status == OrderStatus.CANCELLED
+        assert inventory.get_stock("P001") == 100
+    
+    def test_payment_after_expiry_rejected(self, inventory, clock):
+        """测试过期后支付被拒绝且不扣款"""
+        service = self._service(inventory, clock)
+        balance = service.payment_processor.get_balance(PaymentMethod.ALIPAY)
+        
+        clock.now = 61
+        with pytest.raises(ValueError):
+            service.process_payment("ORD001", PaymentMethod.ALIPAY)
+        
+        assert service.payment_processor.get_balance(PaymentMethod.ALIPAY) == balance
+        assert inventory.get_stock("P001") == 100
+    
+    def test_paid_order_keeps_stock(self, inventory, clock):
+        """测试已支付订单不受过期影响"""
+        service = self._service(inventory, clock)
+        service.process_payment("ORD001", PaymentMethod.ALIPAY)
+        
+        clock.now = 120
+        assert service.expire_holds() == []
+        assert service.get_order("ORD001").status == OrderStatus.PAID
+        assert inventory.get_stock("P001") == 98
+    
+    def test_cancel_confirmed_order_releases_hold(self, inventory, clock):
+        """测试取消暂扣中的订单"""
+        service = self._service(inventory, clock)
+        service.cancel_order("ORD001")
+        
+        assert inventory.get_stock("P001") == 100
+        clock.now = 120
+        assert service.expire_holds() == []
+        assert inventory.get_stock("P001") == 100
+    
+    def test_settle_payments_commits_hold(self, inventory, clock):
+        """测试批量支付的订单转为正式扣减，不再过期"""
+        service = self._service(inventory, clock)
+        
+        assert service.settle_payments([("ORD001", 100.0, PaymentMethod.ALIPAY)]) == {
+            "ORD001": ("success", "PAY_ORD001")
+        }
+        clock.now = 120
+        assert service.expire_holds() == []
+        assert service.get_order("ORD001").status == OrderStatus.PAID
+        assert inventory.get_stock("P001") == 98
+    
+    def test_settle_payments_after_expiry_rejected(self, inventory, clock):
+        """测试暂扣过期后批量支付被拒绝且不扣款"""
+        service = self._service(inventory, clock)
+        balance = service.payment_processor.get_balance(PaymentMethod.ALIPAY)
+        
+        clock.now = 61
+        assert service.settle_payments([("ORD001", 100.0, PaymentMethod.ALIPAY)]) == {
+            "ORD001": ("invalid_state", None)
+        }
+        assert service.payment_processor.get_balance(PaymentMethod.ALIPAY) == balance
+        assert inventory.get_stock("P001") == 100
+    
+    def test_bulk_cancel_releases_holds(self, inventory, clock):
+        """测试批量取消暂扣中的订单"""
+        service = self._service(inventory, clock)
+        service.create_order("ORD002", "CUST001")
+        service.add_item_to_order("ORD002", "P001", 3, 50.0)
+        service.confirm_order("ORD002")
+        
+        progress = list(service.bulk_cancel(["ORD001", "ORD002"]))
+        
+        assert progress[-1]["cancelled"] == 2
+        assert progress[-1]["released_units"] == 5
+        assert inventory.get_stock("P001") == 100
+        clock.now = 120
+        assert service.expire_holds() == []
+        assert inventory.get_stock("P001") == 100
@@ -0,0 +1,92 @@
+"""
+ID生成模块单元测试
+"""
+
+import threading
+import pytest
+from .id_generator import EPOCH_MS, MAX_SEQUENCE, SnowflakeIdGenerator, parse_id
+
+
+class FakeClock:
+    """可手动设置的毫秒时钟"""
+    
+    def __init__(self, now: int):
+        self.now = now
+    
+    def __call__(self) -> int:
+        return self.now
+
+
+class TestSnowflakeIdGenerator:
+    """雪花ID生成器测试"""
+    
+    def test_id_layout(self):
+        """测试ID包含时间戳、工作进程编号和序号"""
+        clock = FakeClock(EPOCH_MS + 1000)
+        generator = SnowflakeIdGenerator(worker_id=5, clock=clock)
+        
+        first = parse_id(generator.next_id())
+        second = parse_id(generator.next_id())
+        
+        assert first == (EPOCH_MS + 1000, 5, 0)
+        assert second == (EPOCH_MS + 1000, 5, 1)
+    
+    def test_ids_increase_across_milliseconds(self):
+        """测试时间前进后序号归零且ID递增"""
+        clock = FakeClock(EPOCH_MS + 1000)
+        generator = SnowflakeIdGenerator(clock=clock)
+        first = generator.next_id()
+        generator.next_id()
+        
+        clock.now += 1
+        third = generator.next_id()
+        
+        assert third > first
+        assert parse_id(third).sequence == 0
+    
+    def test_sequence_overflow_borrows_next_millisecond(self):
+        """测试同一毫秒序号用完时借用下一毫秒"""
+        clock = FakeClock(EPOCH_MS + 1000)
+        generator = SnowflakeIdGenerator(clock=clock)
+        ids = [generator.next_id() for _ in range(MAX_SEQUENCE + 2)]
+        
+        assert ids == sorted(set(ids))
+        assert parse_id(ids[-1]) == (EPOCH_MS + 1001, 0, 0)
+    
+    def test_clock_moving_backwards_stays_monotonic(self):
+        """测试时钟回拨时ID仍然递增"""
+        clock = FakeClock(EPOCH_MS + 1000)
+        generator = SnowflakeIdGenerator(clock=clock)
+        first = generator.next_id()
+        
+        clock.now -= 500
+        second = generator.next_id()
+        
+        assert second > first
+        assert parse_id(second).timestamp_ms == EPOCH_MS + 1000
+    
+    def test_concurrent_ids_are_unique(self):
+        """测试多线程生成的ID不重复"""
+        generator = SnowflakeIdGenerator(worker_id=1023)
+        results = [[] for _ in range(8)]
+        
+        def worker(index: int) -> None:
+            results[index].extend(generator.next_id() for _ in range(2000))
+        
+        threads = [threading.Thread(target=worker, args=(i,)) for i in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        
+        ids = [value for result in results for value in result]
+        assert len(set(ids)) == len(ids)
+        assert all(0 < value < 1 << 63 for value in ids)
+        assert all(result == sorted(result) for result in results)
+    
+    def test_invalid_worker_id(self):
+        """测试工作进程编号超出范围"""
+        with pytest.raises(ValueError):
+            SnowflakeIdGenerator(worker_id=1024)
+        with pytest.raises(ValueError):
+            SnowflakeIdGenerator(worker_id=-1)
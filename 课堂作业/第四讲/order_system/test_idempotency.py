@@ -0,0 +1,149 @@
+"""
+幂等键模块单元测试
+"""
+
+import asyncio
+import threading
+import pytest
+from .idempotency import IdempotencyKeyReusedError, IdempotencyStore
+
+
+class FakeClock:
+    """可手动推进的时钟"""
+    
+    def __init__(self):
+        self.now = 0.0
+    
+    def __call__(self) -> float:
+        return self.now
+
+
+class TestIdempotencyStore:
+    """幂等键存储测试"""
+    
+    def test_first_request_executes(self):
+        """测试首次请求由调用方执行"""
+        store = IdempotencyStore()
+        
+        record, owner = store.begin("k1", "POST /a")
+        
+        assert owner
+        assert not record.done
+        assert len(store) == 1
+    
+    def test_completed_request_is_replayed(self):
+        """测试完成后的重试返回缓存的响应"""
+        store = IdempotencyStore()
+        record, _ = store.begin("k1", "POST /a")
+        store.complete(record, (201, {}, b"ok"))
+        
+        replay, owner = store.begin("k1", "POST /a")
+        
+        assert not owner
+        assert replay is record
+        assert replay.response == (201, {}, b"ok")
+    
+    def test_key_reused_for_different_request(self):
+        """测试幂等键用于不同请求时报错"""
+        store = IdempotencyStore()
+        store.begin("k1", "POST /a")
+        
+        with pytest.raises(IdempotencyKeyReusedError):
+            store.begin("k1", "POST /b")
+    
+    def test_concurrent_duplicates_wait_for_first(self):
+        """测试并发的重复请求等待首次执行的结果"""
+        store = IdempotencyStore()
+        record, _ = store.begin("k1", "POST /a")
+        results = []
+        
+        def retry():
+            duplicate, owner = store.begin("k1", "POST /a")
+            results.append((owner, duplicate.wait(timeout=5)))
+        
+        threads = [threading.Thread(target=retry) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        store.complete(record, "response")
+        for thread in threads:
+            thread.join()
+        
+        assert results == [(False, "response")] * 4
+    
+    def test_wait_async(self):
+        """测试异步等待首次执行的结果"""
+        store = IdempotencyStore()
+        record, _ = store.begin("k1", "POST /a")
+        threading.Timer(0.05, store.complete, args=(record, "response")).start()
+        
+        duplicate, _ = store.begin("k1", "POST /a")
+        
+        assert asyncio.run(duplicate.wait_async()) == "response"
+    
+    def test_abandon_lets_retry_execute(self):
+        """测试放弃执行后重试重新执行"""
+        store = IdempotencyStore()
+        record, _ = store.begin("k1", "POST /a")
+        duplicate, _ = store.begin("k1", "POST /a")
+        
+        store.abandon(record)
+        
+        assert duplicate.wait(timeout=1) is None
+        _, owner = store.begin("k1", "POST /a")
+        assert owner
+    
+    def test_completed_record_expires(self):
+        """测试已完成记录过期后重新执行"""
+        clock = FakeClock()
+        store = IdempotencyStore(ttl=10.0, clock=clock)
+        record, _ = store.begin("k1", "POST /a")
+        clock.now = 100.0
+        store.complete(record, "response")
+        
+        clock.now = 109.0
+        assert not store.begin("k1", "POST /a")[1]
+        clock.now = 110.0
+        assert store.begin("k1", "POST /a")[1]
+    
+    def test_lru_eviction_skips_in_flight(self):
+        """测试超出上限时淘汰最久未使用的已完成记录，执行中的记录保留"""
+        store = IdempotencyStore(max_entries=2)
+        in_flight, _ = store.begin("k1", "r1")
+        done, _ = store.begin("k2", "r2")
+        store.complete(done, "r2")
+        
+        store.begin("k3", "r3")
+        
+        assert len(store) == 2
+        assert store.begin("k1", "r1")[0] is in_flight
+        assert store.begin("k2", "r2")[1]
+    
+    def test_replay_refreshes_lru_order(self):
+        """测试命中缓存的记录变为最近使用"""
+        store = IdempotencyStore(max_entries=2)
+        for key in ("k1", "k2"):
+            record, _ = store.begin(key, key)
+            store.complete(record, key)
+        store.begin("k1", "k1")
+        
+        record, _ = store.begin("k3", "k3")
+        
+        assert not store.begin("k1", "k1")[1]
+    
+    def test_clear_keeps_in_flight(self):
+        """测试清空时保留执行中的记录"""
+        store = IdempotencyStore()
+        done, _ = store.begin("k1", "r1")
+        store.complete(done, "r1")
+        store.begin("k2", "r2")
+        
+        store.clear()
+        
+        assert len(store) == 1
+    
+    def test_invalid_arguments(self):
+        """测试无效参数"""
+        with pytest.raises(ValueError):
+            IdempotencyStore(ttl=0)
+        with pytest.raises(ValueError):
+            IdempotencyStore(max_entries=0)
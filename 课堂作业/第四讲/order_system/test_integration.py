@@ -237,7 +237,8 @@ class TestCompleteOrderWorkflow:
         # 4. 支付
         response = requests.post(
             f"{BASE_URL}/api/orders/{order_id}/payment",
-            json={"payment_method": "alipay"}
+            json={"payment_method": "alipay"},
+            params={"wait": 5}
         )
         assert response.status_code == 200
         data = response.json()
@@ -333,7 +334,8 @@ class TestCompleteOrderWorkflow:
             # 使用不同支付方式
             response = requests.post(
                 f"{BASE_URL}/api/orders/{order_id}/payment",
-                json={"payment_method": method}
+                json={"payment_method": method},
+                params={"wait": 5}
             )
             assert response.status_code == 200
             assert response.json()["status"] == "paid"
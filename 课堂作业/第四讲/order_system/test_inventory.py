@@ -2,8 +2,11 @@
 库存模块单元测试
 """
 
+import threading
 import pytest
-from .inventory import Inventory, InsufficientStockError, ProductNotFoundError
+from .inventory import (
+    Inventory, ConcurrentInventory, InsufficientStockError, ProductNotFoundError
+)
 
 
 class TestInventoryBasic:
@@ -60,6 +63,13 @@ class TestInventoryBasic:
         inventory = Inventory()
         with pytest.raises(ProductNotFoundError):
             inventory.get_stock("P999")
+    
+    def test_has_product(self):
+        """测试商品是否存在"""
+        inventory = Inventory()
+        inventory.add_product("P001", 100)
+        assert inventory.has_product("P001")
+        assert not inventory.has_product("P999")
 
 
 class TestInventoryAvailability:
@@ -174,6 +184,94 @@ class TestInventoryRelease:
             inventory.release_stock("P001", -10)
 
 
+class TestInventoryBatch:
+    """批量预留/释放测试"""
+    
+    def test_reserve_many_success(self):
+        """测试批量预留成功"""
+        inventory = Inventory()
+        inventory.add_product("P001", 100)
+        inventory.add_product("P002", 50)
+        
+        inventory.reserve_many([("P001", 30), ("P002", 10), ("P001", 20)])
+        
+        assert inventory.get_stock("P001") == 50
+        assert inventory.get_stock("P002") == 40
+    
+    def test_reserve_many_insufficient_is_atomic(self):
+        """测试批量预留失败时库存不变"""
+        inventory = Inventory()
+        inventory.add_product("P001", 100)
+        inventory.add_product("P002", 5)
+        
+        with pytest.raises(InsufficientStockError):
+            inventory.reserve_many([("P001", 30), ("P002", 10)])
+        
+        assert inventory.get_stock("P001") == 100
+        assert inventory.get_stock("P002") == 5
+    
+    def test_reserve_many_duplicate_lines_aggregated(self):
+        """测试同一商品多行合计超出库存"""
+        inventory = Inventory()
+        inventory.add_product("P001", 10)
+        
+        with pytest.raises(InsufficientStockError):
+            inventory.reserve_many([("P001", 6), ("P001", 6)])
+        
+        assert inventory.get_stock("P001") == 10
+    
+    def test_reserve_many_nonexistent_is_atomic(self):
+        """测试批量预留包含不存在的商品"""
+        inventory = Inventory()
+        inventory.add_product("P001", 100)
+        
+        with pytest.raises(ProductNotFoundError):
+            inventory.reserve_many([("P001", 30), ("P999", 1)])
+        
+        assert inventory.get_stock("P001") == 100
+    
+    def test_reserve_many_invalid_quantity(self):
+        """测试批量预留无效数量"""
+        inventory = Inventory()
+        inventory.add_product("P001", 100)
+        
+        with pytest.raises(ValueError):
+            inventory.reserve_many([("P001", 0)])
+    
+    def test_release_many(self):
+        """测试批量释放"""
+        inventory = Inventory()
+        inventory.add_product("P001", 100)
+        inventory.add_product("P002", 50)
+        inventory.reserve_many([("P001", 30), ("P002", 10)])
+        
+        inventory.release_many([("P001", 30), ("P002", 10)])
+        
+        assert inventory.get_all_stock() == {"P001": 100, "P002": 50}
+    
+    def test_concurrent_reserve_many(self):
+        """测试线程安全库存的批量预留"""
+        inventory = ConcurrentInventory(stripes=4)
+        inventory.add_product("P001", 100)
+        inventory.add_product("P002", 100)
+        
+        def worker():
+            for _ in range(50):
+                try:
+                    inventory.reserve_many([("P001", 1), ("P002", 1)])
+                except InsufficientStockError:
+                    pass
+        
+        threads = [threading.Thread(target=worker) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        
+        assert inventory.get_stock("P001") == 0
+        assert inventory.get_stock("P002") == 0
+
+
 class TestInventoryMultipleProducts:
     """多商品测试"""
     
@@ -219,6 +317,61 @@ class TestInventoryMultipleProducts:
         assert inventory.get_all_stock() == {}
 
 
+class TestConcurrentInventory:
+    """线程安全库存测试"""
+    
+    def test_basic_operations(self):
+        """测试基本操作与普通库存一致"""
+        inventory = ConcurrentInventory(stripes=4)
+        inventory.add_product("P001", 100)
+        inventory.reserve_stock("P001", 30)
+        inventory.release_stock("P001", 10)
+        
+        assert inventory.get_stock("P001") == 80
+        assert inventory.get_all_stock() == {"P001": 80}
+        
+        inventory.remove_product("P001")
+        with pytest.raises(ProductNotFoundError):
+            inventory.get_stock("P001")
+    
+    def test_invalid_stripes(self):
+        """测试无效的分段数量"""
+        with pytest.raises(ValueError):
+            ConcurrentInventory(stripes=0)
+    
+    def test_concurrent_reserve_no_oversell(self):
+        """测试并发预留同一商品不会超卖"""
+        inventory = ConcurrentInventory()
+        inventory.add_product("P001", 500)
+        successes = []
+        
+        def worker():
+            count = 0
+            for _ in range(200):
+                try:
+                    inventory.reserve_stock("P001", 1)
+                    count += 1
+                except InsufficientStockError:
+                    pass
+            successes.append(count)
+        
+        threads = [threading.Thread(target=worker) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        
+        assert sum(successes) == 500
+        assert inventory.get_stock("P001") == 0
+    
+    def test_clear(self):
+        """测试清空库存"""
+        inventory = ConcurrentInventory()
+        inventory.add_product("P001", 100)
+        inventory.clear()
+        assert inventory.get_all_stock() == {}
+
+
 # Fixtures
 @pytest.fixture
 def inventory_with_products():
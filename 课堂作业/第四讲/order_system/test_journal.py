@@ -0,0 +1,228 @@
+"""
+事件日志模块单元测试
+"""
+
+import os
+import threading
+import pytest
+from .journal import EventJournal
+from .holds import StockHoldManager
+from .inventory import Inventory, ConcurrentInventory
+from .order import OrderService, OrderStatus
+from .payment import PaymentProcessor, PaymentMethod
+
+
+def new_state():
+    """创建一组空服务"""
+    inventory = Inventory()
+    payment_processor = PaymentProcessor()
+    order_service = OrderService(inventory, payment_processor)
+    return {"stock": inventory, "payment": payment_processor, "order": order_service}
+
+
+def state_of(services):
+    """服务状态的可比较表示"""
+    return {name: service.snapshot_state() for name, service in services.items()}
+
+
+def run_workload(services):
+    """执行包含各类事件的业务流程"""
+    inventory = services["stock"]
+    order_service = services["order"]
+    inventory.add_product("P001", 100)
+    inventory.add_product("P002", 50)
+    inventory.add_product("P003", 10)
+    inventory.remove_product("P003")
+    
+    order_service.create_order("ORD001", "CUST001")
+    order_service.add_item_to_order("ORD001", "P001", 2, 50.0)
+    order_service.add_item_to_order("ORD001", "P002", 1, 30.0)
+    order_service.confirm_order("ORD001")
+    order_service.process_payment("ORD001", PaymentMethod.ALIPAY)
+    order_service.ship_order("ORD001")
+    
+    order_service.create_order("ORD002", "CUST002")
+    order_service.add_item_to_order("ORD002", "P002", 3, 30.0)
+    order_service.confirm_order("ORD002")
+    order_service.process_payment("ORD002", PaymentMethod.WECHAT)
+    order_service.cancel_order("ORD002")
+    
+    order_service.create_order("ORD003", "CUST001")
+    order_service.add_item_to_order("ORD003", "P001", 1, 50.0)
+    order_service.confirm_order("ORD003")
+    services["payment"].set_balance(PaymentMethod.PAYPAL, 1.0)
+
+
+@pytest.fixture
+def journal_dir(tmp_path):
+    """日志目录"""
+    return str(tmp_path / "journal")
+
+
+class TestEventJournal:
+    """事件日志测试"""
+    
+    def test_replay_restores_state(self, journal_dir):
+        """测试重启后重放日志恢复全部状态"""
+        services = new_state()
+        journal = EventJournal(journal_dir)
+        assert journal.recover(services) == 0
+        run_workload(services)
+        journal.close()
+        
+        restored = new_state()
+        journal = EventJournal(journal_dir)
+        assert journal.recover(restored) == journal.last_seq > 0
+        journal.close()
+        
+        assert state_of(restored) == state_of(services)
+        order_service = restored["order"]
+        assert order_service.get_order("ORD001").total_amount == 130.0
+        assert [o.order_id for o in order_service.find_orders(status=OrderStatus.CANCELLED)] == ["ORD002"]
+        assert restored["payment"].get_balance(PaymentMethod.WECHAT) == 6000.0
+    
+    def test_recovered_services_keep_journaling(self, journal_dir):
+        """测试恢复后继续记录事件"""
+        services = new_state()
+        journal = EventJournal(journal_dir)
+        journal.recover(services)
+        services["stock"].add_product("P001", 10)
+        journal.close()
+        
+        services = new_state()
+        journal = EventJournal(journal_dir)
+        journal.recover(services)
+        services["stock"].reserve_stock("P001", 4)
+        journal.close()
+        
+        restored = new_state()
+        journal = EventJournal(journal_dir)
+        assert journal.recover(restored) == 2
+        journal.close()
+        assert restored["stock"].get_stock("P001") == 6
+    
+    def test_snapshot_replays_only_tail(self, journal_dir):
+        """测试生成快照后只重放快照之后的事件"""
+        services = new_state()
+        journal = EventJournal(journal_dir, state_factory=new_state)
+        journal.recover(services)
+        run_workload(services)
+        journal.sync()
+        snapshot_seq = journal.compact()
+        assert snapshot_seq == journal.last_seq
+        
+        services["stock"].add_product("P004", 5)
+        services["order"].complete_order("ORD001")
+        journal.close()
+        
+        restored = new_state()
+        journal = EventJournal(journal_dir)
+        assert journal.recover(restored) == 2
+        journal.close()
+        assert state_of(restored) == state_of(services)
+    
+    def test_compact_removes_sealed_segments(self, journal_dir):
+        """测试快照生成后删除旧日志段"""
+        services = new_state()
+        journal = EventJournal(journal_dir, state_factory=new_state)
+        journal.recover(services)
+        for i in range(3):
+            services["stock"].add_product(f"P{i}", 1)
+            journal.compact()
+        journal.close()
+        
+        segments = [name for name in os.listdir(journal_dir) if name.endswith(".log")]
+        assert len(segments) == 1
+    
+    def test_automatic_snapshot(self, journal_dir):
+        """测试达到快照间隔后自动生成快照"""
+        services = new_state()
+        journal = EventJournal(journal_dir, snapshot_every=10, state_factory=new_state)
+        journal.recover(services)
+        for i in range(50):
+            services["stock"].add_product(f"P{i}", 1)
+            journal.sync()
+        journal.close()
+        
+        restored = new_state()
+        journal = EventJournal(journal_dir)
+        assert journal.recover(restored) < 50
+        journal.close()
+        assert len(restored["stock"].get_all_stock()) == 50
+    
+    def test_torn_last_line_is_ignored(self, journal_dir):
+        """测试忽略崩溃时未写完的最后一行"""
+        services = new_state()
+        journal = EventJournal(journal_dir)
+        journal.recover(services)
+        services["stock"].add_product("P001", 10)
+        journal.close()
+        
+        segment = sorted(name for name in os.listdir(journal_dir) if name.endswith(".log"))[-1]
+        with open(os.path.join(journal_dir, segment), "ab") as f:
+            f.write(b'[2,"stock","added",{"product_id":"P0')
+        
+        restored = new_state()
+        journal = EventJournal(journal_dir)
+        assert journal.recover(restored) == 1
+        journal.close()
+        assert restored["stock"].get_all_stock() == {"P001": 10}
+    
+    def test_group_commit(self, journal_dir):
+        """测试多线程并发写入的事件全部落盘且序号连续"""
+        inventory = ConcurrentInventory()
+        journal = EventJournal(journal_dir)
+        journal.recover({"stock": inventory})
+        
+        def worker(n):
+            for i in range(200):
+                inventory.add_product(f"P{n}", 1)
+                journal.sync()
+        
+        threads = [threading.Thread(target=worker, args=(n,)) for n in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        journal.close()
+        
+        restored = Inventory()
+        journal = EventJournal(journal_dir)
+        assert journal.recover({"stock": restored}) == 1600
+        journal.close()
+        assert restored.get_all_stock() == {f"P{n}": 200 for n in range(8)}
+    
+    def test_closed_journal(self, journal_dir):
+        """测试关闭后服务不再记录事件"""
+        services = new_state()
+        journal = EventJournal(journal_dir)
+        journal.recover(services)
+        journal.close()
+        
+        services["stock"].add_product("P001", 1)
+        with pytest.raises(ValueError, match="事件日志未打开"):
+            journal.append("stock", "cleared", {})
+    
+    def test_resume_holds(self, journal_dir):
+        """测试恢复后为已确认订单重新登记暂扣"""
+        services = new_state()
+        journal = EventJournal(journal_dir)
+        journal.recover(services)
+        run_workload(services)
+        journal.close()
+        
+        restored = new_state()
+        restored["order"] = OrderService(
+            restored["stock"], restored["payment"],
+            StockHoldManager(restored["stock"], ttl=60.0)
+        )
+        journal = EventJournal(journal_dir)
+        journal.recover(restored)
+        
+        order_service = restored["order"]
+        assert order_service.resume_holds() == 1
+        assert order_service.hold_manager.has_hold("ORD003")
+        
+        order_service.cancel_order("ORD003")
+        assert restored["stock"].get_stock("P001") == 98
+        journal.close()
@@ -0,0 +1,81 @@
+"""
+余额账本模块单元测试
+"""
+
+import threading
+import pytest
+from .ledger import BalanceLedger
+
+
+class TestBalanceLedger:
+    """分段余额账本测试"""
+    
+    def test_initial_balance(self):
+        """测试初始余额均分到子余额"""
+        ledger = BalanceLedger({"A": 100.01}, stripes=4)
+        
+        assert ledger.balance("A") == 100.01
+        assert sum(ledger._stripes["A"]) == 10001
+        assert max(ledger._stripes["A"]) - min(ledger._stripes["A"]) <= 1
+    
+    def test_debit_and_credit(self):
+        """测试扣款和入账"""
+        ledger = BalanceLedger({"A": 100.0})
+        
+        assert ledger.try_debit("A", 30.5)
+        ledger.credit("A", 0.5)
+        
+        assert ledger.balance("A") == 70.0
+    
+    def test_debit_rebalances_when_stripe_runs_dry(self):
+        """测试子余额不足时汇总全部子余额扣款"""
+        ledger = BalanceLedger({"A": 100.0}, stripes=4)
+        
+        assert ledger.try_debit("A", 90.0)
+        assert ledger.balance("A") == 10.0
+        assert ledger.try_debit("A", 10.0)
+        assert ledger.balance("A") == 0.0
+    
+    def test_insufficient_balance(self):
+        """测试余额不足时不扣款"""
+        ledger = BalanceLedger({"A": 50.0}, stripes=4)
+        
+        assert not ledger.try_debit("A", 50.01)
+        assert ledger.balance("A") == 50.0
+    
+    def test_set_balance(self):
+        """测试设置余额"""
+        ledger = BalanceLedger({"A": 50.0, "B": 1.0})
+        ledger.set_balance("A", 5.0)
+        
+        assert ledger.balances() == {"A": 5.0, "B": 1.0}
+    
+    def test_invalid_arguments(self):
+        """测试无效参数"""
+        with pytest.raises(ValueError, match="子余额数量必须大于0"):
+            BalanceLedger({"A": 1.0}, stripes=0)
+        
+        ledger = BalanceLedger({"A": 1.0})
+        with pytest.raises(ValueError, match="金额不能为负数"):
+            ledger.try_debit("A", -1.0)
+        with pytest.raises(KeyError):
+            ledger.try_debit("B", 1.0)
+    
+    def test_concurrent_debits_never_overdraw(self):
+        """测试并发扣款不会透支"""
+        ledger = BalanceLedger({"A": 1000.0}, stripes=8)
+        succeeded = [0] * 8
+        
+        def worker(index):
+            for _ in range(500):
+                if ledger.try_debit("A", 1.0):
+                    succeeded[index] += 1
+        
+        threads = [threading.Thread(target=worker, args=(n,)) for n in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        
+        assert sum(succeeded) == 1000
+        assert ledger.balance("A") == 0.0
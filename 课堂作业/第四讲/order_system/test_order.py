@@ -3,9 +3,11 @@
 """
 
 import pytest
+from datetime import datetime
 from .order import Order, OrderItem, OrderService, OrderStatus
 from .inventory import Inventory, InsufficientStockError
 from .payment import PaymentProcessor, PaymentMethod, InsufficientFundsError
+from .id_generator import SnowflakeIdGenerator, parse_id
 
 
 class TestOrderItem:
@@ -75,6 +77,23 @@ class TestOrder:
         assert order.item_count == 3
         assert order.total_amount == 290.0
     
+    def test_serialization_cache(self):
+        """测试序列化结果在订单修改前复用、修改后刷新"""
+        order = Order("ORD001", "CUST001")
+        order.add_item("P001", 2, 50.0)
+        
+        first = order.to_dict()
+        assert order.to_dict() is first
+        assert order.to_json() is order.to_json()
+        
+        order.add_item("P002", 1, 10.0)
+        assert order.to_dict()["total_amount"] == 110.0
+        assert len(order.to_dict()["items"]) == 2
+        
+        order.confirm()
+        assert order.to_dict()["status"] == "confirmed"
+        assert b'"status":"confirmed"' in order.to_json()
+    
     def test_confirm_order(self):
         """测试确认订单"""
         order = Order("ORD001", "CUST001")
@@ -158,6 +177,20 @@ class TestOrderService:
         assert order.order_id == "ORD001"
         assert order.customer_id == "CUST001"
     
+    def test_next_order_id(self):
+        """测试服务端生成的订单ID按生成顺序排序并携带工作进程编号"""
+        service = OrderService(Inventory(), PaymentProcessor(),
+                               id_generator=SnowflakeIdGenerator(worker_id=7))
+        
+        order_ids = [service.next_order_id() for _ in range(100)]
+        for order_id in order_ids:
+            service.create_order(order_id, "CUST001")
+        
+        assert order_ids == sorted(set(order_ids))
+        assert all(len(order_id) == 22 for order_id in order_ids)
+        assert parse_id(int(order_ids[0][3:])).worker_id == 7
+        assert [order.order_id for order in service.find_orders(limit=100)] == order_ids
+    
     def test_create_duplicate_order(self):
         """测试创建重复订单"""
         inventory = Inventory()
@@ -256,6 +289,39 @@ class TestOrderServiceWithInventory:
         
         assert inventory.get_stock("P001") == 98
         assert inventory.get_stock("P002") == 49
+    
+    def test_confirm_order_partial_shortage_reserves_nothing(self):
+        """测试部分商品库存不足时不预留任何商品"""
+        inventory = Inventory()
+        inventory.add_product("P001", 100)
+        inventory.add_product("P002", 1)
+        
+        service = OrderService(inventory, PaymentProcessor())
+        service.create_order("ORD001", "CUST001")
+        service.add_item_to_order("ORD001", "P001", 2, 50.0)
+        service.add_item_to_order("ORD001", "P002", 5, 10.0)
+        
+        with pytest.raises(InsufficientStockError):
+            service.confirm_order("ORD001")
+        
+        assert inventory.get_stock("P001") == 100
+        assert inventory.get_stock("P002") == 1
+        assert service.get_order("ORD001").status == OrderStatus.CREATED
+    
+    def test_confirm_order_twice_releases_stock(self):
+        """测试重复确认订单时不会重复扣减库存"""
+        inventory = Inventory()
+        inventory.add_product("P001", 100)
+        
+        service = OrderService(inventory, PaymentProcessor())
+        service.create_order("ORD001", "CUST001")
+        service.add_item_to_order("ORD001", "P001", 2, 50.0)
+        service.confirm_order("ORD001")
+        
+        with pytest.raises(ValueError):
+            service.confirm_order("ORD001")
+        
+        assert inventory.get_stock("P001") == 98
 
 
 class TestOrderServiceWithPayment:
@@ -430,6 +496,374 @@ class TestOrderServiceWithFixtures:
         assert inventory.get_stock("P002") == 49
 
 
+class TestCompactOrders:
+    """紧凑模式（列式订单项）测试"""
+    
+    def test_compact_order_items(self):
+        """测试列式存储中的订单项"""
+        service = OrderService(Inventory(), PaymentProcessor(), compact=True)
+        first = service.create_order("ORD001", "CUST001")
+        second = service.create_order("ORD002", "CUST002")
+        
+        # 交替添加，验证各订单只看到自己的订单项
+        first.add_item("P001", 2, 50.0)
+        second.add_item("P002", 1, 9.99)
+        first.add_item("P003", 3, 30.0)
+        
+        assert first.item_count == 2
+        assert [(i.product_id, i.quantity, i.price) for i in first.items] == [
+            ("P001", 2, 50.0), ("P003", 3, 30.0)
+        ]
+        assert first.total_amount == 190.0
+        assert second.to_dict()["items"] == [
+            {"product_id": "P002", "quantity": 1, "price": 9.99, "total_price": 9.99}
+        ]
+    
+    def test_compact_order_workflow(self):
+        """测试紧凑模式下完整订单流程"""
+        inventory = Inventory()
+        inventory.add_product("P001", 10)
+        service = OrderService(inventory, PaymentProcessor(), compact=True)
+        
+        service.create_order("ORD001", "CUST001")
+        service.add_item_to_order("ORD001", "P001", 2, 50.0)
+        service.confirm_order("ORD001")
+        service.process_payment("ORD001", PaymentMethod.ALIPAY)
+        service.cancel_order("ORD001")
+        
+        assert inventory.get_stock("P001") == 10
+        assert service.get_order("ORD001").status == OrderStatus.CANCELLED
+    
+    def test_compact_quantity_out_of_range(self):
+        """测试超出数量列范围的订单项被拒绝"""
+        service = OrderService(Inventory(), PaymentProcessor(), compact=True)
+        order = service.create_order("ORD001", "CUST001")
+        
+        with pytest.raises(ValueError, match="数量超出范围"):
+            order.add_item("P001", 2 ** 32, 1.0)
+        assert order.item_count == 0
+        assert len(service._columns) == 0
+    
+    def test_slots(self):
+        """测试订单对象不再使用实例字典"""
+        order = Order("ORD001", "CUST001")
+        assert not hasattr(order, "__dict__")
+        assert isinstance(order.created_at, datetime)
+
+
+class TestOrderServiceIndexes:
+    """订单二级索引测试"""
+    
+    def test_find_by_customer(self, setup_service):
+        """测试按客户查询"""
+        service, _, _ = setup_service
+        service.create_order("ORD001", "CUST001")
+        service.create_order("ORD002", "CUST002")
+        service.create_order("ORD003", "CUST001")
+        
+        orders = service.find_orders(customer_id="CUST001")
+        assert [order.order_id for order in orders] == ["ORD001", "ORD003"]
+        assert service.find_orders(customer_id="CUST999") == []
+    
+    def test_status_index_follows_transitions(self, setup_service):
+        """测试状态索引随状态变化更新"""
+        service, _, _ = setup_service
+        service.create_order("ORD001", "CUST001")
+        service.add_item_to_order("ORD001", "P001", 1, 50.0)
+        service.create_order("ORD002", "CUST001")
+        
+        service.confirm_order("ORD001")
+        assert [o.order_id for o in service.find_orders(status=OrderStatus.CONFIRMED)] == ["ORD001"]
+        
+        service.process_payment("ORD001", PaymentMethod.ALIPAY)
+        service.ship_order("ORD001")
+        service.complete_order("ORD001")
+        service.cancel_order("ORD002")
+        
+        assert service.find_orders(status=OrderStatus.CONFIRMED) == []
+        assert [o.order_id for o in service.find_orders(status=OrderStatus.COMPLETED)] == ["ORD001"]
+        assert [o.order_id for o in service.find_orders(
+            customer_id="CUST001", status=OrderStatus.CANCELLED)] == ["ORD002"]
+        assert service.count_orders(OrderStatus.COMPLETED) == 1
+        assert service.count_orders() == 2
+    
+    def test_find_by_time_range(self, setup_service):
+        """测试按创建时间范围查询"""
+        service, _, _ = setup_service
+        first = service.create_order("ORD001", "CUST001")
+        second = service.create_order("ORD002", "CUST002")
+        
+        since = service.find_orders(since=second.created_at)
+        assert second in since
+        assert service.find_orders(until=first.created_at) == []
+        assert [o.order_id for o in service.find_orders()] == ["ORD001", "ORD002"]
+    
+    def test_keyset_pagination(self, setup_service):
+        """测试按游标分页遍历全部订单"""
+        service, _, _ = setup_service
+        for i in range(25):
+            service.create_order(f"ORD{i:03d}", "CUST001" if i % 2 else "CUST002")
+        
+        for customer_id in (None, "CUST001"):
+            seen = []
+            after = None
+            while True:
+                page = service.find_orders(customer_id=customer_id, after=after, limit=10)
+                seen.extend(order.order_id for order in page)
+                if len(page) < 10:
+                    break
+                after = page[-1].sort_key
+            
+            expected = service.find_orders(customer_id=customer_id)
+            assert seen == [order.order_id for order in expected]
+    
+    def test_clear_resets_indexes(self, setup_service):
+        """测试清空订单时清空索引"""
+        service, _, _ = setup_service
+        service.create_order("ORD001", "CUST001")
+        service.clear()
+        
+        assert service.find_orders(customer_id="CUST001") == []
+        assert service.find_orders(status=OrderStatus.CREATED) == []
+        assert service.count_orders() == 0
+
+
+class TestBulkCancel:
+    """批量取消订单测试"""
+    
+    def _place(self, service, order_id, customer_id, product_id, quantity, status):
+        service.create_order(order_id, customer_id)
+        service.add_item_to_order(order_id, product_id, quantity, 10.0)
+        if status in (OrderStatus.CONFIRMED, OrderStatus.PAID):
+            service.confirm_order(order_id)
+        if status == OrderStatus.PAID:
+            service.process_payment(order_id, PaymentMethod.ALIPAY)
+    
+    def test_cancel_by_product(self, setup_service):
+        """测试按商品批量取消，库存和退款一次归还"""
+        service, inventory, payment_processor = setup_service
+        balance = payment_processor.get_balance(PaymentMethod.ALIPAY)
+        self._place(service, "ORD001", "CUST001", "P001", 2, OrderStatus.CREATED)
+        self._place(service, "ORD002", "CUST002", "P001", 3, OrderStatus.CONFIRMED)
+        self._place(service, "ORD003", "CUST001", "P001", 4, OrderStatus.PAID)
+        self._place(service, "ORD004", "CUST001", "P002", 5, OrderStatus.PAID)
+        
+        progress = list(service.bulk_cancel(product_id="P001", chunk_size=2))
+        
+        assert [p["processed"] for p in progress] == [2, 3]
+        assert progress[-1]["cancelled"] == 3
+        assert progress[-1]["refunded"] == 1
+        assert progress[-1]["refund_amount"] == 40.0
+        assert progress[-1]["released_units"] == 7
+        assert inventory.get_stock("P001") == 100
+        assert inventory.get_stock("P002") == 45
+        assert payment_processor.get_balance(PaymentMethod.ALIPAY) == balance - 50.0
+        assert service.get_order("ORD004").status == OrderStatus.PAID
+        assert service.count_orders(OrderStatus.CANCELLED) == 3
+    
+    def test_order_paid_during_chunk_is_skipped(self, setup_service):
+        """测试处理期间被并发支付的订单单独记为失败，同批其他订单照常取消"""
+        service, inventory, payment_processor = setup_service
+        self._place(service, "ORD001", "CUST001", "P001", 2, OrderStatus.CONFIRMED)
+        self._place(service, "ORD002", "CUST001", "P001", 3, OrderStatus.CONFIRMED)
+        refund_batch = payment_processor.refund_batch
+        
+        def pay_then_refund(payment_ids):
+            service.process_payment("ORD002", PaymentMethod.ALIPAY)
+            return refund_batch(payment_ids)
+        
+        payment_processor.refund_batch = pay_then_refund
+        progress = list(service.bulk_cancel(["ORD001", "ORD002"]))
+        
+        assert progress[-1]["cancelled"] == 1
+        assert progress[-1]["released_units"] == 2
+        assert [error["order_id"] for error in progress[-1]["errors"]] == ["ORD002"]
+        assert service.get_order("ORD001").status == OrderStatus.CANCELLED
+        assert service.get_order("ORD002").status == OrderStatus.PAID
+        assert inventory.get_stock("P001") == 97
+    
+    def test_cancel_by_ids_reports_failures(self, setup_service):
+        """测试按订单ID批量取消时报告无法取消的订单"""
+        service, inventory, _ = setup_service
+        self._place(service, "ORD001", "CUST001", "P001", 2, OrderStatus.PAID)
+        self._place(service, "ORD002", "CUST001", "P001", 2, OrderStatus.PAID)
+        service.ship_order("ORD002")
+        
+        progress = list(service.bulk_cancel(["ORD001", "ORD002", "ORD999"]))
+        
+        assert progress[-1]["cancelled"] == 1
+        assert progress[-1]["failed"] == 2
+        assert {error["order_id"] for error in progress[-1]["errors"]} == {"ORD002", "ORD999"}
+        assert inventory.get_stock("P001") == 98
+    
+    def test_removed_product_fails_only_its_orders(self, setup_service):
+        """测试包含已下架商品的订单单独失败"""
+        service, inventory, _ = setup_service
+        self._place(service, "ORD001", "CUST001", "P001", 2, OrderStatus.CONFIRMED)
+        self._place(service, "ORD002", "CUST001", "P002", 2, OrderStatus.CONFIRMED)
+        inventory.remove_product("P002")
+        
+        progress = list(service.bulk_cancel(customer_id="CUST001"))
+        
+        assert progress[-1]["cancelled"] == 1
+        assert progress[-1]["errors"][0]["order_id"] == "ORD002"
+        assert service.get_order("ORD002").status == OrderStatus.CONFIRMED
+    
+    def test_matches_individual_cancellation(self, setup_service):
+        """测试批量取消与逐个取消的结果一致"""
+        service, inventory, payment_processor = setup_service
+        other_inventory = Inventory()
+        for product_id, quantity in inventory.get_all_stock().items():
+            other_inventory.add_product(product_id, quantity)
+        other = OrderService(other_inventory, PaymentProcessor())
+        for target in (service, other):
+            for i in range(6):
+                status = [OrderStatus.CREATED, OrderStatus.CONFIRMED, OrderStatus.PAID][i % 3]
+                self._place(target, f"ORD{i}", "CUST001", f"P00{i % 3 + 1}", i + 1, status)
+        
+        list(service.bulk_cancel([f"ORD{i}" for i in range(6)]))
+        for i in range(6):
+            other.cancel_order(f"ORD{i}")
+        
+        assert inventory.get_all_stock() == other_inventory.get_all_stock()
+        assert (payment_processor.get_balance(PaymentMethod.ALIPAY)
+                == other.payment_processor.get_balance(PaymentMethod.ALIPAY))
+    
+    def test_requires_ids_or_filter(self, setup_service):
+        """测试必须且只能指定订单ID或筛选条件"""
+        service, _, _ = setup_service
+        
+        with pytest.raises(ValueError):
+            service.bulk_cancel()
+        with pytest.raises(ValueError):
+            service.bulk_cancel(["ORD001"], customer_id="CUST001")
+
+
+class TestSettlePayments:
+    """批量支付测试"""
+    
+    def _confirmed(self, service, order_id, quantity, price):
+        """创建并确认订单"""
+        service.create_order(order_id, "CUST001")
+        service.add_item_to_order(order_id, "P001", quantity, price)
+        service.confirm_order(order_id)
+    
+    def test_settle_marks_orders_paid(self, setup_service):
+        """测试批量支付后订单与逐笔支付一样标记为已支付"""
+        service, inventory, payment_processor = setup_service
+        balance = payment_processor.get_balance(PaymentMethod.ALIPAY)
+        self._confirmed(service, "ORD001", 2, 50.0)
+        self._confirmed(service, "ORD002", 1, 30.0)
+        
+        results = service.settle_payments([("ORD002", 30.0, PaymentMethod.ALIPAY),
+                                           ("ORD001", 100.0, PaymentMethod.ALIPAY)])
+        
+        assert results == {"ORD002": ("success", "PAY_ORD002"),
+                           "ORD001": ("success", "PAY_ORD001")}
+        assert service.get_order("ORD001").status == OrderStatus.PAID
+        assert service.get_order("ORD001").payment_id == "PAY_ORD001"
+        assert payment_processor.get_balance(PaymentMethod.ALIPAY) == balance - 130.0
+        assert inventory.get_stock("P001") == 97
+        with pytest.raises(ValueError, match="只能支付已确认的订单"):
+            service.process_payment("ORD001", PaymentMethod.ALIPAY)
+    
+    def test_invalid_orders_not_charged(self, setup_service):
+        """测试不存在、未确认和金额不符的订单不扣款"""
+        service, _, payment_processor = setup_service
+        balance = payment_processor.get_balance(PaymentMethod.ALIPAY)
+        service.create_order("ORD001", "CUST001")
+        self._confirmed(service, "ORD002", 1, 30.0)
+        
+        results = service.settle_payments([("ORD999", 10.0, PaymentMethod.ALIPAY),
+                                           ("ORD001", 10.0, PaymentMethod.ALIPAY),
+                                           ("ORD002", 1.0, PaymentMethod.ALIPAY)])
+        
+        assert results == {"ORD999": ("not_found", None),
+                           "ORD001": ("invalid_state", None),
+                           "ORD002": ("amount_mismatch", None)}
+        assert payment_processor.get_balance(PaymentMethod.ALIPAY) == balance
+        assert payment_processor.get_all_payments() == {}
+        
+        service.process_payment("ORD002", PaymentMethod.ALIPAY)
+        assert service.get_order("ORD002").status == OrderStatus.PAID
+    
+    def test_insufficient_funds(self, setup_service):
+        """测试余额不足的订单保持已确认状态"""
+        service, _, payment_processor = setup_service
+        payment_processor.set_balance(PaymentMethod.WECHAT, 50.0)
+        self._confirmed(service, "ORD001", 1, 80.0)
+        
+        results = service.settle_payments([("ORD001", 80.0, PaymentMethod.WECHAT)])
+        
+        assert results == {"ORD001": ("insufficient_funds", "PAY_ORD001")}
+        assert service.get_order("ORD001").status == OrderStatus.CONFIRMED
+        assert payment_processor.get_balance(PaymentMethod.WECHAT) == 50.0
+
+
+class TestCheckout:
+    """一次下单测试"""
+    
+    def test_checkout_success(self, setup_service):
+        """测试一次完成创建、添加商品、确认和支付"""
+        service, inventory, _ = setup_service
+        
+        order = service.checkout("CUST001", [("P001", 2, 50.0), ("P002", 1, 30.0)],
+                                 PaymentMethod.ALIPAY)
+        
+        assert order.order_id.startswith("ORD")
+        assert order.status == OrderStatus.PAID
+        assert order.total_amount == 130.0
+        assert service.get_order(order.order_id) is order
+        assert inventory.get_stock("P001") == 98
+        assert inventory.get_stock("P002") == 49
+    
+    def test_checkout_with_order_id(self, setup_service):
+        """测试使用指定的订单ID"""
+        service, _, _ = setup_service
+        
+        order = service.checkout("CUST001", [("P001", 1, 10.0)], PaymentMethod.ALIPAY,
+                                 order_id="ORD001")
+        
+        assert order.order_id == "ORD001"
+        assert order.payment_id == "PAY_ORD001"
+    
+    def test_insufficient_stock_cancels_order(self, setup_service):
+        """测试库存不足时取消订单，不预留任何库存"""
+        service, inventory, _ = setup_service
+        
+        with pytest.raises(InsufficientStockError):
+            service.checkout("CUST001", [("P001", 2, 10.0), ("P002", 51, 10.0)],
+                             PaymentMethod.ALIPAY, order_id="ORD001")
+        
+        assert service.get_order("ORD001").status == OrderStatus.CANCELLED
+        assert inventory.get_stock("P001") == 100
+        assert inventory.get_stock("P002") == 50
+    
+    def test_payment_failure_releases_stock(self, setup_service):
+        """测试支付失败时取消订单并归还已预留的库存"""
+        service, inventory, payment_processor = setup_service
+        payment_processor.set_balance(PaymentMethod.WECHAT, 50.0)
+        
+        with pytest.raises(InsufficientFundsError):
+            service.checkout("CUST001", [("P001", 2, 50.0)], PaymentMethod.WECHAT,
+                             order_id="ORD001")
+        
+        assert service.get_order("ORD001").status == OrderStatus.CANCELLED
+        assert inventory.get_stock("P001") == 100
+        assert payment_processor.get_balance(PaymentMethod.WECHAT) == 50.0
+    
+    def test_invalid_cart(self, setup_service):
+        """测试购物车为空或订单项无效"""
+        service, _, _ = setup_service
+        
+        with pytest.raises(ValueError):
+            service.checkout("CUST001", [], PaymentMethod.ALIPAY)
+        with pytest.raises(ValueError):
+            service.checkout("CUST001", [("P001", 0, 10.0)], PaymentMethod.ALIPAY,
+                             order_id="ORD001")
+        assert service.get_order("ORD001").status == OrderStatus.CANCELLED
+
+
 # 参数化测试
 @pytest.mark.parametrize("product_id,quantity,price,expected_total", [
     ("P001", 2, 50.0, 100.0),
@@ -0,0 +1,158 @@
+"""
+订单归档模块单元测试
+"""
+
+import pytest
+from datetime import datetime, timedelta
+from .order_archive import OrderArchive
+from .inventory import Inventory
+from .order import Order, OrderService, OrderStatus
+from .payment import PaymentProcessor, PaymentMethod
+
+
+@pytest.fixture
+def archive():
+    """内存中的冷存储"""
+    archive = OrderArchive(cache_size=2)
+    yield archive
+    archive.close()
+
+
+@pytest.fixture
+def service(archive):
+    """带冷存储的订单服务"""
+    inventory = Inventory()
+    inventory.add_product("P001", 100)
+    return OrderService(inventory, PaymentProcessor(), archive=archive)
+
+
+def complete(service, order_id, customer_id="CUST001"):
+    """创建并走完整个订单流程"""
+    service.create_order(order_id, customer_id)
+    service.add_item_to_order(order_id, "P001", 2, 50.0)
+    service.confirm_order(order_id)
+    service.process_payment(order_id, PaymentMethod.ALIPAY)
+    service.ship_order(order_id)
+    service.complete_order(order_id)
+
+
+class TestOrderArchive:
+    """冷存储测试"""
+    
+    def test_append_and_get(self, archive):
+        """测试归档后读取订单"""
+        order = Order("ORD001", "CUST001")
+        order.add_item("P001", 2, 50.0)
+        order.cancel()
+        
+        assert archive.append([order]) == 1
+        assert "ORD001" in archive
+        assert len(archive) == 1
+        
+        restored = archive.get("ORD001", Order.from_dict)
+        assert restored.to_dict() == order.to_dict()
+        assert archive.get("ORD002", Order.from_dict) is None
+    
+    def test_duplicate_append(self, archive):
+        """测试重复归档"""
+        order = Order("ORD001", "CUST001")
+        archive.append([order])
+        
+        with pytest.raises(ValueError, match="订单已归档"):
+            archive.append([order])
+    
+    def test_lru_cache(self, archive):
+        """测试 LRU 缓存淘汰最久未使用的订单"""
+        archive.append([Order(f"ORD{i}", "CUST001") for i in range(3)])
+        
+        first = archive.get("ORD0", Order.from_dict)
+        archive.get("ORD1", Order.from_dict)
+        assert archive.get("ORD0", Order.from_dict) is first
+        archive.get("ORD2", Order.from_dict)
+        
+        assert archive.get("ORD0", Order.from_dict) is first
+        assert archive.get("ORD1", Order.from_dict) is not None
+    
+    def test_clear(self, archive):
+        """测试清空归档"""
+        archive.append([Order("ORD001", "CUST001")])
+        archive.get("ORD001", Order.from_dict)
+        archive.clear()
+        
+        assert len(archive) == 0
+        assert "ORD001" not in archive
+
+
+class TestOrderServiceArchive:
+    """订单服务归档测试"""
+    
+    def test_archive_terminal_orders(self, service, archive):
+        """测试只归档已完成和已取消的订单"""
+        complete(service, "ORD001")
+        service.create_order("ORD002", "CUST001")
+        service.cancel_order("ORD002")
+        service.create_order("ORD003", "CUST001")
+        
+        assert service.archive_orders() == 2
+        assert len(archive) == 2
+        assert list(service.get_all_orders()) == ["ORD003"]
+        assert [o.order_id for o in service.find_orders(customer_id="CUST001")] == ["ORD003"]
+        assert service.find_orders(status=OrderStatus.COMPLETED) == []
+        assert service.count_orders() == 1
+        assert service.archive_orders() == 0
+    
+    def test_get_archived_order(self, service):
+        """测试归档后仍可透明查询订单"""
+        complete(service, "ORD001")
+        expected = service.get_order("ORD001").to_dict()
+        service.archive_orders()
+        
+        order = service.get_order("ORD001")
+        assert order.status == OrderStatus.COMPLETED
+        assert order.to_dict() == expected
+        
+        with pytest.raises(ValueError, match="订单不存在"):
+            service.get_order("ORD999")
+    
+    def test_archived_order_id_cannot_be_reused(self, service):
+        """测试已归档的订单ID不能重复创建"""
+        complete(service, "ORD001")
+        service.archive_orders()
+        
+        with pytest.raises(ValueError, match="订单ID已存在"):
+            service.create_order("ORD001", "CUST002")
+    
+    def test_archive_older_than(self, service):
+        """测试只归档早于指定时间的订单"""
+        complete(service, "ORD001")
+        
+        assert service.archive_orders(older_than=datetime.now() - timedelta(hours=1)) == 0
+        assert service.archive_orders(older_than=datetime.now() + timedelta(hours=1)) == 1
+    
+    def test_archive_reclaims_compact_rows(self, archive):
+        """测试紧凑模式下归档订单的行被之后的订单复用"""
+        inventory = Inventory()
+        inventory.add_product("P001", 100)
+        service = OrderService(inventory, PaymentProcessor(), compact=True, archive=archive)
+        dropped = service.create_order("ORD001", "CUST001")
+        service.add_item_to_order("ORD001", "P001", 2, 50.0)
+        service.add_item_to_order("ORD001", "P001", 1, 50.0)
+        service.cancel_order("ORD001")
+        service.archive_orders()
+        
+        service.create_order("ORD002", "CUST001")
+        service.add_item_to_order("ORD002", "P001", 5, 10.0)
+        
+        assert service._columns.capacity == 2
+        assert len(service._columns) == 1
+        assert [(i.quantity, i.price) for i in dropped.items] == [(2, 50.0), (1, 50.0)]
+        assert [(i.quantity, i.price) for i in service.get_order("ORD002").items] == [(5, 10.0)]
+    
+    def test_without_archive(self):
+        """测试未配置冷存储时不归档"""
+        service = OrderService(Inventory(), PaymentProcessor())
+        service.create_order("ORD001", "CUST001")
+        service.cancel_order("ORD001")
+        
+        assert service.archive_orders() == 0
+        assert service.get_order("ORD001").status == OrderStatus.CANCELLED
@@ -2,6 +2,7 @@
 支付模块单元测试
 """
 
+import threading
 import pytest
 from datetime import datetime
 from .payment import (
@@ -264,6 +265,236 @@ class TestPaymentWorkflow:
         assert processor.get_payment("PAY001").status == PaymentStatus.SUCCESS
         assert processor.get_payment("PAY002").status == PaymentStatus.SUCCESS
         assert processor.get_payment("PAY003").status == PaymentStatus.SUCCESS
+    
+    def test_concurrent_payments_never_overdraw(self):
+        """测试同一支付方式的并发支付不会透支"""
+        processor = PaymentProcessor()
+        processor.set_balance(PaymentMethod.ALIPAY, 1000.0)
+        for i in range(200):
+            processor.create_payment(f"PAY{i:03d}", f"ORD{i:03d}", 10.0, PaymentMethod.ALIPAY)
+        
+        def worker(offset):
+            for i in range(offset, 200, 8):
+                try:
+                    processor.process_payment(f"PAY{i:03d}")
+                except InsufficientFundsError:
+                    pass
+        
+        threads = [threading.Thread(target=worker, args=(n,)) for n in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        
+        statuses = [payment.status for payment in processor.get_all_payments().values()]
+        assert statuses.count(PaymentStatus.SUCCESS) == 100
+        assert statuses.count(PaymentStatus.FAILED) == 100
+        assert processor.get_balance(PaymentMethod.ALIPAY) == 0.0
+
+
+class TestSettleBatch:
+    """批量结算测试"""
+    
+    def test_settle_batch(self):
+        """测试按支付方式分组批量扣款"""
+        processor = PaymentProcessor()
+        alipay = processor.get_balance(PaymentMethod.ALIPAY)
+        wechat = processor.get_balance(PaymentMethod.WECHAT)
+        processor.create_payment("PAY001", "ORD001", 100.0, PaymentMethod.ALIPAY)
+        processor.create_payment("PAY002", "ORD002", 200.0, PaymentMethod.WECHAT)
+        processor.create_payment("PAY003", "ORD003", 50.5, PaymentMethod.ALIPAY)
+        
+        results = processor.settle_batch(["PAY003", "PAY001", "PAY002"])
+        
+        assert results == {"PAY003": "success", "PAY001": "success", "PAY002": "success"}
+        assert processor.get_balance(PaymentMethod.ALIPAY) == alipay - 150.5
+        assert processor.get_balance(PaymentMethod.WECHAT) == wechat - 200.0
+        payments = [processor.get_payment(f"PAY00{i}") for i in (1, 2, 3)]
+        assert all(payment.status == PaymentStatus.SUCCESS for payment in payments)
+        assert len({payment.updated_at for payment in payments}) == 1
+    
+    def test_settle_passes_through_processing(self):
+        """测试批量结算与逐笔处理一样经过处理中状态"""
+        processor = PaymentProcessor()
+        payment = processor.create_payment("PAY001", "ORD001", 10.0, PaymentMethod.ALIPAY)
+        statuses = []
+        listener = payment._status_listener
+        payment._status_listener = lambda p, old: (statuses.append(p.status), listener(p, old))
+        
+        processor.settle_batch(["PAY001"])
+        
+        assert statuses == [PaymentStatus.PROCESSING, PaymentStatus.SUCCESS]
+    
+    def test_insufficient_group_settles_in_order(self):
+        """测试总额不足时按顺序逐笔扣款"""
+        processor = PaymentProcessor()
+        processor.set_balance(PaymentMethod.ALIPAY, 250.0)
+        for i, amount in enumerate([100.0, 200.0, 150.0]):
+            processor.create_payment(f"PAY{i}", f"ORD{i}", amount, PaymentMethod.ALIPAY)
+        
+        results = processor.settle_batch(["PAY0", "PAY1", "PAY2"])
+        
+        assert results == {"PAY0": "success", "PAY1": "insufficient_funds", "PAY2": "success"}
+        assert processor.get_payment("PAY1").status == PaymentStatus.FAILED
+        assert processor.get_balance(PaymentMethod.ALIPAY) == 0.0
+    
+    def test_invalid_payments_are_reported(self):
+        """测试不存在和非待支付的支付记录"""
+        processor = PaymentProcessor()
+        processor.create_payment("PAY001", "ORD001", 100.0, PaymentMethod.ALIPAY)
+        processor.create_payment("PAY002", "ORD002", 100.0, PaymentMethod.ALIPAY)
+        processor.process_payment("PAY002")
+        
+        results = processor.settle_batch(["PAY001", "PAY002", "PAY999", "PAY001"])
+        
+        assert results == {"PAY001": "success", "PAY002": "invalid_state", "PAY999": "not_found"}
+    
+    def test_matches_sequential_processing(self):
+        """测试批量结算与逐笔处理结果一致"""
+        amounts = [30.0, 70.0, 25.5, 10.0, 99.99]
+        batch, sequential = PaymentProcessor(), PaymentProcessor()
+        for processor in (batch, sequential):
+            processor.set_balance(PaymentMethod.PAYPAL, 150.0)
+            for i, amount in enumerate(amounts):
+                processor.create_payment(f"PAY{i}", f"ORD{i}", amount, PaymentMethod.PAYPAL)
+        
+        batch.settle_batch([f"PAY{i}" for i in range(len(amounts))])
+        for i in range(len(amounts)):
+            try:
+                sequential.process_payment(f"PAY{i}")
+            except InsufficientFundsError:
+                pass
+        
+        assert batch.get_balance(PaymentMethod.PAYPAL) == sequential.get_balance(PaymentMethod.PAYPAL)
+        for i in range(len(amounts)):
+            assert batch.get_payment(f"PAY{i}").status == sequential.get_payment(f"PAY{i}").status
+
+
+class TestRefundBatch:
+    """批量退款测试"""
+    
+    def test_refund_batch(self):
+        """测试批量退款按支付方式入账"""
+        processor = PaymentProcessor()
+        processor.set_balance(PaymentMethod.ALIPAY, 100.0)
+        processor.create_payment("PAY1", "ORD1", 30.0, PaymentMethod.ALIPAY)
+        processor.create_payment("PAY2", "ORD2", 20.5, PaymentMethod.ALIPAY)
+        processor.create_payment("PAY3", "ORD3", 10.0, PaymentMethod.WECHAT)
+        processor.settle_batch(["PAY1", "PAY2"])
+        
+        results = processor.refund_batch(["PAY1", "PAY2", "PAY3", "PAY_NONE"])
+        
+        assert results == {"PAY1": "refunded", "PAY2": "refunded",
+                           "PAY3": "invalid_state", "PAY_NONE": "not_found"}
+        assert processor.get_balance(PaymentMethod.ALIPAY) == 100.0
+        assert processor.get_payment("PAY1").status == PaymentStatus.REFUNDED
+        assert processor.count_payments(PaymentStatus.REFUNDED) == 2
+    
+    def test_refund_batch_events_replay(self):
+        """测试批量退款的事件可以重放"""
+        processor = PaymentProcessor()
+        events = []
+        processor.event_sink = lambda event, data: events.append((event, data))
+        processor.create_payment("PAY1", "ORD1", 30.0, PaymentMethod.PAYPAL)
+        processor.process_payment("PAY1")
+        processor.refund_batch(["PAY1"])
+        
+        replayed = PaymentProcessor()
+        for event, data in events:
+            replayed.apply_event(event, data)
+        
+        assert replayed.get_payment("PAY1").status == PaymentStatus.REFUNDED
+        assert replayed.get_balance(PaymentMethod.PAYPAL) == processor.get_balance(PaymentMethod.PAYPAL)
+
+
+class TestPaymentIndexes:
+    """支付二级索引和汇总计数测试"""
+    
+    def test_find_by_order_status_and_method(self):
+        """测试按订单、状态和支付方式查询"""
+        processor = PaymentProcessor()
+        processor.create_payment("PAY1", "ORD1", 10.0, PaymentMethod.ALIPAY)
+        processor.create_payment("PAY2", "ORD1", 20.0, PaymentMethod.WECHAT)
+        processor.create_payment("PAY3", "ORD2", 30.0, PaymentMethod.ALIPAY)
+        processor.process_payment("PAY1")
+        
+        assert [p.payment_id for p in processor.get_payments_by_order("ORD1")] == ["PAY1", "PAY2"]
+        assert [p.payment_id for p in processor.find_payments(
+            status=PaymentStatus.PENDING, method=PaymentMethod.ALIPAY)] == ["PAY3"]
+        assert [p.payment_id for p in processor.find_payments(limit=2)] == ["PAY1", "PAY2"]
+        assert processor.get_payments_by_order("ORD_NONE") == []
+    
+    def test_find_without_filters_uses_creation_order(self):
+        """测试无筛选条件时按创建时间索引分页，恢复的乱序记录也按时间排列"""
+        processor = PaymentProcessor()
+        processor.restore_state({
+            "payments": [
+                ["PAY_C", "ORD3", 30.0, "alipay", "pending", 300, 300],
+                ["PAY_A", "ORD1", 10.0, "alipay", "success", 100, 100],
+                ["PAY_B", "ORD2", 20.0, "wechat", "failed", 200, 200],
+            ],
+            "balances": {}
+        })
+        
+        assert [p.payment_id for p in processor.find_payments(limit=2)] == ["PAY_A", "PAY_B"]
+        assert [p.payment_id for p in processor.find_payments()] == ["PAY_A", "PAY_B", "PAY_C"]
+        processor.clear()
+        assert processor.find_payments() == []
+    
+    def test_counters_follow_status_changes(self):
+        """测试汇总计数随支付状态变化更新"""
+        processor = PaymentProcessor()
+        processor.set_balance(PaymentMethod.ALIPAY, 100.0)
+        processor.create_payment("PAY1", "ORD1", 60.0, PaymentMethod.ALIPAY)
+        processor.create_payment("PAY2", "ORD2", 60.0, PaymentMethod.ALIPAY)
+        processor.create_payment("PAY3", "ORD3", 0.1, PaymentMethod.WECHAT)
+        
+        assert processor.count_payments(PaymentStatus.PENDING) == 3
+        processor.process_payment("PAY1")
+        with pytest.raises(InsufficientFundsError):
+            processor.process_payment("PAY2")
+        processor.settle_batch(["PAY3"])
+        processor.refund_payment("PAY1")
+        
+        assert processor.count_payments(PaymentStatus.PENDING) == 0
+        assert processor.count_payments(PaymentStatus.REFUNDED, PaymentMethod.ALIPAY) == 1
+        assert processor.count_payments(PaymentStatus.FAILED) == 1
+        assert processor.total_amount(PaymentStatus.SUCCESS) == 0.1
+        assert processor.total_amount() == 120.1
+        stats = processor.get_payment_stats()
+        assert stats["failed"]["alipay"] == {"count": 1, "amount": 60.0}
+        assert [p.payment_id for p in processor.find_payments(status=PaymentStatus.SUCCESS)] == ["PAY3"]
+    
+    def test_indexes_rebuilt_on_restore_and_replay(self):
+        """测试从快照恢复和重放事件后索引正确"""
+        source = PaymentProcessor()
+        events = []
+        source.event_sink = lambda event, data: events.append((event, data))
+        source.create_payment("PAY1", "ORD1", 10.0, PaymentMethod.ALIPAY)
+        source.process_payment("PAY1")
+        source.create_payment("PAY2", "ORD2", 20.0, PaymentMethod.PAYPAL)
+        
+        restored, replayed = PaymentProcessor(), PaymentProcessor()
+        restored.restore_state(source.snapshot_state())
+        for event, data in events:
+            replayed.apply_event(event, data)
+        
+        for processor in (restored, replayed):
+            assert processor.count_payments(PaymentStatus.SUCCESS) == 1
+            assert processor.count_payments(PaymentStatus.PENDING, PaymentMethod.PAYPAL) == 1
+            assert [p.payment_id for p in processor.get_payments_by_order("ORD2")] == ["PAY2"]
+    
+    def test_clear_resets_indexes(self):
+        """测试清空后索引和计数归零"""
+        processor = PaymentProcessor()
+        processor.create_payment("PAY1", "ORD1", 10.0, PaymentMethod.ALIPAY)
+        payment = processor.get_payment("PAY1")
+        
+        processor.clear()
+        payment.process()
+        
+        assert processor.count_payments() == 0
+        assert processor.find_payments(order_id="ORD1") == []
 
 
 # Fixtures
@@ -0,0 +1,174 @@
+"""
+异步支付队列模块单元测试
+"""
+
+import asyncio
+import threading
+import pytest
+from .payment import PaymentMethod
+from .payment_queue import PaymentQueue, QueueFullError, TicketStatus
+
+
+@pytest.fixture
+def queues():
+    """创建的队列在测试结束时关闭"""
+    created = []
+    
+    def make(handler, **kwargs):
+        queue = PaymentQueue(handler, **kwargs)
+        created.append(queue)
+        return queue
+    
+    yield make
+    for queue in created:
+        queue.close()
+
+
+class TestPaymentQueue:
+    """异步支付队列测试"""
+    
+    def test_submit_and_wait(self, queues):
+        """测试提交后等待支付成功"""
+        queue = queues(lambda order_id, method: f"PAY_{order_id}")
+        
+        ticket = queue.submit("PAY_O1", "O1", PaymentMethod.ALIPAY)
+        result = queue.wait("PAY_O1", timeout=5)
+        
+        assert result is ticket
+        assert ticket.status == TicketStatus.SUCCEEDED
+        assert ticket.payment_id == "PAY_O1"
+        assert ticket.to_dict()["finished_at"] is not None
+        assert queue.pending == 0
+    
+    def test_handler_error_marks_ticket_failed(self, queues):
+        """测试支付异常时凭证记录错误"""
+        def handler(order_id, method):
+            raise ValueError("余额不足")
+        
+        queue = queues(handler)
+        queue.submit("PAY_O1", "O1", PaymentMethod.WECHAT)
+        ticket = queue.wait("PAY_O1", timeout=5)
+        
+        assert ticket.status == TicketStatus.FAILED
+        assert ticket.error == "余额不足"
+        assert ticket.error_type == "ValueError"
+        assert ticket.payment_id is None
+    
+    def test_duplicate_submit_returns_existing_ticket(self, queues):
+        """测试处理中或已成功的凭证重复提交返回原凭证"""
+        release = threading.Event()
+        calls = []
+        
+        def handler(order_id, method):
+            calls.append(order_id)
+            release.wait(5)
+            return f"PAY_{order_id}"
+        
+        queue = queues(handler)
+        first = queue.submit("PAY_O1", "O1", PaymentMethod.ALIPAY)
+        assert queue.submit("PAY_O1", "O1", PaymentMethod.ALIPAY) is first
+        
+        release.set()
+        queue.wait("PAY_O1", timeout=5)
+        assert queue.submit("PAY_O1", "O1", PaymentMethod.ALIPAY) is first
+        assert calls == ["O1"]
+    
+    def test_failed_ticket_can_be_resubmitted(self, queues):
+        """测试失败的凭证可以重新提交"""
+        attempts = []
+        
+        def handler(order_id, method):
+            attempts.append(order_id)
+            if len(attempts) == 1:
+                raise ValueError("数据库连接错误")
+            return f"PAY_{order_id}"
+        
+        queue = queues(handler)
+        queue.submit("PAY_O1", "O1", PaymentMethod.ALIPAY)
+        assert queue.wait("PAY_O1", timeout=5).status == TicketStatus.FAILED
+        
+        queue.submit("PAY_O1", "O1", PaymentMethod.ALIPAY)
+        assert queue.wait("PAY_O1", timeout=5).status == TicketStatus.SUCCEEDED
+        assert len(attempts) == 2
+    
+    def test_queue_full(self, queues):
+        """测试排队数量达到上限时拒绝提交"""
+        release = threading.Event()
+        queue = queues(lambda order_id, method: release.wait(5) and order_id,
+                       workers=1, max_pending=2)
+        
+        queue.submit("PAY_O1", "O1", PaymentMethod.ALIPAY)
+        queue.submit("PAY_O2", "O2", PaymentMethod.ALIPAY)
+        with pytest.raises(QueueFullError):
+            queue.submit("PAY_O3", "O3", PaymentMethod.ALIPAY)
+        
+        release.set()
+        queue.wait("PAY_O2", timeout=5)
+        queue.submit("PAY_O3", "O3", PaymentMethod.ALIPAY)
+    
+    def test_workers_process_concurrently(self, queues):
+        """测试多个工作协程并发处理支付"""
+        barrier = threading.Barrier(4, timeout=5)
+        
+        def handler(order_id, method):
+            barrier.wait()
+            return order_id
+        
+        queue = queues(handler, workers=4)
+        for i in range(4):
+            queue.submit(f"PAY_O{i}", f"O{i}", PaymentMethod.ALIPAY)
+        
+        for i in range(4):
+            assert queue.wait(f"PAY_O{i}", timeout=5).status == TicketStatus.SUCCEEDED
+    
+    def test_wait_timeout_returns_unfinished_ticket(self, queues):
+        """测试等待超时返回未完成的凭证"""
+        release = threading.Event()
+        queue = queues(lambda order_id, method: release.wait(5) and order_id)
+        
+        queue.submit("PAY_O1", "O1", PaymentMethod.ALIPAY)
+        ticket = queue.wait("PAY_O1", timeout=0.05)
+        
+        assert not ticket.done
+        assert queue.wait("PAY_UNKNOWN", timeout=0.05) is None
+        release.set()
+    
+    def test_wait_async(self, queues):
+        """测试在其他事件循环中异步等待"""
+        queue = queues(lambda order_id, method: f"PAY_{order_id}")
+        queue.submit("PAY_O1", "O1", PaymentMethod.ALIPAY)
+        
+        ticket = asyncio.run(queue.wait_async("PAY_O1", timeout=5))
+        
+        assert ticket.status == TicketStatus.SUCCEEDED
+    
+    def test_finished_tickets_are_bounded(self, queues):
+        """测试只保留最近完成的凭证"""
+        queue = queues(lambda order_id, method: order_id, workers=1, max_finished=2)
+        for i in range(3):
+            queue.submit(f"PAY_O{i}", f"O{i}", PaymentMethod.ALIPAY)
+            queue.wait(f"PAY_O{i}", timeout=5)
+        
+        assert queue.get("PAY_O0") is None
+        assert queue.get("PAY_O2") is not None
+        
+        queue.clear()
+        assert queue.get("PAY_O2") is None
+    
+    def test_close_drains_queue(self):
+        """测试关闭前处理完已提交的支付"""
+        queue = PaymentQueue(lambda order_id, method: order_id, workers=1)
+        tickets = [queue.submit(f"PAY_O{i}", f"O{i}", PaymentMethod.ALIPAY) for i in range(10)]
+        
+        queue.close()
+        
+        assert all(ticket.status == TicketStatus.SUCCEEDED for ticket in tickets)
+        with pytest.raises(ValueError):
+            queue.submit("PAY_X", "X", PaymentMethod.ALIPAY)
+    
+    def test_invalid_arguments(self):
+        """测试无效参数"""
+        with pytest.raises(ValueError):
+            PaymentQueue(lambda order_id, method: order_id, workers=0)
+        with pytest.raises(ValueError):
+            PaymentQueue(lambda order_id, method: order_id, max_pending=0)
@@ -0,0 +1,121 @@
+"""
+支付对账模块单元测试
+"""
+
+import pytest
+from .database_simulator import DatabaseSimulator
+from .payment import PaymentMethod, PaymentProcessor
+from .reconciliation import PaymentColumns, reconcile
+
+
+class TestPaymentColumns:
+    """支付记录列式快照测试"""
+    
+    def test_sorted_by_payment_id(self):
+        """测试按支付ID排序并以分为单位保存金额"""
+        columns = PaymentColumns.from_records([
+            ("PAY_2", 10.1, "success"),
+            ("PAY_1", 0.3, "failed"),
+        ])
+        
+        assert columns.payment_ids.tolist() == ["PAY_1", "PAY_2"]
+        assert columns.amounts.tolist() == [30, 1010]
+        assert columns.statuses.tolist() == ["failed", "success"]
+    
+    def test_duplicate_payment_id(self):
+        """测试支付ID重复时报错"""
+        with pytest.raises(ValueError):
+            PaymentColumns.from_records([("PAY_1", 1, "success"), ("PAY_1", 2, "success")])
+    
+    def test_from_processor(self):
+        """测试从支付处理器加载"""
+        processor = PaymentProcessor()
+        processor.set_balance(PaymentMethod.ALIPAY, 1000)
+        processor.create_payment("PAY_1", "O1", 99.99, PaymentMethod.ALIPAY)
+        processor.process_payment("PAY_1")
+        
+        columns = PaymentColumns.from_processor(processor)
+        
+        assert columns.payment_ids.tolist() == ["PAY_1"]
+        assert columns.amounts.tolist() == [9999]
+        assert columns.statuses.tolist() == ["success"]
+    
+    def test_from_db_records(self):
+        """测试只导出指定表的数据库记录"""
+        db = DatabaseSimulator()
+        db.execute_query("INSERT INTO payment_records (payment_id, amount, status)",
+                         {"id": "PAY_1", "payment_id": "PAY_1", "amount": 5.0, "status": "success"})
+        db.execute_query("INSERT INTO payment_logs (payment_id, status)",
+                         {"id": "log_PAY_1_start", "payment_id": "PAY_1", "status": "processing"})
+        
+        columns = PaymentColumns.from_db_records(db.dump_records("payment_records"))
+        
+        assert columns.payment_ids.tolist() == ["PAY_1"]
+        assert len(db.dump_records()) == 2
+
+
+class TestReconcile:
+    """对账测试"""
+    
+    def test_consistent(self):
+        """测试两侧一致，已退款的支付对应成功流水"""
+        memory = PaymentColumns.from_records([
+            ("PAY_1", 10, "success"), ("PAY_2", 20, "refunded"), ("PAY_3", 30, "failed"),
+        ])
+        db = PaymentColumns.from_records([("PAY_1", 10, "success"), ("PAY_2", 20, "success")])
+        
+        report = reconcile(memory, db)
+        
+        assert report.consistent
+        assert report.matched == 2
+    
+    def test_reports_differences(self):
+        """测试报告缺失、金额不一致和状态不一致的记录"""
+        memory = PaymentColumns.from_records([
+            ("PAY_1", 10, "success"),
+            ("PAY_2", 20, "success"),
+            ("PAY_3", 30, "failed"),
+            ("PAY_4", 40, "success"),
+            ("PAY_5", 50, "processing"),
+        ])
+        db = PaymentColumns.from_records([
+            ("PAY_0", 1, "success"),
+            ("PAY_2", 21, "success"),
+            ("PAY_3", 30, "success"),
+            ("PAY_5", 99, "success"),
+            ("PAY_9", 9, "success"),
+        ])
+        
+        report = reconcile(memory, db)
+        result = report.to_dict()
+        
+        assert not report.consistent
+        assert result["in_flight"] == 1
+        assert result["missing_in_db"] == ["PAY_1", "PAY_4"]
+        assert result["missing_in_memory"] == ["PAY_0", "PAY_9"]
+        assert result["amount_mismatches"] == [
+            {"payment_id": "PAY_2", "memory_amount": 20.0, "db_amount": 21.0}
+        ]
+        assert result["status_mismatches"] == [
+            {"payment_id": "PAY_3", "memory_status": "failed", "db_status": "success"}
+        ]
+    
+    def test_empty_sides(self):
+        """测试任一侧为空"""
+        memory = PaymentColumns.from_records([("PAY_1", 10, "success")])
+        empty = PaymentColumns.from_records([])
+        
+        assert reconcile(memory, empty).missing_in_db.tolist() == ["PAY_1"]
+        assert reconcile(empty, memory).missing_in_memory.tolist() == ["PAY_1"]
+        assert reconcile(empty, empty).consistent
+    
+    def test_to_dict_limit(self):
+        """测试差异列表按上限截断，计数不受影响"""
+        memory = PaymentColumns.from_records(
+            (f"PAY_{i}", 1, "success") for i in range(10)
+        )
+        
+        result = reconcile(memory, PaymentColumns.from_records([])).to_dict(limit=3)
+        
+        assert len(result["missing_in_db"]) == 3
+        assert result["counts"]["missing_in_db"] == 10
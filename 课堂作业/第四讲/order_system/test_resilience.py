@@ -0,0 +1,219 @@
+"""
+容错策略模块单元测试
+"""
+
+import pytest
+from .resilience import CircuitBreaker, CircuitState, RetryAttempts, RetryBudget, RetryPolicy
+
+
+class FakeClock:
+    """可手动推进的时钟"""
+    
+    def __init__(self):
+        self.now = 0.0
+    
+    def __call__(self) -> float:
+        return self.now
+
+
+class TestRetryPolicy:
+    """重试策略测试"""
+    
+    def test_backoff_grows_exponentially_with_cap(self):
+        """测试退避上限按指数增长并受 max_delay 限制"""
+        policy = RetryPolicy(base_delay=0.1, max_delay=0.5, rng=lambda: 0.999999)
+        
+        delays = [policy.backoff(retry) for retry in range(5)]
+        
+        assert delays == pytest.approx([0.1, 0.2, 0.4, 0.5, 0.5], rel=1e-3)
+    
+    def test_full_jitter(self):
+        """测试退避时长在 [0, 上限) 内随机"""
+        policy = RetryPolicy(base_delay=1.0, max_delay=10.0)
+        
+        delays = [policy.backoff(2) for _ in range(200)]
+        
+        assert all(0 <= delay < 4.0 for delay in delays)
+        assert len(set(delays)) > 100
+    
+    def test_max_attempts(self):
+        """测试达到最多尝试次数后不再重试"""
+        policy = RetryPolicy(max_attempts=3)
+        
+        assert policy.allow_retry(1)
+        assert policy.allow_retry(2)
+        assert not policy.allow_retry(3)
+    
+    def test_budget_limits_retries(self):
+        """测试重试预算用完后不再重试，新请求补充预算"""
+        policy = RetryPolicy(max_attempts=10, budget=RetryBudget(ratio=0.5, min_retries=2))
+        
+        assert policy.allow_retry(1)
+        assert policy.allow_retry(1)
+        assert not policy.allow_retry(1)
+        
+        policy.on_request()
+        policy.on_request()
+        assert policy.allow_retry(1)
+    
+    def test_invalid_arguments(self):
+        """测试无效参数"""
+        with pytest.raises(ValueError):
+            RetryPolicy(max_attempts=0)
+        with pytest.raises(ValueError):
+            RetryPolicy(base_delay=-1)
+        with pytest.raises(ValueError):
+            RetryBudget(ratio=-0.1)
+
+
+class TestCircuitBreaker:
+    """熔断器测试"""
+    
+    def test_opens_after_consecutive_failures(self):
+        """测试连续失败达到阈值后打开并拒绝请求"""
+        breaker = CircuitBreaker(failure_threshold=3, clock=FakeClock())
+        for _ in range(2):
+            breaker.record_failure()
+        breaker.record_success()
+        for _ in range(2):
+            breaker.record_failure()
+        assert breaker.state == CircuitState.CLOSED
+        
+        breaker.record_failure()
+        
+        assert breaker.state == CircuitState.OPEN
+        assert not breaker.allow_request()
+        assert breaker.get_stats()["rejected"] == 1
+    
+    def test_half_open_allows_limited_probes(self):
+        """测试恢复时间后进入半开状态，只放行有限的探测请求"""
+        clock = FakeClock()
+        breaker = CircuitBreaker(failure_threshold=1, recovery_timeout=5.0,
+                                 half_open_max_calls=2, clock=clock)
+        breaker.record_failure()
+        clock.now = 4.0
+        assert breaker.retry_after() == pytest.approx(1.0)
+        assert not breaker.allow_request()
+        
+        clock.now = 5.0
+        assert breaker.state == CircuitState.HALF_OPEN
+        assert breaker.allow_request()
+        assert breaker.allow_request()
+        assert not breaker.allow_request()
+    
+    def test_lost_probe_expires(self):
+        """测试探测请求未报告结果时，超时后重新放行探测"""
+        clock = FakeClock()
+        breaker = CircuitBreaker(failure_threshold=1, recovery_timeout=5.0, clock=clock)
+        breaker.record_failure()
+        clock.now = 5.0
+        assert breaker.allow_request()
+        
+        clock.now = 7.0
+        assert not breaker.allow_request()
+        assert breaker.retry_after() == pytest.approx(3.0)
+        
+        clock.now = 10.0
+        assert breaker.allow_request()
+        breaker.record_success()
+        assert breaker.state == CircuitState.CLOSED
+    
+    def test_release_frees_probe(self):
+        """测试放弃的探测请求释放名额，不改变状态"""
+        clock = FakeClock()
+        breaker = CircuitBreaker(failure_threshold=1, recovery_timeout=5.0, clock=clock)
+        breaker.record_failure()
+        clock.now = 5.0
+        assert breaker.allow_request()
+        
+        breaker.release()
+        
+        assert breaker.state == CircuitState.HALF_OPEN
+        assert breaker.allow_request()
+    
+    def test_probe_success_closes(self):
+        """测试探测成功后关闭"""
+        clock = FakeClock()
+        breaker = CircuitBreaker(failure_threshold=1, recovery_timeout=5.0, clock=clock)
+        breaker.record_failure()
+        clock.now = 5.0
+        assert breaker.allow_request()
+        
+        breaker.record_success()
+        
+        assert breaker.state == CircuitState.CLOSED
+        assert breaker.allow_request()
+    
+    def test_probe_failure_reopens(self):
+        """测试探测失败后重新打开并重新计时"""
+        clock = FakeClock()
+        breaker = CircuitBreaker(failure_threshold=1, recovery_timeout=5.0, clock=clock)
+        breaker.record_failure()
+        clock.now = 5.0
+        assert breaker.allow_request()
+        
+        breaker.record_failure()
+        
+        assert breaker.state == CircuitState.OPEN
+        assert breaker.retry_after() == pytest.approx(5.0)
+        assert breaker.get_stats()["times_opened"] == 2
+    
+    def test_reset(self):
+        """测试重置为关闭状态"""
+        breaker = CircuitBreaker(failure_threshold=1, clock=FakeClock())
+        breaker.record_failure()
+        
+        breaker.reset()
+        
+        assert breaker.state == CircuitState.CLOSED
+        assert breaker.get_stats()["consecutive_failures"] == 0
+    
+    def test_invalid_arguments(self):
+        """测试无效参数"""
+        with pytest.raises(ValueError):
+            CircuitBreaker(failure_threshold=0)
+        with pytest.raises(ValueError):
+            CircuitBreaker(half_open_max_calls=0)
+
+
+class TestRetryAttempts:
+    """单次调用的重试和熔断状态测试"""
+    
+    def test_failures_until_exhausted(self):
+        """测试失败后按策略退避，达到尝试次数后不再重试"""
+        breaker = CircuitBreaker(failure_threshold=5, clock=FakeClock())
+        attempts = RetryAttempts(RetryPolicy(max_attempts=2, base_delay=0.1, rng=lambda: 0.5),
+                                 breaker)
+        error = ConnectionError("down")
+        
+        assert attempts.start()
+        assert attempts.failed(error) == pytest.approx(0.05)
+        assert attempts.start()
+        assert attempts.failed(error) is None
+        assert attempts.attempt == 2
+        assert attempts.last_error is error
+        assert breaker.get_stats()["consecutive_failures"] == 2
+    
+    def test_abandoned_probe_keeps_breaker_half_open(self):
+        """测试放弃的探测不关闭熔断器，名额可以再次使用"""
+        clock = FakeClock()
+        breaker = CircuitBreaker(failure_threshold=1, recovery_timeout=5.0, clock=clock)
+        breaker.record_failure()
+        clock.now = 5.0
+        attempts = RetryAttempts(RetryPolicy(), breaker)
+        
+        assert attempts.start()
+        attempts.abandoned()
+        
+        assert breaker.state == CircuitState.HALF_OPEN
+        assert attempts.start()
+        assert not RetryAttempts(RetryPolicy(), breaker).start()
+    
+    def test_without_breaker(self):
+        """测试未配置熔断器时总是放行"""
+        attempts = RetryAttempts(RetryPolicy())
+        
+        assert attempts.start()
+        attempts.abandoned()
+        attempts.succeeded()
+        assert attempts.retry_after() == 0.0
@@ -0,0 +1,167 @@
+"""
+持久化存储模块单元测试
+"""
+
+import sqlite3
+import pytest
+from .storage import MemoryStorage, SQLiteStorage, StorageBackend
+from .inventory import Inventory
+from .order import OrderService, OrderStatus
+from .order_archive import OrderArchive
+from .payment import PaymentProcessor, PaymentMethod, PaymentStatus
+
+
+def new_state(archive=None):
+    """创建一组空服务"""
+    inventory = Inventory()
+    payment_processor = PaymentProcessor()
+    order_service = OrderService(inventory, payment_processor, archive=archive)
+    return {"stock": inventory, "payment": payment_processor, "order": order_service}
+
+
+def state_of(services):
+    """服务状态的可比较表示"""
+    return {name: service.snapshot_state() for name, service in services.items()}
+
+
+def load_from(path):
+    """从数据库加载一组新服务"""
+    services = new_state()
+    storage = SQLiteStorage(path)
+    loaded = storage.load(services)
+    storage.close()
+    return services, loaded
+
+
+def run_workload(services):
+    """执行包含各类事件的业务流程"""
+    inventory = services["stock"]
+    order_service = services["order"]
+    inventory.add_product("P001", 100)
+    inventory.add_product("P002", 50)
+    
+    order_service.create_order("ORD001", "CUST001")
+    order_service.add_item_to_order("ORD001", "P001", 2, 50.0)
+    order_service.add_item_to_order("ORD001", "P002", 1, 30.0)
+    order_service.confirm_order("ORD001")
+    order_service.process_payment("ORD001", PaymentMethod.ALIPAY)
+    
+    order_service.create_order("ORD002", "CUST002")
+    order_service.add_item_to_order("ORD002", "P002", 3, 30.0)
+    order_service.confirm_order("ORD002")
+    order_service.process_payment("ORD002", PaymentMethod.WECHAT)
+    order_service.cancel_order("ORD002")
+    services["payment"].set_balance(PaymentMethod.PAYPAL, 1.0)
+
+
+@pytest.fixture(params=[True, False], ids=["write_behind", "sync"])
+def db_path(request, tmp_path):
+    """数据库路径和写入模式"""
+    return str(tmp_path / "orders.db"), request.param
+
+
+class TestSQLiteStorage:
+    """SQLite 存储测试"""
+    
+    def test_load_restores_state(self, db_path):
+        """测试重新打开数据库后恢复全部状态"""
+        path, write_behind = db_path
+        services = new_state()
+        storage = SQLiteStorage(path, write_behind=write_behind)
+        assert not storage.load(services)
+        storage.attach(services)
+        run_workload(services)
+        storage.close()
+        
+        restored = new_state()
+        storage = SQLiteStorage(path, write_behind=write_behind)
+        assert storage.load(restored)
+        storage.close()
+        
+        assert state_of(restored) == state_of(services)
+        order = restored["order"].get_order("ORD001")
+        assert order.total_amount == 130.0
+        assert order.status == OrderStatus.PAID
+        assert restored["payment"].get_payment("PAY_ORD002").status == PaymentStatus.REFUNDED
+        assert restored["payment"].get_balance(PaymentMethod.ALIPAY) == 7870.0
+    
+    def test_flush_commits_pending_writes(self, db_path):
+        """测试 flush 后其他连接可以读到全部写入"""
+        path, write_behind = db_path
+        services = new_state()
+        storage = SQLiteStorage(path, write_behind=write_behind, flush_interval=10.0)
+        storage.attach(services)
+        for i in range(50):
+            services["stock"].add_product(f"P{i:03d}", i)
+        storage.flush()
+        
+        reader, _ = load_from(path)
+        assert reader["stock"].get_all_stock() == services["stock"].get_all_stock()
+        storage.close()
+    
+    def test_archived_orders_are_removed(self, db_path):
+        """测试归档的订单从数据库中删除"""
+        path, write_behind = db_path
+        services = new_state(OrderArchive())
+        storage = SQLiteStorage(path, write_behind=write_behind)
+        storage.attach(services)
+        run_workload(services)
+        services["order"].archive_orders()
+        storage.close()
+        
+        restored, _ = load_from(path)
+        assert list(restored["order"].get_all_orders()) == ["ORD001"]
+    
+    def test_clear(self, db_path):
+        """测试清空数据"""
+        path, write_behind = db_path
+        services = new_state()
+        storage = SQLiteStorage(path, write_behind=write_behind)
+        storage.attach(services)
+        run_workload(services)
+        for service in services.values():
+            service.clear()
+        storage.close()
+        
+        _, loaded = load_from(path)
+        assert not loaded
+    
+    def test_record_after_writer_failure(self, tmp_path):
+        """测试后台写入失败后继续记录事件会报错，不再排队"""
+        storage = SQLiteStorage(str(tmp_path / "orders.db"))
+        created = {"order_id": "ORD001", "customer_id": "CUST001", "at": 1}
+        storage.record("order", "created", created)
+        storage.record("order", "created", created)
+        
+        with pytest.raises(sqlite3.IntegrityError):
+            storage.flush()
+        with pytest.raises(sqlite3.IntegrityError):
+            storage.record("order", "created", created)
+        assert storage._pending == []
+        storage.close()
+    
+    def test_invalid_batch_size(self, tmp_path):
+        """测试无效的批量大小"""
+        with pytest.raises(ValueError, match="批量大小必须大于0"):
+            SQLiteStorage(str(tmp_path / "orders.db"), batch_size=0)
+
+
+def test_memory_storage():
+    """测试纯内存存储不持久化"""
+    services = new_state()
+    storage = MemoryStorage()
+    storage.attach(services)
+    run_workload(services)
+    storage.close()
+    
+    assert not storage.load(new_state())
+    assert services["stock"].get_stock("P001") == 98
+
+
+def test_backend_requires_record():
+    """测试未实现 record 的存储后端不能实例化"""
+    class IncompleteStorage(StorageBackend):
+        pass
+    
+    with pytest.raises(TypeError):
+        IncompleteStorage()
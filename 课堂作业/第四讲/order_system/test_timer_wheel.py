@@ -0,0 +1,100 @@
+"""
+时间轮模块单元测试
+"""
+
+import random
+import pytest
+from .timer_wheel import TimerWheel
+
+
+class TestTimerWheel:
+    """时间轮测试"""
+    
+    def test_schedule_and_expire(self):
+        """测试任务按时到期"""
+        wheel = TimerWheel(tick=1.0)
+        wheel.schedule("A", 5)
+        
+        assert wheel.advance(4) == []
+        assert wheel.advance(5) == ["A"]
+        assert len(wheel) == 0
+    
+    def test_cancel(self):
+        """测试取消任务"""
+        wheel = TimerWheel(tick=1.0)
+        wheel.schedule("A", 5)
+        
+        assert wheel.cancel("A") is True
+        assert wheel.cancel("A") is False
+        assert wheel.advance(10) == []
+    
+    def test_reschedule(self):
+        """测试重置任务到期时间"""
+        wheel = TimerWheel(tick=1.0)
+        wheel.schedule("A", 5)
+        wheel.schedule("A", 8)
+        
+        assert wheel.advance(5) == []
+        assert wheel.advance(8) == ["A"]
+    
+    def test_past_deadline_expires_on_next_tick(self):
+        """测试已过期时间在下一个 tick 到期"""
+        wheel = TimerWheel(tick=1.0, start=10)
+        wheel.schedule("A", 3)
+        
+        assert wheel.advance(11) == ["A"]
+    
+    def test_cascade_across_levels(self):
+        """测试跨层任务逐层下沉后准确到期"""
+        wheel = TimerWheel(tick=1.0, slots=4, levels=3)
+        deadlines = {"A": 3, "B": 17, "C": 50, "D": 64, "E": 200}
+        for key, deadline in deadlines.items():
+            wheel.schedule(key, deadline)
+        
+        for now in range(1, 201):
+            for key in wheel.advance(now):
+                assert deadlines[key] == now
+        
+        assert len(wheel) == 0
+    
+    @pytest.mark.parametrize("levels", [1, 2])
+    def test_deadline_beyond_one_lap(self, levels):
+        """测试超过一圈的任务不会提前一圈到期"""
+        wheel = TimerWheel(tick=1.0, slots=4, levels=levels)
+        deadlines = {"A": 5, "B": 19, "C": 40, "D": 100}
+        for key, deadline in deadlines.items():
+            wheel.schedule(key, deadline)
+        
+        for now in range(1, 101):
+            for key in wheel.advance(now):
+                assert deadlines[key] == now
+        
+        assert len(wheel) == 0
+    
+    def test_many_random_timers(self):
+        """测试大量随机任务全部按时到期"""
+        rng = random.Random(42)
+        wheel = TimerWheel(tick=0.5, slots=8, levels=3)
+        deadlines = {i: rng.uniform(0, 300) for i in range(2000)}
+        for key, deadline in deadlines.items():
+            wheel.schedule(key, deadline)
+        
+        expired_at = {}
+        now = 0.0
+        while now < 301:
+            now += 0.5
+            for key in wheel.advance(now):
+                expired_at[key] = now
+        
+        assert len(expired_at) == 2000
+        for key, deadline in deadlines.items():
+            assert deadline <= expired_at[key] < deadline + 0.5 + 1e-9
+    
+    def test_invalid_parameters(self):
+        """测试无效参数"""
+        with pytest.raises(ValueError):
+            TimerWheel(tick=0)
+        with pytest.raises(ValueError):
+            TimerWheel(slots=1)
+        with pytest.raises(ValueError):
+            TimerWheel(levels=0)
@@ -0,0 +1,104 @@
+"""
+支付处理跟踪模块单元测试
+"""
+
+import pytest
+from .trace_store import TraceStore
+
+
+class TestTraceStore:
+    """支付处理跟踪存储测试"""
+    
+    def test_trace_steps(self):
+        """测试记录步骤并结束跟踪"""
+        store = TraceStore()
+        trace = store.start("PAY_1")
+        trace.add_step("db_insert", "记录支付开始")
+        trace.add_step("db_commit", "提交事务")
+        store.finish(trace)
+        
+        result = store.get("PAY_1").to_dict()
+        
+        assert result["status"] == "completed"
+        assert [step["step"] for step in result["steps"]] == ["db_insert", "db_commit"]
+        assert result["steps"][0]["elapsed_ms"] <= result["steps"][1]["elapsed_ms"]
+        assert result["duration_ms"] >= result["steps"][1]["elapsed_ms"]
+        assert result["start_time"] <= result["end_time"]
+        assert "error" not in result
+    
+    def test_failed_trace(self):
+        """测试失败的跟踪记录错误"""
+        store = TraceStore()
+        trace = store.start("PAY_1")
+        store.finish(trace, "数据库连接错误")
+        
+        result = trace.to_dict()
+        
+        assert result["status"] == "failed"
+        assert result["error"] == "数据库连接错误"
+    
+    def test_counters(self):
+        """测试处理中、已完成和失败的计数"""
+        store = TraceStore()
+        first = store.start("PAY_1")
+        second = store.start("PAY_2")
+        store.start("PAY_3")
+        store.finish(first)
+        store.finish(second, "余额不足")
+        store.finish(second)
+        
+        assert store.get_stats() == {"processing": 1, "completed": 1, "failed": 1, "traces": 3}
+    
+    def test_ring_buffer_drops_oldest(self):
+        """测试超出上限时丢弃最早的跟踪，计数不受影响"""
+        store = TraceStore(capacity=2)
+        evicted = store.start("PAY_1")
+        store.start("PAY_2")
+        store.start("PAY_3")
+        
+        assert store.get("PAY_1") is None
+        assert len(store) == 2
+        
+        store.finish(evicted)
+        assert store.get_stats()["processing"] == 2
+        assert store.get_stats()["completed"] == 1
+    
+    def test_restart_replaces_trace(self):
+        """测试同一支付重新处理时替换原有跟踪"""
+        store = TraceStore(capacity=2)
+        store.finish(store.start("PAY_1"), "数据库连接错误")
+        store.start("PAY_2")
+        retry = store.start("PAY_1")
+        store.start("PAY_3")
+        
+        assert store.get("PAY_1") is retry
+        assert store.get("PAY_2") is None
+    
+    def test_steps_are_bounded(self):
+        """测试超过上限的步骤只计数不保存"""
+        store = TraceStore(max_steps=2)
+        trace = store.start("PAY_1")
+        for i in range(5):
+            trace.add_step(f"step_{i}", "步骤")
+        
+        result = trace.to_dict()
+        
+        assert len(result["steps"]) == 2
+        assert result["dropped_steps"] == 3
+    
+    def test_clear_keeps_processing_count(self):
+        """测试清空时保留处理中的计数"""
+        store = TraceStore()
+        store.finish(store.start("PAY_1"))
+        store.start("PAY_2")
+        
+        store.clear()
+        
+        assert store.get_stats() == {"processing": 1, "completed": 0, "failed": 0, "traces": 0}
+    
+    def test_invalid_arguments(self):
+        """测试无效参数"""
+        with pytest.raises(ValueError):
+            TraceStore(capacity=0)
+        with pytest.raises(ValueError):
+            TraceStore(max_steps=0)
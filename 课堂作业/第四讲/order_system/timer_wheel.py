@@ -0,0 +1,153 @@
+"""
+分层时间轮模块
+用于大量定时任务（如库存暂扣过期）的调度，添加、取消和到期均摊 O(1)
+"""
+
+import math
+from typing import Dict, Hashable, List, Tuple
+
+
+class TimerWheel:
+    """
+    分层时间轮
+    
+    第 0 层每个槽代表一个 tick，第 n 层每个槽代表 slots^n 个 tick。
+    定时任务先放入能容纳其剩余时间的最低层，随着时间推进逐层下沉，
+    每个任务最多下沉 levels 次，因此推进时间的代价与到期任务数成正比，
+    不需要扫描全部任务。
+    """
+    
+    def __init__(self, tick: float = 1.0, slots: int = 64, levels: int = 4,
+                 start: float = 0.0):
+        """
+        初始化时间轮
+        
+        Args:
+            tick: 每个 tick 的时长（秒）
+            slots: 每层的槽数量
+            levels: 层数
+            start: 起始时间
+        
+        Raises:
+            ValueError: 参数无效
+        """
+        if tick <= 0:
+            raise ValueError(f"tick 必须大于0: {tick}")
+        if slots < 2:
+            raise ValueError(f"每层槽数量不能小于2: {slots}")
+        if levels < 1:
+            raise ValueError(f"层数必须大于0: {levels}")
+        
+        self._tick = tick
+        self._slots = slots
+        self._levels = levels
+        self._current_tick = int(start / tick)
+        # 每层每个槽: 任务键 -> 到期 tick
+        self._wheels: List[List[Dict[Hashable, int]]] = [
+            [{} for _ in range(slots)] for _ in range(levels)
+        ]
+        # 任务键 -> (层, 槽)
+        self._timers: Dict[Hashable, Tuple[int, int]] = {}
+    
+    def schedule(self, key: Hashable, deadline: float) -> None:
+        """
+        添加或重置定时任务
+        
+        Args:
+            key: 任务键
+            deadline: 到期时间（与 advance 使用同一时钟）
+        """
+        self.cancel(key)
+        # 向上取整，任务不会早于到期时间触发
+        expire_tick = max(math.ceil(deadline / self._tick), self._current_tick + 1)
+        self._place(key, expire_tick)
+    
+    def cancel(self, key: Hashable) -> bool:
+        """
+        取消定时任务
+        
+        Args:
+            key: 任务键
+        
+        Returns:
+            任务是否存在
+        """
+        position = self._timers.pop(key, None)
+        if position is None:
+            return False
+        
+        level, slot = position
+        del self._wheels[level][slot][key]
+        return True
+    
+    def advance(self, now: float) -> List[Hashable]:
+        """
+        推进时间并收集到期任务
+        
+        Args:
+            now: 当前时间
+        
+        Returns:
+            到期的任务键列表（按到期顺序）
+        """
+        target_tick = int(now / self._tick)
+        expired: List[Hashable] = []
+        
+        while self._current_tick < target_tick:
+            if not self._timers:
+                self._current_tick = target_tick
+                break
+            
+            self._current_tick += 1
+            
+            # 从高层到低层下沉，保证同一 tick 下沉到低层的任务也能继续下沉
+            for level in range(self._levels - 1, 0, -1):
+                span = self._slots ** level
+                if self._current_tick % span == 0:
+                    self._cascade(level, (self._current_tick // span) % self._slots)
+            
+            bucket = self._wheels[0][self._current_tick % self._slots]
+            if bucket:
+                entries = list(bucket.items())
+                bucket.clear()
+                for key, expire_tick in entries:
+                    # 层数不足时第 0 层的槽会容纳多圈之后的任务，未到期的重新放入
+                    if expire_tick > self._current_tick:
+                        self._place(key, expire_tick)
+                    else:
+                        del self._timers[key]
+                        expired.append(key)
+        
+        return expired
+    
+    def _place(self, key: Hashable, expire_tick: int) -> None:
+        """将任务放入合适的层和槽"""
+        delta = expire_tick - self._current_tick
+        level = 0
+        span = self._slots
+        while delta >= span and level < self._levels - 1:
+            level += 1
+            span *= self._slots
+        
+        slot = (expire_tick // (self._slots ** level)) % self._slots
+        self._wheels[level][slot][key] = expire_tick
+        self._timers[key] = (level, slot)
+    
+    def _cascade(self, level: int, slot: int) -> None:
+        """将高层槽中的任务重新放入低层"""
+        bucket = self._wheels[level][slot]
+        if not bucket:
+            return
+        
+        entries = list(bucket.items())
+        bucket.clear()
+        for key, expire_tick in entries:
+            self._place(key, max(expire_tick, self._current_tick))
+    
+    def __len__(self) -> int:
+        """定时任务数量"""
+        return len(self._timers)
+    
+    def __contains__(self, key: Hashable) -> bool:
+        """任务是否存在"""
+        return key in self._timers
@@ -0,0 +1,39 @@
+"""
+时间戳工具模块
+订单和支付的时间以整数纪元微秒保存，比 datetime 对象更节省内存
+"""
+
+import time
+from datetime import datetime
+
+
+def now_us() -> int:
+    """当前时间（纪元微秒）"""
+    return time.time_ns() // 1000
+
+
+def to_datetime(timestamp_us: int) -> datetime:
+    """
+    纪元微秒转换为本地时间
+    
+    Args:
+        timestamp_us: 纪元微秒
+    
+    Returns:
+        不带时区的本地时间
+    """
+    seconds, micros = divmod(timestamp_us, 1_000_000)
+    return datetime.fromtimestamp(seconds).replace(microsecond=micros)
+
+
+def from_datetime(value: datetime) -> int:
+    """
+    时间转换为纪元微秒
+    
+    Args:
+        value: 时间（不带时区时视为本地时间）
+    
+    Returns:
+        纪元微秒
+    """
+    return int(value.replace(microsecond=0).timestamp()) * 1_000_000 + value.microsecond
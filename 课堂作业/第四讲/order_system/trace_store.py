@@ -0,0 +1,188 @@
+"""
+支付处理跟踪模块
+只保留最近若干笔支付的处理步骤（环形缓冲），步骤以元组保存、用单调时钟纳秒计时；
+处理中、已完成和失败的数量随状态变化增量维护，查询统计不遍历跟踪记录
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+from timestamps import now_us, to_datetime
+
+
+class PaymentTrace:
+    """一笔支付的处理跟踪"""
+    
+    __slots__ = (
+        "payment_id", "status", "error", "dropped_steps",
+        "_steps", "_max_steps", "_start_us", "_start_ns", "_end_ns",
+    )
+    
+    def __init__(self, payment_id: str, max_steps: int):
+        """
+        初始化处理跟踪
+        
+        Args:
+            payment_id: 支付ID
+            max_steps: 最多保留的步骤数
+        """
+        self.payment_id = payment_id
+        self.status = "processing"
+        self.error: Optional[str] = None
+        self.dropped_steps = 0
+        # (相对开始的纳秒, 步骤, 描述)
+        self._steps: List[Tuple[int, str, str]] = []
+        self._max_steps = max_steps
+        # 墙上时间只记录开始时刻，其余时刻由单调时钟的偏移推算
+        self._start_us = now_us()
+        self._start_ns = time.monotonic_ns()
+        self._end_ns: Optional[int] = None
+    
+    @property
+    def done(self) -> bool:
+        """处理是否已结束"""
+        return self._end_ns is not None
+    
+    def add_step(self, step: str, description: str) -> None:
+        """
+        记录一个处理步骤，超过上限的步骤只计数不保存
+        
+        Args:
+            step: 步骤标识
+            description: 步骤描述
+        """
+        if len(self._steps) >= self._max_steps:
+            self.dropped_steps += 1
+            return
+        self._steps.append((time.monotonic_ns() - self._start_ns, step, description))
+    
+    def _isoformat(self, offset_ns: int) -> str:
+        """相对开始的纳秒偏移转换为 ISO 格式时间"""
+        return to_datetime(self._start_us + offset_ns // 1000).isoformat()
+    
+    def to_dict(self) -> Dict[str, Any]:
+        """转换为字典"""
+        result: Dict[str, Any] = {
+            "status": self.status,
+            "start_time": self._isoformat(0),
+            "steps": [
+                {
+                    "step": step,
+                    "description": description,
+                    "timestamp": self._isoformat(offset_ns),
+                    "elapsed_ms": offset_ns / 1_000_000,
+                }
+                for offset_ns, step, description in self._steps
+            ],
+        }
+        if self.dropped_steps:
+            result["dropped_steps"] = self.dropped_steps
+        if self._end_ns is not None:
+            duration_ns = self._end_ns - self._start_ns
+            result["end_time"] = self._isoformat(duration_ns)
+            result["duration_ms"] = duration_ns / 1_000_000
+        if self.error is not None:
+            result["error"] = self.error
+        return result
+
+
+class TraceStore:
+    """
+    支付处理跟踪存储
+    
+    按开始顺序保留最近 capacity 笔支付的跟踪，超出时丢弃最早的记录。
+    被丢弃的跟踪仍可继续记录步骤和结束，计数不受影响。
+    """
+    
+    def __init__(self, capacity: int = 10000, max_steps: int = 64):
+        """
+        初始化跟踪存储
+        
+        Args:
+            capacity: 最多保留的跟踪数
+            max_steps: 每笔支付最多保留的步骤数
+        
+        Raises:
+            ValueError: 参数无效
+        """
+        if capacity <= 0:
+            raise ValueError(f"跟踪数上限必须大于0: {capacity}")
+        if max_steps <= 0:
+            raise ValueError(f"步骤数上限必须大于0: {max_steps}")
+        
+        self.capacity = capacity
+        self.max_steps = max_steps
+        self._lock = threading.Lock()
+        self._traces: "OrderedDict[str, PaymentTrace]" = OrderedDict()
+        self._counts = {"processing": 0, "completed": 0, "failed": 0}
+    
+    def __len__(self) -> int:
+        """保留的跟踪数"""
+        return len(self._traces)
+    
+    def start(self, payment_id: str) -> PaymentTrace:
+        """
+        开始跟踪一笔支付（同一支付重新处理时替换原有跟踪）
+        
+        Args:
+            payment_id: 支付ID
+        
+        Returns:
+            处理跟踪
+        """
+        trace = PaymentTrace(payment_id, self.max_steps)
+        with self._lock:
+            self._traces.pop(payment_id, None)
+            self._traces[payment_id] = trace
+            if len(self._traces) > self.capacity:
+                self._traces.popitem(last=False)
+            self._counts["processing"] += 1
+        return trace
+    
+    def finish(self, trace: PaymentTrace, error: Optional[str] = None) -> None:
+        """
+        结束跟踪
+        
+        Args:
+            trace: start 返回的处理跟踪
+            error: 失败原因，为空表示处理完成
+        """
+        with self._lock:
+            if trace.done:
+                return
+            trace._end_ns = time.monotonic_ns()
+            trace.status = "completed" if error is None else "failed"
+            trace.error = error
+            self._counts["processing"] -= 1
+            self._counts[trace.status] += 1
+    
+    def get(self, payment_id: str) -> Optional[PaymentTrace]:
+        """
+        获取支付的处理跟踪
+        
+        Args:
+            payment_id: 支付ID
+        
+        Returns:
+            处理跟踪，不存在或已被丢弃时返回 None
+        """
+        return self._traces.get(payment_id)
+    
+    def get_stats(self) -> Dict[str, int]:
+        """
+        获取处理统计
+        
+        Returns:
+            处理中、已完成、失败的数量和保留的跟踪数
+        """
+        with self._lock:
+            return dict(self._counts, traces=len(self._traces))
+    
+    def clear(self) -> None:
+        """丢弃所有跟踪并清零已完成和失败的计数（处理中的计数保留）"""
+        with self._lock:
+            self._traces.clear()
+            self._counts["completed"] = 0
+            self._counts["failed"] = 0